@@ -1,28 +1,79 @@
-import os
+from datetime import datetime
 import streamlit as st
-from src.config import get_supabase
-from src.services import product_service, order_service, customer_service
+import src.config as config
+from src.services import product_service, report_service, sales_aggregates
+from src.services.catalog_view import CatalogView
 
 st.title("Retail Inventory & Order Management")
 
-# Example: show products
-if st.button("Refresh products"):
-    pass
+@st.cache_resource
+def _terminal():
+    # one replica and sync thread per server process (TERMINAL_MODE)
+    from src.services import terminal
+    return terminal.start()
 
-products = product_service.list_products()  # implement this service wrapper
-for p in products:
-    st.write(f"{p['prod_id']}: {p['name']} — ₹{p['price']} — stock: {p['stock']}— categoty: {p['category']}")
+if config.TERMINAL_MODE:
+    sync = _terminal().status()
+    lag = sync["tables"]["products"]["lag_s"]
+    st.caption(f"Terminal {'online' if sync['online'] else 'offline'} · "
+               f"catalog synced {'never' if lag is None else f'{lag:.0f}s ago'} · "
+               f"{sync['waiting']} orders waiting to sync")
 
-# Example: add a product form
+# Sales at a glance (running totals, O(1) reads)
+now = datetime.utcnow()
+col_month, col_last = st.columns(2)
+col_month.metric("Revenue this month", f"₹{sales_aggregates.revenue_for_month(now.year, now.month):,.2f}")
+col_last.metric("Revenue last month", f"₹{report_service.total_revenue_last_month():,.2f}")
+
+@st.cache_resource
+def _search_index():
+    # built once per server process; kept current by product_service on add/update/delete
+    return product_service.enable_search_index()
+
+# Typeahead search (prefix + fuzzy, served from the in-process index)
+query = st.text_input("Search products")
+if query:
+    _search_index()
+    for p in product_service.quick_search(query):
+        st.write(f"{p['prod_id']}: {p['name']} — ₹{p['price']} — stock: {p['stock']}")
+
+# Example: add a product form (above the table, so the new row shows in this same rerun)
 with st.form("add_product"):
     name = st.text_input("Name")
     sku = st.text_input("SKU")
     price = st.number_input("Price", min_value=0.0, format="%.2f")
     stock = st.number_input("Stock", min_value=0, step=1)
-    category = st.text_input("Categoty")
+    category = st.text_input("Category")
     if st.form_submit_button("Add"):
         try:
             product_service.add_product(name, sku, price, int(stock),category)
             st.success("Product added")
         except Exception as e:
-            st.error(f"Failed: {e}")
\ No newline at end of file
+            st.error(f"Failed: {e}")
+
+def _catalog() -> CatalogView:
+    # one view per browser session: it survives reruns, picks up this server's writes
+    # through events and only fetches changed rows once it is older than the refresh interval
+    view = st.session_state.get("catalog")
+    if view is None:
+        view = st.session_state["catalog"] = CatalogView()
+        view.refresh()
+    elif view.stats()["age_s"] >= config.CATALOG_REFRESH_INTERVAL:
+        view.refresh()
+    return view
+
+st.subheader("Products")
+catalog = _catalog()
+col_category, col_refresh = st.columns([3, 1])
+category = col_category.selectbox("Category", ["All"] + catalog.categories())
+category = None if category == "All" else category
+if col_refresh.button("Refresh products"):
+    catalog.refresh()
+pages = catalog.page_count(config.CATALOG_PAGE_SIZE, category)
+page_no = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, step=1)
+st.dataframe(catalog.page(int(page_no) - 1, category=category).to_columns(),
+             use_container_width=True, hide_index=True)
+stats = catalog.stats()
+last = stats["last_refresh"]
+st.caption(f"{catalog.count(category):,} of {stats['rows']:,} products · cache age {stats['age_s']:.0f}s · "
+           f"last refresh: {last.get('mode')} ({last.get('rows', 0):,} rows, {last.get('ms', 0):.0f} ms)")
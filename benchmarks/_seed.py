@@ -0,0 +1,89 @@
+"""Helpers shared by the benchmark scripts."""
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+from src import config
+from src.backends.memory import MemoryClient
+from src.dao import cache
+
+
+def seed_catalog(sb: MemoryClient, products: int = 100, customers: int = 10, stock: int = 10_000,
+                 categories=("grocery", "dairy", "snacks", "household"), rng: random.Random | None = None):
+    """Bulk-load products and customers straight into the stand-in (not counted as round trips)."""
+    rng = rng or random.Random(42)
+    sb.table("products").insert([
+        {"name": f"Product {i}", "sku": f"SKU-{i:06d}", "price": round(rng.uniform(1, 500), 2),
+         "stock": stock, "category": categories[i % len(categories)]}
+        for i in range(products)
+    ]).execute()
+    sb.table("customers").insert([
+        {"name": f"Customer {i}", "email": f"c{i}@example.com", "phone": f"9{i:09d}", "city": "Pune"}
+        for i in range(customers)
+    ]).execute()
+    sb.reset_counters()
+
+
+_ADJECTIVES = ["organic", "fresh", "classic", "spicy", "sweet", "salted", "roasted", "premium",
+               "low-fat", "crunchy", "whole", "mini", "family", "instant", "herbal", "dark"]
+_NOUNS = ["milk", "bread", "chocolate", "coffee", "tea", "rice", "almonds", "cookies", "butter",
+          "cheese", "noodles", "juice", "yogurt", "honey", "oats", "chips", "soap", "detergent"]
+
+
+def seed_store(sb: MemoryClient, products: int, customers: int, orders: int, rng: random.Random,
+               days: int = 120, now: Optional[datetime] = None, batch: int = 2000) -> Dict[str, int]:
+    """
+    Synthetic store for the benchmark suite: a catalog with word-based names
+    and varied stock (some of it low), customers in a few cities, and an
+    order history of 1-5 line orders spread over the last `days` days with a
+    PLACED/COMPLETED/CANCELLED mix. Loaded straight into the stand-in; the
+    same rng seed always produces the same store.
+    """
+    cities = ["Pune", "Mumbai", "Delhi", "Bengaluru", "Chennai"]
+    categories = ["grocery", "dairy", "snacks", "household", "beverages"]
+    catalog = []
+    for i in range(products):
+        name = f"{rng.choice(_ADJECTIVES).title()} {rng.choice(_NOUNS)} {rng.choice([100, 250, 500, 1000])}g"
+        stock = rng.randint(0, 10) if rng.random() < 0.05 else rng.randint(50, 5000)
+        catalog.append({"name": name, "sku": f"SKU-{i:06d}", "price": round(rng.uniform(1, 500), 2),
+                        "stock": stock, "category": categories[i % len(categories)]})
+    for start in range(0, products, batch):
+        sb.table("products").insert(catalog[start:start + batch]).execute()
+    people = [{"name": f"Customer {i}", "email": f"c{i}@example.com", "phone": f"9{i:09d}",
+               "city": rng.choice(cities)} for i in range(customers)]
+    for start in range(0, customers, batch):
+        sb.table("customers").insert(people[start:start + batch]).execute()
+
+    now = now or datetime.now(timezone.utc)
+    for start in range(0, orders, batch):
+        order_rows, lines = [], []
+        for _ in range(min(batch, orders - start)):
+            basket = [(rng.randint(1, products), rng.randint(1, 4)) for _ in range(rng.randint(1, 5))]
+            when = now - timedelta(days=rng.uniform(0, days))
+            order_rows.append({
+                "cust_id": rng.randint(1, customers),
+                "order_date": when.isoformat(),
+                "total_amount": round(sum(catalog[p - 1]["price"] * q for p, q in basket), 2),
+                "status": rng.choices(["PLACED", "COMPLETED", "CANCELLED"], weights=[2, 7, 1])[0],
+            })
+            lines.append(basket)
+        inserted = sb.table("orders").insert(order_rows).execute().data
+        items = [{"order_id": o["order_id"], "prod_id": p, "quantity": q, "price": catalog[p - 1]["price"]}
+                 for o, basket in zip(inserted, lines) for p, q in basket]
+        sb.table("order_items").insert(items).execute()
+    sb.reset_counters()
+    return {"products": products, "customers": customers, "orders": orders}
+
+
+def install(latency_ms: float = 0.0, use_cache: bool = False, backend: str = "memory",
+            path: str = ":memory:") -> MemoryClient:
+    """
+    Create a stand-in client and route every DAO call to it.
+    backend is "memory" or "sqlite" (at `path`, a private in-memory database by default).
+    The row cache is off by default so round-trip counts are comparable.
+    """
+    kwargs = {"path": path} if backend == "sqlite" else {}
+    sb = config.open_backend(backend, latency=latency_ms / 1000.0, **kwargs)
+    config.use_client(sb)
+    config.CACHE_ENABLED = use_cache
+    cache.clear_caches()
+    return sb
@@ -0,0 +1,141 @@
+"""
+Offline analytics snapshot (src/services/analytics_service.py) versus the
+live report queries, on a seeded order history over the in-memory stand-in
+with per-round-trip latency.
+
+  live        report_service / sales_aggregates questions, each a fresh
+              set of queries and per-row loops
+  snapshot    the first full load, an incremental refresh after new,
+              paid, cancelled and rolled-back orders, and the same
+              questions answered from the memory-mapped columns
+
+Checks that the snapshot answers match the live ones (money rounded to
+cents) before and after the changes, and that the incrementally refreshed
+snapshot matches one loaded from scratch.
+
+    python -m benchmarks.analytics [--orders 20000] [--latency-ms 2]
+"""
+import argparse
+import random
+import shutil
+import sys
+import tempfile
+import time
+from typing import Dict, List
+from src import config
+from src.dao import order_dao
+from src.services import analytics_service, order_service, payment_service, report_service, sales_aggregates
+from benchmarks._seed import install, seed_store
+
+
+def _money(rows: List[Dict]) -> List[Dict]:
+    return [{k: round(v, 2) if isinstance(v, float) else v for k, v in r.items()} for r in rows]
+
+
+def _live(limit: int, n: int) -> Dict:
+    agg = sales_aggregates.rebuild()
+    return {
+        "top-products": _money(report_service.top_selling_products(limit)),
+        "orders-per-customer": _money(report_service.orders_per_customer()),
+        "more-than-n": _money(report_service.customers_more_than_n_orders(n)),
+        "revenue-by-month": {k: round(v, 2) for k, v in agg.revenue_by_month.items()},
+        "revenue-by-day": {k: round(v, 2) for k, v in agg.revenue_by_day.items()},
+    }
+
+
+def _offline(snap: analytics_service.Snapshot, limit: int, n: int) -> Dict:
+    return {
+        "top-products": snap.top_selling_products(limit),
+        "orders-per-customer": snap.orders_per_customer(),
+        "more-than-n": snap.customers_more_than_n_orders(n),
+        "revenue-by-month": {r["period"]: r["revenue"] for r in snap.revenue_by_period("month")},
+        "revenue-by-day": {r["period"]: r["revenue"] for r in snap.revenue_by_period("day")},
+    }
+
+
+def _timed(sb, fn, *args):
+    sb.reset_counters()
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, sb.round_trips, (time.perf_counter() - start) * 1000
+
+
+def _compare(label: str, got: Dict, want: Dict) -> bool:
+    ok = True
+    for question, rows in want.items():
+        if got[question] != rows:
+            print(f"MISMATCH {label}: {question}")
+            ok = False
+    return ok
+
+
+def _change_history(sb, rng: random.Random, products: int, customers: int, new_orders: int, snap):
+    """New, paid and cancelled orders, plus placements caught half-written by a refresh."""
+    half_written = [order_dao.create_order_row(rng.randint(1, customers), 25.0) for _ in range(2)]
+    snap.refresh()   # sees both orders without items
+    order_dao.delete_orders([half_written[0]["order_id"]])   # rolled back
+    order_dao.add_order_items(half_written[1]["order_id"], [{"prod_id": 1, "quantity": 1, "price": 25.0}])
+    placed = [o["order_id"] for o in order_dao.iter_orders(status="PLACED")]
+    for order_id in rng.sample(placed, len(placed) // 4):
+        payment_service.pay_order(order_id, "card")
+    for order_id in rng.sample(placed, len(placed) // 8):
+        try:
+            order_service.cancel_order(order_id)
+        except Exception:
+            pass   # already paid above
+    for _ in range(new_orders):
+        basket = [{"prod_id": rng.randint(1, products), "quantity": rng.randint(1, 3)} for _ in range(rng.randint(1, 4))]
+        try:
+            order_service.create_order(rng.randint(1, customers), basket)
+        except Exception:
+            pass   # out of stock
+
+
+def run(orders: int = 20_000, products: int = 2_000, customers: int = 2_000, latency_ms: float = 2.0,
+        new_orders: int = 200, limit: int = 10, n: int = 12) -> bool:
+    sb = install(latency_ms)
+    tmp = tempfile.mkdtemp(prefix="retail-analytics-bench-")
+    ok = True
+    try:
+        rng = random.Random(21)
+        seed_store(sb, products=products, customers=customers, orders=orders, rng=rng)
+        live, live_rt, live_ms = _timed(sb, _live, limit, n)
+        snap = analytics_service.Snapshot(f"{tmp}/incremental")
+        build, build_rt, build_ms = _timed(sb, snap.refresh)
+        answers, _, offline_ms = _timed(sb, _offline, snap, limit, n)
+        ok &= _compare("after full load", answers, live)
+
+        _change_history(sb, rng, products, customers, new_orders, snap)
+        refreshed, refresh_rt, refresh_ms = _timed(sb, snap.refresh)
+        live = _live(limit, n)
+        ok &= _compare("after incremental refresh", _offline(snap, limit, n), live)
+        fresh = analytics_service.Snapshot(f"{tmp}/fresh")
+        fresh.refresh()
+        ok &= _compare("incremental vs from scratch", _offline(snap, limit, n), _offline(fresh, limit, n))
+        if snap.basket_metrics() != fresh.basket_metrics():
+            print("MISMATCH incremental vs from scratch: basket metrics")
+            ok = False
+        basket_ms = _timed(sb, snap.basket_metrics)[2]
+    finally:
+        config.use_client(None)
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    print(f"orders={orders} items={build['rows']['items']} latency={latency_ms}ms per round trip")
+    print(f"{'step':<36}{'round trips':>12}{'ms':>10}")
+    print(f"{'live: 5 questions':<36}{live_rt:>12}{live_ms:>10.0f}")
+    print(f"{'snapshot: full load':<36}{build_rt:>12}{build_ms:>10.0f}")
+    print(f"{'snapshot: 5 questions':<36}{0:>12}{offline_ms:>10.1f}")
+    print(f"{'snapshot: basket metrics':<36}{0:>12}{basket_ms:>10.1f}")
+    print(f"{'snapshot: incremental refresh':<36}{refresh_rt:>12}{refresh_ms:>10.0f}"
+          f"   (+{refreshed['orders']} orders, {refreshed['status_changes']} status changes)")
+    print("PASS" if ok else "FAIL")
+    return ok
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--orders", type=int, default=20_000)
+    ap.add_argument("--latency-ms", type=float, default=2.0)
+    ap.add_argument("--new-orders", type=int, default=200)
+    a = ap.parse_args()
+    sys.exit(0 if run(a.orders, latency_ms=a.latency_ms, new_orders=a.new_orders) else 1)
@@ -0,0 +1,53 @@
+"""
+Latency of the service hot paths with and without concurrent async fan-out
+(config.ASYNC_FANOUT). With fan-out, independent reads overlap so a call
+costs roughly its longest dependency chain instead of the sum of round trips.
+
+    python -m benchmarks.async_fanout [--latency-ms 20] [--repeat 10]
+"""
+import argparse
+import time
+from src import config
+from src.services import order_service
+from benchmarks._seed import install, seed_catalog
+
+
+def _ms(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def run(latency_ms=20.0, repeat=10):
+    sb = install(latency_ms)
+    try:
+        seed_catalog(sb, products=20, customers=2, stock=10 ** 9)
+        basket = [{"prod_id": p, "quantity": 1} for p in range(1, 11)]
+        order_id = order_service.create_order(1, basket)["order"]["order_id"]
+        for _ in range(9):
+            order_service.create_order(1, basket)
+
+        cases = [
+            ("create_order (10 lines)", lambda: order_service.create_order(2, basket)),
+            ("get_order_details", lambda: order_service.get_order_details(order_id)),
+            ("customer orders page (10)", lambda: order_service.get_customer_order_details(1)),
+        ]
+        print(f"latency per round trip: {latency_ms} ms")
+        print(f"{'operation':<28}{'sequential ms':>15}{'fan-out ms':>12}")
+        for name, fn in cases:
+            config.ASYNC_FANOUT = False
+            seq = _ms(fn, repeat)
+            config.ASYNC_FANOUT = True
+            par = _ms(fn, repeat)
+            print(f"{name:<28}{seq:>15.1f}{par:>12.1f}")
+    finally:
+        config.use_client(None)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--latency-ms", type=float, default=20.0)
+    ap.add_argument("--repeat", type=int, default=10)
+    a = ap.parse_args()
+    run(a.latency_ms, a.repeat)
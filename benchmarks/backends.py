@@ -0,0 +1,96 @@
+"""
+Service-layer cost per operation on each local storage engine, with no
+network in the way: the same mixed workload (product/customer writes,
+order placement, order details, cancel, reports) runs against the memory
+engine, SQLite in memory and a SQLite WAL file.
+
+The workload's results are compared across engines, so this doubles as a
+conformance check of the SQLite engine against the memory one. Exits
+non-zero if they disagree.
+
+    python -m benchmarks.backends [--orders 500] [--sqlite-path /tmp/bench.db]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from src import config
+from src.dao import customer_dao, product_dao
+from src.services import customer_service, order_service, product_service, report_service
+from benchmarks._seed import install
+
+
+def _strip(value):
+    """Drop columns that legitimately differ between runs (timestamps)."""
+    if isinstance(value, dict):
+        return {k: _strip(v) for k, v in value.items() if k not in ("order_date", "paid_at", "updated_at")}
+    if isinstance(value, list):
+        return [_strip(v) for v in value]
+    if isinstance(value, float):
+        return round(value, 6)
+    return value
+
+
+def _workload(orders: int):
+    timings, results = {}, []
+
+    def timed(name, fn, n):
+        start = time.perf_counter()
+        out = [fn(i) for i in range(n)]
+        timings[name] = (time.perf_counter() - start) / n * 1e6
+        results.append((name, _strip(out)))
+        return out
+
+    products = timed("add_product", lambda i: product_service.add_product(
+        f"Product {i}", f"SKU-{i:05d}", 10.0 + i % 7, 1000, ("dairy", "snacks")[i % 2]), 100)
+    customers = timed("add_customer", lambda i: customer_service.add_customer(
+        f"Customer {i}", f"c{i}@example.com", f"9{i:09d}", "Pune"), 50)
+
+    def place(i):
+        basket = [{"prod_id": products[(i * 7 + k) % 100]["prod_id"], "quantity": 1 + k} for k in range(3)]
+        return order_service.create_order(customers[i % 50]["cust_id"], basket)["order"]
+    placed = timed("create_order", place, orders)
+    timed("get_order_details", lambda i: order_service.get_order_details(placed[i]["order_id"]), orders)
+    timed("get_product_by_sku", lambda i: product_dao.get_product_by_sku(f"SKU-{i % 100:05d}"), orders)
+    timed("get_customer_by_email", lambda i: customer_dao.get_customer_by_email(f"c{i % 50}@example.com"), orders)
+    timed("list_products", lambda i: product_dao.list_products(limit=20, category="dairy", offset=i % 30), 100)
+    timed("cancel_order", lambda i: order_service.cancel_order(placed[i * 5]["order_id"]), orders // 5)
+    timed("top_selling_products", lambda i: report_service.top_selling_products(5), 20)
+    timed("orders_per_customer", lambda i: report_service.orders_per_customer(), 20)
+    return timings, results
+
+
+def run(orders: int = 500, sqlite_path: str = None) -> bool:
+    path = sqlite_path or os.path.join(tempfile.mkdtemp(), "bench.db")
+    engines = [("memory", "memory", None), ("sqlite :memory:", "sqlite", ":memory:"), ("sqlite file", "sqlite", path)]
+    all_timings, all_results = [], []
+    try:
+        for _, backend, db in engines:
+            install(backend=backend, path=db)
+            timings, results = _workload(orders)
+            all_timings.append(timings)
+            all_results.append(results)
+    finally:
+        config.use_client(None)
+
+    print(f"{'operation (us/op)':<24}" + "".join(f"{name:>18}" for name, _, _ in engines))
+    for op in all_timings[0]:
+        print(f"{op:<24}" + "".join(f"{t[op]:>18.1f}" for t in all_timings))
+
+    ok = True
+    for (name, _, _), results in zip(engines[1:], all_results[1:]):
+        for (op, expected), (_, got) in zip(all_results[0], results):
+            if expected != got:
+                print(f"MISMATCH {name}: {op} differs from the memory engine")
+                ok = False
+    print("PASS" if ok else "FAIL")
+    return ok
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--orders", type=int, default=500)
+    ap.add_argument("--sqlite-path", default=None, help="SQLite file to use (default: a temp file); must not exist")
+    a = ap.parse_args()
+    sys.exit(0 if run(a.orders, a.sqlite_path) else 1)
@@ -0,0 +1,130 @@
+"""
+Batch mode versus a shell loop that starts retail-cli once per command.
+
+  per process   a sample of the commands run as `python -m src.cli.main ...`
+                against a seeded SQLite file (startup + imports + connect each time)
+  batch         the whole command file through batch.run_commands in one process,
+                sequentially and with --concurrency, over the in-memory stand-in
+                with per-round-trip latency
+
+Checks every batch command succeeded and that the concurrent run returns the
+same records as the sequential one (ignoring timings, write timestamps and
+the ids given to concurrently added products).
+
+    python -m benchmarks.batch_mode [--commands 400] [--concurrency 8] [--latency-ms 2] [--sample 10]
+"""
+import argparse
+import os
+import random
+import shlex
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+from src import config
+from src.cli import batch
+from benchmarks._seed import install, seed_catalog
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _commands(n: int, products: int, customers: int, seed: int = 11) -> List[str]:
+    """Per-product adds, then lookups: the shape of the shell loops batch mode replaces."""
+    rng = random.Random(seed)
+    adds = [f'product add --name "Batch item {i}" --sku BATCH-{i:05d} --price {rng.randint(1, 99)} --stock 10'
+            for i in range(n // 2)]
+    reads = []
+    for i in range(n - len(adds)):
+        kind = i % 3
+        if kind == 0:
+            reads.append(f"customer search --city {rng.choice(['Pune', 'Delhi'])}")
+        elif kind == 1:
+            reads.append(f"product list --limit 20 --category {rng.choice(['grocery', 'dairy'])}")
+        else:
+            reads.append(f"product low-stock --threshold {rng.randint(1, 5)} --limit 20")
+    return adds + reads
+
+
+def _batch(lines: List[str], latency_ms: float, concurrency: int, products: int, customers: int):
+    install(latency_ms, backend="memory")
+    try:
+        seed_catalog(config.get_supabase(), products=products, customers=customers, stock=3)
+        start = time.perf_counter()
+        records = list(batch.run_commands(lines, concurrency=concurrency))
+        return records, (time.perf_counter() - start) * 1000
+    finally:
+        config.use_client(None)
+
+
+def _per_process(lines: List[str], sample: int, products: int, customers: int) -> float:
+    tmp = tempfile.mkdtemp(prefix="retail-batch-bench-")
+    db = os.path.join(tmp, "store.db")
+    install(0.0, backend="sqlite", path=db)
+    try:
+        seed_catalog(config.get_supabase(), products=products, customers=customers, stock=3)
+    finally:
+        config.use_client(None)
+    env = dict(os.environ, STORAGE_BACKEND="sqlite", SQLITE_PATH=db, PYTHONPATH=ROOT)
+    env.pop("RETAIL_CLI_SOCKET", None)
+    picked = lines[:sample // 2] + lines[-(sample - sample // 2):]
+    start = time.perf_counter()
+    for line in picked:
+        subprocess.run([sys.executable, "-m", "src.cli.main"] + shlex.split(line), env=env, cwd=ROOT,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+    return (time.perf_counter() - start) * 1000 / len(picked)
+
+
+def _drop(value, keys):
+    if isinstance(value, dict):
+        return {k: _drop(v, keys) for k, v in value.items() if k not in keys}
+    if isinstance(value, list):
+        return [_drop(v, keys) for v in value]
+    return value
+
+
+def _strip(records: List[Dict]) -> List[Dict]:
+    # timings and write timestamps differ between runs, and concurrent adds are
+    # assigned ids in completion order; everything else must match
+    out = []
+    for r in records:
+        r = _drop(r, ("ms", "updated_at"))
+        if isinstance(r.get("result"), dict) and r["command"].startswith("product add"):
+            r["result"] = {k: v for k, v in r["result"].items() if k != "prod_id"}
+        out.append(r)
+    return out
+
+
+def run(commands: int = 400, concurrency: int = 8, latency_ms: float = 2.0, sample: int = 10,
+        products: int = 200, customers: int = 50) -> bool:
+    lines = _commands(commands, products, customers)
+    seq, seq_ms = _batch(lines, latency_ms, 1, products, customers)
+    par, par_ms = _batch(lines, latency_ms, concurrency, products, customers)
+    proc_ms = _per_process(lines, sample, products, customers)
+
+    ok = True
+    failed = [r for r in seq + par if not r["ok"]]
+    if failed:
+        print(f"FAILED commands: {failed[:3]}")
+        ok = False
+    if _strip(seq) != _strip(par):
+        print("MISMATCH between sequential and concurrent batch records")
+        ok = False
+
+    print(f"commands={commands} latency={latency_ms}ms per round trip")
+    print(f"{'mode':<32}{'total s':>9}{'ms/command':>12}")
+    print(f"{'process per command (est.)':<32}{proc_ms * commands / 1000:>9.2f}{proc_ms:>12.2f}")
+    print(f"{'batch':<32}{seq_ms / 1000:>9.2f}{seq_ms / commands:>12.2f}")
+    print(f"{f'batch --concurrency {concurrency}':<32}{par_ms / 1000:>9.2f}{par_ms / commands:>12.2f}")
+    print("PASS" if ok else "FAIL")
+    return ok
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--commands", type=int, default=400)
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--latency-ms", type=float, default=2.0)
+    ap.add_argument("--sample", type=int, default=10, help="commands run as separate processes")
+    a = ap.parse_args()
+    sys.exit(0 if run(a.commands, a.concurrency, a.latency_ms, a.sample) else 1)
@@ -0,0 +1,115 @@
+"""
+CLI startup-time measurements: lazy imports and the daemon.
+
+Seeds a small store into a temporary SQLite file, then runs retail-cli
+commands as fresh processes, each several times, and reports the median and
+best wall time for:
+
+  eager imports   importing every service module up front (what each command used to pay)
+  local           a normal invocation with lazy per-command imports
+  daemon          the same command forwarded to `retail-cli daemon serve`
+
+Fails (exit 1) if `--help` still loads the network stack or a forwarded
+command prints something different from the local run.
+
+    python -m benchmarks.cli_startup [--runs 10] [--products 2000]
+"""
+import argparse
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+from src import config
+from benchmarks._seed import install, seed_store
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+COMMANDS = [
+    ["--help"],
+    ["product", "list", "--limit", "20"],
+    ["order", "show", "--order", "7"],
+    ["customer", "search", "--city", "Pune"],
+]
+
+EAGER = "import src.services.product_service, src.services.customer_service, src.services.order_service"
+
+
+def _time(cmd: List[str], env: Dict[str, str], runs: int) -> Dict:
+    times, out = [], None
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        proc = subprocess.run(cmd, env=env, cwd=ROOT, capture_output=True, text=True)
+        times.append((time.perf_counter() - t0) * 1000)
+        out = proc.stdout
+    return {"median_ms": statistics.median(times), "best_ms": min(times), "stdout": out}
+
+
+def _wait_for(path: str, timeout: float = 30.0):
+    from src.cli import daemon
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if os.path.exists(path) and daemon.status(path) is not None:
+            return
+        time.sleep(0.05)
+    raise RuntimeError(f"daemon did not come up on {path}")
+
+
+def run(runs: int = 10, products: int = 2000) -> bool:
+    tmp = tempfile.mkdtemp(prefix="retail-cli-bench-")
+    db, sock = os.path.join(tmp, "store.db"), os.path.join(tmp, "cli.sock")
+    sb = install(0.0, backend="sqlite", path=db)
+    try:
+        seed_store(sb, products, 200, 2_000, random.Random(42))
+    finally:
+        config.use_client(None)
+
+    env = dict(os.environ, STORAGE_BACKEND="sqlite", SQLITE_PATH=db, PYTHONPATH=ROOT)
+    env.pop("RETAIL_CLI_SOCKET", None)
+    cli = [sys.executable, "-m", "src.cli.main"]
+    ok = True
+
+    imports = subprocess.run([sys.executable, "-X", "importtime", "-m", "src.cli.main", "--help"],
+                             env=env, cwd=ROOT, capture_output=True, text=True).stderr
+    heavy = sorted({m for m in ("supabase", "httpx", "dotenv") if f" {m}\n" in imports})
+    print(f"modules loaded by --help: {'none of supabase/httpx/dotenv' if not heavy else ', '.join(heavy)}")
+    if heavy:
+        ok = False
+
+    rows = [("eager imports", _time([sys.executable, "-c", EAGER], env, runs))]
+    local = {}
+    for argv in COMMANDS:
+        local[tuple(argv)] = r = _time(cli + argv, env, runs)
+        rows.append((f"local  {' '.join(argv)}", r))
+
+    server = subprocess.Popen(cli + ["daemon", "serve", "--socket", sock], env=env, cwd=ROOT,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        _wait_for(sock)
+        denv = dict(env, RETAIL_CLI_SOCKET=sock)
+        for argv in COMMANDS:
+            r = _time(cli + argv, denv, runs)
+            rows.append((f"daemon {' '.join(argv)}", r))
+            if r["stdout"] != local[tuple(argv)]["stdout"]:
+                print(f"MISMATCH daemon output for {' '.join(argv)}")
+                ok = False
+    finally:
+        subprocess.run(cli + ["daemon", "stop", "--socket", sock], env=env, cwd=ROOT, capture_output=True)
+        server.wait(timeout=10)
+
+    print(f"{'command':<44}{'median ms':>11}{'best ms':>10}")
+    for label, r in rows:
+        print(f"{label:<44}{r['median_ms']:>11.1f}{r['best_ms']:>10.1f}")
+    print("PASS" if ok else "FAIL")
+    return ok
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--runs", type=int, default=10)
+    ap.add_argument("--products", type=int, default=2000)
+    a = ap.parse_args()
+    sys.exit(0 if run(a.runs, a.products) else 1)
@@ -0,0 +1,108 @@
+"""
+Round trips per DAO write, before and after returning rows from the write itself.
+
+Runs against the in-memory stand-in (src.backends.memory), so no supabase
+project is needed. "before" replays the old insert/update-then-select and
+select-then-delete sequences; "after" calls the current src.dao functions.
+
+    python -m benchmarks.dao_roundtrips [--latency-ms 20] [--repeat 50]
+"""
+import argparse
+import time
+from src import config
+from src.backends.memory import MemoryClient
+from src.dao import customer_dao, order_dao, payment_dao, product_dao
+
+
+# ---- the pre-RETURNING implementations, kept here for comparison ----
+
+def _legacy_create_product(sb, i):
+    sku = f"L-{i}"
+    sb.table("products").insert({"name": f"p{i}", "sku": sku, "price": 10.0, "stock": 5}).execute()
+    return sb.table("products").select("*").eq("sku", sku).limit(1).execute().data[0]
+
+def _legacy_update_product(sb, prod_id):
+    sb.table("products").update({"stock": 7}).eq("prod_id", prod_id).execute()
+    return sb.table("products").select("*").eq("prod_id", prod_id).limit(1).execute().data[0]
+
+def _legacy_delete_product(sb, prod_id):
+    row = sb.table("products").select("*").eq("prod_id", prod_id).limit(1).execute().data
+    sb.table("products").delete().eq("prod_id", prod_id).execute()
+    return row
+
+def _legacy_create_customer(sb, i):
+    email = f"l{i}@example.com"
+    sb.table("customers").insert({"name": "c", "email": email, "phone": "1"}).execute()
+    return sb.table("customers").select("*").eq("email", email).limit(1).execute().data[0]
+
+def _legacy_create_order_row(sb, cust_id):
+    sb.table("orders").insert({"cust_id": cust_id, "total_amount": 10.0, "status": "PLACED"}).execute()
+    return (sb.table("orders").select("*").eq("cust_id", cust_id).eq("status", "PLACED")
+            .order("order_id", desc=True).limit(1).execute().data[0])
+
+def _legacy_update_order_status(sb, order_id):
+    sb.table("orders").update({"status": "COMPLETED"}).eq("order_id", order_id).execute()
+    return sb.table("orders").select("*").eq("order_id", order_id).limit(1).execute().data[0]
+
+def _legacy_create_payment(sb, order_id):
+    sb.table("payments").insert({"order_id": order_id, "amount": 10.0, "status": "PENDING"}).execute()
+    return (sb.table("payments").select("*").eq("order_id", order_id).eq("status", "PENDING")
+            .order("payment_id", desc=True).limit(1).execute().data[0])
+
+
+def _measure(sb: MemoryClient, fn, repeat: int):
+    sb.reset_counters()
+    start = time.perf_counter()
+    for i in range(repeat):
+        fn(i)
+    elapsed = time.perf_counter() - start
+    return sb.round_trips / repeat, elapsed / repeat * 1000
+
+
+def run(latency_ms: float = 0.0, repeat: int = 50):
+    sb = MemoryClient(latency=latency_ms / 1000.0)
+    config.use_client(sb)
+    try:
+        cust = customer_dao.create_customer("bench", "bench@example.com", "0")
+        order = order_dao.create_order_row(cust["cust_id"], 1.0)
+        pids = [product_dao.create_product(f"seed{i}", f"SEED-{i}", 1.0, 0)["prod_id"] for i in range(2 * repeat)]
+
+        cases = [
+            ("create_product",
+             lambda i: _legacy_create_product(sb, i),
+             lambda i: product_dao.create_product(f"n{i}", f"N-{i}", 10.0, 5)),
+            ("update_product",
+             lambda i: _legacy_update_product(sb, pids[i]),
+             lambda i: product_dao.update_product(pids[i], {"stock": 7})),
+            ("delete_product",
+             lambda i: _legacy_delete_product(sb, pids[i]),
+             lambda i: product_dao.delete_product(pids[repeat + i])),
+            ("create_customer",
+             lambda i: _legacy_create_customer(sb, i),
+             lambda i: customer_dao.create_customer("c", f"n{i}@example.com", "1")),
+            ("create_order_row",
+             lambda i: _legacy_create_order_row(sb, cust["cust_id"]),
+             lambda i: order_dao.create_order_row(cust["cust_id"], 10.0)),
+            ("update_order_status",
+             lambda i: _legacy_update_order_status(sb, order["order_id"]),
+             lambda i: order_dao.update_order_status(order["order_id"], "COMPLETED")),
+            ("create_payment",
+             lambda i: _legacy_create_payment(sb, order["order_id"]),
+             lambda i: payment_dao.create_payment(order["order_id"], 10.0)),
+        ]
+
+        print(f"{'operation':<22}{'rt before':>10}{'rt after':>10}{'ms before':>11}{'ms after':>10}")
+        for name, before, after in cases:
+            rt_b, ms_b = _measure(sb, before, repeat)
+            rt_a, ms_a = _measure(sb, after, repeat)
+            print(f"{name:<22}{rt_b:>10.1f}{rt_a:>10.1f}{ms_b:>11.2f}{ms_a:>10.2f}")
+    finally:
+        config.use_client(None)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--latency-ms", type=float, default=0.0, help="simulated network latency per round trip")
+    ap.add_argument("--repeat", type=int, default=50)
+    a = ap.parse_args()
+    run(a.latency_ms, a.repeat)
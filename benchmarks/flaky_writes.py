@@ -0,0 +1,311 @@
+"""
+Keyed order and payment writes (src/services/outbox.py) over a flaky network.
+
+A client wrapper makes a share of the round trips fail with ConnectionError,
+either before the request reaches the store (request lost) or after it was
+applied (response lost). Worker threads place orders and pay half of them
+with idempotency keys, retrying each failed call with the same key; a few
+clients give up mid-write instead (a crash), and a few of those are left
+claimed by a dead process. outbox.replay() then finishes the leftovers.
+
+  clean, unkeyed     create_order + pay_order without keys or faults
+  clean, keyed       the same with keys (outbox sync full, then normal)
+  flaky, keyed       the same with faults injected, retries and crashes
+
+Checks, after the flaky run: exactly one order row per key, stock equal to
+the initial stock minus the units of live orders, every order has its items,
+one payment per paid key and those orders COMPLETED, no pending outbox
+entries, and a retry of a finished key answered from the outbox with no
+round trips.
+
+    python -m benchmarks.flaky_writes [--orders 400] [--threads 8] [--fault-rate 0.1]
+                                      [--latency-ms 1] [--backend memory|sqlite]
+"""
+import argparse
+import inspect
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from src import config
+from src.dao import order_dao, product_dao
+from src.services import order_service, outbox, payment_service
+from benchmarks._seed import install, seed_catalog
+
+
+class _Faults:
+    """Shared fault switch and counters; rng draws are serialized for repeatability per thread mix."""
+
+    def __init__(self, rate: float, seed: int = 22):
+        self.rate = rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.lost_requests = 0
+        self.lost_responses = 0
+
+    def draw(self) -> Optional[str]:
+        with self.lock:
+            if not self.rate or self.rng.random() >= self.rate:
+                return None
+            if self.rng.random() < 0.5:
+                self.lost_requests += 1
+                return "request"
+            self.lost_responses += 1
+            return "response"
+
+
+class _FlakyQuery:
+    def __init__(self, inner, faults: _Faults):
+        self._inner = inner
+        self._faults = faults
+
+    def __getattr__(self, name):
+        attr = getattr(self._inner, name)
+        if name == "execute":
+            return self._execute
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            return _FlakyQuery(attr(*args, **kwargs), self._faults)
+        return call
+
+    def _execute(self, *args, **kwargs):
+        fault = self._faults.draw()
+        if fault == "request":
+            raise ConnectionError("injected: request lost")
+        resp = self._inner.execute(*args, **kwargs)
+        if inspect.isawaitable(resp):
+            return self._await(resp, fault)
+        if fault == "response":
+            raise ConnectionError("injected: response lost")
+        return resp
+
+    async def _await(self, aw, fault):
+        resp = await aw
+        if fault == "response":
+            raise ConnectionError("injected: response lost")
+        return resp
+
+
+class _FlakyClient:
+    def __init__(self, client, faults: _Faults):
+        self._client = client
+        self._faults = faults
+
+    def table(self, name: str):
+        return _FlakyQuery(self._client.table(name), self._faults)
+
+    from_ = table
+
+    def rpc(self, name: str, params: Optional[Dict] = None, *args, **kwargs):
+        return _FlakyQuery(self._client.rpc(name, params or {}, *args, **kwargs), self._faults)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+def _retrying(fn, attempts: int = 50):
+    for attempt in range(attempts):
+        try:
+            return fn()
+        except Exception as e:
+            if not outbox.is_transient(e) or attempt == attempts - 1:
+                raise
+
+
+def _basket(rng: random.Random, products: int) -> List[Dict]:
+    picked = rng.sample(range(1, products + 1), rng.randint(1, 3))
+    return [{"prod_id": pid, "quantity": rng.randint(1, 3)} for pid in picked]
+
+
+def _dead_owner() -> str:
+    proc = subprocess.Popen([sys.executable, "-c", "pass"])
+    proc.wait()
+    return f"{proc.pid}:1"
+
+
+def _workload(orders: int, threads: int, products: int, customers: int, keyed: bool,
+              faults: Optional[_Faults], crash_every: int, tag: str) -> Dict:
+    """Place `orders` orders and pay every other one; returns the keys by fate."""
+    rng = random.Random(7)
+    jobs = [(n, rng.randint(1, customers), _basket(rng, products)) for n in range(orders)]
+    placed: Dict[str, int] = {}
+    paid: List[str] = []
+    abandoned: List[str] = []
+    lock = threading.Lock()
+
+    def client(job):
+        n, cust, basket = job
+        key = f"{tag}-order-{n}" if keyed else None
+        crash = faults is not None and crash_every and n % crash_every == 0
+        try:
+            if crash:
+                # one attempt only: a failure leaves the write to outbox.replay()
+                o = order_service.create_order(cust, basket, idempotency_key=key)
+            else:
+                o = _retrying(lambda: order_service.create_order(cust, basket, idempotency_key=key))
+        except order_service.OrderError:
+            return
+        except Exception as e:
+            if crash and outbox.is_transient(e):
+                with lock:
+                    abandoned.append(key)
+                return
+            raise
+        order_id = o["order"]["order_id"]
+        with lock:
+            placed[key or str(order_id)] = order_id
+        if n % 2:
+            return
+        pkey = f"{tag}-pay-{order_id}" if keyed else None
+        _retrying(lambda: payment_service.pay_order(order_id, "Card", idempotency_key=pkey))
+        with lock:
+            paid.append(pkey or str(order_id))
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(client, jobs))
+    return {"placed": placed, "paid": paid, "abandoned": abandoned}
+
+
+def _check(sb, initial: Dict[int, int], tag: str, fate: Dict) -> bool:
+    ok = True
+    orders = [o for o in order_dao.iter_orders() if (o.get("idempotency_key") or "").startswith(f"{tag}-")]
+    keys = [o["idempotency_key"] for o in orders]
+    if len(keys) != len(set(keys)):
+        print(f"DUPLICATE orders for {len(keys) - len(set(keys))} keys")
+        ok = False
+    items = order_dao.get_order_items([o["order_id"] for o in orders])
+    with_items = {it["order_id"] for it in items}
+    bare = [o["order_id"] for o in orders if o["order_id"] not in with_items]
+    if bare:
+        print(f"ORDERS WITHOUT ITEMS: {bare[:5]}")
+        ok = False
+
+    live = {o["order_id"] for o in orders if o["status"] != "CANCELLED"}
+    sold: Dict[int, int] = {}
+    for it in items:
+        if it["order_id"] in live:
+            sold[it["prod_id"]] = sold.get(it["prod_id"], 0) + it["quantity"]
+    for p in product_dao.get_products_by_ids(list(initial)):
+        if p["stock"] + sold.get(p["prod_id"], 0) != initial[p["prod_id"]]:
+            print(f"STOCK DRIFT product {p['prod_id']}: stock={p['stock']} sold={sold.get(p['prod_id'], 0)} "
+                  f"initial={initial[p['prod_id']]}")
+            ok = False
+
+    by_id = {o["order_id"]: o for o in orders}
+    payments = sb.table("payments").select("*").execute().data
+    per_order: Dict[int, int] = {}
+    for pay in payments:
+        if (pay.get("idempotency_key") or "").startswith(f"{tag}-"):
+            per_order[pay["order_id"]] = per_order.get(pay["order_id"], 0) + 1
+    for key in fate["paid"]:
+        order_id = int(key.rsplit("-", 1)[1])
+        if per_order.get(order_id) != 1 or by_id[order_id]["status"] != "COMPLETED":
+            print(f"PAYMENT {key}: payments={per_order.get(order_id, 0)} status={by_id[order_id]['status']}")
+            ok = False
+
+    pending = outbox.get_outbox().entries(outbox.PENDING)
+    if pending:
+        print(f"PENDING outbox entries left: {[e['key'] for e in pending[:5]]}")
+        ok = False
+    return ok
+
+
+def _timed_run(sb, label, rows, orders, threads, products, customers, keyed, faults=None, crash_every=0):
+    tag = label.replace(" ", "").replace(",", "-")
+    sb.reset_counters()
+    start = time.perf_counter()
+    fate = _workload(orders, threads, products, customers, keyed, faults, crash_every, tag)
+    elapsed = time.perf_counter() - start
+    rows.append((label, elapsed, sb.round_trips, len(fate["placed"]), len(fate["paid"])))
+    return tag, fate
+
+
+def run(orders: int = 400, threads: int = 8, fault_rate: float = 0.1, latency_ms: float = 1.0,
+        backend: str = "memory", products: int = 50, customers: int = 40, crash_every: int = 25) -> bool:
+    sb = install(latency_ms, backend=backend)
+    tmp = tempfile.mkdtemp(prefix="retail-outbox-bench-")
+    saved = (config.OUTBOX_PATH, config.OUTBOX_SYNC)
+    ok = True
+    rows = []
+    try:
+        seed_catalog(sb, products=products, customers=customers, stock=10_000)
+        config.OUTBOX_PATH = os.path.join(tmp, "warmup.db")
+        outbox.replay_once()   # nothing to replay; done here so it is not timed
+
+        _timed_run(sb, "clean, unkeyed", rows, orders, threads, products, customers, keyed=False)
+        for sync in ("full", "normal"):
+            config.OUTBOX_SYNC = sync
+            config.OUTBOX_PATH = os.path.join(tmp, f"clean-{sync}.db")
+            _timed_run(sb, f"clean, keyed, sync {sync}", rows, orders, threads, products, customers, keyed=True)
+
+        config.OUTBOX_SYNC = "full"
+        config.OUTBOX_PATH = os.path.join(tmp, "flaky.db")
+        initial = {p["prod_id"]: p["stock"] for p in product_dao.get_products_by_ids(list(range(1, products + 1)))}
+        faults = _Faults(fault_rate)
+        config.set_client_wrapper(lambda client: _FlakyClient(client, faults))
+        try:
+            tag, fate = _timed_run(sb, "flaky, keyed", rows, orders, threads, products, customers, keyed=True,
+                                   faults=faults, crash_every=crash_every)
+            # some of the abandoned writes are still claimed by a process that died
+            box = outbox.get_outbox()
+            left = [e["key"] for e in box.entries(outbox.PENDING, limit=orders)]
+            dead = _dead_owner()
+            for key in left[::2]:
+                with box._tx() as c:
+                    c.execute("update outbox set owner = ?, lease_until = ? where key = ?",
+                              (dead, time.time() + 3600, key))
+            replays = []
+            for _ in range(20):
+                counts = outbox.replay(limit=orders)
+                replays.append(counts)
+                if not counts[outbox.PENDING] and not counts["busy"]:
+                    break
+        finally:
+            config.set_client_wrapper(None)
+
+        ok &= _check(sb, initial, tag, fate)
+        done = [e for e in outbox.get_outbox().entries(outbox.DONE, limit=1) if e["kind"] == "order"]
+        if done:
+            e = done[0]
+            sb.reset_counters()
+            again = order_service.create_order(e["request"]["customer_id"], e["request"]["items"],
+                                               idempotency_key=e["key"])
+            if sb.round_trips or again["order"]["order_id"] != e["result"]["order"]["order_id"]:
+                print(f"RETRY of a finished key took {sb.round_trips} round trips")
+                ok = False
+    finally:
+        config.set_client_wrapper(None)
+        config.OUTBOX_PATH, config.OUTBOX_SYNC = saved
+        config.use_client(None)
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    print(f"backend={backend} orders={orders} threads={threads} latency={latency_ms}ms per round trip "
+          f"fault rate={fault_rate}")
+    print(f"{'run':<28}{'s':>7}{'orders/s':>10}{'round trips':>13}{'placed':>8}{'paid':>6}")
+    for label, elapsed, rt, placed, paid in rows:
+        print(f"{label:<28}{elapsed:>7.2f}{orders / elapsed:>10.0f}{rt:>13}{placed:>8}{paid:>6}")
+    print(f"injected: {faults.lost_requests} lost requests, {faults.lost_responses} lost responses; "
+          f"{len(fate['abandoned'])} clients gave up, leaving {len(left)} writes pending "
+          f"({len(left[::2])} held by a dead process)")
+    print(f"replay rounds: {replays}")
+    print("PASS" if ok else "FAIL")
+    return ok
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--orders", type=int, default=400)
+    ap.add_argument("--threads", type=int, default=8)
+    ap.add_argument("--fault-rate", type=float, default=0.1)
+    ap.add_argument("--latency-ms", type=float, default=1.0)
+    ap.add_argument("--backend", choices=["memory", "sqlite"], default="memory")
+    a = ap.parse_args()
+    sys.exit(0 if run(a.orders, a.threads, a.fault_rate, a.latency_ms, a.backend) else 1)
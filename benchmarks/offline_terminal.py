@@ -0,0 +1,261 @@
+"""
+Offline-first terminal mode (src/services/terminal.py): reads from the local
+replica versus over the WAN, and a link outage with orders queued on the
+terminal while another terminal sells the same stock on the server.
+
+The "server" is a SQLite store file with per-round-trip latency; the
+terminal reaches it through a link that can be cut (ConnectionError, like
+a dropped connection). Sequence: product/customer reads without the
+terminal, first sync, the same reads from the replica, a restock copied
+into the replica, then the link goes down: reads go on, orders are queued
+(a hot SKU until the terminal's own view runs out), and meanwhile the
+server gets a competing sale, a price change, a new customer and a
+deleted product. The link comes back and the terminal syncs.
+
+Checks: no link attempt while offline, every queued order placed exactly
+once or rejected for stock, no stock below zero and every unit accounted
+for, replica stock equal to the server's after reconciliation, changed
+rows pulled as deltas (the deleted product dropped at the full resync),
+and nothing left waiting.
+
+    python -m benchmarks.offline_terminal [--reads 200] [--orders 40] [--latency-ms 10]
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List
+from src import config
+from src.dao import customer_dao, product_dao
+from src.services import outbox, product_service, terminal
+from benchmarks._seed import install, seed_catalog
+
+HOT = 2
+
+
+class _Link:
+    """The WAN: counts attempts and fails them with ConnectionError while down."""
+
+    def __init__(self):
+        self.down = False
+        self.attempts = 0
+        self._lock = threading.Lock()
+
+    def check(self):
+        with self._lock:
+            self.attempts += 1
+            if self.down:
+                raise ConnectionError("link down")
+
+
+class _LinkQuery:
+    def __init__(self, link: _Link, inner):
+        self._link = link
+        self._inner = inner
+
+    def __getattr__(self, name):
+        attr = getattr(self._inner, name)
+        if name == "execute":
+            return self._execute
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            return _LinkQuery(self._link, attr(*args, **kwargs))
+        return call
+
+    def _execute(self, *args, **kwargs):
+        self._link.check()
+        return self._inner.execute(*args, **kwargs)
+
+
+class _LinkClient:
+    def __init__(self, link: _Link, client):
+        self._link = link
+        self._client = client
+
+    def table(self, name: str):
+        return _LinkQuery(self._link, self._client.table(name))
+
+    from_ = table
+
+    def rpc(self, name: str, params=None):
+        return _LinkQuery(self._link, self._client.rpc(name, params or {}))
+
+    def as_async(self):
+        return _LinkClient(self._link, self._client.as_async())
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+def _reads(n: int, products: int, customers: int, seed: int = 25) -> float:
+    """Mean ms per DAO read over a mix of product and customer lookups."""
+    rng = random.Random(seed)
+    start = time.perf_counter()
+    for i in range(n):
+        kind = i % 4
+        if kind == 0:
+            product_dao.get_products_by_ids([rng.randint(1, products) for _ in range(3)])
+        elif kind == 1:
+            product_dao.search_products(f"Product {rng.randint(1, 9)}", limit=20)
+        elif kind == 2:
+            customer_dao.get_customer_by_id(rng.randint(1, customers))
+        else:
+            customer_dao.get_customers_by_ids([rng.randint(1, customers) for _ in range(3)])
+    return (time.perf_counter() - start) * 1000 / n
+
+
+def _basket(rng: random.Random, products: int) -> List[Dict]:
+    items = {rng.randint(3, products - 1): rng.randint(1, 3) for _ in range(rng.randint(1, 3))}
+    return [{"prod_id": p, "quantity": q} for p, q in items.items()]
+
+
+def run(reads: int = 200, orders: int = 40, latency_ms: float = 10.0, products: int = 300,
+        customers: int = 50, stock: int = 100, hot_stock: int = 20, competing: int = 10) -> bool:
+    tmp = tempfile.mkdtemp(prefix="retail-terminal-bench-")
+    saved_outbox = config.OUTBOX_PATH
+    config.OUTBOX_PATH = os.path.join(tmp, "outbox.db")
+    server = install(latency_ms, backend="sqlite", path=os.path.join(tmp, "server.db"))
+    link = _Link()
+    ok = True
+    try:
+        seed_catalog(server, products=products, customers=customers, stock=stock)
+        server.table("products").update({"stock": hot_stock}).eq("prod_id", HOT).execute()
+        config.use_client(_LinkClient(link, server))
+
+        wan_ms = _reads(reads, products, customers)
+
+        t = terminal.start(path=os.path.join(tmp, "replica.db"), interval=3600)
+        first = t.sync(full=True)
+        replica_ms = _reads(reads, products, customers)
+
+        product_service.restock_product(1, 5)
+        if product_dao.get_products_by_ids([1])[0]["stock"] != stock + 5:
+            print("WRITE-THROUGH: restock not visible in the replica")
+            ok = False
+
+        # ---- link down ----
+        link.down = True
+        offline = t.sync()
+        before = link.attempts
+        _reads(reads // 4, products, customers)
+        rng = random.Random(7)
+        receipts, refused = [], 0
+        for i in range(orders):
+            items = [{"prod_id": HOT, "quantity": 4}] if i % 4 == 0 else _basket(rng, products)
+            try:
+                receipts.append((terminal.place_order(1 + i % customers, items, wait=0), items))
+            except Exception:
+                refused += 1
+        offline_attempts = link.attempts - before
+        queued_hot = sum(it["quantity"] for r, items in receipts for it in items if it["prod_id"] == HOT)
+        if product_dao.get_products_by_ids([HOT])[0]["stock"] != hot_stock - queued_hot:
+            print("HOLDS: replica stock of the hot SKU does not show the queued orders")
+            ok = False
+
+        # meanwhile, on the server (another terminal, the back office)
+        server.rpc("adjust_stock", {"p_deltas": [{"prod_id": HOT, "delta": -competing}]}).execute()
+        server.table("products").update({"price": 1.0}).eq("prod_id", 7).execute()
+        newcomer = server.table("customers").insert(
+            {"name": "Walk-in", "email": "walkin@example.com", "phone": "9999999999"}).execute().data[0]
+        server.table("products").delete().eq("prod_id", products).execute()
+
+        # ---- link back ----
+        link.down = False
+        start = time.perf_counter()
+        rounds = []
+        while True:
+            rounds.append(t.sync())
+            if not t.status()["waiting"] or len(rounds) >= 20:
+                break
+        catch_up_ms = (time.perf_counter() - start) * 1000
+        deleted_before_full = product_dao.get_products_by_ids([products])
+        full = t.sync(full=True)
+        status = t.status()
+
+        # ---- checks ----
+        if offline_attempts:
+            print(f"OFFLINE: {offline_attempts} link attempts while reading and queueing")
+            ok = False
+        if offline.get("error") is None or status["online"] is not True:
+            print(f"ONLINE FLAG: offline sync {offline}, status online={status['online']}")
+            ok = False
+        box = outbox.get_outbox()
+        placed = {}
+        for r, items in receipts:
+            entry = box.get(r["key"])
+            if entry["state"] == outbox.DONE:
+                placed[r["key"]] = items
+            elif entry["state"] != outbox.FAILED or "stock" not in (entry["error"] or "").lower():
+                print(f"ORDER {r['key']}: {entry['state']} {entry['error']}")
+                ok = False
+        server_orders = server.rows("orders")
+        per_key: Dict[str, int] = {}
+        for o in server_orders:
+            if o["idempotency_key"]:
+                per_key[o["idempotency_key"]] = per_key.get(o["idempotency_key"], 0) + 1
+        if per_key != {key: 1 for key in placed}:
+            print("ORDERS: server orders do not match the placed keys one to one")
+            ok = False
+        sold: Dict[int, int] = {}
+        for items in placed.values():
+            for it in items:
+                sold[it["prod_id"]] = sold.get(it["prod_id"], 0) + it["quantity"]
+        server_stock = {p["prod_id"]: p["stock"] for p in server.rows("products")}
+        for pid, have in server_stock.items():
+            initial = hot_stock - competing if pid == HOT else stock + (5 if pid == 1 else 0)
+            if have < 0 or have + sold.get(pid, 0) != initial:
+                print(f"STOCK product {pid}: server={have} sold={sold.get(pid, 0)} expected start={initial}")
+                ok = False
+        replica_stock = {p["prod_id"]: p["stock"] for p in t.replica.client.rows("products")}
+        if replica_stock != server_stock:
+            diff = {pid for pid in server_stock.keys() | replica_stock.keys()
+                    if server_stock.get(pid) != replica_stock.get(pid)}
+            print(f"RECONCILE: replica stock differs from the server for {sorted(diff)[:10]}")
+            ok = False
+        if product_dao.get_products_by_ids([7])[0]["price"] != 1.0 or not customer_dao.get_customers_by_ids(
+                [newcomer["cust_id"]]):
+            print("DELTAS: price change or new customer missing from the replica")
+            ok = False
+        if not deleted_before_full or product_dao.get_products_by_ids([products]):
+            print("FULL RESYNC: deleted product not dropped by the full resync (only by it)")
+            ok = False
+        if status["waiting"] or status["rejected"] == 0:
+            print(f"SETTLE: waiting={status['waiting']} rejected={status['rejected']}")
+            ok = False
+        delta_rows = sum(p["rows"] for r in rounds for p in r.get("pulled", {}).values())
+    finally:
+        terminal.stop()
+        config.use_client(None)
+        config.OUTBOX_PATH = saved_outbox
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    print(f"products={products} customers={customers} latency={latency_ms}ms per round trip reads={reads}")
+    print(f"{'reads':<22}{'ms/read':>10}")
+    print(f"{'over the WAN':<22}{wan_ms:>10.3f}")
+    print(f"{'from the replica':<22}{replica_ms:>10.3f}   ({wan_ms / replica_ms:.0f}x faster)")
+    print(f"full load: {first['ms']:.0f} ms, {sum(p['rows'] for p in first['pulled'].values())} rows")
+    print(f"offline: {len(receipts)} orders queued, {refused} refused locally (hot SKU held out), "
+          f"{offline_attempts} link attempts")
+    print(f"catch-up: {len(rounds)} sync(s) in {catch_up_ms:.0f} ms, {delta_rows} rows pulled as deltas "
+          f"(changed rows and the ones stamped at the watermark), "
+          f"{status['pushed']} orders pushed, {status['rejected']} rejected by the server "
+          f"(stock conflicts), full resync dropped {full['pulled']['products']['deleted']} product(s)")
+    print(f"lag: products synced {status['tables']['products']['lag_s']}s ago, waiting={status['waiting']}, "
+          f"push lag last={status['last_push_lag_s']}s max={status['max_push_lag_s']}s")
+    print("PASS" if ok else "FAIL")
+    return ok
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--reads", type=int, default=200)
+    ap.add_argument("--orders", type=int, default=40)
+    ap.add_argument("--latency-ms", type=float, default=10.0)
+    a = ap.parse_args()
+    sys.exit(0 if run(a.reads, a.orders, a.latency_ms) else 1)
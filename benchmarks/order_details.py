@@ -0,0 +1,54 @@
+"""
+Order detail hydration: round trips and latency as orders grow, old per-item
+product lookups versus order_service.hydrate_orders.
+
+    python -m benchmarks.order_details [--latency-ms 5] [--sizes 1 5 20 50] [--orders 10]
+"""
+import argparse
+import time
+from src import config
+from src.dao import customer_dao, order_dao, product_dao
+from src.services import order_service
+from benchmarks._seed import install, seed_catalog
+
+
+def _legacy_get_order_details(order_id):
+    order = order_dao.get_order_by_id(order_id)
+    customer_dao.get_customer_by_id(order["cust_id"])
+    for it in order_dao.get_order_items([order_id]):
+        product_dao.get_product_by_id(it["prod_id"])
+
+
+def _time(sb, fn):
+    sb.reset_counters()
+    start = time.perf_counter()
+    fn()
+    return sb.round_trips, (time.perf_counter() - start) * 1000
+
+
+def run(latency_ms=5.0, sizes=(1, 5, 20, 50), orders=10):
+    sb = install(latency_ms)
+    try:
+        seed_catalog(sb, products=max(sizes), customers=len(sizes), stock=10 ** 9)
+        print(f"latency per round trip: {latency_ms} ms")
+        print(f"{'items':>6}{'show old rt':>12}{'show new rt':>12}{'show old ms':>12}{'show new ms':>12}"
+              f"{'page rt':>9}{'page ms':>9}")
+        for cust_id, size in enumerate(sizes, start=1):
+            basket = [{"prod_id": p, "quantity": 1} for p in range(1, size + 1)]
+            ids = [order_service.create_order(cust_id, basket)["order"]["order_id"] for _ in range(orders)]
+            rt_old, ms_old = _time(sb, lambda: _legacy_get_order_details(ids[0]))
+            rt_new, ms_new = _time(sb, lambda: order_service.get_order_details(ids[0]))
+            rt_page, ms_page = _time(sb, lambda: order_service.get_customer_order_details(cust_id))
+            print(f"{size:>6}{rt_old:>12}{rt_new:>12}{ms_old:>12.1f}{ms_new:>12.1f}{rt_page:>9}{ms_page:>9.1f}")
+        print(f"(page = all {orders} orders of one customer hydrated at once)")
+    finally:
+        config.use_client(None)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--latency-ms", type=float, default=5.0)
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1, 5, 20, 50])
+    ap.add_argument("--orders", type=int, default=10)
+    a = ap.parse_args()
+    run(a.latency_ms, a.sizes, a.orders)
@@ -0,0 +1,99 @@
+"""
+Order feed ingestion: one create_order call per order (what `order create`
+does per process launch, minus the startup) versus create_orders_bulk.
+
+Also checks the bulk path is deterministic: the same feed against the same
+starting stock accepts the same orders, and stock matches the placed items.
+
+    python -m benchmarks.order_ingest [--latency-ms 5] [--orders 2000] [--chunk-size 500]
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from src import config
+from src.services import order_service
+from benchmarks._seed import install, seed_catalog
+
+
+def _feed(orders: int, products: int, customers: int, seed: int = 7):
+    rng = random.Random(seed)
+    lines = []
+    for i in range(orders):
+        items = []
+        for _ in range(rng.randint(1, 5)):
+            p = rng.randrange(products)
+            # half the lines name the product by SKU, like POS exports do
+            items.append({"sku": f"SKU-{p:06d}"} if rng.random() < 0.5 else {"prod_id": p + 1})
+            items[-1]["quantity"] = rng.randint(1, 3)
+        lines.append(json.dumps({"customer_id": rng.randint(1, customers), "items": items, "ref": f"POS-{i}"}))
+    lines.append("not json")
+    lines.append(json.dumps({"customer_id": 10 ** 6, "items": [{"prod_id": 1, "quantity": 1}], "ref": "bad-customer"}))
+    return lines
+
+
+def _ingest(lines, chunk_size):
+    return list(order_service.create_orders_bulk(order_service.read_order_feed(lines), chunk_size=chunk_size))
+
+
+def run(latency_ms: float = 5.0, orders: int = 2000, chunk_size: int = 500, products: int = 200, stock: int = 60):
+    lines = _feed(orders, products, customers=50)
+    try:
+        # the cas engine costs one conditional update per product per chunk, rpc one call
+        print(f"latency per round trip: {latency_ms} ms, {orders} orders, stock engine: {config.STOCK_ENGINE}")
+
+        sb = install(latency_ms)
+        seed_catalog(sb, products=products, customers=50, stock=stock)
+        single = min(orders, 200)
+        start = time.perf_counter()
+        for _, raw in order_service.read_order_feed(lines[:single]):
+            items = [{"prod_id": it.get("prod_id") or int(it["sku"][4:]) + 1, "quantity": it["quantity"]}
+                     for it in raw["items"]]
+            try:
+                order_service.create_order(raw["customer_id"], items)
+            except order_service.OrderError:
+                pass
+        elapsed = time.perf_counter() - start
+        print(f"create_order loop : {single / elapsed * 60:>10.0f} orders/min  "
+              f"({sb.round_trips / single:.1f} round trips/order, first {single} orders)")
+
+        outcomes = []
+        for _ in range(2):
+            sb = install(latency_ms)
+            seed_catalog(sb, products=products, customers=50, stock=stock)
+            start = time.perf_counter()
+            results = _ingest(lines, chunk_size)
+            elapsed = time.perf_counter() - start
+            outcomes.append([(r["line"], r["status"], r.get("order_id")) for r in results])
+        counts = {s: sum(1 for r in results if r["status"] == s) for s in ("placed", "rejected", "failed")}
+        print(f"create_orders_bulk: {len(results) / elapsed * 60:>10.0f} orders/min  "
+              f"({sb.round_trips} round trips for {len(results)} orders, chunk={chunk_size})  {counts}")
+
+        ok = True
+        if outcomes[0] != outcomes[1]:
+            print("FAIL: two runs over the same feed gave different results")
+            ok = False
+        if [r["line"] for r in results] != sorted(r["line"] for r in results) or len(results) != len(lines):
+            print("FAIL: results are not one per input line, in input order")
+            ok = False
+        sold = {}
+        for it in sb.rows("order_items"):
+            sold[it["prod_id"]] = sold.get(it["prod_id"], 0) + it["quantity"]
+        bad = [p for p in sb.rows("products") if p["stock"] != stock - sold.get(p["prod_id"], 0) or p["stock"] < 0]
+        if bad:
+            print(f"FAIL: stock does not match placed items for {len(bad)} products")
+            ok = False
+        print("PASS" if ok else "FAIL")
+        return ok
+    finally:
+        config.use_client(None)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--latency-ms", type=float, default=5.0)
+    ap.add_argument("--orders", type=int, default=2000)
+    ap.add_argument("--chunk-size", type=int, default=500)
+    a = ap.parse_args()
+    sys.exit(0 if run(a.latency_ms, a.orders, a.chunk_size) else 1)
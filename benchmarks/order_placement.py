@@ -0,0 +1,66 @@
+"""
+Order placement throughput across basket sizes: the old per-line
+create_order path versus the batched one in order_service.
+
+    python -m benchmarks.order_placement [--latency-ms 5] [--orders 20] [--sizes 1 5 20 50]
+"""
+import argparse
+import time
+from src import config
+from src.dao import customer_dao, order_dao, product_dao
+from src.services import order_service
+from benchmarks._seed import install, seed_catalog
+
+
+def _legacy_create_order(customer_id, items):
+    """create_order as it was before batching (2 product reads + 1 write per line)."""
+    customer_dao.get_customer_by_id(customer_id)
+    total_amount = 0
+    items_with_price = []
+    for item in items:
+        prod = product_dao.get_product_by_id(item["prod_id"])
+        items_with_price.append({"prod_id": item["prod_id"], "quantity": item["quantity"], "price": prod["price"]})
+        total_amount += prod["price"] * item["quantity"]
+    for item in items_with_price:
+        prod = product_dao.get_product_by_id(item["prod_id"])
+        product_dao.update_product(prod["prod_id"], {"stock": prod["stock"] - item["quantity"]})
+    order_row = order_dao.create_order_row(customer_id, total_amount)
+    order_dao.add_order_items(order_row["order_id"], items_with_price)
+    # the old path re-read everything, item by item
+    order = order_dao.get_order_by_id(order_row["order_id"])
+    customer_dao.get_customer_by_id(order["cust_id"])
+    for it in items_with_price:
+        product_dao.get_product_by_id(it["prod_id"])
+
+
+def _run(sb, place, size, orders):
+    basket = [{"prod_id": p, "quantity": 1} for p in range(1, size + 1)]
+    sb.reset_counters()
+    start = time.perf_counter()
+    for n in range(orders):
+        place(1 + n % 10, basket)
+    elapsed = time.perf_counter() - start
+    return sb.round_trips / orders, orders / elapsed
+
+
+def run(latency_ms: float = 5.0, orders: int = 20, sizes=(1, 5, 20, 50)):
+    sb = install(latency_ms)
+    try:
+        seed_catalog(sb, products=max(sizes), customers=10, stock=10 ** 9)
+        print(f"latency per round trip: {latency_ms} ms")
+        print(f"{'basket':>6}{'rt/order old':>14}{'rt/order new':>14}{'orders/s old':>14}{'orders/s new':>14}")
+        for size in sizes:
+            rt_old, tput_old = _run(sb, _legacy_create_order, size, orders)
+            rt_new, tput_new = _run(sb, order_service.create_order, size, orders)
+            print(f"{size:>6}{rt_old:>14.1f}{rt_new:>14.1f}{tput_old:>14.1f}{tput_new:>14.1f}")
+    finally:
+        config.use_client(None)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--latency-ms", type=float, default=5.0)
+    ap.add_argument("--orders", type=int, default=20)
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1, 5, 20, 50])
+    a = ap.parse_args()
+    run(a.latency_ms, a.orders, a.sizes)
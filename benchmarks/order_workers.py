@@ -0,0 +1,156 @@
+"""
+Order throughput of the SKU-sharded worker pool (src/services/order_pool.py)
+at 1, 2, 4 and 8 worker processes.
+
+Each run gets a fresh SQLite store file (shared by the workers, with
+per-round-trip latency standing in for the network) and pushes the same
+request stream through OrderPool: orders over a catalog with a few hot
+SKUs, then a cancel or a payment for part of the placed orders. Worker
+start-up is not timed; the final drain is.
+
+Checks after every run: no product oversold, stock equal to the initial
+stock minus the units of live orders, every paid order COMPLETED with one
+payment, and every request answered. Workers use the cas stock engine by
+default, so the conflict count shows how well routing keeps each SKU on one
+worker.
+
+    python -m benchmarks.order_workers [--orders 1500] [--workers 1,2,4,8] [--threads 4] [--latency-ms 2]
+                                       [--engine cas|rpc|auto]
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from typing import Dict, List
+from src import config
+from src.dao import order_dao, product_dao
+from src.services import order_pool
+from benchmarks._seed import install, seed_catalog
+
+
+def _baskets(n: int, products: int, hot: int, seed: int = 24) -> List[Dict]:
+    rng = random.Random(seed)
+    out = []
+    for i in range(n):
+        size = 1 if rng.random() < 0.7 else rng.randint(2, 3)
+        pick = lambda: rng.randint(1, hot) if rng.random() < 0.3 else rng.randint(1, products)
+        items = {pick(): rng.randint(1, 3) for _ in range(size)}
+        out.append({"customer_id": 1 + i % 50, "items": [{"prod_id": p, "quantity": q} for p, q in items.items()]})
+    return out
+
+
+def _seed(db: str, products: int, stock: int):
+    install(0.0, backend="sqlite", path=db)
+    try:
+        seed_catalog(config.get_supabase(), products=products, customers=50, stock=stock)
+    finally:
+        config.use_client(None)
+
+
+def _check(db: str, products: int, stock: int, paid: List[int]) -> bool:
+    install(0.0, backend="sqlite", path=db)
+    ok = True
+    try:
+        orders = list(order_dao.iter_orders())
+        live = {o["order_id"] for o in orders if o["status"] != "CANCELLED"}
+        sold: Dict[int, int] = {}
+        for it in order_dao.get_order_items([o["order_id"] for o in orders]):
+            if it["order_id"] in live:
+                sold[it["prod_id"]] = sold.get(it["prod_id"], 0) + it["quantity"]
+        for p in product_dao.get_products_by_ids(list(range(1, products + 1))):
+            if p["stock"] < 0 or p["stock"] + sold.get(p["prod_id"], 0) != stock:
+                print(f"STOCK product {p['prod_id']}: stock={p['stock']} sold={sold.get(p['prod_id'], 0)} initial={stock}")
+                ok = False
+        status = {o["order_id"]: o["status"] for o in orders}
+        payments: Dict[int, int] = {}
+        for pay in config.get_supabase().table("payments").select("*").execute().data:
+            payments[pay["order_id"]] = payments.get(pay["order_id"], 0) + 1
+        for order_id in paid:
+            if status.get(order_id) != "COMPLETED" or payments.get(order_id) != 1:
+                print(f"PAYMENT order {order_id}: status={status.get(order_id)} payments={payments.get(order_id, 0)}")
+                ok = False
+    finally:
+        config.use_client(None)
+    return ok
+
+
+def _run(workers: int, threads: int, latency_ms: float, baskets: List[Dict], products: int, stock: int,
+         tmp: str) -> Dict:
+    db = os.path.join(tmp, f"store-{workers}.db")
+    _seed(db, products, stock)
+    backend = {"name": "sqlite", "path": db, "latency": latency_ms / 1000.0}
+    pool = order_pool.OrderPool(workers, threads, backend=backend)
+    start = time.perf_counter()
+    try:
+        created = [pool.create_order(**b) for b in baskets]
+        placed, rejected = [], 0
+        for f in created:
+            try:
+                placed.append(f.result()["order"]["order_id"])
+            except order_pool.PoolError:
+                raise
+            except Exception:
+                rejected += 1
+        follow_ups, paid = [], []
+        for i, order_id in enumerate(placed):
+            if i % 5 == 0:
+                follow_ups.append(pool.cancel_order(order_id))
+            elif i % 5 in (1, 2):
+                follow_ups.append(pool.pay_order(order_id, "Card"))
+                paid.append(order_id)
+        failed = sum(1 for f in follow_ups if f.exception() is not None)
+    finally:
+        stats = pool.close()
+    elapsed = time.perf_counter() - start
+    requests = len(baskets) + len(follow_ups)
+    conflicts = sum(s["stock"]["cas_conflicts"] for s in stats if s)
+    return {"workers": workers, "elapsed": elapsed, "requests": requests, "placed": len(placed),
+            "rejected": rejected, "failed": failed, "cas_conflicts": conflicts, "routed": dict(pool.routed),
+            "handled": [s["handled"] if s else None for s in stats],
+            "ok": _check(db, products, stock, paid) and failed == 0 and all(stats)}
+
+
+def run(orders: int = 1500, workers=(1, 2, 4, 8), threads: int = 4, latency_ms: float = 2.0,
+        products: int = 400, hot: int = 8, stock: int = 300, engine: str = "cas") -> bool:
+    baskets = _baskets(orders, products, hot)
+    tmp = tempfile.mkdtemp(prefix="retail-workers-bench-")
+    # worker processes read their settings from the environment
+    saved_engine = os.environ.get("STOCK_ENGINE")
+    os.environ["STOCK_ENGINE"] = engine
+    try:
+        results = [_run(n, threads, latency_ms, baskets, products, stock, tmp) for n in workers]
+    finally:
+        if saved_engine is None:
+            os.environ.pop("STOCK_ENGINE", None)
+        else:
+            os.environ["STOCK_ENGINE"] = saved_engine
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    ok = all(r["ok"] for r in results)
+    base = results[0]["requests"] / results[0]["elapsed"]
+    print(f"orders={orders} (+cancels/payments) threads/worker={threads} latency={latency_ms}ms per round trip "
+          f"stock engine={engine} cpus={os.cpu_count()}")
+    print(f"{'workers':>8}{'s':>8}{'req/s':>9}{'speedup':>9}{'placed':>8}{'rejected':>10}{'cross-shard':>13}"
+          f"{'cas conflicts':>15}  per-worker requests")
+    for r in results:
+        rate = r["requests"] / r["elapsed"]
+        cross = r["routed"]["cross_shard"] / max(1, r["routed"]["home"] + r["routed"]["cross_shard"])
+        print(f"{r['workers']:>8}{r['elapsed']:>8.2f}{rate:>9.0f}{rate / base:>9.2f}{r['placed']:>8}"
+              f"{r['rejected']:>10}{cross:>13.0%}{r['cas_conflicts']:>15}  {r['handled']}")
+    print("PASS" if ok else "FAIL")
+    return ok
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--orders", type=int, default=1500)
+    ap.add_argument("--workers", default="1,2,4,8")
+    ap.add_argument("--threads", type=int, default=4)
+    ap.add_argument("--latency-ms", type=float, default=2.0)
+    ap.add_argument("--engine", choices=["cas", "rpc", "auto"], default="cas")
+    a = ap.parse_args()
+    sys.exit(0 if run(a.orders, tuple(int(n) for n in a.workers.split(",")), a.threads, a.latency_ms,
+                      engine=a.engine) else 1)
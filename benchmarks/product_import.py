@@ -0,0 +1,65 @@
+"""
+Bulk import throughput: chunked, parallel upserts versus one add_product
+call per row, on the in-memory stand-in with simulated latency.
+
+    python -m benchmarks.product_import [--rows 20000] [--latency-ms 5] [--chunk-size 1000] [--workers 4]
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from src import config
+from src.services import product_bulk_service, product_service
+from benchmarks._seed import install
+
+
+def _write_input(path, rows):
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(rows):
+            f.write(json.dumps({"name": f"Item {i}", "sku": f"IMP-{i:07d}", "price": 1 + i % 500,
+                                "stock": i % 100, "category": "bulk"}) + "\n")
+        f.write('{"name": "", "sku": "BAD-1", "price": 5}\n')   # rejected: no name
+        f.write('{"name": "dup", "sku": "IMP-0000000", "price": 5}\n')  # rejected: duplicate
+
+
+def run(rows=20_000, latency_ms=5.0, chunk_size=1000, workers=4, baseline_rows=200):
+    with tempfile.TemporaryDirectory() as tmp:
+        src_file = os.path.join(tmp, "products.ndjson")
+        _write_input(src_file, rows)
+
+        sb = install(latency_ms)
+        try:
+            start = time.perf_counter()
+            for n in range(baseline_rows):
+                product_service.add_product(f"Base {n}", f"BASE-{n}", 1.0, 1)
+            per_row = baseline_rows / (time.perf_counter() - start)
+            per_row_rt = sb.round_trips / baseline_rows
+
+            sb.reset_counters()
+            report = product_bulk_service.import_products(
+                product_bulk_service.read_rows(src_file), chunk_size=chunk_size, workers=workers,
+                reject_file=os.path.join(tmp, "rejects.ndjson"))
+            export_file = os.path.join(tmp, "out.ndjson")
+            t = time.perf_counter()
+            exported = product_bulk_service.export_products(export_file)
+            export_s = time.perf_counter() - t
+        finally:
+            config.use_client(None)
+
+    print(f"latency per round trip: {latency_ms} ms")
+    print(f"add_product per row : {per_row:10.0f} rows/s  ({per_row_rt:.1f} round trips/row)")
+    print(f"bulk import         : {report['rows_per_sec']:10.0f} rows/s  ({sb.round_trips} round trips for "
+          f"{report['rows']} rows, chunk={chunk_size}, workers={workers})")
+    print(f"  inserted={report['inserted']} updated={report['updated']} rejected={report['rejected']}")
+    print(f"export              : {exported / export_s:10.0f} rows/s  ({exported} rows)")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--rows", type=int, default=20_000)
+    ap.add_argument("--latency-ms", type=float, default=5.0)
+    ap.add_argument("--chunk-size", type=int, default=1000)
+    ap.add_argument("--workers", type=int, default=4)
+    a = ap.parse_args()
+    run(a.rows, a.latency_ms, a.chunk_size, a.workers)
@@ -0,0 +1,130 @@
+"""
+Memory and throughput of product rows as dicts, slotted Product objects and
+a ColumnBatch (src/dao/models.py), on a synthetic catalog (1M rows by default).
+
+For each layout: bytes per row held (tracemalloc, values included), time to
+build it from DAO-shaped dicts arriving in 10k-row pages, time to hand
+every row back as a dict, a stock-value aggregate over all rows, and
+pages of one category (what the catalog view does). Checks that every
+layout round-trips to the same dicts.
+
+    python -m benchmarks.row_models [--rows 1000000]
+"""
+import argparse
+import gc
+import random
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, Iterator, List
+from src.dao.models import ColumnBatch, Product
+
+CATEGORIES = ["grocery", "dairy", "snacks", "household", "beverages", None]
+PAGE = 10_000
+
+
+def _pages(rows: int, seed: int = 5) -> Iterator[List[Dict]]:
+    """DAO-shaped pages with fresh value objects, like json-decoded responses."""
+    rng = random.Random(seed)
+    page = []
+    for i in range(1, rows + 1):
+        page.append({"prod_id": i, "name": f"Product {i} {rng.choice(['milk', 'tea', 'soap'])}",
+                     "sku": f"SKU-{i:07d}", "price": round(rng.uniform(1, 500), 2), "stock": rng.randint(0, 400),
+                     "category": rng.choice(CATEGORIES), "updated_at": f"2026-10-{1 + i % 28:02d}T10:00:00.000+00:00"})
+        if len(page) == PAGE:
+            yield page
+            page = []
+    if page:
+        yield page
+
+
+def _build_dicts(rows):
+    out = []
+    for page in _pages(rows):
+        out.extend(page)
+    return out
+
+
+def _build_slots(rows):
+    out = []
+    for page in _pages(rows):
+        out.extend(Product.from_dict(r) for r in page)
+    return out
+
+
+def _build_columns(rows):
+    batch = ColumnBatch.empty(Product.FIELDS)
+    for page in _pages(rows):
+        batch.extend(ColumnBatch.from_rows(page, Product.FIELDS))
+    return batch
+
+
+LAYOUTS = {
+    "dicts": {
+        "build": _build_dicts,
+        "to_dicts": lambda held: [dict(r) for r in held],
+        "stock_value": lambda held: sum(r["price"] * r["stock"] for r in held),
+        "category_page": lambda held: [r for r in held if r["category"] == "dairy"][5000:5050],
+    },
+    "slots": {
+        "build": _build_slots,
+        "to_dicts": lambda held: [r.to_dict() for r in held],
+        "stock_value": lambda held: sum(r.price * r.stock for r in held),
+        "category_page": lambda held: [r for r in held if r.category == "dairy"][5000:5050],
+    },
+    "columns": {
+        "build": _build_columns,
+        "to_dicts": lambda held: list(held.rows()),
+        "stock_value": lambda held: sum(p * s for p, s in zip(held.column("price"), held.column("stock"))),
+        "category_page": lambda held: held.take(
+            [i for i, c in enumerate(held.column("category")) if c == "dairy"][5000:5050]),
+    },
+}
+
+
+def _timed(fn: Callable, *args):
+    gc.collect()
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def run(rows: int = 1_000_000) -> bool:
+    results, reference, ok = {}, None, True
+    for name, layout in LAYOUTS.items():
+        gc.collect()
+        tracemalloc.start()
+        held = layout["build"](rows)
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        held = None
+        gc.collect()
+        held, build_ms = _timed(layout["build"], rows)
+        as_dicts, dicts_ms = _timed(layout["to_dicts"], held)
+        value, agg_ms = _timed(layout["stock_value"], held)
+        _, page_ms = _timed(layout["category_page"], held)
+        sample = as_dicts[::max(1, rows // 1000)]
+        if reference is None:
+            reference = (sample, round(value, 2))
+        elif (sample, round(value, 2)) != reference:
+            print(f"MISMATCH: {name} does not round-trip to the same rows")
+            ok = False
+        results[name] = {"bytes_per_row": size / rows, "build_ms": build_ms, "to_dicts_ms": dicts_ms,
+                         "stock_value_ms": agg_ms, "category_page_ms": page_ms}
+        held = as_dicts = None
+        gc.collect()
+
+    print(f"rows={rows:,}")
+    print(f"{'layout':<10}{'bytes/row':>11}{'MB':>9}{'build ms':>11}{'to dicts ms':>13}{'aggregate ms':>14}{'page ms':>10}")
+    for name, r in results.items():
+        print(f"{name:<10}{r['bytes_per_row']:>11.0f}{r['bytes_per_row'] * rows / 2 ** 20:>9.0f}{r['build_ms']:>11.0f}"
+              f"{r['to_dicts_ms']:>13.0f}{r['stock_value_ms']:>14.1f}{r['category_page_ms']:>10.1f}")
+    print("PASS" if ok else "FAIL")
+    return ok
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--rows", type=int, default=1_000_000)
+    a = ap.parse_args()
+    sys.exit(0 if run(a.rows) else 1)
@@ -0,0 +1,84 @@
+"""
+Multi-threaded checkout stress test for the stock reservation engine.
+
+Hundreds of concurrent create_order calls hit a few hot SKUs on the in-memory
+stand-in (with per-round-trip latency so reads and writes interleave). Checks
+that nothing is oversold and that units sold match the stock that disappeared,
+then prints contention metrics. Exits non-zero on any violation.
+
+    python -m benchmarks.stock_stress [--orders 500] [--threads 64] [--stock 200] [--engine cas|rpc]
+                                      [--backend memory|sqlite]
+"""
+import argparse
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from src import config
+from src.services import order_service, stock_service
+from benchmarks._seed import install, seed_catalog
+
+
+def run(orders=500, threads=64, stock=200, hot_skus=3, latency_ms=1.0, engine="cas", cancel_every=10,
+        backend="memory") -> bool:
+    config.STOCK_ENGINE = engine
+    sb = install(latency_ms, backend=backend)
+    stock_service.reset_stock_metrics()
+    try:
+        seed_catalog(sb, products=hot_skus, customers=20, stock=stock)
+
+        def checkout(n):
+            # every basket touches two hot SKUs, in varying order
+            a, b = 1 + n % hot_skus, 1 + (n + 1) % hot_skus
+            try:
+                o = order_service.create_order(1 + n % 20, [{"prod_id": a, "quantity": 1}, {"prod_id": b, "quantity": 1}])
+            except order_service.OrderError:
+                return "rejected"
+            if cancel_every and n % cancel_every == 0:
+                order_service.cancel_order(o["order"]["order_id"])
+                return "cancelled"
+            return "placed"
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            outcomes = list(pool.map(checkout, range(orders)))
+        elapsed = time.perf_counter() - start
+
+        products = {p["prod_id"]: p for p in sb.rows("products")}
+        live_orders = {o["order_id"] for o in sb.rows("orders") if o["status"] == "PLACED"}
+        sold = {}
+        for it in sb.rows("order_items"):
+            if it["order_id"] in live_orders:
+                sold[it["prod_id"]] = sold.get(it["prod_id"], 0) + it["quantity"]
+
+        ok = True
+        for pid, p in products.items():
+            if p["stock"] < 0:
+                print(f"OVERSOLD product {pid}: stock={p['stock']}")
+                ok = False
+            if p["stock"] + sold.get(pid, 0) != stock:
+                print(f"LOST UPDATE product {pid}: stock={p['stock']} sold={sold.get(pid, 0)} initial={stock}")
+                ok = False
+
+        counts = {k: outcomes.count(k) for k in ("placed", "cancelled", "rejected")}
+        print(f"backend={backend} engine={engine} orders={orders} threads={threads} elapsed={elapsed:.2f}s "
+              f"({orders / elapsed:.0f} orders/s) {counts}")
+        print("final stock:", {pid: p["stock"] for pid, p in products.items()})
+        m = stock_service.stock_metrics()
+        print("metrics:", {k: round(v, 3) if isinstance(v, float) else v for k, v in m.items()})
+        print("PASS" if ok else "FAIL")
+        return ok
+    finally:
+        config.use_client(None)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--orders", type=int, default=500)
+    ap.add_argument("--threads", type=int, default=64)
+    ap.add_argument("--stock", type=int, default=200)
+    ap.add_argument("--hot-skus", type=int, default=3)
+    ap.add_argument("--latency-ms", type=float, default=1.0)
+    ap.add_argument("--engine", choices=["cas", "rpc"], default="cas")
+    ap.add_argument("--backend", choices=["memory", "sqlite"], default="memory")
+    a = ap.parse_args()
+    sys.exit(0 if run(a.orders, a.threads, a.stock, a.hot_skus, a.latency_ms, a.engine, backend=a.backend) else 1)
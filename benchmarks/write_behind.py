@@ -0,0 +1,216 @@
+"""
+Write-behind coalescing (src/services/write_behind.py) versus one synchronous
+call per change.
+
+A stream of restock_product / reduce_stock calls on a few hot SKUs mixed with
+cancel_order calls runs from worker threads over the in-memory stand-in with
+per-round-trip latency, first with WRITE_BEHIND off, then on.
+
+Checks that both runs end with the same stock and order statuses, that the
+process reads its own queued changes back before they are flushed, that
+writers block at WRITE_BEHIND_MAX_PENDING (bounded memory), and that a
+process exiting with queued changes writes them first.
+
+    python -m benchmarks.write_behind [--ops 3000] [--threads 8] [--latency-ms 1]
+"""
+import argparse
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+from src import config
+from src.dao import order_dao, product_dao
+from src.services import order_service, payment_service, product_service, write_behind
+from benchmarks._seed import install, seed_catalog
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _ops(n: int, hot: int, order_ids: List[int], seed: int = 23) -> List[Tuple]:
+    rng = random.Random(seed)
+    to_cancel = list(order_ids)
+    rng.shuffle(to_cancel)
+    ops = []
+    for i in range(n):
+        if to_cancel and i % 10 == 0:
+            ops.append(("cancel", to_cancel.pop()))
+        elif rng.random() < 0.6:
+            ops.append(("restock", rng.randint(1, hot), rng.randint(1, 5)))
+        else:
+            ops.append(("reduce", rng.randint(1, hot), rng.randint(1, 3)))
+    return ops
+
+
+def _apply(op: Tuple):
+    if op[0] == "restock":
+        product_service.restock_product(op[1], op[2])
+    elif op[0] == "reduce":
+        product_service.reduce_stock(op[1], op[2])
+    else:
+        order_service.cancel_order(op[1])
+
+
+def _store(latency_ms: float, products: int, orders: int):
+    sb = install(latency_ms)
+    seed_catalog(sb, products=products, customers=20, stock=10_000)
+    rng = random.Random(5)
+    placed = [order_service.create_order(1 + n % 20, [{"prod_id": rng.randint(1, products), "quantity": 2}])
+              for n in range(orders)]
+    sb.reset_counters()
+    return sb, [o["order"]["order_id"] for o in placed]
+
+
+def _run(enabled: bool, ops_n: int, threads: int, latency_ms: float, hot: int, products: int, orders: int) -> Dict:
+    sb, order_ids = _store(latency_ms, products, orders)
+    config.WRITE_BEHIND = enabled
+    try:
+        ops = _ops(ops_n, hot, order_ids)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(_apply, ops))
+        coalescer = write_behind.active()
+        write_behind.shutdown()   # the final flush counts towards the run
+        elapsed = time.perf_counter() - start
+        metrics = coalescer.metrics() if coalescer else {}
+        state = {
+            "stock": {p["prod_id"]: p["stock"] for p in product_dao.get_products_by_ids(list(range(1, products + 1)))},
+            "status": {o["order_id"]: o["status"] for o in order_dao.get_orders_by_ids(order_ids)},
+        }
+        return {"elapsed": elapsed, "round_trips": sb.round_trips, "ops": len(ops), "state": state,
+                "metrics": metrics}
+    finally:
+        config.WRITE_BEHIND = False
+        write_behind.shutdown()
+        config.use_client(None)
+
+
+def _read_your_writes(latency_ms: float) -> bool:
+    """Queued changes are visible to this process at once, and to the store only after the flush."""
+    sb, order_ids = _store(latency_ms, 5, 2)
+    config.WRITE_BEHIND = True
+    saved = config.WRITE_BEHIND_INTERVAL
+    config.WRITE_BEHIND_INTERVAL = 3600
+    ok = True
+    try:
+        before = product_dao.get_product_by_id(1, fresh=True)["stock"]
+        product_service.restock_product(1, 7)
+        product_service.reduce_stock(1, 3)
+        order_service.cancel_order(order_ids[0])
+        if product_service.get_product(1)["stock"] != before + 4:
+            print("READ-YOUR-WRITES: queued stock change not visible")
+            ok = False
+        if order_service.get_order_details(order_ids[0])["order"]["status"] != "CANCELLED":
+            print("READ-YOUR-WRITES: queued cancel not visible")
+            ok = False
+        try:
+            payment_service.pay_order(order_ids[0], "Card")
+            print("READ-YOUR-WRITES: paid an order with a queued cancel")
+            ok = False
+        except payment_service.PaymentError:
+            pass
+        if product_dao.get_product_by_id(1, fresh=True)["stock"] != before:
+            print("WRITE-BEHIND: change reached the store before the flush")
+            ok = False
+        write_behind.flush()
+        order = order_dao.get_order_by_id(order_ids[0])
+        if product_dao.get_product_by_id(1, fresh=True)["stock"] != before + 4 or order["status"] != "CANCELLED":
+            print("WRITE-BEHIND: flush did not store the queued changes")
+            ok = False
+    finally:
+        config.WRITE_BEHIND_INTERVAL = saved
+        config.WRITE_BEHIND = False
+        write_behind.shutdown()
+        config.use_client(None)
+    return ok
+
+
+def _backpressure(latency_ms: float, cap: int = 8) -> Tuple[bool, Dict]:
+    sb, order_ids = _store(latency_ms, 60, 40)
+    config.WRITE_BEHIND = True
+    saved = config.WRITE_BEHIND_MAX_PENDING
+    config.WRITE_BEHIND_MAX_PENDING = cap
+    try:
+        ops = [("restock", pid, 1) for pid in range(1, 61)] + [("cancel", oid) for oid in order_ids]
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(_apply, ops))
+        m = write_behind.metrics()
+    finally:
+        config.WRITE_BEHIND_MAX_PENDING = saved
+        config.WRITE_BEHIND = False
+        write_behind.shutdown()
+        config.use_client(None)
+    ok = m["max_pending"] <= cap and m["backpressure_waits"] > 0
+    if not ok:
+        print(f"BACKPRESSURE: max pending {m['max_pending']} (cap {cap}), waits {m['backpressure_waits']}")
+    return ok, m
+
+
+def _flush_on_exit() -> bool:
+    tmp = tempfile.mkdtemp(prefix="retail-wb-bench-")
+    db = os.path.join(tmp, "store.db")
+    try:
+        install(0.0, backend="sqlite", path=db)
+        try:
+            seed_catalog(config.get_supabase(), products=3, customers=1, stock=10)
+        finally:
+            config.use_client(None)
+        env = dict(os.environ, STORAGE_BACKEND="sqlite", SQLITE_PATH=db, PYTHONPATH=ROOT,
+                   WRITE_BEHIND="1", WRITE_BEHIND_INTERVAL="3600")
+        subprocess.run([sys.executable, "-c",
+                        "from src.services import product_service as p; p.restock_product(1, 7); p.reduce_stock(2, 4)"],
+                       env=env, cwd=ROOT, check=True)
+        install(0.0, backend="sqlite", path=db)
+        try:
+            stock = {p["prod_id"]: p["stock"] for p in product_dao.get_products_by_ids([1, 2])}
+        finally:
+            config.use_client(None)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    if stock != {1: 17, 2: 6}:
+        print(f"FLUSH ON EXIT: stock after exit {stock}, expected {{1: 17, 2: 6}}")
+        return False
+    return True
+
+
+def run(ops: int = 3000, threads: int = 8, latency_ms: float = 1.0, hot: int = 5, products: int = 50,
+        orders: int = 300) -> bool:
+    sync = _run(False, ops, threads, latency_ms, hot, products, orders)
+    wb = _run(True, ops, threads, latency_ms, hot, products, orders)
+    ok = True
+    if sync["state"] != wb["state"]:
+        print("MISMATCH: write-behind run ended with different stock or order statuses")
+        ok = False
+    ok &= _read_your_writes(latency_ms)
+    bp_ok, bp = _backpressure(latency_ms)
+    ok &= bp_ok
+    ok &= _flush_on_exit()
+
+    print(f"ops={ops} threads={threads} hot skus={hot} latency={latency_ms}ms per round trip")
+    print(f"{'mode':<16}{'s':>7}{'ops/s':>9}{'round trips':>13}{'rt/op':>8}")
+    for label, r in (("synchronous", sync), ("write-behind", wb)):
+        print(f"{label:<16}{r['elapsed']:>7.2f}{r['ops'] / r['elapsed']:>9.0f}{r['round_trips']:>13}"
+              f"{r['round_trips'] / r['ops']:>8.2f}")
+    saved = sync["round_trips"] - wb["round_trips"]
+    rate = wb["ops"] / wb["elapsed"]
+    print(f"saved {saved} round trips ({saved / ops:.2f} per op): {saved / ops * rate:.0f} writes/s "
+          f"at the write-behind op rate")
+    m = wb["metrics"]
+    print(f"coalescer: queued={m['queued']} coalesced={m['coalesced']} flushes={m['flushes']} "
+          f"writes={m['writes']} max pending={m['max_pending']}")
+    print(f"backpressure (cap 8): waits={bp['backpressure_waits']} max pending={bp['max_pending']}")
+    print("PASS" if ok else "FAIL")
+    return ok
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--ops", type=int, default=3000)
+    ap.add_argument("--threads", type=int, default=8)
+    ap.add_argument("--latency-ms", type=float, default=1.0)
+    a = ap.parse_args()
+    sys.exit(0 if run(a.ops, a.threads, a.latency_ms) else 1)
@@ -0,0 +1,39 @@
+-- Atomic multi-product stock adjustment used by src/services/stock_service.py
+-- (STOCK_ENGINE=rpc). p_deltas is a JSON array of {"prod_id": .., "delta": ..};
+-- negative deltas reserve stock, positive ones release it. The whole call runs
+-- in one transaction: if any product is missing or would go below zero,
+-- nothing is changed and an 'insufficient stock' error is raised with SQLSTATE
+-- 23514 (check_violation), which callers match on (APIError.code).
+
+create or replace function adjust_stock(p_deltas jsonb)
+returns setof products
+language plpgsql
+as $$
+declare
+    v_short bigint;
+begin
+    -- lock the rows in a stable order so concurrent baskets cannot deadlock
+    perform 1
+       from products p
+      where p.prod_id in (select d.prod_id from jsonb_to_recordset(p_deltas) as d(prod_id bigint, delta int))
+      order by p.prod_id
+        for update;
+
+    select d.prod_id into v_short
+      from jsonb_to_recordset(p_deltas) as d(prod_id bigint, delta int)
+      left join products p on p.prod_id = d.prod_id
+     where p.prod_id is null or p.stock + d.delta < 0
+     limit 1;
+
+    if found then
+        raise exception 'insufficient stock for product %', v_short using errcode = '23514';
+    end if;
+
+    return query
+        update products p
+           set stock = p.stock + d.delta
+          from jsonb_to_recordset(p_deltas) as d(prod_id bigint, delta int)
+         where p.prod_id = d.prod_id
+     returning p.*;
+end;
+$$;
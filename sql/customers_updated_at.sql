@@ -0,0 +1,11 @@
+-- Last-modified timestamp on customers, for incremental replica sync
+-- (src/services/terminal.py fetches rows with updated_at >= the newest it has seen).
+-- Needs set_updated_at() from products_updated_at.sql.
+alter table customers add column if not exists updated_at timestamptz not null default now();
+
+create index if not exists customers_updated_at_idx on customers (updated_at);
+
+drop trigger if exists customers_set_updated_at on customers;
+create trigger customers_set_updated_at
+    before update on customers
+    for each row execute function set_updated_at();
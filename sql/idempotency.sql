@@ -0,0 +1,45 @@
+-- Idempotent order and payment writes (order_service.create_order and
+-- payment_service.pay_order with an idempotency key, src/services/outbox.py).
+-- A retried request carries the same key, so:
+--   - orders / payments hold at most one row per key;
+--   - adjust_stock_once() records the key in stock_movements in the same
+--     transaction as the stock change, so a retry after a lost response is
+--     a no-op instead of a second reservation.
+-- stock_movements rows can be purged once no client will retry their key
+-- (e.g. after a week).
+
+alter table orders add column if not exists idempotency_key text unique;
+alter table payments add column if not exists idempotency_key text unique;
+
+create table if not exists stock_movements (
+    movement_id     bigserial primary key,
+    idempotency_key text not null unique,
+    deltas          jsonb not null,
+    created_at      timestamptz not null default now()
+);
+
+-- adjust_stock() (sql/adjust_stock.sql) applied at most once per p_key.
+-- Returns {"applied": bool, "rows": [product rows]}; applied is false when
+-- the key was seen before, and rows are then the products as they are now.
+create or replace function adjust_stock_once(p_key text, p_deltas jsonb)
+returns jsonb
+language plpgsql
+as $$
+begin
+    insert into stock_movements (idempotency_key, deltas) values (p_key, p_deltas)
+    on conflict (idempotency_key) do nothing;
+
+    if not found then
+        return jsonb_build_object('applied', false, 'rows', coalesce((
+            select jsonb_agg(to_jsonb(p) order by p.prod_id)
+              from products p
+             where p.prod_id in (select d.prod_id from jsonb_to_recordset(p_deltas) as d(prod_id bigint, delta int))
+        ), '[]'::jsonb));
+    end if;
+
+    -- adjust_stock raises on insufficient stock, which also undoes the movement row
+    return jsonb_build_object('applied', true, 'rows', coalesce((
+        select jsonb_agg(to_jsonb(a) order by a.prod_id) from adjust_stock(p_deltas) a
+    ), '[]'::jsonb));
+end;
+$$;
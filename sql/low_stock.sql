@@ -0,0 +1,54 @@
+-- Low-stock monitoring used by src/services/low_stock_service.py.
+--
+-- stock_thresholds holds reorder levels for one product (prod_id) or a whole
+-- category; a product's level is its own, else its category's, else the
+-- caller's default. reorder_suggestions is the queue fed by threshold-crossing
+-- events; at most one OPEN suggestion exists per product.
+-- low_stock_products() does the filtering on the server, keyset-paginated
+-- with p_after, using the stock index to skip well-stocked products.
+
+create table if not exists stock_thresholds (
+    threshold_id bigint generated always as identity primary key,
+    prod_id      bigint unique references products (prod_id) on delete cascade,
+    category     text unique,
+    threshold    int not null check (threshold >= 0),
+    reorder_qty  int check (reorder_qty > 0),
+    check ((prod_id is null) <> (category is null))
+);
+
+create index if not exists products_stock_idx on products (stock);
+
+create table if not exists reorder_suggestions (
+    suggestion_id bigint generated always as identity primary key,
+    prod_id       bigint not null references products (prod_id) on delete cascade,
+    stock         int not null,
+    threshold     int not null,
+    suggested_qty int not null,
+    status        text not null default 'OPEN',  -- OPEN, ORDERED, DISMISSED, RESOLVED
+    created_at    timestamptz not null default now(),
+    updated_at    timestamptz
+);
+
+create unique index if not exists reorder_suggestions_open_idx
+    on reorder_suggestions (prod_id) where status = 'OPEN';
+
+create or replace function low_stock_products(p_default int default 5, p_limit int default 500,
+                                              p_after bigint default 0)
+returns table (prod_id bigint, name text, sku text, price numeric, stock int, category text,
+               threshold int, reorder_qty int)
+language sql
+stable
+as $$
+    select p.prod_id, p.name, p.sku, p.price, p.stock, p.category,
+           coalesce(tp.threshold, tc.threshold, p_default) as threshold,
+           coalesce(tp.reorder_qty, tc.reorder_qty) as reorder_qty
+      from products p
+      left join stock_thresholds tp on tp.prod_id = p.prod_id
+      left join stock_thresholds tc on tc.category = p.category
+     -- range bound on the indexed column first, exact per-product level second
+     where p.stock <= greatest(p_default, (select coalesce(max(threshold), 0) from stock_thresholds))
+       and p.stock <= coalesce(tp.threshold, tc.threshold, p_default)
+       and p.prod_id > p_after
+     order by p.prod_id
+     limit p_limit;
+$$;
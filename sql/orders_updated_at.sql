@@ -0,0 +1,11 @@
+-- Last-modified timestamp on orders, for incremental reconciling of the running
+-- sales totals (src/services/sales_aggregates.py fetches orders with
+-- updated_at >= the newest it has seen). Needs set_updated_at() from products_updated_at.sql.
+alter table orders add column if not exists updated_at timestamptz not null default now();
+
+create index if not exists orders_updated_at_idx on orders (updated_at);
+
+drop trigger if exists orders_set_updated_at on orders;
+create trigger orders_set_updated_at
+    before update on orders
+    for each row execute function set_updated_at();
@@ -0,0 +1,8 @@
+-- Index for product_dao.search_products (name ILIKE '%term%').
+-- A trigram GIN index lets Postgres answer substring / ILIKE searches without
+-- scanning the whole products table.
+
+create extension if not exists pg_trgm;
+
+create index if not exists products_name_trgm_idx
+    on products using gin (name gin_trgm_ops);
@@ -0,0 +1,23 @@
+-- Last-modified timestamp on products, for incremental catalog refresh
+-- (src/services/catalog_view.py fetches rows with updated_at >= the newest it has seen).
+alter table products add column if not exists updated_at timestamptz not null default now();
+
+create index if not exists products_updated_at_idx on products (updated_at);
+
+-- stamp every update that does not set updated_at itself (stock changes, upserts, edits)
+create or replace function set_updated_at()
+returns trigger
+language plpgsql
+as $$
+begin
+    if new.updated_at is not distinct from old.updated_at then
+        new.updated_at := now();
+    end if;
+    return new;
+end;
+$$;
+
+drop trigger if exists products_set_updated_at on products;
+create trigger products_set_updated_at
+    before update on products
+    for each row execute function set_updated_at();
@@ -0,0 +1,78 @@
+-- Reporting layer used by src/dao/report_dao.py / src/services/report_service.py.
+-- Aggregates live in materialized views so a top-N report reads a few
+-- pre-computed rows instead of grouping every order_items row per request.
+-- Report rows already carry product / customer names (no N+1 lookups).
+-- Cancelled orders are not counted as sales.
+
+create materialized view if not exists mv_product_sales as
+select p.prod_id,
+       p.name                          as product_name,
+       coalesce(sum(oi.quantity), 0)   as total_qty,
+       coalesce(sum(oi.quantity * oi.price), 0) as total_revenue,
+       count(distinct oi.order_id)     as order_count
+  from products p
+  join order_items oi on oi.prod_id = p.prod_id
+  join orders o on o.order_id = oi.order_id and o.status <> 'CANCELLED'
+ group by p.prod_id, p.name;
+
+create unique index if not exists mv_product_sales_pk on mv_product_sales (prod_id);
+create index if not exists mv_product_sales_qty on mv_product_sales (total_qty desc);
+
+create materialized view if not exists mv_customer_orders as
+select c.cust_id,
+       c.name                 as customer_name,
+       count(o.order_id)      as total_orders,
+       coalesce(sum(o.total_amount), 0) as total_spent
+  from customers c
+  join orders o on o.cust_id = c.cust_id and o.status <> 'CANCELLED'
+ group by c.cust_id, c.name;
+
+create unique index if not exists mv_customer_orders_pk on mv_customer_orders (cust_id);
+create index if not exists mv_customer_orders_cnt on mv_customer_orders (total_orders desc);
+
+create or replace function report_top_selling_products(p_limit int default 5)
+returns table (prod_id bigint, product_name text, total_qty bigint, total_revenue numeric, order_count bigint)
+language sql stable
+as $$
+    select prod_id, product_name, total_qty, total_revenue, order_count
+      from mv_product_sales
+     order by total_qty desc, prod_id
+     limit p_limit;
+$$;
+
+create or replace function report_orders_per_customer()
+returns table (cust_id bigint, customer_name text, total_orders bigint, total_spent numeric)
+language sql stable
+as $$
+    select cust_id, customer_name, total_orders, total_spent
+      from mv_customer_orders
+     order by total_orders desc, cust_id;
+$$;
+
+create or replace function report_customers_more_than_n_orders(p_n int default 2)
+returns table (cust_id bigint, customer_name text, total_orders bigint, total_spent numeric)
+language sql stable
+as $$
+    select cust_id, customer_name, total_orders, total_spent
+      from mv_customer_orders
+     where total_orders > p_n
+     order by total_orders desc, cust_id;
+$$;
+
+-- CONCURRENTLY keeps the views readable during the refresh (needs the unique indexes above).
+create or replace function refresh_report_views()
+returns void
+language plpgsql
+security definer
+as $$
+begin
+    refresh materialized view concurrently mv_product_sales;
+    refresh materialized view concurrently mv_customer_orders;
+end;
+$$;
+
+-- Scheduled refresh every 5 minutes. Requires the pg_cron extension
+-- (Supabase: Database -> Extensions -> pg_cron). Reports can also be
+-- refreshed on demand with `retail-cli report refresh`.
+create extension if not exists pg_cron;
+select cron.schedule('refresh-report-views', '*/5 * * * *', 'select refresh_report_views()');
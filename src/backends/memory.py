@@ -0,0 +1,617 @@
+"""
+In-process stand-in for the supabase/PostgREST client.
+
+Implements the slice of the query-builder API the DAO layer uses
+(table().select/insert/update/upsert/delete + filters + order/limit/range,
+and rpc()) against plain dicts, so services can run without a network.
+Every execute() counts as one round trip and can optionally sleep to
+simulate network latency.
+"""
+import re
+import time
+import asyncio
+import threading
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+# table -> primary key column
+PRIMARY_KEYS = {
+    "products": "prod_id",
+    "customers": "cust_id",
+    "orders": "order_id",
+    "order_items": "item_id",
+    "payments": "payment_id",
+    "stock_thresholds": "threshold_id",
+    "reorder_suggestions": "suggestion_id",
+    "stock_movements": "movement_id",
+}
+
+# table -> columns that must be unique
+UNIQUE_COLUMNS = {
+    "products": ("sku",),
+    "customers": ("email",),
+    "stock_thresholds": ("prod_id", "category"),
+    "orders": ("idempotency_key",),
+    "payments": ("idempotency_key",),
+    "stock_movements": ("idempotency_key",),
+}
+
+# table -> non-unique columns with a lookup index (foreign keys the DAOs filter on)
+INDEXED_COLUMNS = {
+    "orders": ("cust_id",),
+    "order_items": ("order_id",),
+    "payments": ("order_id",),
+    "products": ("stock",),
+    "reorder_suggestions": ("prod_id", "status"),
+}
+
+# table -> column stamped with the current time on insert and on every update
+# that does not set it (the set_updated_at triggers in sql/products_updated_at.sql,
+# sql/customers_updated_at.sql and sql/orders_updated_at.sql)
+TOUCHED_COLUMNS = {"products": "updated_at", "customers": "updated_at", "orders": "updated_at"}
+
+# table -> column defaults applied on insert
+DEFAULTS: Dict[str, Dict[str, Callable[[], Any]]] = {
+    "products": {"stock": lambda: 0, "category": lambda: None},
+    "customers": {"city": lambda: None},
+    "orders": {"status": lambda: "PLACED", "order_date": lambda: _now(), "idempotency_key": lambda: None},
+    "payments": {"status": lambda: "PENDING", "method": lambda: None, "paid_at": lambda: None,
+                 "idempotency_key": lambda: None},
+    "stock_thresholds": {"prod_id": lambda: None, "category": lambda: None, "reorder_qty": lambda: None},
+    "reorder_suggestions": {"status": lambda: "OPEN", "created_at": lambda: _now(), "updated_at": lambda: None},
+    "stock_movements": {"created_at": lambda: _now()},
+}
+
+# table -> defaulted columns declared NOT NULL: a bulk write that sends them as
+# NULL fails, as it does in PostgreSQL
+NOT_NULL = {
+    "products": ("stock",),
+    "orders": ("order_date", "status"),
+    "payments": ("status",),
+    "reorder_suggestions": ("status", "created_at"),
+    "stock_movements": ("created_at",),
+}
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+# SQLSTATEs carried in .code, as PostgREST reports them
+UNIQUE_VIOLATION = "23505"
+NOT_NULL_VIOLATION = "23502"
+CHECK_VIOLATION = "23514"       # also raised by adjust_stock() for insufficient stock
+UNDEFINED_TABLE = "42P01"
+UNDEFINED_FUNCTION = "42883"
+
+
+class MemoryAPIError(Exception):
+    """Raised for constraint violations, mirroring postgrest.APIError (message and SQLSTATE code)."""
+
+    def __init__(self, message: str, code: Optional[str] = None):
+        super().__init__(message)
+        self.message = message
+        self.code = code
+
+
+class MemoryResponse:
+    def __init__(self, data: List[Dict], count: Optional[int] = None):
+        self.data = data
+        self.count = count
+
+
+def _payloads(payload) -> List[Dict]:
+    if not isinstance(payload, list):
+        return [dict(payload)]
+    # a bulk write sends every column any row has, and NULL where a row lacks
+    # one (postgrest-py default_to_null): column defaults only fill columns
+    # that no row gives
+    cols = list(dict.fromkeys(c for p in payload for c in p))
+    return [{c: p.get(c) for c in cols} for p in payload]
+
+
+def _like_to_regex(pattern: str, flags: int = re.IGNORECASE) -> "re.Pattern":
+    out = []
+    escaped = False
+    for ch in pattern:
+        if escaped:
+            out.append(re.escape(ch))
+            escaped = False
+        elif ch == "\\":
+            escaped = True
+        elif ch == "%" or ch == "*":
+            out.append(".*")
+        elif ch == "_":
+            out.append(".")
+        else:
+            out.append(re.escape(ch))
+    return re.compile("^" + "".join(out) + "$", flags | re.DOTALL)
+
+
+def _cmp(op: str, left: Any, right: Any) -> bool:
+    if left is None:
+        return op == "is" and right is None
+    if op == "eq":
+        return left == right
+    if op == "neq":
+        return left != right
+    if op == "gt":
+        return left > right
+    if op == "gte":
+        return left >= right
+    if op == "lt":
+        return left < right
+    if op == "lte":
+        return left <= right
+    if op == "in":
+        return left in right
+    if op in ("ilike", "like"):
+        return bool(right.match(str(left)))
+    if op == "is":
+        return left is right
+    raise MemoryAPIError(f"Unsupported filter: {op}")
+
+
+def _rpc_adjust_stock(client: "MemoryClient", params: Dict) -> List[Dict]:
+    """Python twin of sql/adjust_stock.sql (runs under the client lock)."""
+    products = client._tables["products"]
+    deltas = [(int(d["prod_id"]), int(d["delta"])) for d in params["p_deltas"]]
+    for prod_id, delta in deltas:
+        row = products.get(prod_id)
+        if row is None or (row.get("stock") or 0) + delta < 0:
+            raise MemoryAPIError(f"insufficient stock for product {prod_id}", CHECK_VIOLATION)
+    out = []
+    for prod_id, delta in deltas:
+        row = products[prod_id]
+        client._update_row("products", row, {"stock": (row.get("stock") or 0) + delta})
+        out.append(dict(row))
+    return out
+
+
+def _rpc_adjust_stock_once(client: "MemoryClient", params: Dict) -> Dict:
+    """Python twin of adjust_stock_once() in sql/idempotency.sql."""
+    key = params["p_key"]
+    if key in client._unique["stock_movements"]["idempotency_key"]:
+        products = client._tables["products"]
+        ids = sorted({int(d["prod_id"]) for d in params["p_deltas"]})
+        return {"applied": False, "rows": [dict(products[pid]) for pid in ids if pid in products]}
+    rows = _rpc_adjust_stock(client, params)
+    client._insert_row("stock_movements", {"idempotency_key": key, "deltas": list(params["p_deltas"])})
+    return {"applied": True, "rows": sorted(rows, key=lambda r: r["prod_id"])}
+
+
+def _product_sales(client: "MemoryClient") -> List[Dict]:
+    """mv_product_sales from sql/reports.sql, computed live."""
+    orders = client._tables["orders"]
+    products = client._tables["products"]
+    sales: Dict[int, Dict] = {}
+    for it in client._tables["order_items"].values():
+        order = orders.get(it["order_id"])
+        if order is None or order.get("status") == "CANCELLED" or it["prod_id"] not in products:
+            continue
+        s = sales.setdefault(it["prod_id"], {
+            "prod_id": it["prod_id"], "product_name": products[it["prod_id"]]["name"],
+            "total_qty": 0, "total_revenue": 0, "order_count": set(),
+        })
+        s["total_qty"] += it["quantity"]
+        s["total_revenue"] += it["quantity"] * it["price"]
+        s["order_count"].add(it["order_id"])
+    for s in sales.values():
+        s["order_count"] = len(s["order_count"])
+    return list(sales.values())
+
+
+def _customer_orders(client: "MemoryClient") -> List[Dict]:
+    """mv_customer_orders from sql/reports.sql, computed live."""
+    customers = client._tables["customers"]
+    out: Dict[int, Dict] = {}
+    for o in client._tables["orders"].values():
+        if o.get("status") == "CANCELLED" or o["cust_id"] not in customers:
+            continue
+        c = out.setdefault(o["cust_id"], {
+            "cust_id": o["cust_id"], "customer_name": customers[o["cust_id"]]["name"],
+            "total_orders": 0, "total_spent": 0,
+        })
+        c["total_orders"] += 1
+        c["total_spent"] += o.get("total_amount") or 0
+    return sorted(out.values(), key=lambda c: (-c["total_orders"], c["cust_id"]))
+
+
+def _rpc_low_stock_products(client: "MemoryClient", params: Dict) -> List[Dict]:
+    """Python twin of low_stock_products() in sql/low_stock.sql."""
+    default = params.get("p_default", 5)
+    limit = params.get("p_limit", 500)
+    after = params.get("p_after", 0)
+    by_prod, by_category = {}, {}
+    for t in client._tables["stock_thresholds"].values():
+        if t.get("prod_id") is not None:
+            by_prod[t["prod_id"]] = t
+        else:
+            by_category[t["category"]] = t
+    ceiling = max([default] + [t["threshold"] for t in client._tables["stock_thresholds"].values()])
+    out = []
+    # walk the stock index instead of the whole catalog, like products_stock_idx
+    stock_index = client._indexes["products"]["stock"]
+    candidates = sorted(pk for s, pks in stock_index.items() if s is not None and s <= ceiling for pk in pks)
+    for pk in candidates:
+        p = client._tables["products"][pk]
+        if pk <= after:
+            continue
+        t = by_prod.get(pk) or by_category.get(p.get("category"))
+        threshold = t["threshold"] if t else default
+        if (p.get("stock") or 0) <= threshold:
+            out.append(dict(p, threshold=threshold, reorder_qty=t.get("reorder_qty") if t else None))
+            if len(out) >= limit:
+                break
+    return out
+
+
+# rpc name -> python stand-in for the SQL function of the same name in sql/
+BUILTIN_RPCS: Dict[str, Callable[["MemoryClient", Dict], Any]] = {
+    "adjust_stock": _rpc_adjust_stock,
+    "adjust_stock_once": _rpc_adjust_stock_once,
+    "report_top_selling_products": lambda c, p: sorted(
+        _product_sales(c), key=lambda s: (-s["total_qty"], s["prod_id"]))[:p.get("p_limit", 5)],
+    "report_orders_per_customer": lambda c, p: _customer_orders(c),
+    "report_customers_more_than_n_orders": lambda c, p: [
+        r for r in _customer_orders(c) if r["total_orders"] > p.get("p_n", 2)],
+    "refresh_report_views": lambda c, p: None,
+    "low_stock_products": _rpc_low_stock_products,
+}
+
+
+class MemoryQuery:
+    """Chainable query builder; one execute() == one round trip."""
+
+    def __init__(self, client: "MemoryClient", table: str):
+        self._client = client
+        self._table = table
+        self._op = "select"
+        self._columns = "*"
+        self._count = None
+        self._payload: Any = None
+        self._on_conflict: Optional[str] = None
+        self._filters: List[tuple] = []
+        self._order: List[tuple] = []
+        self._limit: Optional[int] = None
+        self._offset = 0
+
+    # ---- operations ----
+    def select(self, columns: str = "*", count: Optional[str] = None) -> "MemoryQuery":
+        self._columns = columns
+        self._count = count
+        return self
+
+    def insert(self, payload, **_) -> "MemoryQuery":
+        self._op, self._payload = "insert", payload
+        return self
+
+    def upsert(self, payload, on_conflict: str = "", **_) -> "MemoryQuery":
+        self._op, self._payload, self._on_conflict = "upsert", payload, on_conflict or None
+        return self
+
+    def update(self, fields: Dict, **_) -> "MemoryQuery":
+        self._op, self._payload = "update", fields
+        return self
+
+    def delete(self, **_) -> "MemoryQuery":
+        self._op = "delete"
+        return self
+
+    # ---- filters / modifiers ----
+    def _filter(self, op: str, column: str, value: Any) -> "MemoryQuery":
+        self._filters.append((op, column, value))
+        return self
+
+    def eq(self, column, value):
+        return self._filter("eq", column, value)
+
+    def neq(self, column, value):
+        return self._filter("neq", column, value)
+
+    def gt(self, column, value):
+        return self._filter("gt", column, value)
+
+    def gte(self, column, value):
+        return self._filter("gte", column, value)
+
+    def lt(self, column, value):
+        return self._filter("lt", column, value)
+
+    def lte(self, column, value):
+        return self._filter("lte", column, value)
+
+    def in_(self, column, values):
+        return self._filter("in", column, set(values))
+
+    def is_(self, column, value):
+        return self._filter("is", column, None if value in (None, "null") else value)
+
+    def like(self, column, pattern):
+        return self._filter("like", column, _like_to_regex(pattern, flags=0))
+
+    def ilike(self, column, pattern):
+        return self._filter("ilike", column, _like_to_regex(pattern))
+
+    def order(self, column: str, desc: bool = False, **_) -> "MemoryQuery":
+        self._order.append((column, desc))
+        return self
+
+    def limit(self, size: int, **_) -> "MemoryQuery":
+        self._limit = size
+        return self
+
+    def range(self, start: int, end: int, **_) -> "MemoryQuery":
+        self._offset = start
+        self._limit = end - start + 1
+        return self
+
+    # ---- execution ----
+    def _matches(self, row: Dict) -> bool:
+        return all(_cmp(op, row.get(col), val) for op, col, val in self._filters)
+
+    def _project(self, row: Dict) -> Dict:
+        if self._columns.strip() == "*":
+            return dict(row)
+        cols = [c.strip() for c in self._columns.split(",") if c.strip()]
+        if "*" in cols:
+            return dict(row)
+        return {c: row.get(c) for c in cols}
+
+    def _sorted(self, rows: List[Dict]) -> List[Dict]:
+        for column, desc in reversed(self._order):
+            rows = sorted(rows, key=lambda r: (r.get(column) is None, r.get(column)), reverse=desc)
+        return rows
+
+    def execute(self) -> MemoryResponse:
+        return self._client._execute(self)
+
+
+class MemoryRpc:
+    def __init__(self, client: "MemoryClient", name: str, params: Dict):
+        self._client = client
+        self._name = name
+        self._params = params or {}
+
+    def execute(self) -> MemoryResponse:
+        return self._client._execute_rpc(self._name, self._params)
+
+
+class MemoryAsyncQuery(MemoryQuery):
+    """Same builder, awaitable execute(); runs in a worker thread so latencies overlap."""
+
+    async def execute(self) -> MemoryResponse:
+        return await asyncio.to_thread(self._client._execute, self)
+
+
+class MemoryAsyncRpc(MemoryRpc):
+    async def execute(self) -> MemoryResponse:
+        return await asyncio.to_thread(self._client._execute_rpc, self._name, self._params)
+
+
+class MemoryAsyncClient:
+    """AsyncClient-shaped view over a MemoryClient (shares its tables and counters)."""
+
+    def __init__(self, client: "MemoryClient"):
+        self._client = client
+
+    def table(self, name: str) -> MemoryAsyncQuery:
+        self._client.table(name)  # validates the name
+        return MemoryAsyncQuery(self._client, name)
+
+    from_ = table
+
+    def rpc(self, name: str, params: Optional[Dict] = None) -> MemoryAsyncRpc:
+        return MemoryAsyncRpc(self._client, name, params or {})
+
+
+class MemoryClient:
+    """
+    Thread-safe in-memory database exposing the supabase client surface.
+    Writes take the client lock, so a conditional update (update ... eq(stock, old))
+    behaves like a single-row compare-and-swap, just as it does on Postgres.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.round_trips = 0
+        self._lock = threading.RLock()
+        self._tables: Dict[str, Dict[int, Dict]] = {t: {} for t in PRIMARY_KEYS}
+        self._next_id: Dict[str, int] = {t: 1 for t in PRIMARY_KEYS}
+        # table -> unique column -> value -> pk, so constraint checks don't scan
+        self._unique: Dict[str, Dict[str, Dict[Any, int]]] = {
+            t: {c: {} for c in UNIQUE_COLUMNS.get(t, ())} for t in PRIMARY_KEYS
+        }
+        # table -> indexed column -> value -> pks
+        self._indexes: Dict[str, Dict[str, Dict[Any, set]]] = {
+            t: {c: {} for c in INDEXED_COLUMNS.get(t, ())} for t in PRIMARY_KEYS
+        }
+        self._rpcs: Dict[str, Callable[["MemoryClient", Dict], Any]] = dict(BUILTIN_RPCS)
+
+    # ---- supabase client surface ----
+    def table(self, name: str) -> MemoryQuery:
+        if name not in self._tables:
+            raise MemoryAPIError(f'relation "{name}" does not exist', UNDEFINED_TABLE)
+        return MemoryQuery(self, name)
+
+    from_ = table
+
+    def rpc(self, name: str, params: Optional[Dict] = None) -> MemoryRpc:
+        return MemoryRpc(self, name, params or {})
+
+    def as_async(self) -> MemoryAsyncClient:
+        return MemoryAsyncClient(self)
+
+    def register_rpc(self, name: str, fn: Callable[["MemoryClient", Dict], Any]):
+        """Register a python stand-in for a SQL function called through rpc()."""
+        self._rpcs[name] = fn
+
+    def reset_counters(self):
+        self.round_trips = 0
+
+    def rows(self, table: str) -> List[Dict]:
+        """Direct snapshot of a table (no round trip), for assertions and seeding checks."""
+        with self._lock:
+            return [dict(r) for r in self._tables[table].values()]
+
+    # ---- internals ----
+    def _tick(self):
+        with self._lock:
+            self.round_trips += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _execute_rpc(self, name: str, params: Dict) -> MemoryResponse:
+        self._tick()
+        fn = self._rpcs.get(name)
+        if fn is None:
+            raise MemoryAPIError(f"function {name} does not exist", UNDEFINED_FUNCTION)
+        with self._lock:
+            data = fn(self, params)
+        return MemoryResponse(data)
+
+    def _check_unique(self, table: str, row: Dict, ignore_pk: Optional[int] = None):
+        for col, index in self._unique[table].items():
+            val = row.get(col)
+            if val is None:
+                continue
+            owner = index.get(val)
+            if owner is not None and owner != ignore_pk:
+                raise MemoryAPIError(f'duplicate key value violates unique constraint "{table}_{col}_key"',
+                                     UNIQUE_VIOLATION)
+
+    def _check_not_null(self, table: str, row: Dict):
+        for col in NOT_NULL.get(table, ()):
+            if row.get(col) is None:
+                raise MemoryAPIError(f'null value in column "{col}" of relation "{table}" violates not-null constraint',
+                                     NOT_NULL_VIOLATION)
+
+    def _index_row(self, table: str, row: Dict):
+        pk = PRIMARY_KEYS[table]
+        for col, index in self._unique[table].items():
+            if row.get(col) is not None:
+                index[row[col]] = row[pk]
+        for col, index in self._indexes[table].items():
+            index.setdefault(row.get(col), set()).add(row[pk])
+
+    def _unindex_row(self, table: str, row: Dict):
+        pk = PRIMARY_KEYS[table]
+        for col, index in self._unique[table].items():
+            if row.get(col) is not None:
+                index.pop(row[col], None)
+        for col, index in self._indexes[table].items():
+            pks = index.get(row.get(col))
+            if pks is not None:
+                pks.discard(row[pk])
+                if not pks:
+                    del index[row.get(col)]
+
+    def _candidates(self, q: MemoryQuery) -> List[Dict]:
+        """
+        Rows that can match q: narrowed through the primary key, a unique
+        column or an indexed column when q filters on one with eq/in, else
+        the whole table. Always in primary key order.
+        """
+        table = q._table
+        store = self._tables[table]
+        pk = PRIMARY_KEYS[table]
+        for op, col, val in q._filters:
+            if op not in ("eq", "in"):
+                continue
+            values = val if op == "in" else (val,)
+            if col == pk:
+                pks = set(values)
+            elif col in self._unique[table]:
+                index = self._unique[table][col]
+                pks = {index[v] for v in values if v in index}
+            elif col in self._indexes[table]:
+                index = self._indexes[table][col]
+                pks = set().union(*(index.get(v, ()) for v in values))
+            else:
+                continue
+            return [store[k] for k in sorted(pks) if k in store]
+        return list(store.values())
+
+    def _update_row(self, table: str, row: Dict, changes: Dict):
+        touched = TOUCHED_COLUMNS.get(table)
+        if touched and touched not in changes:
+            changes = dict(changes, **{touched: _now()})
+        self._check_not_null(table, dict(row, **changes))
+        self._check_unique(table, dict(row, **changes), ignore_pk=row[PRIMARY_KEYS[table]])
+        self._unindex_row(table, row)
+        row.update(changes)
+        self._index_row(table, row)
+
+    def _insert_row(self, table: str, payload: Dict) -> Dict:
+        pk = PRIMARY_KEYS[table]
+        row = {k: f() for k, f in DEFAULTS.get(table, {}).items()}
+        if table in TOUCHED_COLUMNS:
+            row[TOUCHED_COLUMNS[table]] = _now()
+        row.update(payload)
+        if row.get(pk) is None:
+            row[pk] = self._next_id[table]
+        self._next_id[table] = max(self._next_id[table], row[pk] + 1)
+        if row[pk] in self._tables[table]:
+            raise MemoryAPIError(f'duplicate key value violates unique constraint "{table}_pkey"', UNIQUE_VIOLATION)
+        self._check_not_null(table, row)
+        self._check_unique(table, row)
+        self._tables[table][row[pk]] = row
+        self._index_row(table, row)
+        return row
+
+    def _execute(self, q: MemoryQuery) -> MemoryResponse:
+        self._tick()
+        table = q._table
+        pk = PRIMARY_KEYS[table]
+        with self._lock:
+            store = self._tables[table]
+            if q._op == "insert":
+                payloads = _payloads(q._payload)
+                # a failing row undoes the rows inserted before it (statement atomicity)
+                next_id = self._next_id[table]
+                inserted: List[Dict] = []
+                try:
+                    for p in payloads:
+                        inserted.append(self._insert_row(table, p))
+                except MemoryAPIError:
+                    for row in inserted:
+                        self._unindex_row(table, row)
+                        del store[row[pk]]
+                    self._next_id[table] = next_id
+                    raise
+                out = [dict(r) for r in inserted]
+                return MemoryResponse(out)
+            if q._op == "upsert":
+                payloads = _payloads(q._payload)
+                key = q._on_conflict or pk
+                by_key = {r.get(key): r for r in store.values()}
+                out = []
+                for p in payloads:
+                    existing = by_key.get(p.get(key))
+                    if existing is None:
+                        row = self._insert_row(table, dict(p))
+                        by_key[row.get(key)] = row
+                        out.append(dict(row))
+                    else:
+                        self._update_row(table, existing, p)
+                        out.append(dict(existing))
+                return MemoryResponse(out)
+
+            matched = [r for r in self._candidates(q) if q._matches(r)]
+            if q._op == "update":
+                out = []
+                for r in matched:
+                    self._update_row(table, r, q._payload)
+                    out.append(dict(r))
+                return MemoryResponse(out)
+            if q._op == "delete":
+                for r in matched:
+                    self._unindex_row(table, r)
+                    del store[r[pk]]
+                return MemoryResponse([dict(r) for r in matched])
+
+            rows = q._sorted(matched) if q._order else matched
+            total = len(rows)
+            end = None if q._limit is None else q._offset + q._limit
+            rows = rows[q._offset:end]
+            return MemoryResponse([q._project(r) for r in rows], total if q._count else None)
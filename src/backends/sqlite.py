@@ -0,0 +1,493 @@
+"""
+SQLite engine behind the supabase/PostgREST client surface.
+
+Speaks the same query-builder API as src.backends.memory (and the slice of
+supabase-py the DAO layer uses), but stores the products, customers,
+orders, order_items and payments tables (plus the low-stock tables from
+sql/low_stock.sql) in a SQLite file in WAL mode, so a
+store terminal can run the whole app locally without a network. Every
+execute() is a single SQL statement and counts as one round trip; writes
+use RETURNING so they hand back the affected rows like PostgREST does.
+
+Each thread gets its own connection; WAL lets readers run alongside the
+single writer, and a conditional UPDATE ... WHERE stock = ? is still an
+atomic compare-and-swap. The rpc() functions from sql/ are implemented in
+SQL here (report views are computed live instead of materialized).
+"""
+import re
+import json
+import time
+import asyncio
+import sqlite3
+import threading
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, List, Optional
+from src.backends.memory import (
+    CHECK_VIOLATION, NOT_NULL_VIOLATION, PRIMARY_KEYS, TOUCHED_COLUMNS, UNDEFINED_FUNCTION, UNDEFINED_TABLE, UNIQUE_VIOLATION,
+    MemoryQuery, MemoryResponse, _like_to_regex,
+)
+
+SCHEMA = """
+create table if not exists products (
+    prod_id  integer primary key autoincrement,
+    name     text not null,
+    sku      text not null unique,
+    price    real not null,
+    stock    integer not null default 0,
+    category text,
+    updated_at text default (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+);
+create index if not exists products_category_idx on products (category);
+create index if not exists products_stock_idx on products (stock);
+
+create table if not exists customers (
+    cust_id integer primary key autoincrement,
+    name    text not null,
+    email   text not null unique,
+    phone   text not null,
+    city    text,
+    updated_at text default (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+);
+create index if not exists customers_city_idx on customers (city);
+
+create table if not exists orders (
+    order_id     integer primary key autoincrement,
+    cust_id      integer not null references customers (cust_id),
+    order_date   text not null default (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')),
+    total_amount real not null default 0,
+    status       text not null default 'PLACED',
+    idempotency_key text,
+    updated_at   text default (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+);
+create index if not exists orders_cust_id_idx on orders (cust_id);
+create index if not exists orders_status_idx on orders (status);
+
+create table if not exists order_items (
+    item_id  integer primary key autoincrement,
+    order_id integer not null references orders (order_id) on delete cascade,
+    prod_id  integer not null references products (prod_id),
+    quantity integer not null,
+    price    real not null
+);
+create index if not exists order_items_order_id_idx on order_items (order_id);
+create index if not exists order_items_prod_id_idx on order_items (prod_id);
+
+create table if not exists payments (
+    payment_id integer primary key autoincrement,
+    order_id   integer not null references orders (order_id),
+    amount     real not null,
+    method     text,
+    status     text not null default 'PENDING',
+    paid_at    text,
+    idempotency_key text
+);
+create index if not exists payments_order_id_idx on payments (order_id);
+
+create table if not exists stock_thresholds (
+    threshold_id integer primary key autoincrement,
+    prod_id      integer unique references products (prod_id) on delete cascade,
+    category     text unique,
+    threshold    integer not null check (threshold >= 0),
+    reorder_qty  integer check (reorder_qty > 0),
+    check ((prod_id is null) <> (category is null))
+);
+
+create table if not exists reorder_suggestions (
+    suggestion_id integer primary key autoincrement,
+    prod_id       integer not null references products (prod_id) on delete cascade,
+    stock         integer not null,
+    threshold     integer not null,
+    suggested_qty integer not null,
+    status        text not null default 'OPEN',
+    created_at    text not null default (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')),
+    updated_at    text
+);
+create unique index if not exists reorder_suggestions_open_idx
+    on reorder_suggestions (prod_id) where status = 'OPEN';
+
+create table if not exists stock_movements (
+    movement_id     integer primary key autoincrement,
+    idempotency_key text not null unique,
+    deltas          text not null,
+    created_at      text not null default (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+);
+"""
+
+_IDENT_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+class SQLiteAPIError(Exception):
+    """Raised for constraint violations and bad queries, mirroring postgrest.APIError (message and SQLSTATE code)."""
+
+    def __init__(self, message: str, code: Optional[str] = None):
+        super().__init__(message)
+        self.message = message
+        self.code = code
+
+
+def _ident(name: str) -> str:
+    name = name.strip()
+    if not _IDENT_RE.match(name):
+        raise SQLiteAPIError(f"invalid column name: {name!r}")
+    return f'"{name}"'
+
+
+def _error(e: sqlite3.Error) -> SQLiteAPIError:
+    msg = str(e)
+    m = re.match(r"UNIQUE constraint failed: (\w+)\.(\w+)", msg)
+    if m:
+        table, col = m.groups()
+        suffix = "pkey" if col == PRIMARY_KEYS.get(table) else f"{col}_key"
+        return SQLiteAPIError(f'duplicate key value violates unique constraint "{table}_{suffix}"', UNIQUE_VIOLATION)
+    if msg.startswith("CHECK constraint failed"):
+        return SQLiteAPIError(msg, CHECK_VIOLATION)
+    if msg.startswith("NOT NULL constraint failed"):
+        return SQLiteAPIError(msg, NOT_NULL_VIOLATION)
+    return SQLiteAPIError(msg)
+
+
+class SQLiteQuery(MemoryQuery):
+    """The memory engine's builder, compiled to one SQL statement on execute()."""
+
+    def like(self, column, pattern):
+        return self._filter("like", column, pattern)
+
+    def ilike(self, column, pattern):
+        return self._filter("ilike", column, pattern)
+
+    def _where(self):
+        clauses, params = [], []
+        for op, col, val in self._filters:
+            c = _ident(col)
+            if op == "in":
+                vals = list(val)
+                if not vals:
+                    clauses.append("0")
+                    continue
+                clauses.append(f"{c} in ({', '.join('?' * len(vals))})")
+                params += vals
+            elif op == "is":
+                clauses.append(f"{c} is null" if val is None else f"{c} is ?")
+                params += [] if val is None else [val]
+            elif op == "ilike":
+                clauses.append(f"lower({c}) like lower(?) escape '\\'")
+                params.append(val.replace("*", "%"))
+            elif op == "like":
+                # sqlite's LIKE ignores ASCII case; PostgreSQL's doesn't
+                clauses.append(f"pg_like({c}, ?)")
+                params.append(val)
+            else:
+                sql_op = {"eq": "=", "neq": "!=", "gt": ">", "gte": ">=", "lt": "<", "lte": "<="}[op]
+                clauses.append(f"{c} {sql_op} ?")
+                params.append(val)
+        return (" where " + " and ".join(clauses)) if clauses else "", params
+
+    def _select_list(self) -> str:
+        cols = [c.strip() for c in self._columns.split(",") if c.strip()]
+        if not cols or "*" in cols:
+            return "*"
+        return ", ".join(_ident(c) for c in cols)
+
+    def execute(self) -> MemoryResponse:
+        return self._client._execute(self)
+
+
+class SQLiteRpc:
+    def __init__(self, client: "SQLiteClient", name: str, params: Dict):
+        self._client = client
+        self._name = name
+        self._params = params or {}
+
+    def execute(self) -> MemoryResponse:
+        return self._client._execute_rpc(self._name, self._params)
+
+
+class SQLiteAsyncQuery(SQLiteQuery):
+    async def execute(self) -> MemoryResponse:
+        return await asyncio.to_thread(self._client._execute, self)
+
+
+class SQLiteAsyncRpc(SQLiteRpc):
+    async def execute(self) -> MemoryResponse:
+        return await asyncio.to_thread(self._client._execute_rpc, self._name, self._params)
+
+
+class SQLiteAsyncClient:
+    """AsyncClient-shaped view over a SQLiteClient."""
+
+    def __init__(self, client: "SQLiteClient"):
+        self._client = client
+
+    def table(self, name: str) -> SQLiteAsyncQuery:
+        self._client.table(name)  # validates the name
+        return SQLiteAsyncQuery(self._client, name)
+
+    from_ = table
+
+    def rpc(self, name: str, params: Optional[Dict] = None) -> SQLiteAsyncRpc:
+        return SQLiteAsyncRpc(self._client, name, params or {})
+
+
+# current time in the format the schema defaults use (RETURNING does not see trigger changes,
+# so touched columns are set in the statement itself)
+_NOW = "strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')"
+
+
+def _migrate(conn: sqlite3.Connection):
+    """Bring database files created by an older SCHEMA up to date."""
+    for table in ("products", "customers", "orders"):
+        if "updated_at" not in {r[1] for r in conn.execute(f"pragma table_info({table})")}:
+            conn.execute(f"alter table {table} add column updated_at text")
+            conn.execute(f"update {table} set updated_at = {_NOW}")
+        conn.execute(f"create index if not exists {table}_updated_at_idx on {table} (updated_at)")
+    for table in ("orders", "payments"):
+        if "idempotency_key" not in {r[1] for r in conn.execute(f"pragma table_info({table})")}:
+            conn.execute(f"alter table {table} add column idempotency_key text")
+        conn.execute(f"create unique index if not exists {table}_idempotency_key_idx on {table} (idempotency_key)")
+    conn.commit()
+
+
+def _apply_deltas(conn: sqlite3.Connection, params: Dict) -> List[Dict]:
+    # runs inside the caller's write transaction
+    deltas = [(int(d["prod_id"]), int(d["delta"])) for d in params["p_deltas"]]
+    out = []
+    for prod_id, delta in sorted(deltas):
+        rows = conn.execute(
+            f"update products set stock = stock + ?, updated_at = {_NOW} "
+            "where prod_id = ? and stock + ? >= 0 returning *",
+            (delta, prod_id, delta),
+        ).fetchall()
+        if not rows:
+            raise SQLiteAPIError(f"insufficient stock for product {prod_id}", CHECK_VIOLATION)
+        out.append(dict(rows[0]))
+    return out
+
+
+def _rpc_adjust_stock(conn: sqlite3.Connection, params: Dict) -> List[Dict]:
+    """sql/adjust_stock.sql for SQLite: all deltas or none, in one write transaction."""
+    conn.execute("begin immediate")
+    try:
+        out = _apply_deltas(conn, params)
+        conn.execute("commit")
+    except BaseException:
+        conn.execute("rollback")
+        raise
+    return out
+
+
+def _rpc_adjust_stock_once(conn: sqlite3.Connection, params: Dict) -> Dict:
+    """adjust_stock_once() from sql/idempotency.sql: the movement row and the stock change commit together."""
+    conn.execute("begin immediate")
+    try:
+        fresh = conn.execute(
+            "insert into stock_movements (idempotency_key, deltas) values (?, ?) "
+            "on conflict (idempotency_key) do nothing returning movement_id",
+            (params["p_key"], json.dumps(params["p_deltas"])),
+        ).fetchall()
+        if fresh:
+            out = {"applied": True, "rows": _apply_deltas(conn, params)}
+        else:
+            ids = sorted({int(d["prod_id"]) for d in params["p_deltas"]})
+            rows = conn.execute(f"select * from products where prod_id in ({', '.join('?' * len(ids))}) "
+                                "order by prod_id", ids).fetchall()
+            out = {"applied": False, "rows": [dict(r) for r in rows]}
+        conn.execute("commit")
+    except BaseException:
+        conn.execute("rollback")
+        raise
+    return out
+
+
+# live equivalents of the materialized views in sql/reports.sql
+_PRODUCT_SALES = """
+    select p.prod_id, p.name as product_name, sum(oi.quantity) as total_qty,
+           sum(oi.quantity * oi.price) as total_revenue, count(distinct oi.order_id) as order_count
+    from order_items oi
+    join orders o on o.order_id = oi.order_id and o.status != 'CANCELLED'
+    join products p on p.prod_id = oi.prod_id
+    group by p.prod_id, p.name
+"""
+_CUSTOMER_ORDERS = """
+    select c.cust_id, c.name as customer_name, count(*) as total_orders,
+           coalesce(sum(o.total_amount), 0) as total_spent
+    from orders o
+    join customers c on c.cust_id = o.cust_id
+    where o.status != 'CANCELLED'
+    group by c.cust_id, c.name
+"""
+
+
+def _query(sql: str, *args):
+    return lambda conn, params: [dict(r) for r in conn.execute(sql, tuple(a(params) for a in args))]
+
+
+BUILTIN_RPCS: Dict[str, Callable[[sqlite3.Connection, Dict], Any]] = {
+    "adjust_stock": _rpc_adjust_stock,
+    "adjust_stock_once": _rpc_adjust_stock_once,
+    "report_top_selling_products": _query(
+        f"select * from ({_PRODUCT_SALES}) order by total_qty desc, prod_id limit ?",
+        lambda p: p.get("p_limit", 5)),
+    "report_orders_per_customer": _query(
+        f"select * from ({_CUSTOMER_ORDERS}) order by total_orders desc, cust_id"),
+    "report_customers_more_than_n_orders": _query(
+        f"select * from ({_CUSTOMER_ORDERS}) where total_orders > ? order by total_orders desc, cust_id",
+        lambda p: p.get("p_n", 2)),
+    "refresh_report_views": lambda conn, params: None,
+    "low_stock_products": _query(
+        """
+        select p.*, coalesce(tp.threshold, tc.threshold, ?) as threshold,
+               coalesce(tp.reorder_qty, tc.reorder_qty) as reorder_qty
+        from products p
+        left join stock_thresholds tp on tp.prod_id = p.prod_id
+        left join stock_thresholds tc on tc.category = p.category
+        where p.stock <= max(?, (select coalesce(max(threshold), 0) from stock_thresholds))
+          and p.stock <= coalesce(tp.threshold, tc.threshold, ?)
+          and p.prod_id > ?
+        order by p.prod_id
+        limit ?
+        """,
+        *([lambda p: p.get("p_default", 5)] * 3), lambda p: p.get("p_after", 0), lambda p: p.get("p_limit", 500)),
+}
+
+
+class SQLiteClient:
+    """
+    Supabase-client-shaped access to a SQLite database file.
+    path=":memory:" gives a private in-memory database; its threads share one
+    connection and take turns (handy for benchmarks and tests).
+    """
+
+    def __init__(self, path: str, latency: float = 0.0, busy_timeout: float = 5.0):
+        self.latency = latency
+        self.round_trips = 0
+        self.busy_timeout = busy_timeout
+        self._target = path
+        self._shared = path == ":memory:"
+        self._lock = threading.Lock()
+        self._serial = threading.RLock() if self._shared else nullcontext()
+        self._local = threading.local()
+        self._rpcs: Dict[str, Callable[[sqlite3.Connection, Dict], Any]] = dict(BUILTIN_RPCS)
+        self._main = self._connect()
+        self._main.executescript(SCHEMA)
+        _migrate(self._main)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self._target, timeout=self.busy_timeout,
+                               isolation_level=None, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        if not self._shared:
+            conn.execute("pragma journal_mode = wal")
+            conn.execute("pragma synchronous = normal")
+        conn.execute("pragma foreign_keys = on")
+        conn.create_function("pg_like", 2, lambda value, pattern: value is not None and bool(
+            _like_to_regex(pattern, flags=0).match(str(value))), deterministic=True)
+        return conn
+
+    def _conn(self) -> sqlite3.Connection:
+        if self._shared:
+            return self._main
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    # ---- supabase client surface ----
+    def table(self, name: str) -> SQLiteQuery:
+        if name not in PRIMARY_KEYS:
+            raise SQLiteAPIError(f'relation "{name}" does not exist', UNDEFINED_TABLE)
+        return SQLiteQuery(self, name)
+
+    from_ = table
+
+    def rpc(self, name: str, params: Optional[Dict] = None) -> SQLiteRpc:
+        return SQLiteRpc(self, name, params or {})
+
+    def as_async(self) -> SQLiteAsyncClient:
+        return SQLiteAsyncClient(self)
+
+    def register_rpc(self, name: str, fn: Callable[[sqlite3.Connection, Dict], Any]):
+        """Register a python implementation of a SQL function called through rpc()."""
+        self._rpcs[name] = fn
+
+    def reset_counters(self):
+        self.round_trips = 0
+
+    def rows(self, table: str) -> List[Dict]:
+        """Direct snapshot of a table (no round trip), for assertions and seeding checks."""
+        self.table(table)
+        pk = PRIMARY_KEYS[table]
+        with self._serial:
+            return [dict(r) for r in self._conn().execute(f"select * from {table} order by {pk}")]
+
+    # ---- internals ----
+    def _tick(self):
+        with self._lock:
+            self.round_trips += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _execute_rpc(self, name: str, params: Dict) -> MemoryResponse:
+        self._tick()
+        fn = self._rpcs.get(name)
+        if fn is None:
+            raise SQLiteAPIError(f"function {name} does not exist", UNDEFINED_FUNCTION)
+        try:
+            with self._serial:
+                return MemoryResponse(fn(self._conn(), params))
+        except sqlite3.Error as e:
+            raise _error(e)
+
+    def _execute(self, q: SQLiteQuery) -> MemoryResponse:
+        self._tick()
+        table = q._table
+        try:
+            with self._serial:
+                return self._run(q, table, self._conn())
+        except sqlite3.Error as e:
+            raise _error(e)
+
+    def _run(self, q: SQLiteQuery, table: str, conn: sqlite3.Connection) -> MemoryResponse:
+        where, params = q._where()
+        if q._op in ("insert", "upsert"):
+            payloads = q._payload if isinstance(q._payload, list) else [q._payload]
+            if not payloads:
+                return MemoryResponse([])
+            cols = list(dict.fromkeys(c for p in payloads for c in p))
+            sql = (f"insert into {table} ({', '.join(_ident(c) for c in cols)}) values "
+                   + ", ".join(f"({', '.join('?' * len(cols))})" for _ in payloads))
+            args = [p.get(c) for p in payloads for c in cols]
+            if q._op == "upsert":
+                key = q._on_conflict or PRIMARY_KEYS[table]
+                updates = [c for c in cols if c != key]
+                sets = [f"{_ident(c)} = excluded.{_ident(c)}" for c in updates]
+                if TOUCHED_COLUMNS.get(table) and TOUCHED_COLUMNS[table] not in cols:
+                    sets.append(f"{_ident(TOUCHED_COLUMNS[table])} = {_NOW}")
+                sql += f" on conflict ({_ident(key)}) do " + ("update set " + ", ".join(sets) if updates else "nothing")
+            # one statement: the whole batch is inserted or none of it
+            rows = [dict(r) for r in conn.execute(sql + " returning *", args).fetchall()]
+            if q._op == "insert":
+                # RETURNING order is unspecified; new keys follow input order
+                rows.sort(key=lambda r: r[PRIMARY_KEYS[table]])
+            return MemoryResponse(rows)
+        if q._op == "update":
+            sets = ", ".join(f"{_ident(c)} = ?" for c in q._payload)
+            if TOUCHED_COLUMNS.get(table) and TOUCHED_COLUMNS[table] not in q._payload:
+                sets += f", {_ident(TOUCHED_COLUMNS[table])} = {_NOW}"
+            sql = f"update {table} set {sets}{where} returning *"
+            return MemoryResponse([dict(r) for r in conn.execute(sql, list(q._payload.values()) + params).fetchall()])
+        if q._op == "delete":
+            return MemoryResponse([dict(r) for r in conn.execute(f"delete from {table}{where} returning *", params).fetchall()])
+
+        total = None
+        if q._count:
+            total = conn.execute(f"select count(*) from {table}{where}", params).fetchone()[0]
+        sql = f"select {q._select_list()} from {table}{where}"
+        if q._order:
+            sql += " order by " + ", ".join(
+                # PostgreSQL puts nulls last ascending and first descending
+                f"{_ident(c)} is null{' desc' if desc else ''}, {_ident(c)}{' desc' if desc else ''}"
+                for c, desc in q._order)
+        if q._limit is not None or q._offset:
+            sql += " limit ? offset ?"
+            params = params + [-1 if q._limit is None else q._limit, q._offset]
+        return MemoryResponse([dict(r) for r in conn.execute(sql, params)], total)
@@ -0,0 +1,210 @@
+"""
+Batch and interactive modes: many retail-cli commands in one process.
+
+Each input line is a command in the usual grammar, without the program name
+(`product add --name Milk --sku M1 --price 30 --stock 5`). Blank lines and
+lines starting with '#' are skipped. All commands share the process's
+clients, row cache and event subscribers, so a file of 10,000 commands pays
+startup once instead of 10,000 times.
+
+    retail-cli batch --file commands.txt [--concurrency 8] [--stop-on-error]
+    retail-cli shell
+
+Batch output is NDJSON, one record per command in input order:
+
+    {"line": 3, "command": "order show --order 7", "ok": true, "exit": 0,
+     "ms": 4.1, "result": {...}}
+
+"result" is the command's JSON output (a list for NDJSON-producing
+commands); output that is not JSON comes back as "output", a leading label
+line such as "Created product:" as "message", and "Error: ..." lines as
+"error" with ok=false.
+
+With --concurrency > 1, independent commands run together on a thread
+pool: consecutive read-only commands, and consecutive adds of the same
+kind (product add, customer add). Every other command waits for
+everything before it and runs alone, so a command always sees the effects
+of the writes above it.
+"""
+import json
+import shlex
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from src.cli import capture
+
+READ_ONLY = {
+    ("product", "list"), ("product", "low-stock"), ("product", "reorders"),
+    ("customer", "list"), ("customer", "search"),
+    ("order", "show"), ("order", "list"),
+    ("report", "top-products"), ("report", "orders-per-customer"), ("report", "sales"),
+    ("outbox", "list"), ("terminal", "status"),
+}
+# flags that turn an otherwise read-only command into a write
+WRITE_FLAGS = {"--close", "--reconcile"}
+# inserts of independent rows that may run alongside each other
+ADDS = {("product", "add"), ("customer", "add")}
+# modes that cannot be nested inside a batch
+NESTED = ("batch", "shell", "daemon")
+
+
+def _split(line: str) -> Tuple[Optional[List[str]], Optional[str]]:
+    try:
+        return shlex.split(line), None
+    except ValueError as e:
+        return None, f"Error: {e}"
+
+
+def classify(argv: Optional[List[str]]) -> Optional[str]:
+    """Concurrency class of a command: "read", "add:<cmd>", or None (runs alone)."""
+    if not argv:
+        return None
+    words = [a for a in argv if not a.startswith("-")]
+    key = tuple(words[:2])
+    if key in READ_ONLY and not WRITE_FLAGS.intersection(argv):
+        return "read"
+    if key in ADDS:
+        return "add:" + key[0]
+    return None
+
+
+def _parse_output(text: str) -> Dict:
+    text = text.strip()
+    if not text:
+        return {}
+    if text.startswith("Error:"):
+        return {"error": text[len("Error:"):].strip()}
+    try:
+        return {"result": json.loads(text)}
+    except ValueError:
+        pass
+    lines = text.splitlines()
+    try:
+        return {"result": [json.loads(line) for line in lines]}
+    except ValueError:
+        pass
+    if len(lines) > 1:
+        try:
+            return {"message": lines[0].rstrip(":"), "result": json.loads("\n".join(lines[1:]))}
+        except ValueError:
+            pass
+    return {"output": text}
+
+
+def _execute(line_no: int, line: str, argv: Optional[List[str]] = None) -> Tuple[Dict, capture.Buffer]:
+    from src.cli import main as cli
+    buf = capture.Buffer()
+    start = time.perf_counter()
+    with capture.redirect(buf):
+        if argv is None:
+            argv, error = _split(line)
+            if error:
+                print(error)
+        if argv is not None:
+            try:
+                code = cli.run_argv(argv, refuse=NESTED, stdin=False)
+            except Exception as e:
+                print("Error:", e)
+                code = 1
+            if code is None:
+                # stdin holds the commands (or the shell's terminal), not this command's input
+                print("Error: this command reads stdin; pass --file here")
+                code = 1
+        else:
+            code = 2
+    record = {"line": line_no, "command": line, "ok": code == 0, "exit": code,
+              "ms": round((time.perf_counter() - start) * 1000, 3)}
+    record.update(_parse_output(buf.stdout))
+    if buf.stderr.strip():
+        record["stderr"] = buf.stderr.strip()
+    record["ok"] = code == 0 and "error" not in record
+    return record, buf
+
+
+def run_command(line_no: int, line: str, argv: Optional[List[str]] = None) -> Dict:
+    """Run one command line in this process; the result record described above."""
+    return _execute(line_no, line, argv)[0]
+
+
+def read_commands(lines: Iterable[str]) -> Iterator[Tuple[int, str]]:
+    for n, raw in enumerate(lines, 1):
+        line = raw.strip()
+        if line and not line.startswith("#"):
+            yield n, line
+
+
+def run_commands(lines: Iterable[str], concurrency: int = 1, stop_on_error: bool = False) -> Iterator[Dict]:
+    """
+    Execute command lines in this process, yielding one record per command in
+    input order. Lines are read lazily, so an endless feed (a pipe) streams.
+    """
+    window = max(1, concurrency) * 4  # commands in flight before results are emitted
+    with capture.routed(), ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        group: List[Tuple[int, str, Optional[List[str]]]] = []
+        group_class = None
+
+        def flush() -> Iterator[Dict]:
+            if len(group) == 1 or concurrency <= 1:
+                results = (run_command(*cmd) for cmd in group)
+            else:
+                results = pool.map(lambda cmd: run_command(*cmd), group)
+            for record in results:
+                yield record
+            group.clear()
+
+        for n, line in read_commands(lines):
+            argv, _ = _split(line)
+            cls = classify(argv)
+            if group and (cls is None or cls != group_class or len(group) >= window):
+                for record in flush():
+                    yield record
+                    if stop_on_error and not record["ok"]:
+                        return
+            group.append((n, line, argv))
+            group_class = cls
+        for record in flush():
+            yield record
+            if stop_on_error and not record["ok"]:
+                return
+
+
+def shell(stdin, stdout, ndjson: bool = False, prompt: str = "retail> "):
+    """Read-eval-print loop, one command per line; `help` lists commands, `exit` or EOF quits."""
+    from src.cli import main as cli
+    try:
+        import readline  # noqa: F401  (line editing and history where available)
+    except ImportError:
+        pass
+    interactive = stdin.isatty()
+    n = 0
+    while True:
+        if interactive:
+            try:
+                line = input(prompt)
+            except EOFError:
+                print(file=stdout)
+                return
+            except KeyboardInterrupt:
+                print(file=stdout)
+                continue
+        else:
+            line = stdin.readline()
+            if not line:
+                return
+        n += 1
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if line in ("exit", "quit"):
+            return
+        if line in ("help", "?"):
+            cli.build_parser().print_help(stdout)
+            continue
+        # routed only while the command runs, so input() keeps the real terminal for line editing
+        with capture.routed():
+            record, buf = _execute(n, line)
+        if ndjson:
+            print(json.dumps(record, default=str), file=stdout, flush=True)
+            continue
+        stdout.write(buf.stdout + buf.stderr)
+        print(f"({record['ms']:.1f} ms)", file=stdout, flush=True)
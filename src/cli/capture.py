@@ -0,0 +1,84 @@
+"""
+Per-thread stdout/stderr capture for commands run inside a long-lived CLI
+process (the daemon, batch mode). While routed() is active, sys.stdout and
+sys.stderr send each thread's writes to the sink bound with redirect() on
+that thread, or to the real streams when none is bound. Command handlers
+keep using plain print().
+"""
+import io
+import sys
+import threading
+from contextlib import contextmanager
+from typing import Dict, List
+
+_tls = threading.local()
+_lock = threading.Lock()
+_depth = 0
+
+
+class Router(io.TextIOBase):
+    """Stands in for sys.stdout/sys.stderr and forwards to the current thread's sink."""
+
+    def __init__(self, fallback, stream: str):
+        self.fallback = fallback
+        self._stream = stream
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        sink = getattr(_tls, "sink", None)
+        if sink is None:
+            return self.fallback.write(text)
+        sink.write(self._stream, text)
+        return len(text)
+
+    def flush(self):
+        if getattr(_tls, "sink", None) is None:
+            self.fallback.flush()
+
+
+class Buffer:
+    """Sink collecting a command's output in memory."""
+
+    def __init__(self):
+        self._parts: Dict[str, List[str]] = {"stdout": [], "stderr": []}
+
+    def write(self, stream: str, text: str):
+        self._parts[stream].append(text)
+
+    @property
+    def stdout(self) -> str:
+        return "".join(self._parts["stdout"])
+
+    @property
+    def stderr(self) -> str:
+        return "".join(self._parts["stderr"])
+
+
+@contextmanager
+def routed():
+    """Install the routers on sys.stdout/sys.stderr (nestable, process-wide)."""
+    global _depth
+    with _lock:
+        if _depth == 0:
+            sys.stdout, sys.stderr = Router(sys.stdout, "stdout"), Router(sys.stderr, "stderr")
+        _depth += 1
+    try:
+        yield
+    finally:
+        with _lock:
+            _depth -= 1
+            if _depth == 0:
+                sys.stdout, sys.stderr = sys.stdout.fallback, sys.stderr.fallback
+
+
+@contextmanager
+def redirect(sink):
+    """Send this thread's output to sink (anything with write(stream, text))."""
+    previous = getattr(_tls, "sink", None)
+    _tls.sink = sink
+    try:
+        yield sink
+    finally:
+        _tls.sink = previous
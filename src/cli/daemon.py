@@ -0,0 +1,227 @@
+"""
+Long-lived CLI daemon.
+
+`retail-cli daemon serve` listens on a Unix socket and keeps the imported
+services, the shared clients and the row caches warm. With RETAIL_CLI_SOCKET
+pointing at that socket, every retail-cli invocation forwards its arguments
+to the daemon and streams the output back, instead of importing the network
+stack and connecting from scratch:
+
+    retail-cli daemon serve --socket /tmp/retail.sock &
+    export RETAIL_CLI_SOCKET=/tmp/retail.sock
+    retail-cli product list --limit 5      # served by the daemon
+    retail-cli daemon stop
+
+Commands run with the daemon's environment and configuration. A command that
+reads stdin (``--file -``, ``shell``, ``batch`` or ``order pool`` without --file) or is started
+from another directory than the daemon's runs in the local process, as does every command when no daemon
+is listening.
+
+Protocol: the client sends one JSON line {"argv": [...], "cwd": ...}; the
+daemon answers with JSON lines {"stdout": text} / {"stderr": text} as the
+command prints, then {"exit": code}, or {"local": true} to decline.
+"""
+import os
+import sys
+import json
+import time
+import signal
+import socket
+import logging
+import tempfile
+import threading
+import socketserver
+from typing import Dict, List, Optional
+
+log = logging.getLogger(__name__)
+
+_CHUNK = 64 * 1024  # output is sent once this much is buffered, and at the end
+
+class DaemonError(Exception):
+    pass
+
+def default_socket() -> str:
+    path = os.environ.get("RETAIL_CLI_SOCKET")
+    if path:
+        return path
+    uid = os.getuid() if hasattr(os, "getuid") else 0
+    return os.path.join(tempfile.gettempdir(), f"retail-cli-{uid}.sock")
+
+# ---- client side (kept free of service imports) ----
+
+def _connect(path: str) -> Optional[socket.socket]:
+    if not hasattr(socket, "AF_UNIX"):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError:
+        sock.close()
+        return None
+    return sock
+
+def _request(path: str, message: Dict) -> Optional[Dict]:
+    sock = _connect(path)
+    if sock is None:
+        return None
+    with sock, sock.makefile("rb") as reader:
+        sock.sendall((json.dumps(message) + "\n").encode("utf-8"))
+        line = reader.readline()
+    return json.loads(line) if line else None
+
+# commands whose --file defaults to stdin
+_STDIN_BY_DEFAULT = (["batch"], ["order", "pool"])
+
+def _reads_stdin(argv: List[str]) -> bool:
+    """Cheap check before connecting; the daemon also declines what its parser says reads stdin."""
+    words = [a for a in argv if not a.startswith("-")]
+    if "-" in argv or "--file=-" in argv or words[:1] == ["shell"]:
+        return True
+    has_file = any(a == "--file" or a.startswith("--file=") for a in argv)
+    return not has_file and any(words[:len(cmd)] == cmd for cmd in _STDIN_BY_DEFAULT)
+
+def forward(path: str, argv: List[str]) -> Optional[int]:
+    """
+    Run argv on the daemon at path, copying its output to this process.
+    Returns the exit code, or None when the command should run locally.
+    """
+    if _reads_stdin(argv):
+        return None
+    sock = _connect(path)
+    if sock is None:
+        return None
+    with sock, sock.makefile("rb") as reader:
+        sock.sendall((json.dumps({"argv": argv, "cwd": os.getcwd()}) + "\n").encode("utf-8"))
+        for line in reader:
+            msg = json.loads(line)
+            if "stdout" in msg:
+                sys.stdout.write(msg["stdout"])
+            elif "stderr" in msg:
+                sys.stderr.write(msg["stderr"])
+            elif "exit" in msg:
+                sys.stdout.flush()
+                return msg["exit"]
+            elif msg.get("local"):
+                return None
+    sys.stdout.flush()
+    print("Error: daemon closed the connection before the command finished", file=sys.stderr)
+    return 1
+
+def status(path: str) -> Optional[Dict]:
+    return _request(path, {"control": "status"})
+
+def stop(path: str) -> bool:
+    return _request(path, {"control": "stop"}) is not None
+
+# ---- server side ----
+
+class _Channel:
+    """Output sink of one forwarded command (see src.cli.capture), sent as JSON lines."""
+
+    def __init__(self, wfile):
+        self._wfile = wfile
+        self._parts: Dict[str, List[str]] = {"stdout": [], "stderr": []}
+        self._size = 0
+
+    def write(self, stream: str, text: str):
+        self._parts[stream].append(text)
+        self._size += len(text)
+        if self._size >= _CHUNK:
+            self.flush()
+
+    def flush(self):
+        for stream, parts in self._parts.items():
+            if parts:
+                self.send({stream: "".join(parts)})
+                parts.clear()
+        self._size = 0
+
+    def send(self, message: Dict):
+        self._wfile.write((json.dumps(message) + "\n").encode("utf-8"))
+        self._wfile.flush()
+
+class _Handler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        try:
+            req = json.loads(line)
+        except ValueError:
+            return
+        channel = _Channel(self.wfile)
+        server: _Server = self.server
+        if "control" in req:
+            if req["control"] == "stop":
+                channel.send({"stopping": True})
+                threading.Thread(target=server.shutdown, daemon=True).start()
+            else:
+                channel.send(server.status())
+            return
+        if req.get("cwd") != os.getcwd():
+            channel.send({"local": True})
+            return
+        server.count()
+        from src.cli import capture, main as cli
+        try:
+            with capture.redirect(channel):
+                code = cli.run_argv(req.get("argv") or [], refuse=("daemon",), stdin=False)
+            channel.flush()
+            # None: it reads stdin, which is the client's
+            channel.send({"local": True} if code is None else {"exit": code})
+        except OSError as e:
+            log.info("client went away: %s", e)
+
+class _Server(socketserver.ThreadingUnixStreamServer if hasattr(socketserver, "ThreadingUnixStreamServer")
+              else socketserver.ThreadingTCPServer):
+    daemon_threads = True
+
+    def __init__(self, path: str):
+        super().__init__(path, _Handler)
+        self.started = time.time()
+        self.commands = 0
+        self._lock = threading.Lock()
+
+    def count(self):
+        with self._lock:
+            self.commands += 1
+
+    def status(self) -> Dict:
+        import src.config as config
+        return {"pid": os.getpid(), "cwd": os.getcwd(), "backend": config.STORAGE_BACKEND,
+                "uptime_s": round(time.time() - self.started, 1), "commands": self.commands,
+                "clients": config.client_stats()}
+
+def _warm_up():
+    import src.config as config
+    from src.services import (product_service, customer_service, order_service,  # noqa: F401
+                              payment_service, report_service, low_stock_service)
+    try:
+        config.get_client_manager().warm_up()
+    except Exception as e:
+        log.warning("client warm-up failed, commands will retry: %s", e)
+
+def serve(path: str):
+    """Serve forwarded commands on path until stop() or SIGTERM/SIGINT."""
+    if not hasattr(socket, "AF_UNIX"):
+        raise DaemonError("Unix sockets are not available on this platform")
+    if os.path.exists(path):
+        if status(path) is not None:
+            raise DaemonError(f"A daemon is already listening on {path}")
+        os.unlink(path)  # stale socket from a daemon that did not exit cleanly
+    from src.cli import capture
+    _warm_up()
+    server = _Server(path)
+    os.chmod(path, 0o600)
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown, daemon=True).start())
+    try:
+        with capture.routed():
+            server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(path):
+            os.unlink(path)
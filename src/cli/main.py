@@ -1,11 +1,15 @@
 import argparse
+import itertools
 import json
-from src.services import product_service, customer_service,order_service
-from src.dao import product_dao, customer_dao, order_dao 
+import os
+import sys
+import time
+from typing import Optional
 
 # ------------------- Product Commands -------------------
 
 def cmd_product_add(args):
+    from src.services import product_service
     try:
         p = product_service.add_product(args.name, args.sku, args.price, args.stock, args.category)
         print("Created product:")
@@ -13,13 +17,79 @@ def cmd_product_add(args):
     except Exception as e:
         print("Error:", e)
 
+def _print_ndjson(rows, limit=None):
+    """Stream rows as NDJSON, one line per row, without collecting them first."""
+    for row in itertools.islice(rows, limit):
+        print(json.dumps(row, default=str))
+
 def cmd_product_list(args):
-    ps = product_dao.list_products(limit=100)
-    print(json.dumps(ps, indent=2, default=str))
+    from src.dao import product_dao
+    _print_ndjson(product_dao.iter_products(batch_size=args.batch_size, category=args.category), args.limit)
+
+def cmd_product_import(args):
+    from src.services import product_bulk_service
+    try:
+        report = product_bulk_service.import_products(
+            product_bulk_service.read_rows(args.file, args.format),
+            chunk_size=args.chunk_size,
+            workers=args.workers,
+            on_existing="reject" if args.skip_existing else "update",
+            reject_file=args.reject_file,
+        )
+        print(json.dumps(report, indent=2, default=str))
+    except Exception as e:
+        print("Error:", e)
+
+def cmd_product_export(args):
+    from src.services import product_bulk_service
+    try:
+        n = product_bulk_service.export_products(args.file, args.format, args.category, args.batch_size)
+        print(f"Exported {n} products to {args.file}")
+    except Exception as e:
+        print("Error:", e)
+
+def cmd_product_low_stock(args):
+    from src.dao import product_dao
+    try:
+        if args.threshold is None:
+            from src.services import low_stock_service
+            rows = low_stock_service.iter_low_stock(batch_size=args.batch_size)
+        else:
+            rows = product_dao.iter_products(batch_size=args.batch_size, max_stock=args.threshold)
+        _print_ndjson(rows, args.limit)
+    except Exception as e:
+        print("Error:", e)
+
+def cmd_product_threshold(args):
+    from src.services import low_stock_service
+    try:
+        if args.remove:
+            row = low_stock_service.remove_threshold(prod_id=args.id, category=args.category)
+            print("Removed threshold:" if row else "No such threshold")
+        else:
+            row = low_stock_service.set_threshold(args.threshold, prod_id=args.id, category=args.category,
+                                                  reorder_qty=args.reorder_qty)
+            print("Threshold set:")
+        if row:
+            print(json.dumps(row, indent=2, default=str))
+    except Exception as e:
+        print("Error:", e)
+
+def cmd_product_reorders(args):
+    from src.services import low_stock_service
+    try:
+        if args.close is not None:
+            row = low_stock_service.close_suggestion(args.close, args.as_status)
+            print(json.dumps(row, indent=2, default=str))
+            return
+        _print_ndjson(low_stock_service.reorder_suggestions(None if args.status == "ALL" else args.status, args.limit))
+    except Exception as e:
+        print("Error:", e)
 
 # ------------------- Customer Commands -------------------
 
 def cmd_customer_add(args):
+    from src.services import customer_service
     try:
         c = customer_service.add_customer(args.name, args.email, args.phone, args.city)
         print("Created customer:")
@@ -28,6 +98,7 @@ def cmd_customer_add(args):
         print("Error:", e)
 
 def cmd_customer_update(args):
+    from src.services import customer_service
     try:
         updated = customer_service.update_customer(args.id, phone=args.phone, city=args.city)
         print("Updated customer:")
@@ -36,6 +107,7 @@ def cmd_customer_update(args):
         print("Error:", e)
 
 def cmd_customer_delete(args):
+    from src.services import customer_service
     try:
         deleted = customer_service.delete_customer(args.id)
         print("Deleted customer:")
@@ -44,13 +116,14 @@ def cmd_customer_delete(args):
         print("Error:", e)
 
 def cmd_customer_list(args):
+    from src.dao import customer_dao
     try:
-        customers = customer_dao.list_customers(limit=100)
-        print(json.dumps(customers, indent=2, default=str))
+        _print_ndjson(customer_dao.iter_customers(batch_size=args.batch_size, city=args.city), args.limit)
     except Exception as e:
         print("Error:", e)
 
 def cmd_customer_search(args):
+    from src.dao import customer_dao
     try:
         results = customer_dao.search_customers(email=args.email, city=args.city)
         print(json.dumps(results, indent=2, default=str))
@@ -60,6 +133,8 @@ def cmd_customer_search(args):
 # ------------------- Order Commands ------------------
 
 def cmd_order_create(args):
+    import src.config as config
+    from src.services import order_service
     items = []
     for item in args.item:
         try:
@@ -69,49 +144,301 @@ def cmd_order_create(args):
             print("Invalid item format:", item)
             return
     try:
-        ord = order_service.create_order(args.customer, items)
-        print("Order created:")
+        if config.TERMINAL_MODE:
+            from src.services import terminal
+            ord = terminal.place_order(args.customer, items, args.key)
+            if ord["state"] == "queued":
+                print(f"Order queued (key {ord['key']}); it is placed when the terminal syncs:")
+            else:
+                print("Order created:")
+        else:
+            ord = order_service.create_order(args.customer, items, idempotency_key=args.key)
+            print("Order created:")
         print(json.dumps(ord, indent=2, default=str))
     except Exception as e:
         print("Error:", e)
 
 def cmd_order_show(args):
+    from src.services import order_service
     try:
         o = order_service.get_order_details(args.order)
         print(json.dumps(o, indent=2, default=str))
     except Exception as e:
         print("Error:", e)
 
+def cmd_order_list(args):
+    from src.services import order_service
+    try:
+        _print_ndjson(order_service.iter_customer_order_details(args.customer, batch_size=args.batch_size), args.limit)
+    except Exception as e:
+        print("Error:", e)
+
 def cmd_order_cancel(args):
+    from src.services import order_service
     try:
         o = order_service.cancel_order(args.order)
         print("Order cancelled (updated):")
         print(json.dumps(o, indent=2, default=str))
     except Exception as e:
         print("Error:", e)
+
+def cmd_order_ingest(args):
+    """Place an NDJSON order feed; one result line per order on stdout, a summary on stderr."""
+    from src.services import order_service
+    try:
+        source = sys.stdin if args.file == "-" else open(args.file, encoding="utf-8")
+    except OSError as e:
+        print("Error:", e)
+        return
+    counts = {"placed": 0, "rejected": 0, "failed": 0}
+    try:
+        with source:
+            feed = order_service.read_order_feed(source)
+            for result in order_service.create_orders_bulk(feed, chunk_size=args.chunk_size):
+                counts[result["status"]] += 1
+                print(json.dumps(result, default=str))
+    except Exception as e:
+        print("Error:", e)
+    print(json.dumps(counts), file=sys.stderr)
+
+def cmd_order_pool(args):
+    """
+    Run an NDJSON request feed through the multi-process order pool: one result
+    line per request on stdout (as they finish), a summary on stderr. Requests
+    run concurrently, so a pay or cancel must not depend on a create in the
+    same feed. SIGTERM / Ctrl-C stop reading the feed and drain what was queued.
+    """
+    import signal
+    import threading
+    from src.services import order_pool
+    try:
+        source = sys.stdin if args.file == "-" else open(args.file, encoding="utf-8")
+    except OSError as e:
+        print("Error:", e)
+        return
+    try:
+        pool = order_pool.OrderPool(args.workers, args.threads)
+    except order_pool.PoolError as e:
+        if source is not sys.stdin:
+            source.close()
+        print("Error:", e)
+        return
+    stop = threading.Event()
+    previous = {}
+    if threading.current_thread() is threading.main_thread():   # not under the daemon or batch threads
+        previous = {s: signal.signal(s, lambda *_: stop.set()) for s in (signal.SIGINT, signal.SIGTERM)}
+    counts = {"ok": 0, "failed": 0, "rejected": 0}
+    out_lock = threading.Lock()
+
+    def report(n, future):
+        try:
+            record = {"line": n, "ok": True, "result": future.result()}
+        except Exception as e:
+            record = {"line": n, "ok": False, "error": str(e)}
+        with out_lock:
+            counts["ok" if record["ok"] else "failed"] += 1
+            print(json.dumps(record, default=str), flush=True)
+
+    try:
+        with source:
+            for n, line in enumerate(source, start=1):
+                if stop.is_set():
+                    break
+                if not line.strip():
+                    continue
+                try:
+                    request = json.loads(line)
+                    op = request.pop("op")
+                    future = pool.submit(op if op in order_pool.OPS else f"{op}_order", **request)
+                except (ValueError, KeyError, TypeError) as e:
+                    with out_lock:
+                        counts["rejected"] += 1
+                        print(json.dumps({"line": n, "ok": False, "error": f"invalid request: {e}"}), flush=True)
+                    continue
+                future.add_done_callback(lambda f, n=n: report(n, f))
+    finally:
+        pool.close()
+        for s, handler in previous.items():
+            signal.signal(s, handler)
+    print(json.dumps(counts), file=sys.stderr)
+
 def cmd_payment_pay(args):
     from src.services import payment_service
     try:
-        result = payment_service.pay(args.order, args.method)
+        result = payment_service.pay_order(args.order, args.method, idempotency_key=args.key)
         print("Payment processed:")
-        print(result)
+        print(json.dumps(result, indent=2, default=str))
     except Exception as e:
         print("Error:", e)
 
 def cmd_payment_refund(args):
     from src.services import payment_service
     try:
-        result = payment_service.refund(args.order)
+        result = payment_service.refund_order(args.order)
         print("Payment refunded:")
-        print(result)
+        print(json.dumps(result, indent=2, default=str))
+    except Exception as e:
+        print("Error:", e)
+
+
+# ------------------- Report Commands -------------------
+
+def cmd_report_top_products(args):
+    from src.services import report_service
+    try:
+        print(json.dumps(report_service.top_selling_products(args.limit), indent=2, default=str))
+    except Exception as e:
+        print("Error:", e)
+
+def cmd_report_orders_per_customer(args):
+    from src.services import report_service
+    try:
+        if args.min_orders is not None:
+            rows = report_service.customers_more_than_n_orders(args.min_orders)
+        else:
+            rows = report_service.orders_per_customer()
+        print(json.dumps(rows, indent=2, default=str))
+    except Exception as e:
+        print("Error:", e)
+
+def cmd_report_sales(args):
+    from src.services import report_service
+    try:
+        if args.reconcile:
+            report_service.reconcile_sales()
+        snap = report_service.sales_snapshot()
+        snap["revenue_last_month"] = report_service.total_revenue_last_month()
+        print(json.dumps(snap, indent=2, default=str))
+    except Exception as e:
+        print("Error:", e)
+
+def cmd_report_analytics(args):
+    from src.services import analytics_service
+    try:
+        snap = analytics_service.open_snapshot(args.path, refresh=False)
+        refreshed = None
+        if args.rebuild or args.question == "refresh" or not (args.no_refresh or args.question == "status"):
+            refreshed = snap.refresh(full=args.rebuild)
+        if args.question == "refresh":
+            result = refreshed
+        elif args.question == "top-products":
+            result = snap.top_selling_products(args.limit)
+        elif args.question == "revenue":
+            result = snap.revenue_by_period(args.period, args.since, args.until)
+        elif args.question == "orders-per-customer":
+            if args.min_orders is not None:
+                result = snap.customers_more_than_n_orders(args.min_orders)
+            else:
+                result = snap.orders_per_customer()
+        elif args.question == "basket":
+            result = snap.basket_metrics(args.limit)
+        else:
+            result = snap.stats()
+        print(json.dumps(result, indent=2, default=str))
+    except Exception as e:
+        print("Error:", e)
+
+def cmd_report_refresh(args):
+    from src.services import report_service
+    try:
+        report_service.refresh_reports()
+        print("Report views refreshed")
     except Exception as e:
         print("Error:", e)
 
+# ------------------- Outbox Commands -------------------
+
+def cmd_outbox_list(args):
+    from src.services import outbox
+    try:
+        _print_ndjson(outbox.get_outbox().entries(args.state, args.limit))
+    except Exception as e:
+        print("Error:", e)
+
+def cmd_outbox_replay(args):
+    from src.services import outbox
+    try:
+        print(json.dumps(outbox.replay(args.limit)))
+    except Exception as e:
+        print("Error:", e)
+
+def cmd_outbox_purge(args):
+    from src.services import outbox
+    try:
+        removed = outbox.get_outbox().purge(args.older_than_hours * 3600)
+        print(f"Purged {removed} finished entries")
+    except Exception as e:
+        print("Error:", e)
+
+# ------------------- Terminal Commands -------------------
+
+def cmd_terminal_status(args):
+    from src.services import terminal
+    try:
+        print(json.dumps(terminal.status(), indent=2, default=str))
+    except Exception as e:
+        print("Error:", e)
+
+def cmd_terminal_sync(args):
+    from src.services import terminal
+    try:
+        print(json.dumps(terminal.sync(full=args.full), default=str))
+    except Exception as e:
+        print("Error:", e)
+
+# ------------------- Batch / Shell -------------------
+
+def cmd_batch(args):
+    from src.cli import batch
+    try:
+        source = sys.stdin if args.file == "-" else open(args.file, encoding="utf-8")
+    except OSError as e:
+        print("Error:", e)
+        return
+    counts = {"commands": 0, "ok": 0, "failed": 0}
+    start = time.perf_counter()
+    with source:
+        for record in batch.run_commands(source, concurrency=args.concurrency, stop_on_error=args.stop_on_error):
+            counts["commands"] += 1
+            counts["ok" if record["ok"] else "failed"] += 1
+            print(json.dumps(record, default=str), flush=args.file == "-")
+    counts["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    print(json.dumps(counts), file=sys.stderr)
+
+def cmd_shell(args):
+    from src.cli import batch
+    batch.shell(sys.stdin, sys.stdout, ndjson=args.ndjson)
+
+# ------------------- Daemon Commands -------------------
+
+def cmd_daemon_serve(args):
+    from src.cli import daemon
+    path = args.socket or daemon.default_socket()
+    try:
+        print(f"retail-cli daemon listening on {path} (pid {os.getpid()})", file=sys.stderr)
+        daemon.serve(path)
+    except Exception as e:
+        print("Error:", e)
+
+def cmd_daemon_stop(args):
+    from src.cli import daemon
+    path = args.socket or daemon.default_socket()
+    print("Daemon stopping" if daemon.stop(path) else f"No daemon listening on {path}")
+
+def cmd_daemon_status(args):
+    from src.cli import daemon
+    path = args.socket or daemon.default_socket()
+    s = daemon.status(path)
+    print(json.dumps(s, indent=2, default=str) if s else f"No daemon listening on {path}")
 
 # ------------------- Parser -------------------
 
 def build_parser():
     parser = argparse.ArgumentParser(prog="retail-cli")
+    parser.add_argument("--profile", action="store_true",
+                        help="print the DAO round trips made by the command to stderr")
+    parser.add_argument("--profile-openmetrics", metavar="FILE", default=None,
+                        help="write the command's DAO metrics as OpenMetrics text to FILE")
     sub = parser.add_subparsers(dest="cmd")
 
     # ---- Product ----
@@ -126,9 +453,51 @@ def build_parser():
     addp.add_argument("--category", default=None)
     addp.set_defaults(func=cmd_product_add)
 
-    listp = pprod_sub.add_parser("list")
+    listp = pprod_sub.add_parser("list", help="stream products as NDJSON")
+    listp.add_argument("--category", default=None)
+    listp.add_argument("--limit", type=int, default=None, help="stop after N rows (default: all)")
+    listp.add_argument("--batch-size", type=int, default=500)
     listp.set_defaults(func=cmd_product_list)
 
+    importp = pprod_sub.add_parser("import", help="bulk upsert products from CSV/NDJSON/Parquet")
+    importp.add_argument("--file", required=True)
+    importp.add_argument("--format", choices=["csv", "ndjson", "parquet"], default=None, help="default: from extension")
+    importp.add_argument("--chunk-size", type=int, default=1000)
+    importp.add_argument("--workers", type=int, default=4)
+    importp.add_argument("--skip-existing", action="store_true", help="reject SKUs that already exist instead of updating them")
+    importp.add_argument("--reject-file", default="rejects.ndjson")
+    importp.set_defaults(func=cmd_product_import)
+
+    exportp = pprod_sub.add_parser("export", help="stream the catalog to CSV/NDJSON/Parquet")
+    exportp.add_argument("--file", required=True)
+    exportp.add_argument("--format", choices=["csv", "ndjson", "parquet"], default=None, help="default: from extension")
+    exportp.add_argument("--category", default=None)
+    exportp.add_argument("--batch-size", type=int, default=1000)
+    exportp.set_defaults(func=cmd_product_export)
+
+    lowp = pprod_sub.add_parser("low-stock", help="stream products at or below their reorder threshold as NDJSON")
+    lowp.add_argument("--threshold", type=int, default=None,
+                      help="one threshold for every product (default: per-product/category thresholds)")
+    lowp.add_argument("--limit", type=int, default=None)
+    lowp.add_argument("--batch-size", type=int, default=500)
+    lowp.set_defaults(func=cmd_product_low_stock)
+
+    thrp = pprod_sub.add_parser("threshold", help="set or remove a reorder threshold")
+    target = thrp.add_mutually_exclusive_group(required=True)
+    target.add_argument("--id", type=int, default=None, help="product id")
+    target.add_argument("--category", default=None)
+    thrp.add_argument("--threshold", type=int, default=None)
+    thrp.add_argument("--reorder-qty", type=int, default=None)
+    thrp.add_argument("--remove", action="store_true")
+    thrp.set_defaults(func=cmd_product_threshold)
+
+    reop = pprod_sub.add_parser("reorders", help="list or close reorder suggestions")
+    reop.add_argument("--status", choices=["OPEN", "ORDERED", "DISMISSED", "RESOLVED", "ALL"], default="OPEN")
+    reop.add_argument("--limit", type=int, default=100)
+    reop.add_argument("--close", type=int, default=None, metavar="SUGGESTION_ID")
+    reop.add_argument("--as", dest="as_status", choices=["ORDERED", "DISMISSED"], default="ORDERED")
+    reop.set_defaults(func=cmd_product_reorders)
+
     # ---- Customer ----
     pcust = sub.add_parser("customer", help="customer commands")
     pcust_sub = pcust.add_subparsers(dest="action")
@@ -154,7 +523,10 @@ def build_parser():
     delc.set_defaults(func=cmd_customer_delete)
 
     # list
-    listc = pcust_sub.add_parser("list")
+    listc = pcust_sub.add_parser("list", help="stream customers as NDJSON")
+    listc.add_argument("--city", default=None)
+    listc.add_argument("--limit", type=int, default=None, help="stop after N rows (default: all)")
+    listc.add_argument("--batch-size", type=int, default=500)
     listc.set_defaults(func=cmd_customer_list)
 
     # search
@@ -170,15 +542,34 @@ def build_parser():
     createo = porder_sub.add_parser("create")
     createo.add_argument("--customer", type=int, required=True)
     createo.add_argument("--item", required=True, nargs="+", help="prod_id:qty (repeatable)")
+    createo.add_argument("--key", default=None, help="idempotency key: retrying with the same key never places a second order")
     createo.set_defaults(func=cmd_order_create)
     #show
     showo = porder_sub.add_parser("show")
     showo.add_argument("--order", type=int, required=True)
     showo.set_defaults(func=cmd_order_show)
+    #list (all orders of a customer, with items)
+    listo = porder_sub.add_parser("list", help="stream a customer's orders as NDJSON")
+    listo.add_argument("--customer", type=int, required=True)
+    listo.add_argument("--limit", type=int, default=None, help="stop after N orders (default: all)")
+    listo.add_argument("--batch-size", type=int, default=100)
+    listo.set_defaults(func=cmd_order_list)
     #cancel
     cano = porder_sub.add_parser("cancel")
     cano.add_argument("--order", type=int, required=True)
     cano.set_defaults(func=cmd_order_cancel)
+    #ingest (NDJSON order feed, e.g. end-of-day POS exports)
+    ingesto = porder_sub.add_parser("ingest", help="place orders from an NDJSON feed")
+    ingesto.add_argument("--file", required=True, help="NDJSON file, or - for stdin")
+    ingesto.add_argument("--chunk-size", type=int, default=500)
+    ingesto.set_defaults(func=cmd_order_ingest)
+    #pool (NDJSON create/cancel/pay requests through N SKU-sharded worker processes)
+    poolo = porder_sub.add_parser("pool", help="process an NDJSON request feed with N worker processes")
+    poolo.add_argument("--file", default="-", help='NDJSON requests, e.g. {"op": "create", "customer_id": 1, '
+                                                   '"items": [...]}; - for stdin (default)')
+    poolo.add_argument("--workers", type=int, default=None, help="worker processes (default: ORDER_WORKERS)")
+    poolo.add_argument("--threads", type=int, default=None, help="handler threads per worker")
+    poolo.set_defaults(func=cmd_order_pool)
     # ---- Payment ----
     ppay = sub.add_parser("payment", help="payment commands")
     ppay_sub = ppay.add_subparsers(dest="action")
@@ -187,6 +578,7 @@ def build_parser():
     pay_cmd = ppay_sub.add_parser("pay")
     pay_cmd.add_argument("--order", type=int, required=True)
     pay_cmd.add_argument("--method", type=str, required=True, choices=["Cash", "Card", "UPI"])
+    pay_cmd.add_argument("--key", default=None, help="idempotency key: retrying with the same key never charges twice")
     pay_cmd.set_defaults(func=cmd_payment_pay)
 
     # refund command
@@ -194,17 +586,160 @@ def build_parser():
     refund_cmd.add_argument("--order", type=int, required=True)
     refund_cmd.set_defaults(func=cmd_payment_refund)
 
+    # ---- Report ----
+    prep = sub.add_parser("report", help="report commands")
+    prep_sub = prep.add_subparsers(dest="action")
+
+    topr = prep_sub.add_parser("top-products")
+    topr.add_argument("--limit", type=int, default=5)
+    topr.set_defaults(func=cmd_report_top_products)
+
+    opcr = prep_sub.add_parser("orders-per-customer")
+    opcr.add_argument("--min-orders", type=int, default=None, help="only customers with more than N orders")
+    opcr.set_defaults(func=cmd_report_orders_per_customer)
+
+    salesr = prep_sub.add_parser("sales", help="running revenue/units/order totals")
+    salesr.add_argument("--reconcile", action="store_true", help="rebuild totals from the orders table first")
+    salesr.set_defaults(func=cmd_report_sales)
+
+    anr = prep_sub.add_parser("analytics", help="answer reports from the local columnar snapshot (needs numpy)")
+    anr.add_argument("question", choices=["top-products", "revenue", "orders-per-customer", "basket",
+                                          "refresh", "status"])
+    anr.add_argument("--limit", type=int, default=5, help="top products / product pairs to show")
+    anr.add_argument("--period", choices=["day", "week", "month", "year"], default="month")
+    anr.add_argument("--since", help="revenue from this ISO date")
+    anr.add_argument("--until", help="revenue before this ISO date")
+    anr.add_argument("--min-orders", type=int, default=None, help="only customers with more than N orders")
+    anr.add_argument("--path", default=None, help="snapshot directory (default ANALYTICS_DIR)")
+    anr.add_argument("--no-refresh", action="store_true", help="answer from the snapshot as it is")
+    anr.add_argument("--rebuild", action="store_true", help="reload the whole order history first")
+    anr.set_defaults(func=cmd_report_analytics)
+
+    refr = prep_sub.add_parser("refresh", help="refresh report materialized views")
+    refr.set_defaults(func=cmd_report_refresh)
+
+    # ---- Outbox ----
+    pout = sub.add_parser("outbox", help="local record of keyed order/payment writes")
+    pout_sub = pout.add_subparsers(dest="action")
+    listob = pout_sub.add_parser("list", help="stream outbox entries as NDJSON")
+    listob.add_argument("--state", choices=["pending", "done", "failed"], default=None)
+    listob.add_argument("--limit", type=int, default=100)
+    listob.set_defaults(func=cmd_outbox_list)
+    replayob = pout_sub.add_parser("replay", help="finish pending writes left by crashed or disconnected runs")
+    replayob.add_argument("--limit", type=int, default=100)
+    replayob.set_defaults(func=cmd_outbox_replay)
+    purgeob = pout_sub.add_parser("purge", help="forget finished writes")
+    purgeob.add_argument("--older-than-hours", type=float, default=24 * 7)
+    purgeob.set_defaults(func=cmd_outbox_purge)
+
+    # ---- Terminal ----
+    pterm = sub.add_parser("terminal", help="offline-first terminal mode (local replica, background sync)")
+    pterm_sub = pterm.add_subparsers(dest="action")
+    statust = pterm_sub.add_parser("status", help="replica sync lag and queued orders")
+    statust.set_defaults(func=cmd_terminal_status)
+    synct = pterm_sub.add_parser("sync", help="pull changes and push queued orders now")
+    synct.add_argument("--full", action="store_true", help="reload the whole replica")
+    synct.set_defaults(func=cmd_terminal_sync)
+
+    # ---- Batch / Shell ----
+    pbatch = sub.add_parser("batch", help="run commands from a file or stdin, one per line, in this process")
+    pbatch.add_argument("--file", default="-", help="command file, - for stdin (default)")
+    pbatch.add_argument("--concurrency", type=int, default=1,
+                        help="run up to N independent commands (reads, or adds of one kind) at once")
+    pbatch.add_argument("--stop-on-error", action="store_true")
+    pbatch.set_defaults(func=cmd_batch, action=None)
+
+    pshell = sub.add_parser("shell", help="interactive prompt running commands in this process")
+    pshell.add_argument("--ndjson", action="store_true", help="print one NDJSON record per command")
+    pshell.set_defaults(func=cmd_shell, action=None)
+
+    # ---- Daemon ----
+    pdaemon = sub.add_parser("daemon", help="long-lived process serving forwarded commands (set RETAIL_CLI_SOCKET)")
+    pdaemon_sub = pdaemon.add_subparsers(dest="action")
+    for name, func, help_text in (("serve", cmd_daemon_serve, "run the daemon in the foreground"),
+                                  ("stop", cmd_daemon_stop, "stop a running daemon"),
+                                  ("status", cmd_daemon_status, "show pid, uptime and commands served")):
+        dp = pdaemon_sub.add_parser(name, help=help_text)
+        # resolved by the command, so building the parser does not import the daemon module
+        dp.add_argument("--socket", help="socket path (default: $RETAIL_CLI_SOCKET, else retail-cli-<uid>.sock "
+                                         "in the temp directory)")
+        dp.set_defaults(func=func)
+
     return parser
 
 # ------------------- Main -------------------
 
+def _start_terminal(args):
+    """With TERMINAL_MODE, serve product/customer reads from the local replica while it syncs."""
+    if args.cmd == "daemon":
+        # the daemon starts it on the first command it serves
+        return
+    import src.config as config
+    if config.TERMINAL_MODE:
+        from src.services import terminal
+        terminal.start()
+
+def execute(args):
+    """Run a parsed command, recording its DAO round trips when --profile* was given."""
+    _start_terminal(args)
+    if not (args.profile or args.profile_openmetrics):
+        args.func(args)
+        return
+    from src.dao import instrumentation
+    with instrumentation.profile(f"{args.cmd} {args.action or ''}".strip()) as prof:
+        args.func(args)
+    if args.profile:
+        print(prof.format_summary(), file=sys.stderr)
+    if args.profile_openmetrics:
+        with open(args.profile_openmetrics, "w", encoding="utf-8") as f:
+            f.write(prof.to_openmetrics())
+
+_parser = None
+
+def reads_stdin(args) -> bool:
+    """Whether the parsed command reads this process's stdin (--file -, the default for some)."""
+    return args.cmd == "shell" or getattr(args, "file", None) == "-"
+
+def run_argv(argv, refuse=(), stdin: bool = True) -> Optional[int]:
+    """
+    Parse and run one command in this process (daemon, batch and shell use
+    this). Returns its exit status: 2 for usage errors, 0 after --help.
+    With stdin=False (the caller's stdin is not the user's), a command that
+    would read stdin is not run and None is returned.
+    """
+    global _parser
+    if _parser is None:
+        _parser = build_parser()
+    try:
+        args = _parser.parse_args(argv)
+        if not hasattr(args, "func"):
+            _parser.print_help()
+        elif args.cmd in refuse:
+            print(f"Error: '{args.cmd}' cannot be run from here")
+            return 1
+        elif not stdin and reads_stdin(args):
+            return None
+        else:
+            execute(args)
+    except SystemExit as e:
+        return e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    return 0
+
 def main():
+    argv = sys.argv[1:]
+    # with a daemon running, hand the command over before loading any service code
+    socket_path = os.environ.get("RETAIL_CLI_SOCKET")
+    if socket_path and argv[:1] != ["daemon"]:
+        from src.cli import daemon
+        code = daemon.forward(socket_path, argv)
+        if code is not None:
+            sys.exit(code)
     parser = build_parser()
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     if not hasattr(args, "func"):
         parser.print_help()
         return
-    args.func(args)
+    execute(args)
 
 if __name__ == "__main__":
     main()
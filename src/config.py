@@ -1,16 +1,327 @@
 import os
+import asyncio
+import logging
+import threading
+import weakref
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
 from dotenv import load_dotenv
-from supabase import create_client, Client
- 
+import httpx
+from supabase import (
+    create_client,
+    create_async_client,
+    Client,
+    AsyncClient,
+    ClientOptions,
+    AsyncClientOptions,
+)
+
 load_dotenv()  # loads .env from project root
- 
+
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
- 
+
+# connection pool / timeout tuning (seconds)
+SUPABASE_POOL_SIZE = int(os.getenv("SUPABASE_POOL_SIZE", "10"))
+SUPABASE_TIMEOUT = float(os.getenv("SUPABASE_TIMEOUT", "10"))
+SUPABASE_CONNECT_TIMEOUT = float(os.getenv("SUPABASE_CONNECT_TIMEOUT", "5"))
+
+# storage backend for the DAO layer: "supabase" (default), "memory" (in-process,
+# src/backends/memory.py) or "sqlite" (local WAL file, src/backends/sqlite.py)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "supabase").lower()
+SQLITE_PATH = os.getenv("SQLITE_PATH", "retail.db")
+
+# stock reservation engine: "rpc" (server-side adjust_stock function from
+# sql/adjust_stock.sql, one round trip per basket), "cas" (one conditional
+# update per product, works on any schema) or "auto" (rpc, falling back to cas
+# for the rest of the process if the function is not installed)
+STOCK_ENGINE = os.getenv("STOCK_ENGINE", "auto")
+STOCK_MAX_RETRIES = int(os.getenv("STOCK_MAX_RETRIES", "8"))
+STOCK_BACKOFF_BASE = float(os.getenv("STOCK_BACKOFF_BASE", "0.005"))
+STOCK_BACKOFF_MAX = float(os.getenv("STOCK_BACKOFF_MAX", "0.2"))
+
+# low-stock monitoring (src/services/low_stock_service.py): reorder level for
+# products without their own or a category threshold, and how long the
+# thresholds table is cached per process
+LOW_STOCK_DEFAULT_THRESHOLD = int(os.getenv("LOW_STOCK_DEFAULT_THRESHOLD", "5"))
+LOW_STOCK_THRESHOLD_TTL = float(os.getenv("LOW_STOCK_THRESHOLD_TTL", "60"))
+
+# in-memory catalog for app.py (src/services/catalog_view.py): rows per page,
+# how often a rerun fetches changed rows, and how often everything is reloaded
+# (the only way deletes made by other processes are noticed)
+CATALOG_PAGE_SIZE = int(os.getenv("CATALOG_PAGE_SIZE", "50"))
+CATALOG_REFRESH_INTERVAL = float(os.getenv("CATALOG_REFRESH_INTERVAL", "15"))
+CATALOG_FULL_RELOAD = float(os.getenv("CATALOG_FULL_RELOAD", "300"))
+
+# running sales totals (src/services/sales_aggregates.py): how often a read
+# fetches orders changed by other processes, and how often the totals are
+# rebuilt in full (the only way deleted orders are noticed)
+SALES_REFRESH_INTERVAL = float(os.getenv("SALES_REFRESH_INTERVAL", "15"))
+SALES_FULL_REBUILD = float(os.getenv("SALES_FULL_REBUILD", "3600"))
+
+# offline analytics snapshot (src/services/analytics_service.py): directory
+# holding the memory-mapped order history columns
+ANALYTICS_DIR = os.getenv("ANALYTICS_DIR", "analytics")
+
+# write-ahead outbox for idempotent order/payment writes (src/services/outbox.py):
+# local SQLite file, its fsync level ("full" survives power loss, "normal" only
+# a process crash) and how long a claimed write is reserved for its runner
+OUTBOX_PATH = os.getenv("OUTBOX_PATH", "outbox.db")
+OUTBOX_SYNC = os.getenv("OUTBOX_SYNC", "full").lower()
+OUTBOX_LEASE = float(os.getenv("OUTBOX_LEASE", "30"))
+
+# write-behind coalescer for stock deltas and order status changes
+# (src/services/write_behind.py): off by default; how long changes may wait,
+# how many queued changes trigger an early flush, and how many products +
+# orders may be pending before writers block until a flush makes room
+WRITE_BEHIND = os.getenv("WRITE_BEHIND", "0").lower() in ("1", "true", "yes")
+WRITE_BEHIND_INTERVAL = float(os.getenv("WRITE_BEHIND_INTERVAL", "0.05"))
+WRITE_BEHIND_BATCH = int(os.getenv("WRITE_BEHIND_BATCH", "500"))
+WRITE_BEHIND_MAX_PENDING = int(os.getenv("WRITE_BEHIND_MAX_PENDING", "5000"))
+
+# multi-process order workers (src/services/order_pool.py): processes, handler
+# threads per process, and requests queued per process before submit() blocks
+ORDER_WORKERS = int(os.getenv("ORDER_WORKERS", str(os.cpu_count() or 1)))
+ORDER_WORKER_THREADS = int(os.getenv("ORDER_WORKER_THREADS", "4"))
+ORDER_QUEUE_SIZE = int(os.getenv("ORDER_QUEUE_SIZE", "1000"))
+
+# offline-first store terminal mode (src/services/terminal.py): off by default;
+# local SQLite replica of products/customers, how often the background thread
+# pushes queued orders and pulls changes, how often the replica is reloaded in
+# full (the only way rows deleted on the server are dropped), how many queued
+# writes one sync pushes, and how long `order create` waits for the server
+TERMINAL_MODE = os.getenv("TERMINAL_MODE", "0").lower() in ("1", "true", "yes")
+TERMINAL_REPLICA_PATH = os.getenv("TERMINAL_REPLICA_PATH", "replica.db")
+TERMINAL_SYNC_INTERVAL = float(os.getenv("TERMINAL_SYNC_INTERVAL", "2"))
+TERMINAL_FULL_RESYNC = float(os.getenv("TERMINAL_FULL_RESYNC", "3600"))
+TERMINAL_PUSH_BATCH = int(os.getenv("TERMINAL_PUSH_BATCH", "200"))
+TERMINAL_ORDER_WAIT = float(os.getenv("TERMINAL_ORDER_WAIT", "2"))
+
+# read-through row cache for products/customers (src/dao/cache.py)
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "1").lower() not in ("0", "false", "no")
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+CACHE_NEGATIVE_TTL = float(os.getenv("CACHE_NEGATIVE_TTL", "5"))
+CACHE_TTL_PRODUCTS = float(os.getenv("CACHE_TTL_PRODUCTS", "30"))
+CACHE_TTL_CUSTOMERS = float(os.getenv("CACHE_TTL_CUSTOMERS", "300"))
+
+# concurrent fan-out of independent reads through the async DAO (src/dao/async_dao.py)
+ASYNC_FANOUT = os.getenv("ASYNC_FANOUT", "1").lower() not in ("0", "false", "no")
+ASYNC_CONCURRENCY = int(os.getenv("ASYNC_CONCURRENCY", "8"))
+
+
+def open_backend(name: str, **kwargs):
+    """Build a local storage engine by name ("memory" or "sqlite")."""
+    if name == "memory":
+        from src.backends.memory import MemoryClient
+        return MemoryClient(**kwargs)
+    if name == "sqlite":
+        from src.backends.sqlite import SQLiteClient
+        return SQLiteClient(kwargs.pop("path", SQLITE_PATH), **kwargs)
+    raise ValueError(f"Unknown storage backend: {name} (use supabase, memory or sqlite)")
+
+
+class ClientManager:
+    """
+    Process-wide owner of the supabase clients.
+    Clients are built lazily on first use and shared afterwards, so a CLI run
+    or Streamlit session pays for one connection setup instead of one per query.
+    The sync client is safe to share across threads (httpx keeps a pooled,
+    keep-alive connection set underneath). Async clients are bound to the
+    event loop they were created on, so one is kept per loop (weakly: a
+    collected loop takes its entry with it, and a new loop that gets the
+    same id() never sees a client bound to the dead one).
+    With a local backend ("memory"/"sqlite") that engine is built once and
+    serves both get() and get_async().
+    """
+
+    def __init__(self, url: Optional[str], key: Optional[str], pool_size: int = SUPABASE_POOL_SIZE,
+                 timeout: float = SUPABASE_TIMEOUT, connect_timeout: float = SUPABASE_CONNECT_TIMEOUT,
+                 backend: str = STORAGE_BACKEND):
+        self.url = url
+        self.key = key
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.backend = backend
+        self._local = None
+        self._lock = threading.Lock()
+        self._client: Optional[Client] = None
+        self._override = None
+        self._async_override = None
+        # loop -> (client, its httpx session)
+        self._async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Tuple[AsyncClient, httpx.AsyncClient]]" = \
+            weakref.WeakKeyDictionary()
+        self._stats = {"handshakes": 0, "reuses": 0, "async_handshakes": 0, "async_reuses": 0}
+
+    def _check(self):
+        if not self.url or not self.key:
+            raise RuntimeError("SUPABASE_URL and SUPABASE_KEY must be set in environment (.env)")
+
+    def _limits(self) -> httpx.Limits:
+        return httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+
+    def _timeouts(self) -> httpx.Timeout:
+        return httpx.Timeout(self.timeout, connect=self.connect_timeout)
+
+    def get(self) -> Client:
+        with self._lock:
+            if self._override is not None:
+                self._stats["reuses"] += 1
+                return self._override
+            if self.backend != "supabase":
+                return self._local_backend()
+            if self._client is None:
+                self._check()
+                http = httpx.Client(limits=self._limits(), timeout=self._timeouts())
+                options = ClientOptions(httpx_client=http, postgrest_client_timeout=self.timeout)
+                self._client = create_client(self.url, self.key, options=options)
+                self._stats["handshakes"] += 1
+            else:
+                self._stats["reuses"] += 1
+            return self._client
+
+    async def get_async(self) -> AsyncClient:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._async_override is not None:
+                self._stats["async_reuses"] += 1
+                return self._async_override
+            if self.backend != "supabase":
+                return self._local_backend().as_async()
+            entry = self._async_clients.get(loop)
+            if entry is not None:
+                self._stats["async_reuses"] += 1
+                return entry[0]
+        self._check()
+        http = httpx.AsyncClient(limits=self._limits(), timeout=self._timeouts())
+        options = AsyncClientOptions(httpx_client=http, postgrest_client_timeout=self.timeout)
+        client = await create_async_client(self.url, self.key, options=options)
+        with self._lock:
+            # another task on this loop may have won the race; keep the first one
+            existing = self._async_clients.setdefault(loop, (client, http))
+            if existing[0] is client:
+                self._stats["async_handshakes"] += 1
+            else:
+                self._stats["async_reuses"] += 1
+        if existing[0] is not client:
+            await http.aclose()
+        return existing[0]
+
+    def _local_backend(self):
+        # called with self._lock held
+        if self._local is None:
+            self._local = open_backend(self.backend)
+            self._stats["handshakes"] += 1
+        else:
+            self._stats["reuses"] += 1
+        return self._local
+
+    def warm_up(self) -> Client:
+        """Build the sync client now instead of on the first query."""
+        return self.get()
+
+    def use_client(self, client):
+        """
+        Route get() to an already-built client (e.g. the in-memory stand-in
+        from src.backends.memory). Pass None to go back to supabase.
+        If the client has as_async(), get_async() is routed to that view.
+        """
+        with self._lock:
+            self._override = client
+            self._async_override = client.as_async() if hasattr(client, "as_async") else None
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats)
+
+    def reset(self):
+        """Drop cached clients (e.g. after changing credentials). Counters are kept."""
+        with self._lock:
+            client, self._client = self._client, None
+            async_clients = list(self._async_clients.items())
+            self._async_clients = weakref.WeakKeyDictionary()
+        if client is not None:
+            client.postgrest.session.close()
+        for loop, (_, http) in async_clients:
+            _close_on_loop(loop, http)
+
+
+
+def _close_on_loop(loop: asyncio.AbstractEventLoop, http: httpx.AsyncClient):
+    """Close an async session on the loop it belongs to (a closed loop took its connections with it)."""
+    if loop.is_closed():
+        return
+    try:
+        if loop.is_running():
+            try:
+                running = asyncio.get_running_loop()
+            except RuntimeError:
+                running = None
+            if running is loop:
+                loop.create_task(http.aclose())
+            else:
+                asyncio.run_coroutine_threadsafe(http.aclose(), loop)
+        else:
+            loop.run_until_complete(http.aclose())
+    except Exception as e:
+        logging.getLogger(__name__).warning("could not close an async supabase session: %s", e)
+
+
+_manager = ClientManager(SUPABASE_URL, SUPABASE_KEY)
+# set by src.dao.instrumentation while a profile is active
+_client_wrapper = None
+# set by src.services.terminal while a local replica serves reads
+_read_router = None
+_primary_reads = contextvars.ContextVar("primary_reads", default=False)
+
+def get_client_manager() -> ClientManager:
+    return _manager
+
 def get_supabase() -> Client:
     """
-    Return a supabase client. Raises RuntimeError if config missing.
+    Return the shared supabase client. Raises RuntimeError if config missing.
+    """
+    client = _manager.get()
+    if _read_router is not None and not _primary_reads.get():
+        client = _read_router.route(client)
+    return _client_wrapper(client) if _client_wrapper is not None else client
+
+async def get_async_supabase() -> AsyncClient:
+    """
+    Return the shared async supabase client for the running event loop.
+    """
+    client = await _manager.get_async()
+    if _read_router is not None and not _primary_reads.get():
+        client = _read_router.route_async(client)
+    return _client_wrapper(client) if _client_wrapper is not None else client
+
+def use_client(client):
+    """Make every DAO talk to ``client`` instead of supabase (None restores the default)."""
+    _manager.use_client(client)
+
+def set_client_wrapper(wrapper):
+    """Wrap every client handed to the DAO layer with wrapper(client) (None to stop)."""
+    global _client_wrapper
+    _client_wrapper = wrapper
+
+def set_read_router(router):
+    """
+    Hand every client to router.route(client) / router.route_async(client)
+    first, so it can answer some reads locally (None to stop).
     """
-    if not SUPABASE_URL or not SUPABASE_KEY:
-        raise RuntimeError("SUPABASE_URL and SUPABASE_KEY must be set in environment (.env)")
-    return create_client(SUPABASE_URL, SUPABASE_KEY)
\ No newline at end of file
+    global _read_router
+    _read_router = router
+
+@contextmanager
+def primary_reads():
+    """Reads made inside this block skip the read router and go to the database."""
+    token = _primary_reads.set(True)
+    try:
+        yield
+    finally:
+        _primary_reads.reset(token)
+
+def client_stats() -> Dict[str, int]:
+    """Handshake / reuse counters for the shared clients."""
+    return _manager.stats()
@@ -0,0 +1,94 @@
+"""
+Async read API for fanning out independent lookups concurrently.
+
+Built on the async supabase client (config.get_async_supabase). Services
+combine calls with gather() (bounded by ASYNC_CONCURRENCY) and, from sync
+code such as the CLI, drive them through run_sync(), which uses one
+long-lived event loop thread so the async client and its connection pool
+are reused between calls.
+"""
+import asyncio
+import threading
+from typing import Any, Awaitable, Dict, List, Optional
+import src.config as config
+import src.dao.cache as cache
+from src.dao import instrumentation
+
+async def _sb():
+    return await config.get_async_supabase()
+
+# ---- event loop for sync callers ----
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="async-dao", daemon=True).start()
+        return _loop
+
+def run_sync(coro: Awaitable) -> Any:
+    """Run a coroutine on the shared DAO loop and wait for its result."""
+    loop = _get_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        raise RuntimeError("run_sync() called from the async DAO loop; await the coroutine instead")
+    return asyncio.run_coroutine_threadsafe(instrumentation.bind(coro), loop).result()
+
+async def gather(*aws: Awaitable, limit: Optional[int] = None) -> List[Any]:
+    """asyncio.gather with at most `limit` (default ASYNC_CONCURRENCY) in flight."""
+    sem = asyncio.Semaphore(limit or config.ASYNC_CONCURRENCY)
+
+    async def bounded(aw):
+        async with sem:
+            return await aw
+    return list(await asyncio.gather(*(bounded(a) for a in aws)))
+
+# ---- reads ----
+
+async def get_customer_by_id(cust_id: int, fresh: bool = False) -> Optional[Dict]:
+    async def load():
+        resp = await (await _sb()).table("customers").select("*").eq("cust_id", cust_id).limit(1).execute()
+        return resp.data[0] if resp.data else None
+    return await cache.read_through_async("customers", "cust_id", cust_id, load, fresh)
+
+async def get_customers_by_ids(cust_ids: List[int]) -> List[Dict]:
+    ids = list(dict.fromkeys(cust_ids))
+    if not ids:
+        return []
+    resp = await (await _sb()).table("customers").select("*").in_("cust_id", ids).execute()
+    return resp.data or []
+
+async def get_product_by_id(prod_id: int, fresh: bool = False) -> Optional[Dict]:
+    async def load():
+        resp = await (await _sb()).table("products").select("*").eq("prod_id", prod_id).limit(1).execute()
+        return resp.data[0] if resp.data else None
+    return await cache.read_through_async("products", "prod_id", prod_id, load, fresh)
+
+async def get_products_by_ids(prod_ids: List[int]) -> List[Dict]:
+    ids = list(dict.fromkeys(prod_ids))
+    if not ids:
+        return []
+    resp = await (await _sb()).table("products").select("*").in_("prod_id", ids).execute()
+    return resp.data or []
+
+async def get_order_by_id(order_id: int) -> Optional[Dict]:
+    resp = await (await _sb()).table("orders").select("*").eq("order_id", order_id).limit(1).execute()
+    return resp.data[0] if resp.data else None
+
+async def get_order_items(order_ids: List[int]) -> List[Dict]:
+    ids = list(dict.fromkeys(order_ids))
+    if not ids:
+        return []
+    resp = await (await _sb()).table("order_items").select("*").in_("order_id", ids).order("order_id").execute()
+    return resp.data or []
+
+async def list_orders_by_customer(cust_id: int) -> List[Dict]:
+    resp = await (await _sb()).table("orders").select("*").eq("cust_id", cust_id).execute()
+    return resp.data or []
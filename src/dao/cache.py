@@ -0,0 +1,195 @@
+"""
+Read-through row cache for the hot single-row DAO lookups.
+
+One bounded LRU per table, each with its own TTL (CACHE_TTL_<TABLE>) and a
+shorter TTL for negative entries (lookups that found nothing). Rows are
+indexed by every unique key column, so a product cached by prod_id also
+answers get_product_by_sku. DAO writes call refresh() with the row returned
+by the write, which drops the old keys and stores the new row.
+
+The cache is per process; other writers are only seen once the TTL expires,
+so stock-sensitive reads pass fresh=True to go straight to the database.
+"""
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+import src.config as config
+
+# table -> (unique key columns, first one is the primary key; ttl seconds)
+CACHED_TABLES = {
+    "products": (("prod_id", "sku"), config.CACHE_TTL_PRODUCTS),
+    "customers": (("cust_id", "email"), config.CACHE_TTL_CUSTOMERS),
+}
+
+_MISSING = object()   # not in cache
+_NOT_FOUND = object()  # cached "no such row"
+
+
+class LRUCache:
+    """Thread-safe LRU with per-entry expiry and hit/miss/eviction counters."""
+
+    def __init__(self, max_entries: int, ttl: float, negative_ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.generation = 0
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._stats = {"hits": 0, "negative_hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    def get(self, key: Hashable) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return _MISSING
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                return _MISSING
+            self._data.move_to_end(key)
+            self._stats["negative_hits" if value is _NOT_FOUND else "hits"] += 1
+            return value
+
+    def peek(self, key: Hashable) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            return _MISSING if entry is None else entry[1]
+
+    def put(self, key: Hashable, value: Any, generation: Optional[int] = None):
+        ttl = self.negative_ttl if value is _NOT_FOUND else self.ttl
+        with self._lock:
+            # a write happened while this value was being loaded: it may be stale
+            if generation is not None and generation != self.generation:
+                return
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def invalidate(self, *keys: Hashable):
+        with self._lock:
+            self.generation += 1
+            for key in keys:
+                if self._data.pop(key, None) is not None:
+                    self._stats["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            s = dict(self._stats, size=len(self._data), max_entries=self.max_entries, ttl=self.ttl)
+        lookups = s["hits"] + s["negative_hits"] + s["misses"]
+        s["hit_rate"] = (s["hits"] + s["negative_hits"]) / lookups if lookups else 0.0
+        return s
+
+
+_caches: Dict[str, LRUCache] = {
+    table: LRUCache(config.CACHE_MAX_ENTRIES, ttl, config.CACHE_NEGATIVE_TTL)
+    for table, (_, ttl) in CACHED_TABLES.items()
+}
+
+
+def _row_keys(table: str, row: Dict):
+    return [(col, row[col]) for col in CACHED_TABLES[table][0] if row.get(col) is not None]
+
+
+def _store(cache: LRUCache, table: str, row: Dict, generation: Optional[int] = None):
+    for key in _row_keys(table, row):
+        cache.put(key, row, generation)
+
+
+def _lookup(table: str, column: str, value: Any, fresh: bool) -> Any:
+    if not config.CACHE_ENABLED or fresh:
+        return _MISSING
+    hit = _caches[table].get((column, value))
+    if hit is _NOT_FOUND or hit is _MISSING:
+        return hit
+    return dict(hit)
+
+
+def _remember(table: str, column: str, value: Any, row: Optional[Dict], generation: int):
+    if not config.CACHE_ENABLED:
+        return
+    cache = _caches[table]
+    if row is None:
+        cache.put((column, value), _NOT_FOUND, generation)
+    else:
+        _store(cache, table, dict(row), generation)
+
+
+def read_through(table: str, column: str, value: Any, loader: Callable[[], Optional[Dict]],
+                 fresh: bool = False) -> Optional[Dict]:
+    """
+    Return the row where `column` == `value`, from cache when possible.
+    `loader` runs on a miss (or always when fresh=True) and its result is cached,
+    including None as a negative entry.
+    """
+    hit = _lookup(table, column, value, fresh)
+    if hit is _NOT_FOUND:
+        return None
+    if hit is not _MISSING:
+        return hit
+    generation = _caches[table].generation
+    if fresh:
+        # "must hit the database": not a local replica either
+        with config.primary_reads():
+            row = loader()
+    else:
+        row = loader()
+    _remember(table, column, value, row, generation)
+    return row
+
+
+async def read_through_async(table: str, column: str, value: Any,
+                             loader: Callable[[], Awaitable[Optional[Dict]]],
+                             fresh: bool = False) -> Optional[Dict]:
+    """read_through() for coroutine loaders (src/dao/async_dao.py)."""
+    hit = _lookup(table, column, value, fresh)
+    if hit is _NOT_FOUND:
+        return None
+    if hit is not _MISSING:
+        return hit
+    generation = _caches[table].generation
+    if fresh:
+        with config.primary_reads():
+            row = await loader()
+    else:
+        row = await loader()
+    _remember(table, column, value, row, generation)
+    return row
+
+
+def refresh(table: str, pk_value: Any, row: Optional[Dict] = None, store: bool = True):
+    """
+    Call after a write to `table`: drop every key of the previously cached row
+    and of `row` (clearing negative entries for its keys), then cache `row`
+    unless store=False (deletes).
+    """
+    cache = _caches[table]
+    pk = CACHED_TABLES[table][0][0]
+    keys = [(pk, pk_value)]
+    old = cache.peek((pk, pk_value))
+    if isinstance(old, dict):
+        keys += _row_keys(table, old)
+    if row is not None:
+        keys += _row_keys(table, row)
+    cache.invalidate(*keys)
+    if row is not None and store and config.CACHE_ENABLED:
+        _store(cache, table, dict(row))
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    return {table: c.stats() for table, c in _caches.items()}
+
+
+def clear_caches():
+    for c in _caches.values():
+        c.clear()
@@ -1,5 +1,7 @@
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Iterator
 from src.config import get_supabase
+import src.dao.cache as cache
+from src.dao.paging import keyset_iter
 
 def _sb():
     return get_supabase()
@@ -13,33 +15,58 @@ def create_customer(name: str, email: str, phone: str, city: str | None = None)
     if city:
         payload["city"] = city
 
-    _sb().table("customers").insert(payload).execute()
-    resp = _sb().table("customers").select("*").eq("email", email).limit(1).execute()
-    return resp.data[0] if resp.data else None
+    # insert returns the written row (Prefer: return=representation)
+    resp = _sb().table("customers").insert(payload).execute()
+    row = resp.data[0] if resp.data else None
+    if row:
+        cache.refresh("customers", row["cust_id"], row)
+    return row
+
+def get_customer_by_email(email: str, fresh: bool = False) -> Optional[Dict]:
+    def load():
+        resp = _sb().table("customers").select("*").eq("email", email).limit(1).execute()
+        return resp.data[0] if resp.data else None
+    return cache.read_through("customers", "email", email, load, fresh)
 
-def get_customer_by_email(email: str) -> Optional[Dict]:
-    resp = _sb().table("customers").select("*").eq("email", email).limit(1).execute()
-    return resp.data[0] if resp.data else None
+def get_customer_by_id(cust_id: int, fresh: bool = False) -> Optional[Dict]:
+    def load():
+        resp = _sb().table("customers").select("*").eq("cust_id", cust_id).limit(1).execute()
+        return resp.data[0] if resp.data else None
+    return cache.read_through("customers", "cust_id", cust_id, load, fresh)
 
-def get_customer_by_id(cust_id: int) -> Optional[Dict]:
-    resp = _sb().table("customers").select("*").eq("cust_id", cust_id).limit(1).execute()
-    return resp.data[0] if resp.data else None
+def get_customers_by_ids(cust_ids: List[int]) -> List[Dict]:
+    ids = list(dict.fromkeys(cust_ids))
+    if not ids:
+        return []
+    resp = _sb().table("customers").select("*").in_("cust_id", ids).execute()
+    return resp.data or []
 
 def update_customer(cust_id: int, fields: Dict) -> Optional[Dict]:
-    _sb().table("customers").update(fields).eq("cust_id", cust_id).execute()
-    resp = _sb().table("customers").select("*").eq("cust_id", cust_id).limit(1).execute()
-    return resp.data[0] if resp.data else None
+    resp = _sb().table("customers").update(fields).eq("cust_id", cust_id).execute()
+    row = resp.data[0] if resp.data else None
+    cache.refresh("customers", cust_id, row)
+    return row
 
 def delete_customer(cust_id: int) -> Optional[Dict]:
-    resp_before = _sb().table("customers").select("*").eq("cust_id", cust_id).limit(1).execute()
-    row = resp_before.data[0] if resp_before.data else None
-    _sb().table("customers").delete().eq("cust_id", cust_id).execute()
+    # delete returns the removed row, no need to read it first
+    resp = _sb().table("customers").delete().eq("cust_id", cust_id).execute()
+    row = resp.data[0] if resp.data else None
+    cache.refresh("customers", cust_id, row, store=False)
     return row
 
 def list_customers(limit: int = 100) -> List[Dict]:
     resp = _sb().table("customers").select("*").order("cust_id").limit(limit).execute()
     return resp.data or []
 
+def iter_customers(batch_size: int = 500, city: str | None = None) -> Iterator[Dict]:
+    """
+    Stream every customer in cust_id order, batch_size rows per round trip.
+    """
+    def base():
+        q = _sb().table("customers").select("*")
+        return q.eq("city", city) if city else q
+    return keyset_iter(base, "cust_id", batch_size)
+
 def search_customers(email: str | None = None, city: str | None = None) -> List[Dict]:
     q = _sb().table("customers").select("*")
     if email:
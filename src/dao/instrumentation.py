@@ -0,0 +1,356 @@
+"""
+Round-trip instrumentation for the DAO layer.
+
+While a profile() is active, the clients handed out by src.config are
+wrapped so every .execute() (table queries and rpc calls, sync or async)
+is recorded: table, operation, filters, rows returned, payload bytes sent
+and received, latency, the DAO function that ran it and the service
+function that called into the DAO layer. Records are grouped by service so
+N+1 patterns show up as one query shape with a high call count.
+
+    with instrumentation.profile("order create") as prof:
+        order_service.create_order(1, [{"prod_id": 3, "quantity": 1}])
+    print(prof.format_summary())
+    open("dao.prom", "w").write(prof.to_openmetrics())
+
+Nothing is wrapped when no profile is active, so the normal path pays nothing.
+"""
+import sys
+import json
+import time
+import inspect
+import threading
+import contextvars
+from typing import Any, Dict, List, Optional, Tuple
+import src.config as config
+
+_OPS = {"select", "insert", "upsert", "update", "delete"}
+_FILTERS = {"eq", "neq", "gt", "gte", "lt", "lte", "in_", "is_", "like", "ilike", "contains", "match"}
+_MODIFIERS = {"order", "limit", "range"}
+
+# DAO helpers that run queries on behalf of a DAO function further up the stack
+_DAO_HELPERS = ("instrumentation.py", "cache.py", "paging.py")
+
+_lock = threading.Lock()
+_active: List["Profile"] = []
+# service that started work now running on another thread / event loop (see bind())
+_bound_service: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("dao_bound_service", default=None)
+# DAO function whose query a helper is running (see as_dao())
+_bound_dao: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("dao_bound_dao", default=None)
+
+
+def _size(value: Any) -> int:
+    if value is None:
+        return 0
+    try:
+        return len(json.dumps(value, default=str))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _frame_name(frame) -> str:
+    module = frame.f_code.co_filename.replace("\\", "/").rsplit("/", 1)[-1].rsplit(".", 1)[0]
+    # loader closures (get_product_by_id.<locals>.load) count as their function
+    name = getattr(frame.f_code, "co_qualname", frame.f_code.co_name).split(".<locals>.")[0]
+    return f"{module}.{name}"
+
+
+def _origin(depth: int = 2) -> Tuple[Optional[str], Optional[str]]:
+    """
+    (caller, DAO function) for the query being run: the outermost service
+    function on the stack (or the cmd_* CLI handler when the CLI calls a DAO directly),
+    and the innermost DAO function (else the one bound by as_dao(), else the
+    DAO helper such as keyset_iter).
+    """
+    service = cli = dao = helper = None
+    frame = sys._getframe(depth)
+    while frame is not None:
+        path = frame.f_code.co_filename.replace("\\", "/")
+        if "/src/services/" in path:
+            service = _frame_name(frame)
+        elif "/src/cli/" in path and (cli is None or frame.f_code.co_name.startswith("cmd_")):
+            cli = _frame_name(frame)
+        elif "/src/dao/" in path and dao is None:
+            if not path.endswith(_DAO_HELPERS):
+                dao = _frame_name(frame)
+            elif helper is None and not path.endswith("instrumentation.py"):
+                helper = _frame_name(frame)
+        frame = frame.f_back
+    return service or cli, dao or _bound_dao.get() or helper
+
+
+def bind(target):
+    """
+    Carry the calling service into work that runs elsewhere: a coroutine
+    handed to the async DAO loop, or a callable submitted to a thread pool.
+    Returns target unchanged when no profile is active.
+    """
+    if not _active:
+        return target
+    service = _bound_service.get() or _origin()[0]
+    if inspect.isawaitable(target):
+        async def bound_coro():
+            token = _bound_service.set(service)
+            try:
+                return await target
+            finally:
+                _bound_service.reset(token)
+        return bound_coro()
+
+    def bound_call(*args, **kwargs):
+        token = _bound_service.set(service)
+        try:
+            return target(*args, **kwargs)
+        finally:
+            _bound_service.reset(token)
+    return bound_call
+
+
+def as_dao(query_fn, target):
+    """
+    Attribute the queries `target` runs to the DAO function that defined
+    query_fn (e.g. the base query closure handed to keyset_iter), which is no
+    longer on the stack when a generator or a prefetch thread runs them.
+    Returns target unchanged when no profile is active.
+    """
+    code = getattr(query_fn, "__code__", None)
+    if not _active or code is None or "/src/dao/" not in code.co_filename.replace("\\", "/"):
+        return target
+    module = code.co_filename.replace("\\", "/").rsplit("/", 1)[-1].rsplit(".", 1)[0]
+    name = f"{module}.{query_fn.__qualname__.split('.<locals>.')[0]}"
+
+    def call(*args, **kwargs):
+        token = _bound_dao.set(name)
+        try:
+            return target(*args, **kwargs)
+        finally:
+            _bound_dao.reset(token)
+    return call
+
+
+def _emit(record: Dict):
+    with _lock:
+        targets = list(_active)
+    for prof in targets:
+        prof._add(record)
+
+
+class _QueryProxy:
+    """Wraps a query builder, noting what is built, and records execute()."""
+
+    def __init__(self, inner, info: Dict):
+        self._inner = inner
+        self._info = info
+
+    def __getattr__(self, name):
+        attr = getattr(self._inner, name)
+        if name == "execute":
+            return self._execute
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            info = self._info
+            if name in _OPS:
+                info["op"] = name
+                if args and name != "select":
+                    info["sent_bytes"] = _size(args[0])
+            elif name in _FILTERS and args:
+                info["filters"].append(f"{name.rstrip('_')}({args[0]})")
+            elif name in _MODIFIERS:
+                info["modifiers"].append(name)
+            return _QueryProxy(result, info)
+        return call
+
+    def _execute(self, *args, **kwargs):
+        service, dao = _origin()
+        service = _bound_service.get() or service
+        start = time.perf_counter()
+        try:
+            resp = self._inner.execute(*args, **kwargs)
+        except Exception as e:
+            self._record(service, dao, start, None, e)
+            raise
+        if inspect.isawaitable(resp):
+            return self._await(resp, service, dao, start)
+        self._record(service, dao, start, resp, None)
+        return resp
+
+    async def _await(self, aw, service, dao, start):
+        try:
+            resp = await aw
+        except Exception as e:
+            self._record(service, dao, start, None, e)
+            raise
+        self._record(service, dao, start, resp, None)
+        return resp
+
+    def _record(self, service, dao, start, resp, error):
+        data = getattr(resp, "data", None)
+        _emit({
+            "table": self._info["table"],
+            "op": self._info["op"],
+            "filters": list(self._info["filters"]),
+            "modifiers": list(self._info["modifiers"]),
+            "rows": len(data) if isinstance(data, list) else (0 if data is None else 1),
+            "sent_bytes": self._info.get("sent_bytes", 0),
+            "bytes": _size(data),
+            "ms": (time.perf_counter() - start) * 1000,
+            "service": service or "-",
+            "dao": dao or "-",
+            "error": type(error).__name__ if error is not None else None,
+        })
+
+
+class _ClientProxy:
+    """Same surface as the wrapped client; table()/from_()/rpc() builders are recorded."""
+
+    def __init__(self, client):
+        self._client = client
+
+    def table(self, name: str):
+        return _QueryProxy(self._client.table(name),
+                           {"table": name, "op": "select", "filters": [], "modifiers": []})
+
+    from_ = table
+
+    def rpc(self, name: str, params: Optional[Dict] = None, *args, **kwargs):
+        info = {"table": name, "op": "rpc", "filters": [], "modifiers": [], "sent_bytes": _size(params)}
+        return _QueryProxy(self._client.rpc(name, params or {}, *args, **kwargs), info)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+class Profile:
+    """Collected DAO calls of one profiled block; thread-safe."""
+
+    def __init__(self, name: Optional[str] = None):
+        self.name = name
+        self.records: List[Dict] = []
+        self._lock = threading.Lock()
+        self.started: Optional[float] = None
+        self.elapsed_ms = 0.0
+
+    def _add(self, record: Dict):
+        with self._lock:
+            self.records.append(record)
+
+    def __enter__(self) -> "Profile":
+        self.started = time.perf_counter()
+        with _lock:
+            _active.append(self)
+            config.set_client_wrapper(_ClientProxy)
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed_ms = (time.perf_counter() - self.started) * 1000
+        with _lock:
+            _active.remove(self)
+            if not _active:
+                config.set_client_wrapper(None)
+        return False
+
+    @property
+    def round_trips(self) -> int:
+        return len(self.records)
+
+    def summary(self) -> Dict:
+        """
+        Totals plus one entry per (service, DAO function, table, op, filters)
+        with its call count, rows, bytes and time.
+        """
+        with self._lock:
+            records = list(self.records)
+        groups: Dict[tuple, Dict] = {}
+        for r in records:
+            key = (r["service"], r["dao"], r["table"], r["op"], ",".join(r["filters"]))
+            g = groups.get(key)
+            if g is None:
+                g = groups[key] = {"service": key[0], "dao": key[1], "table": key[2], "op": key[3],
+                                   "filters": key[4], "calls": 0, "rows": 0, "bytes": 0,
+                                   "sent_bytes": 0, "ms": 0.0, "errors": 0}
+            g["calls"] += 1
+            g["rows"] += r["rows"]
+            g["bytes"] += r["bytes"]
+            g["sent_bytes"] += r["sent_bytes"]
+            g["ms"] += r["ms"]
+            g["errors"] += 1 if r["error"] else 0
+        return {
+            "name": self.name,
+            "round_trips": len(records),
+            "rows": sum(r["rows"] for r in records),
+            "bytes": sum(r["bytes"] + r["sent_bytes"] for r in records),
+            "dao_ms": round(sum(r["ms"] for r in records), 3),
+            "elapsed_ms": round(self.elapsed_ms, 3),
+            "queries": sorted(groups.values(), key=lambda g: (g["service"], -g["calls"], g["dao"])),
+        }
+
+    def format_summary(self) -> str:
+        s = self.summary()
+        lines = [f"profile{': ' + s['name'] if s['name'] else ''} -- {s['round_trips']} round trips, "
+                 f"{s['rows']} rows, {s['bytes'] / 1024:.1f} KB, {s['dao_ms']:.1f} ms in DAO "
+                 f"of {s['elapsed_ms']:.1f} ms"]
+        if s["queries"]:
+            lines.append(f"  {'calls':>5} {'rows':>6} {'KB':>7} {'ms':>8}  query")
+        service = None
+        for q in s["queries"]:
+            if q["service"] != service:
+                service = q["service"]
+                lines.append(f"  [{service}]")
+            where = f" where {q['filters']}" if q["filters"] else ""
+            err = f"  ({q['errors']} failed)" if q["errors"] else ""
+            lines.append(f"  {q['calls']:>5} {q['rows']:>6} {(q['bytes'] + q['sent_bytes']) / 1024:>7.1f} "
+                         f"{q['ms']:>8.2f}  {q['op']} {q['table']}{where}  <- {q['dao']}{err}")
+        return "\n".join(lines)
+
+    def to_openmetrics(self, prefix: str = "retail_dao") -> str:
+        """
+        The summary as OpenMetrics text (Prometheus textfile collector
+        compatible). Query shapes that differ only by filters are summed, so
+        each label set appears once per metric.
+        """
+        def labels(q):
+            pairs = [("service", q["service"]), ("dao", q["dao"]), ("table", q["table"]), ("op", q["op"])]
+            return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+        merged: Dict[tuple, Dict] = {}
+        for q in self.summary()["queries"]:
+            key = (q["service"], q["dao"], q["table"], q["op"])
+            m = merged.get(key)
+            if m is None:
+                merged[key] = dict(q)
+            else:
+                for field in ("calls", "errors", "rows", "bytes", "sent_bytes", "ms"):
+                    m[field] += q[field]
+        s = {"queries": list(merged.values())}
+        series = [
+            ("requests", "counter", "DAO round trips.", lambda q: q["calls"]),
+            ("request_errors", "counter", "DAO round trips that raised.", lambda q: q["errors"]),
+            ("rows", "counter", "Rows returned by DAO round trips.", lambda q: q["rows"]),
+            ("response_bytes", "counter", "Approximate JSON bytes received.", lambda q: q["bytes"]),
+            ("request_bytes", "counter", "Approximate JSON bytes sent.", lambda q: q["sent_bytes"]),
+        ]
+        out = []
+        for metric, kind, help_text, value in series:
+            out.append(f"# TYPE {prefix}_{metric} {kind}")
+            out.append(f"# HELP {prefix}_{metric} {help_text}")
+            for q in s["queries"]:
+                out.append(f"{prefix}_{metric}_total{labels(q)} {value(q)}")
+        out.append(f"# TYPE {prefix}_request_seconds summary")
+        out.append(f"# HELP {prefix}_request_seconds Time spent in DAO round trips.")
+        for q in s["queries"]:
+            out.append(f"{prefix}_request_seconds_sum{labels(q)} {q['ms'] / 1000:.6f}")
+            out.append(f"{prefix}_request_seconds_count{labels(q)} {q['calls']}")
+        out.append("# EOF")
+        return "\n".join(out) + "\n"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def profile(name: Optional[str] = None) -> Profile:
+    """Context manager recording every DAO round trip made inside the block (any thread)."""
+    return Profile(name)
@@ -0,0 +1,275 @@
+"""
+Compact row types for large reads.
+
+The DAO functions return plain dicts (the shape PostgREST hands back, which
+the CLI prints and app.py renders), and that stays the default. Code that
+holds many rows at once can convert them to:
+
+- typed rows (Product, Customer, Order, OrderItem, Payment): __slots__
+  objects, a fraction of a dict's size, with attribute access and the same
+  read-only mapping surface (row["price"], row.get(...), dict(row));
+- ColumnBatch: rows stored column by column, with numeric columns in
+  typed arrays (8 bytes per value instead of a boxed float or int per row).
+  Slices and filtered views share the parent's columns instead of
+  copying them.
+
+Both convert back with to_dict() / rows(). Keys a row carries beyond its
+FIELDS (e.g. product_name on joined order items) are kept in an overflow
+dict, so a round trip is lossless.
+"""
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+
+class Row:
+    """Base for typed rows; subclasses list their columns in FIELDS and __slots__."""
+    __slots__ = ("_extra",)
+    FIELDS: Tuple[str, ...] = ()
+    _field_set = frozenset()
+
+    def __init__(self, **values):
+        extra = None
+        for name in self.FIELDS:
+            setattr(self, name, values.pop(name, None))
+        if values:
+            extra = values
+        self._extra = extra
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Row":
+        # replaced per subclass by a generated function (see __init_subclass__)
+        row = cls.__new__(cls)
+        for name in cls.FIELDS:
+            setattr(row, name, data.get(name))
+        row._extra = _extra(cls._field_set, data)
+        return row
+
+    @classmethod
+    def from_dicts(cls, rows: Iterable[Dict]) -> List["Row"]:
+        return [cls.from_dict(r) for r in rows]
+
+    def to_dict(self) -> Dict:
+        out = {name: getattr(self, name) for name in self.FIELDS}
+        if self._extra:
+            out.update(self._extra)
+        return out
+
+    # read-only mapping surface, so code written against dict rows keeps working
+    def keys(self):
+        return self.to_dict().keys()
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self._field_set:
+            return getattr(self, key)
+        if self._extra and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._field_set or bool(self._extra and key in self._extra)
+
+    def __iter__(self):
+        return iter(self.to_dict())
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, Row):
+            other = other.to_dict()
+        return isinstance(other, dict) and self.to_dict() == other
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({', '.join(f'{k}={v!r}' for k, v in self.to_dict().items())})"
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._field_set = frozenset(cls.FIELDS)
+        # straight-line converters, several times faster than looping over FIELDS
+        # with setattr/getattr (the same approach dataclasses takes)
+        source = (
+            "def from_dict(cls, data):\n"
+            "    row = new(cls)\n"
+            + "".join(f"    row.{f} = data.get({f!r})\n" for f in cls.FIELDS)
+            + "    row._extra = None if fields.issuperset(data) else extra(fields, data)\n"
+            "    return row\n"
+            "def to_dict(self):\n"
+            "    out = {" + ", ".join(f"{f!r}: self.{f}" for f in cls.FIELDS) + "}\n"
+            "    if self._extra:\n"
+            "        out.update(self._extra)\n"
+            "    return out\n"
+        )
+        namespace = {"new": object.__new__, "fields": cls._field_set, "extra": _extra}
+        exec(source, namespace)
+        cls.from_dict = classmethod(namespace["from_dict"])
+        cls.to_dict = namespace["to_dict"]
+
+
+def _extra(fields: frozenset, data: Dict) -> Optional[Dict]:
+    """Keys of data outside the model's FIELDS (kept so to_dict() round-trips)."""
+    if fields.issuperset(data):
+        return None
+    return {k: v for k, v in data.items() if k not in fields}
+
+
+class Product(Row):
+    FIELDS = ("prod_id", "name", "sku", "price", "stock", "category", "updated_at")
+    __slots__ = FIELDS
+
+
+class Customer(Row):
+    FIELDS = ("cust_id", "name", "email", "phone", "city")
+    __slots__ = FIELDS
+
+
+class Order(Row):
+    FIELDS = ("order_id", "cust_id", "order_date", "total_amount", "status")
+    __slots__ = FIELDS
+
+
+class OrderItem(Row):
+    FIELDS = ("item_id", "order_id", "prod_id", "quantity", "price")
+    __slots__ = FIELDS
+
+
+class Payment(Row):
+    FIELDS = ("payment_id", "order_id", "amount", "method", "status", "paid_at")
+    __slots__ = FIELDS
+
+
+MODELS = {"products": Product, "customers": Customer, "orders": Order,
+          "order_items": OrderItem, "payments": Payment}
+
+
+def _column(values: List[Any]):
+    """A typed array when every value fits one ('q' ints, 'd' floats), else the list itself."""
+    kind = None
+    for v in values:
+        t = type(v)
+        if t is int:
+            kind = kind or "q"
+        elif t is float:
+            kind = "d"
+        else:
+            return values
+    if kind is None:
+        return values
+    try:
+        return array(kind, values)
+    except OverflowError:
+        return values
+
+
+class ColumnBatch:
+    """
+    Rows held column-wise. columns maps field -> typed array or list, all of
+    equal length. A batch may be a view: `index` is then the positions of
+    the parent's rows it shows (a range for slices), and the columns are
+    shared, not copied.
+    """
+    __slots__ = ("fields", "columns", "_index")
+
+    def __init__(self, fields: Sequence[str], columns: Dict[str, Any], index: Optional[Sequence[int]] = None):
+        self.fields = tuple(fields)
+        self.columns = columns
+        self._index = index
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Dict], fields: Optional[Sequence[str]] = None) -> "ColumnBatch":
+        rows = rows if isinstance(rows, list) else list(rows)
+        if fields is None:
+            fields = list(dict.fromkeys(k for r in rows[:1] for k in r))
+        return cls(fields, {f: _column([r.get(f) for r in rows]) for f in fields})
+
+    @classmethod
+    def empty(cls, fields: Sequence[str]) -> "ColumnBatch":
+        return cls(fields, {f: [] for f in fields})
+
+    def __len__(self) -> int:
+        if self._index is not None:
+            return len(self._index)
+        return len(self.columns[self.fields[0]]) if self.fields else 0
+
+    def _pos(self, i: int) -> int:
+        return self._index[i] if self._index is not None else i
+
+    def row(self, i: int) -> Dict:
+        p = self._pos(i)
+        return {f: self.columns[f][p] for f in self.fields}
+
+    def rows(self) -> Iterator[Dict]:
+        fields = self.fields
+        cols = [self.column(f) for f in fields]
+        for values in zip(*cols):
+            yield dict(zip(fields, values))
+
+    def slice(self, start: int, stop: int) -> "ColumnBatch":
+        """Rows start..stop as a view (no column data is copied)."""
+        positions = self._index if self._index is not None else range(len(self))
+        return ColumnBatch(self.fields, self.columns, positions[start:stop])
+
+    def take(self, positions: Sequence[int]) -> "ColumnBatch":
+        """View of the given row positions (of this batch)."""
+        if self._index is not None:
+            positions = [self._index[p] for p in positions]
+        return ColumnBatch(self.fields, self.columns, positions)
+
+    def column(self, field: str) -> Sequence[Any]:
+        col = self.columns[field]
+        if self._index is None:
+            return col
+        if isinstance(self._index, range) and self._index.step == 1:
+            return col[self._index.start:self._index.stop]
+        return [col[p] for p in self._index]
+
+    def to_columns(self) -> Dict[str, List[Any]]:
+        """field -> list of values; what pandas / st.dataframe accept directly."""
+        return {f: list(self.column(f)) for f in self.fields}
+
+    # in-place edits (owning batches only)
+
+    def append(self, row: Dict) -> int:
+        if self._index is not None:
+            raise ValueError("cannot append to a view")
+        for f in self.fields:
+            self._put(f, None, row.get(f))
+        return len(self) - 1
+
+    def extend(self, other: "ColumnBatch"):
+        """Append another batch's rows (same fields)."""
+        if self._index is not None:
+            raise ValueError("cannot append to a view")
+        for f in self.fields:
+            values = other.column(f)
+            col = self.columns[f]
+            if not len(col):
+                self.columns[f] = array(values.typecode, values) if isinstance(values, array) else list(values)
+            elif isinstance(col, array) and not (isinstance(values, array) and values.typecode == col.typecode):
+                self.columns[f] = _column(list(col) + list(values))
+            else:
+                col.extend(values)
+
+    def set(self, pos: int, row: Dict):
+        if self._index is not None:
+            raise ValueError("cannot modify a view")
+        for f in self.fields:
+            self._put(f, pos, row.get(f))
+
+    def _put(self, field: str, pos: Optional[int], value: Any):
+        col = self.columns[field]
+        try:
+            if pos is None:
+                col.append(value)
+            else:
+                col[pos] = value
+        except TypeError:
+            # a None or a wider type arrived: re-pick the column's layout
+            col = list(col)
+            if pos is None:
+                col.append(value)
+            else:
+                col[pos] = value
+            self.columns[field] = _column(col)
@@ -1,30 +1,72 @@
-from typing import List, Dict, Optional
+from datetime import datetime, timezone
+from typing import List, Dict, Optional, Iterator, Tuple
 from src.config import get_supabase
+from src.dao.paging import keyset_iter
 
 def _sb():
     return get_supabase()
 
-def create_order_row(cust_id: int, total_amount: float) -> Optional[Dict]:
+def create_order_row(cust_id: int, total_amount: float, idempotency_key: Optional[str] = None) -> Optional[Dict]:
     """Insert order and return inserted row"""
     payload = {"cust_id": cust_id, "total_amount": total_amount, "status": "PLACED"}
-    _sb().table("orders").insert(payload).execute()
-    # fetch the inserted row by cust_id & status PLACED (latest)
-    resp = (
-        _sb()
-        .table("orders")
-        .select("*")
-        .eq("cust_id", cust_id)
-        .eq("status", "PLACED")
-        .order("order_id", desc=True)
-        .limit(1)
-        .execute()
-    )
+    if idempotency_key:
+        payload["idempotency_key"] = idempotency_key
+    # the insert itself returns the new row, so concurrent orders for the
+    # same customer can't be mixed up by a follow-up "latest order" select
+    resp = _sb().table("orders").insert(payload).execute()
     return resp.data[0] if resp.data else None
 
-def add_order_items(order_id: int, items: List[Dict]):
+def create_order_row_once(cust_id: int, total_amount: float, idempotency_key: str) -> Tuple[Dict, bool]:
+    """
+    Insert the order for idempotency_key unless an earlier attempt already
+    did (sql/idempotency.sql). Returns (row, created).
+    """
+    try:
+        return create_order_row(cust_id, total_amount, idempotency_key), True
+    except Exception as e:
+        if getattr(e, "code", None) != "23505":    # unique_violation: the key is taken
+            raise
+    row = get_order_by_key(idempotency_key)
+    if row is None:
+        raise RuntimeError(f"order for idempotency key {idempotency_key!r} conflicts but cannot be read")
+    return row, False
+
+def get_order_by_key(idempotency_key: str) -> Optional[Dict]:
+    resp = _sb().table("orders").select("*").eq("idempotency_key", idempotency_key).limit(1).execute()
+    return resp.data[0] if resp.data else None
+
+def create_order_rows(orders: List[Dict]) -> List[Dict]:
+    """
+    Insert many orders in one statement; each dict needs cust_id and
+    total_amount and may carry order_date (feed replays). Rows come back in
+    input order.
+    """
+    # every row sends order_date: a bulk insert sends a column missing from
+    # one row as NULL, not as the column default
+    now = datetime.now(timezone.utc).isoformat()
+    payloads = [
+        {"cust_id": o["cust_id"], "total_amount": o["total_amount"], "status": "PLACED",
+         "order_date": o.get("order_date") or now}
+        for o in orders
+    ]
+    if not payloads:
+        return []
+    resp = _sb().table("orders").insert(payloads).execute()
+    return resp.data or []
+
+def delete_orders(order_ids: List[int]) -> List[Dict]:
+    """Delete orders by id in one round trip (used to undo a failed bulk insert)."""
+    ids = list(dict.fromkeys(order_ids))
+    if not ids:
+        return []
+    resp = _sb().table("orders").delete().in_("order_id", ids).execute()
+    return resp.data or []
+
+def add_order_items(order_id: int, items: List[Dict]) -> List[Dict]:
     """
     Insert multiple items into order_items table.
     Each item must include 'prod_id', 'quantity', and 'price'.
+    Returns the inserted rows.
     """
     payloads = [
         {
@@ -35,7 +77,37 @@ def add_order_items(order_id: int, items: List[Dict]):
         }
         for item in items
     ]
-    _sb().table("order_items").insert(payloads).execute()
+    return insert_order_items(payloads)
+
+def insert_order_items(rows: List[Dict]) -> List[Dict]:
+    """
+    Insert order_items rows for any number of orders in one statement.
+    Each row must include 'order_id', 'prod_id', 'quantity' and 'price'.
+    """
+    if not rows:
+        return []
+    resp = _sb().table("order_items").insert(rows).execute()
+    return resp.data or []
+
+def get_order_items(order_ids: List[int]) -> List[Dict]:
+    """
+    Fetch the order_items rows of one or many orders in a single round trip.
+    """
+    ids = list(dict.fromkeys(order_ids))
+    if not ids:
+        return []
+    resp = _sb().table("order_items").select("*").in_("order_id", ids).order("order_id").execute()
+    return resp.data or []
+
+def get_orders_by_ids(order_ids: List[int]) -> List[Dict]:
+    """
+    Fetch many orders in one round trip (WHERE order_id IN (...)).
+    """
+    ids = list(dict.fromkeys(order_ids))
+    if not ids:
+        return []
+    resp = _sb().table("orders").select("*").in_("order_id", ids).execute()
+    return resp.data or []
 
 def get_order_by_id(order_id: int) -> Optional[Dict]:
     resp = _sb().table("orders").select("*").eq("order_id", order_id).limit(1).execute()
@@ -45,6 +117,61 @@ def list_orders_by_customer(cust_id: int) -> List[Dict]:
     resp = _sb().table("orders").select("*").eq("cust_id", cust_id).execute()
     return resp.data or []
 
-def update_order_status(order_id: int, status: str) -> Optional[Dict]:
-    _sb().table("orders").update({"status": status}).eq("order_id", order_id).execute()
-    return get_order_by_id(order_id)
+def iter_orders(batch_size: int = 500, status: Optional[str] = None,
+                after_id: Optional[int] = None, changed_since: Optional[str] = None) -> Iterator[Dict]:
+    """
+    Stream all orders (optionally of one status, only those above after_id,
+    or only those whose updated_at is at or after changed_since; see
+    sql/orders_updated_at.sql) in order_id order.
+    """
+    def base():
+        q = _sb().table("orders").select("*")
+        if after_id is not None:
+            q = q.gt("order_id", after_id)
+        if changed_since is not None:
+            q = q.gte("updated_at", changed_since)
+        return q.eq("status", status) if status else q
+    return keyset_iter(base, "order_id", batch_size)
+
+def latest_order_update() -> Optional[str]:
+    """Newest updated_at in the orders table (None when it is empty)."""
+    resp = _sb().table("orders").select("updated_at").order("updated_at", desc=True).limit(1).execute()
+    return resp.data[0]["updated_at"] if resp.data else None
+
+def revenue_between(start: str, end: str, batch_size: int = 1000) -> float:
+    """Sum of total_amount over COMPLETED orders with start <= order_date < end."""
+    def base():
+        return (_sb().table("orders").select("order_id,total_amount").eq("status", "COMPLETED")
+                .gte("order_date", start).lt("order_date", end))
+    return sum(float(o["total_amount"] or 0) for o in keyset_iter(base, "order_id", batch_size))
+
+def iter_orders_by_customer(cust_id: int, batch_size: int = 500) -> Iterator[Dict]:
+    """
+    Stream a customer's orders in order_id order, batch_size rows per round trip.
+    """
+    return keyset_iter(lambda: _sb().table("orders").select("*").eq("cust_id", cust_id), "order_id", batch_size)
+
+def update_order_status(order_id: int, status: str, expected_status: Optional[str] = None) -> Optional[Dict]:
+    """
+    Set the order status. With expected_status the update only applies if the
+    order is still in that state (returns None otherwise), so two concurrent
+    transitions can't both succeed.
+    """
+    q = _sb().table("orders").update({"status": status}).eq("order_id", order_id)
+    if expected_status is not None:
+        q = q.eq("status", expected_status)
+    resp = q.execute()
+    return resp.data[0] if resp.data else None
+
+def update_orders_status(order_ids: List[int], status: str, expected_status: Optional[str] = None) -> List[Dict]:
+    """
+    update_order_status() for many orders in one round trip. Returns the rows
+    that changed; with expected_status, orders no longer in that state are left out.
+    """
+    ids = list(dict.fromkeys(order_ids))
+    if not ids:
+        return []
+    q = _sb().table("orders").update({"status": status}).in_("order_id", ids)
+    if expected_status is not None:
+        q = q.eq("status", expected_status)
+    return q.execute().data or []
@@ -0,0 +1,61 @@
+"""
+Keyset pagination shared by the iter_* DAO functions.
+
+Pages are fetched with WHERE key > last_seen ORDER BY key LIMIT n, so each
+page costs the same however deep the scan is (no OFFSET), and at most two
+pages are held in memory. While the caller works through one page the next
+one is already being fetched on a background thread.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from src.dao import instrumentation
+
+# shared by all iterators; prefetches are short single-query tasks
+_prefetch_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="dao-prefetch")
+
+
+def keyset_iter(base_query: Callable[[], Any], key: str, batch_size: int = 500,
+                prefetch: bool = True) -> Iterator[Dict]:
+    """
+    Yield rows one by one in `key` order.
+    base_query() must return a fresh query builder with select/filters applied;
+    this function adds the keyset condition, ordering and page size.
+    Stopping early (break / close()) leaves no further pages requested.
+    """
+    for page in keyset_pages(base_query, key, batch_size, prefetch):
+        yield from page
+
+
+def keyset_pages(base_query: Callable[[], Any], key: str, batch_size: int = 500,
+                 prefetch: bool = True) -> Iterator[List[Dict]]:
+    """keyset_iter() a page at a time: one list of up to batch_size rows per round trip."""
+    if batch_size <= 0:
+        raise ValueError("batch_size must be positive")
+
+    def fetch(after: Optional[Any]) -> List[Dict]:
+        q = base_query()
+        if after is not None:
+            q = q.gt(key, after)
+        resp = q.order(key, desc=False).limit(batch_size).execute()
+        return resp.data or []
+
+    # the DAO function that built base_query has returned by now
+    fetch = instrumentation.as_dao(base_query, fetch)
+
+    page = fetch(None)
+    pending = None
+    try:
+        while page:
+            if len(page) < batch_size:
+                # short page: nothing left to prefetch
+                yield page
+                return
+            last = page[-1][key]
+            if prefetch:
+                pending = _prefetch_pool.submit(instrumentation.bind(fetch), last)
+            yield page
+            page = pending.result() if prefetch else fetch(last)
+            pending = None
+    finally:
+        if pending is not None:
+            pending.cancel()
@@ -1,20 +1,49 @@
-from typing import Optional, Dict
+from typing import Optional, Dict, Tuple
 from src.config import get_supabase
 
 def _sb():
     return get_supabase()
 
-def create_payment(order_id: int, amount: float) -> Optional[Dict]:
+def create_payment(order_id: int, amount: float, method: Optional[str] = None,
+                   idempotency_key: Optional[str] = None) -> Optional[Dict]:
     payload = {"order_id": order_id, "amount": amount, "status": "PENDING"}
-    _sb().table("payments").insert(payload).execute()
-    resp = _sb().table("payments").select("*").eq("order_id", order_id).eq("status", "PENDING").order("payment_id", desc=True).limit(1).execute()
+    if method:
+        payload["method"] = method
+    if idempotency_key:
+        payload["idempotency_key"] = idempotency_key
+    resp = _sb().table("payments").insert(payload).execute()
+    return resp.data[0] if resp.data else None
+
+def create_payment_once(order_id: int, amount: float, method: Optional[str], idempotency_key: str) -> Tuple[Dict, bool]:
+    """
+    Insert the payment for idempotency_key unless an earlier attempt already
+    did (sql/idempotency.sql). Returns (row, created).
+    """
+    try:
+        return create_payment(order_id, amount, method, idempotency_key), True
+    except Exception as e:
+        if getattr(e, "code", None) != "23505":    # unique_violation: the key is taken
+            raise
+    row = get_payment_by_key(idempotency_key)
+    if row is None:
+        raise RuntimeError(f"payment for idempotency key {idempotency_key!r} conflicts but cannot be read")
+    return row, False
+
+def get_payment_by_key(idempotency_key: str) -> Optional[Dict]:
+    resp = _sb().table("payments").select("*").eq("idempotency_key", idempotency_key).limit(1).execute()
     return resp.data[0] if resp.data else None
 
 def update_payment(payment_id: int, fields: Dict) -> Optional[Dict]:
-    _sb().table("payments").update(fields).eq("payment_id", payment_id).execute()
-    resp = _sb().table("payments").select("*").eq("payment_id", payment_id).limit(1).execute()
+    resp = _sb().table("payments").update(fields).eq("payment_id", payment_id).execute()
     return resp.data[0] if resp.data else None
 
 def get_payment_by_order(order_id: int) -> Optional[Dict]:
     resp = _sb().table("payments").select("*").eq("order_id", order_id).order("payment_id", desc=True).limit(1).execute()
     return resp.data[0] if resp.data else None
+
+def mark_payment_refunded(order_id: int) -> Optional[Dict]:
+    """Mark the latest payment of an order as REFUNDED and return it."""
+    payment = get_payment_by_order(order_id)
+    if not payment:
+        return None
+    return update_payment(payment["payment_id"], {"status": "REFUNDED"})
@@ -1,49 +1,187 @@
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Iterator
 from src.config import get_supabase
+import src.dao.cache as cache
+from src.dao.paging import keyset_iter, keyset_pages
+from src.dao.models import ColumnBatch, Product
 
 def _sb():
     return get_supabase()
  
 def create_product(name: str, sku: str, price: float, stock: int = 0, category: str | None = None) -> Optional[Dict]:
     """
-    Insert a product and return the inserted row (two-step: insert then select by unique sku).
+    Insert a product and return the inserted row (returned by the insert itself).
     """
     payload = {"name": name, "sku": sku, "price": price, "stock": stock}
     if category is not None:
         payload["category"] = category
  
-    # Insert (no select chaining)
-    _sb().table("products").insert(payload).execute()
+    resp = _sb().table("products").insert(payload).execute()
+    row = resp.data[0] if resp.data else None
+    if row:
+        cache.refresh("products", row["prod_id"], row)
+    return row
  
-    # Fetch inserted row by unique column (sku)
-    resp = _sb().table("products").select("*").eq("sku", sku).limit(1).execute()
-    return resp.data[0] if resp.data else None
+def get_product_by_id(prod_id: int, fresh: bool = False) -> Optional[Dict]:
+    """
+    Cached lookup; pass fresh=True for stock-sensitive reads that must hit the database.
+    """
+    def load():
+        resp = _sb().table("products").select("*").eq("prod_id", prod_id).limit(1).execute()
+        return resp.data[0] if resp.data else None
+    return cache.read_through("products", "prod_id", prod_id, load, fresh)
  
-def get_product_by_id(prod_id: int) -> Optional[Dict]:
-    resp = _sb().table("products").select("*").eq("prod_id", prod_id).limit(1).execute()
-    return resp.data[0] if resp.data else None
+def get_products_by_ids(prod_ids: List[int]) -> List[Dict]:
+    """
+    Fetch many products in one round trip (WHERE prod_id IN (...)).
+    """
+    ids = list(dict.fromkeys(prod_ids))
+    if not ids:
+        return []
+    resp = _sb().table("products").select("*").in_("prod_id", ids).execute()
+    return resp.data or []
  
-def get_product_by_sku(sku: str) -> Optional[Dict]:
-    resp = _sb().table("products").select("*").eq("sku", sku).limit(1).execute()
-    return resp.data[0] if resp.data else None
+def get_products_by_skus(skus: List[str]) -> List[Dict]:
+    """
+    Existence check for many SKUs in one round trip (returns the matching rows).
+    """
+    keys = list(dict.fromkeys(skus))
+    if not keys:
+        return []
+    resp = _sb().table("products").select("*").in_("sku", keys).execute()
+    return resp.data or []
+ 
+def get_product_by_sku(sku: str, fresh: bool = False) -> Optional[Dict]:
+    def load():
+        resp = _sb().table("products").select("*").eq("sku", sku).limit(1).execute()
+        return resp.data[0] if resp.data else None
+    return cache.read_through("products", "sku", sku, load, fresh)
  
 def update_product(prod_id: int, fields: Dict) -> Optional[Dict]:
     """
-    Update and then return the updated row (two-step).
+    Update and return the updated row (single round trip).
+    """
+    resp = _sb().table("products").update(fields).eq("prod_id", prod_id).execute()
+    row = resp.data[0] if resp.data else None
+    cache.refresh("products", prod_id, row)
+    return row
+ 
+def upsert_products(rows: List[Dict]) -> List[Dict]:
+    """
+    Insert-or-update many products by sku in one round trip; returns the written rows.
     """
-    _sb().table("products").update(fields).eq("prod_id", prod_id).execute()
-    resp = _sb().table("products").select("*").eq("prod_id", prod_id).limit(1).execute()
-    return resp.data[0] if resp.data else None
+    if not rows:
+        return []
+    resp = _sb().table("products").upsert(rows, on_conflict="sku").execute()
+    written = resp.data or []
+    for row in written:
+        cache.refresh("products", row["prod_id"], row)
+    return written
+ 
+def compare_and_set_stock(prod_id: int, expected: int, new_stock: int) -> Optional[Dict]:
+    """
+    Conditional update: set stock only if it still equals `expected`.
+    Returns the updated row, or None if another writer got there first.
+    """
+    resp = (
+        _sb()
+        .table("products")
+        .update({"stock": new_stock})
+        .eq("prod_id", prod_id)
+        .eq("stock", expected)
+        .execute()
+    )
+    row = resp.data[0] if resp.data else None
+    # on a lost race the cached copy is stale too
+    cache.refresh("products", prod_id, row)
+    return row
+ 
+def adjust_stock(deltas: Dict[int, int]) -> List[Dict]:
+    """
+    Apply signed stock deltas atomically through the adjust_stock SQL function
+    (sql/adjust_stock.sql). Either every delta is applied or none is.
+    """
+    payload = [{"prod_id": pid, "delta": d} for pid, d in deltas.items()]
+    resp = _sb().rpc("adjust_stock", {"p_deltas": payload}).execute()
+    rows = resp.data or []
+    for row in rows:
+        cache.refresh("products", row["prod_id"], row)
+    return rows
+ 
+def adjust_stock_once(key: str, deltas: Dict[int, int]) -> Dict:
+    """
+    adjust_stock() applied at most once per key (sql/idempotency.sql).
+    Returns {"applied": bool, "rows": [...]}: applied is False when an
+    earlier call with this key already made the change.
+    """
+    payload = [{"prod_id": pid, "delta": d} for pid, d in deltas.items()]
+    resp = _sb().rpc("adjust_stock_once", {"p_key": key, "p_deltas": payload}).execute()
+    result = resp.data or {"applied": False, "rows": []}
+    for row in result["rows"]:
+        cache.refresh("products", row["prod_id"], row)
+    return result
  
 def delete_product(prod_id: int) -> Optional[Dict]:
-    # fetch row before delete (so we can return it)
-    resp_before = _sb().table("products").select("*").eq("prod_id", prod_id).limit(1).execute()
-    row = resp_before.data[0] if resp_before.data else None
-    _sb().table("products").delete().eq("prod_id", prod_id).execute()
+    # delete returns the removed row
+    resp = _sb().table("products").delete().eq("prod_id", prod_id).execute()
+    row = resp.data[0] if resp.data else None
+    cache.refresh("products", prod_id, row, store=False)
     return row
  
-def list_products(limit: int = 100, category: str | None = None) -> List[Dict]:
-    q = _sb().table("products").select("*").order("prod_id", desc=False).limit(limit)
+def list_products(limit: int = 100, category: str | None = None, offset: int = 0) -> List[Dict]:
+    q = _sb().table("products").select("*").order("prod_id", desc=False).range(offset, offset + limit - 1)
+    if category:
+        q = q.eq("category", category)
+    resp = q.execute()
+    return resp.data or []
+ 
+def iter_products(batch_size: int = 500, category: str | None = None,
+                  max_stock: int | None = None) -> Iterator[Dict]:
+    """
+    Stream every product (optionally only those with stock <= max_stock) in
+    prod_id order, batch_size rows per round trip.
+    """
+    def base():
+        q = _sb().table("products").select("*")
+        if category:
+            q = q.eq("category", category)
+        return q.lte("stock", max_stock) if max_stock is not None else q
+    return keyset_iter(base, "prod_id", batch_size)
+ 
+def iter_product_batches(batch_size: int = 1000, category: str | None = None,
+                         changed_since: str | None = None, after_id: int | None = None) -> Iterator[ColumnBatch]:
+    """
+    Stream the catalog as columnar batches (one per round trip) for bulk
+    readers that hold many rows. changed_since limits it to rows whose
+    updated_at is at or after that timestamp (sql/products_updated_at.sql),
+    after_id to rows with a higher prod_id.
+    """
+    def base():
+        q = _sb().table("products").select("*")
+        if category:
+            q = q.eq("category", category)
+        if after_id is not None:
+            q = q.gt("prod_id", after_id)
+        return q.gte("updated_at", changed_since) if changed_since is not None else q
+    for page in keyset_pages(base, "prod_id", batch_size):
+        yield ColumnBatch.from_rows(page, Product.FIELDS)
+ 
+def _escape_like(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+ 
+def search_products(name_substr: str, limit: int = 100, offset: int = 0, category: str | None = None) -> List[Dict]:
+    """
+    Case-insensitive substring search on name, evaluated by the database
+    (ILIKE; backed by the trigram index from sql/product_search.sql).
+    Paginate with offset/limit; results are ordered by prod_id.
+    """
+    q = (
+        _sb()
+        .table("products")
+        .select("*")
+        .ilike("name", f"%{_escape_like(name_substr)}%")
+        .order("prod_id", desc=False)
+        .range(offset, offset + limit - 1)
+    )
     if category:
         q = q.eq("category", category)
     resp = q.execute()
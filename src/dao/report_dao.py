@@ -0,0 +1,23 @@
+from typing import List, Dict
+from src.config import get_supabase
+
+def _sb():
+    return get_supabase()
+
+# All report queries are SQL functions over materialized views (sql/reports.sql),
+# called in a single rpc round trip; rows already include names.
+
+def top_selling_products(limit: int = 5) -> List[Dict]:
+    resp = _sb().rpc("report_top_selling_products", {"p_limit": limit}).execute()
+    return resp.data or []
+
+def orders_per_customer() -> List[Dict]:
+    resp = _sb().rpc("report_orders_per_customer", {}).execute()
+    return resp.data or []
+
+def customers_more_than_n_orders(n: int = 2) -> List[Dict]:
+    resp = _sb().rpc("report_customers_more_than_n_orders", {"p_n": n}).execute()
+    return resp.data or []
+
+def refresh_views() -> None:
+    _sb().rpc("refresh_report_views", {}).execute()
@@ -0,0 +1,71 @@
+"""
+Low-stock tables (sql/low_stock.sql): per-product / per-category reorder
+thresholds, the reorder suggestion queue, and the server-side low-stock
+filter.
+"""
+from typing import Dict, Iterator, List, Optional
+from src.config import get_supabase
+
+def _sb():
+    return get_supabase()
+
+def list_thresholds() -> List[Dict]:
+    resp = _sb().table("stock_thresholds").select("*").execute()
+    return resp.data or []
+
+def upsert_threshold(threshold: int, prod_id: Optional[int] = None, category: Optional[str] = None,
+                     reorder_qty: Optional[int] = None) -> Optional[Dict]:
+    """Set the threshold of one product or one category (exactly one of prod_id / category)."""
+    key = "prod_id" if prod_id is not None else "category"
+    payload = {key: prod_id if prod_id is not None else category, "threshold": threshold,
+               "reorder_qty": reorder_qty}
+    resp = _sb().table("stock_thresholds").upsert(payload, on_conflict=key).execute()
+    return resp.data[0] if resp.data else None
+
+def delete_threshold(prod_id: Optional[int] = None, category: Optional[str] = None) -> Optional[Dict]:
+    q = _sb().table("stock_thresholds").delete()
+    q = q.eq("prod_id", prod_id) if prod_id is not None else q.eq("category", category)
+    resp = q.execute()
+    return resp.data[0] if resp.data else None
+
+def iter_low_stock(default_threshold: int, batch_size: int = 500) -> Iterator[Dict]:
+    """
+    Stream products at or below their threshold, in prod_id order, with
+    'threshold' and 'reorder_qty' columns added. Filtering runs on the server.
+    """
+    after = 0
+    while True:
+        resp = _sb().rpc("low_stock_products", {
+            "p_default": default_threshold, "p_limit": batch_size, "p_after": after,
+        }).execute()
+        rows = resp.data or []
+        yield from rows
+        if len(rows) < batch_size:
+            return
+        after = rows[-1]["prod_id"]
+
+def get_open_suggestion(prod_id: int) -> Optional[Dict]:
+    resp = (_sb().table("reorder_suggestions").select("*")
+            .eq("prod_id", prod_id).eq("status", "OPEN").limit(1).execute())
+    return resp.data[0] if resp.data else None
+
+def create_suggestion(prod_id: int, stock: int, threshold: int, suggested_qty: int) -> Optional[Dict]:
+    payload = {"prod_id": prod_id, "stock": stock, "threshold": threshold,
+               "suggested_qty": suggested_qty, "status": "OPEN"}
+    resp = _sb().table("reorder_suggestions").insert(payload).execute()
+    return resp.data[0] if resp.data else None
+
+def update_suggestion(suggestion_id: int, fields: Dict, expected_status: Optional[str] = None) -> Optional[Dict]:
+    """Update a suggestion; with expected_status only if it is still in that state."""
+    q = _sb().table("reorder_suggestions").update(fields).eq("suggestion_id", suggestion_id)
+    if expected_status is not None:
+        q = q.eq("status", expected_status)
+    resp = q.execute()
+    return resp.data[0] if resp.data else None
+
+def list_suggestions(status: Optional[str] = "OPEN", limit: int = 100) -> List[Dict]:
+    q = _sb().table("reorder_suggestions").select("*")
+    if status:
+        q = q.eq("status", status)
+    resp = q.order("suggestion_id").limit(limit).execute()
+    return resp.data or []
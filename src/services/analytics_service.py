@@ -0,0 +1,480 @@
+# src/services/analytics_service.py
+"""
+Offline analytics over a columnar snapshot of the order history.
+
+report_service answers each question with fresh queries against the live
+tables. This module keeps a local copy of orders and order_items as NumPy
+columns on disk and answers the same questions, plus revenue by period and
+basket metrics, as vectorized group-bys over memory-mapped arrays:
+
+    <dir>/meta.json                 row counts, max order_id, status codes
+    <dir>/orders.<column>.bin       order_id, cust_id, order_date, total_amount, status
+    <dir>/items.<column>.bin        order_id, prod_id, quantity, price
+    <dir>/products.<column>.npy     prod_id, name (the whole catalog)
+    <dir>/customers.<column>.npy    cust_id, name (customers seen in orders)
+
+The .bin files are raw arrays that only grow. meta.json is written last,
+so a crash mid-refresh leaves extra bytes that the next refresh truncates.
+
+refresh() is incremental. It appends orders above the highest order_id
+already loaded, with their items, and re-reads the orders the snapshot
+still holds as PLACED, because PLACED is the only status an order leaves
+(payment -> COMPLETED, cancel -> CANCELLED). An order that is gone by then
+(a rolled-back placement) is marked DELETED. Items written after their
+order row was loaded are fetched during that re-read. The product catalog
+is reloaded in full on each refresh. Customer names are fetched once, for
+customers not seen before; a rename shows up after a full refresh.
+
+Results follow report_service: orders that are CANCELLED (or DELETED) are
+excluded, and items of products or orders of customers that no longer
+exist are dropped. Revenue counts COMPLETED orders by the date written in
+order_date, like sales_aggregates. Needs numpy.
+"""
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Set
+
+try:
+    import fcntl
+except ImportError:  # Windows: refreshes from several processes are not serialized
+    fcntl = None
+
+import src.config as config
+import src.dao.order_dao as order_dao
+import src.dao.product_dao as product_dao
+import src.dao.customer_dao as customer_dao
+
+FORMAT = 1
+ORDER_COLUMNS = {"order_id": "int64", "cust_id": "int64", "order_date": "int64",   # seconds, wall clock
+                 "total_amount": "float64", "status": "int8"}
+ITEM_COLUMNS = {"order_id": "int64", "prod_id": "int64", "quantity": "int64", "price": "float64"}
+# status codes are positions in meta["statuses"]; statuses not listed are appended
+STATUSES = ["PLACED", "COMPLETED", "CANCELLED", "DELETED"]
+PLACED, COMPLETED, CANCELLED, DELETED = range(4)
+PERIODS = {"day": "D", "week": "D", "month": "M", "year": "Y"}
+_MISSING = -1   # stands in for a NULL cust_id/prod_id; never matches a dimension row
+
+
+class AnalyticsError(Exception):
+    pass
+
+
+def _numpy():
+    try:
+        import numpy
+        return numpy
+    except ImportError:
+        raise AnalyticsError("The analytics engine needs numpy (pip install numpy)")
+
+
+class Snapshot:
+    def __init__(self, path: Optional[str] = None, batch_size: int = 500):
+        self.np = _numpy()
+        self.path = path or config.ANALYTICS_DIR
+        self.batch_size = batch_size
+        self._lock = threading.RLock()
+        self.meta: Dict = {}
+        self.orders: Dict = {}
+        self.items: Dict = {}
+        self.products: Dict = {}
+        self.customers: Dict = {}
+        self._derived: Optional[Dict] = None
+        self._open()
+
+    # ---- files ----
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _open(self):
+        """(Re)map the columns at the row counts recorded in meta.json."""
+        np = self.np
+        try:
+            with open(self._file("meta.json"), encoding="utf-8") as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            meta = {"format": FORMAT, "orders": 0, "items": 0, "max_order_id": None,
+                    "statuses": list(STATUSES), "built_at": None, "refreshed_at": None}
+        if meta.get("format") != FORMAT:
+            raise AnalyticsError(f"{self.path} holds a snapshot in another format; run a full refresh")
+        self.meta = meta
+        self.orders = {c: self._map(f"orders.{c}.bin", t, meta["orders"]) for c, t in ORDER_COLUMNS.items()}
+        self.items = {c: self._map(f"items.{c}.bin", t, meta["items"]) for c, t in ITEM_COLUMNS.items()}
+        for dim, key in (("products", "prod_id"), ("customers", "cust_id")):
+            cols = {}
+            for c, empty in ((key, "int64"), ("name", "U1")):
+                path = self._file(f"{dim}.{c}.npy")
+                cols[c] = np.load(path, mmap_mode="r") if os.path.exists(path) else np.zeros(0, empty)
+            setattr(self, dim, cols)
+        self._derived = None
+
+    def _map(self, name: str, dtype: str, rows: int):
+        if not rows:
+            return self.np.zeros(0, dtype)
+        return self.np.memmap(self._file(name), dtype=dtype, mode="r", shape=(rows,))
+
+    def _append(self, table: str, columns: Dict, counts: Dict):
+        for c, values in columns.items():
+            with open(self._file(f"{table}.{c}.bin"), "a+b") as f:
+                f.truncate(counts[table] * values.dtype.itemsize)   # drop what an interrupted refresh left
+                f.write(values.tobytes())
+        counts[table] += len(columns["order_id"])
+
+    def _save(self, name: str, values):
+        tmp = self._file(name + ".tmp")
+        with open(tmp, "wb") as f:
+            self.np.save(f, values)
+        os.replace(tmp, self._file(name))   # readers keep their mapping of the old file
+
+    def _write_meta(self, meta: Dict):
+        tmp = self._file("meta.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp, self._file("meta.json"))
+
+    @contextmanager
+    def _file_lock(self):
+        """Serialize refreshes of one directory across processes."""
+        os.makedirs(self.path, exist_ok=True)
+        with open(self._file("lock"), "w") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            yield
+
+    # ---- loading ----
+
+    def refresh(self, full: bool = False) -> Dict:
+        """
+        Bring the snapshot up to date; `full` drops it and loads everything
+        again. Returns {"orders", "items", "status_changes", "rows",
+        "max_order_id", "ms"}: orders and items appended, orders whose
+        status changed, and the totals afterwards.
+        """
+        start = time.perf_counter()
+        with self._lock, self._file_lock():
+            if full:
+                for name in os.listdir(self.path):
+                    if name.endswith((".bin", ".npy", ".json")):
+                        os.remove(self._file(name))
+            self._open()   # another process may have refreshed since
+            meta = dict(self.meta, statuses=list(self.meta["statuses"]))
+            counts = {"orders": meta["orders"], "items": meta["items"]}
+            new_customers: Set[int] = set()
+            changed = self._recheck_placed(meta, counts)
+            for page in self._new_orders(meta["max_order_id"]):
+                self._append_orders(page, meta, counts)
+                new_customers.update(r["cust_id"] for r in page if r.get("cust_id") is not None)
+            now = datetime.now(timezone.utc).isoformat()
+            meta.update(counts, refreshed_at=now, built_at=meta["built_at"] or now)
+            self._write_meta(meta)
+            self._load_products()
+            self._load_customers(new_customers)
+            before = self.meta
+            self._open()
+        return {"orders": meta["orders"] - before["orders"], "items": meta["items"] - before["items"],
+                "status_changes": changed, "rows": counts, "max_order_id": meta["max_order_id"],
+                "ms": round((time.perf_counter() - start) * 1000, 1)}
+
+    def _code(self, meta: Dict, status: Optional[str]) -> int:
+        statuses = meta["statuses"]
+        if status not in statuses:
+            statuses.append(status)
+        return statuses.index(status)
+
+    def _new_orders(self, after_id: Optional[int]):
+        page: List[Dict] = []
+        for row in order_dao.iter_orders(self.batch_size, after_id=after_id):
+            page.append(row)
+            if len(page) == self.batch_size:
+                yield page
+                page = []
+        if page:
+            yield page
+
+    def _append_orders(self, rows: List[Dict], meta: Dict, counts: Dict):
+        np = self.np
+        items = order_dao.get_order_items([r["order_id"] for r in rows])
+        self._append("orders", {
+            "order_id": np.array([r["order_id"] for r in rows], "int64"),
+            "cust_id": np.array([_key(r.get("cust_id")) for r in rows], "int64"),
+            "order_date": _seconds(np, [r.get("order_date") for r in rows]),
+            "total_amount": np.array([float(r.get("total_amount") or 0) for r in rows], "float64"),
+            "status": np.array([self._code(meta, r.get("status")) for r in rows], "int8"),
+        }, counts)
+        self._append_items(items, counts)
+        meta["max_order_id"] = rows[-1]["order_id"]
+
+    def _append_items(self, items: List[Dict], counts: Dict):
+        if not items:
+            return
+        np = self.np
+        self._append("items", {
+            "order_id": np.array([it["order_id"] for it in items], "int64"),
+            "prod_id": np.array([_key(it.get("prod_id")) for it in items], "int64"),
+            "quantity": np.array([it.get("quantity") or 0 for it in items], "int64"),
+            "price": np.array([float(it.get("price") or 0) for it in items], "float64"),
+        }, counts)
+
+    def _recheck_placed(self, meta: Dict, counts: Dict) -> int:
+        """Re-read the orders held as PLACED; write status changes in place. Returns how many changed."""
+        np = self.np
+        positions = np.flatnonzero(self.orders["status"] == PLACED)
+        if not len(positions):
+            return 0
+        ids = self.orders["order_id"][positions]
+        lines = self._lines_per_order()
+        moved_pos: List[int] = []
+        moved_code: List[int] = []
+        for start in range(0, len(ids), self.batch_size):
+            chunk = list(zip(ids[start:start + self.batch_size].tolist(),
+                             positions[start:start + self.batch_size].tolist()))
+            current = {r["order_id"]: r for r in order_dao.get_orders_by_ids([oid for oid, _ in chunk])}
+            for oid, pos in chunk:
+                row = current.get(oid)
+                code = DELETED if row is None else self._code(meta, row.get("status"))
+                if code != PLACED:
+                    moved_pos.append(pos)
+                    moved_code.append(code)
+            # order rows are written before their items; pick up items that were not there yet
+            itemless = [oid for oid, pos in chunk if oid in current and not lines[pos]]
+            if itemless:
+                self._append_items(order_dao.get_order_items(itemless), counts)
+        if moved_pos:
+            status = np.memmap(self._file("orders.status.bin"), dtype="int8", mode="r+", shape=(meta["orders"],))
+            status[np.array(moved_pos)] = np.array(moved_code, "int8")
+            status.flush()
+            del status
+        return len(moved_pos)
+
+    def _load_products(self):
+        np = self.np
+        ids: List[int] = []
+        names: List[str] = []
+        for batch in product_dao.iter_product_batches(1000):
+            ids.extend(batch.column("prod_id"))
+            names.extend(n or "" for n in batch.column("name"))
+        self._save("products.prod_id.npy", np.array(ids, "int64"))
+        self._save("products.name.npy", np.array(names, str) if names else np.zeros(0, "U1"))
+
+    def _load_customers(self, cust_ids: Set[int]):
+        np = self.np
+        known = self.customers["cust_id"]
+        wanted = np.setdiff1d(np.array(sorted(cust_ids), "int64"), known)
+        if not len(wanted):
+            return
+        rows: List[Dict] = []
+        for start in range(0, len(wanted), self.batch_size):
+            rows.extend(customer_dao.get_customers_by_ids(wanted[start:start + self.batch_size].tolist()))
+        ids = np.concatenate([known, np.array([r["cust_id"] for r in rows], "int64")])
+        names = np.concatenate([np.asarray(self.customers["name"], str),
+                                np.array([r.get("name") or "" for r in rows], str)])
+        order = np.argsort(ids, kind="stable")
+        self._save("customers.cust_id.npy", ids[order])
+        self._save("customers.name.npy", names[order])
+
+    # ---- shared intermediates (recomputed after each refresh) ----
+
+    def _lines_per_order(self):
+        return self.np.bincount(self._d()["pos"], minlength=len(self.orders["order_id"]))
+
+    def _d(self) -> Dict:
+        if self._derived is None:
+            np = self.np
+            status = self.orders["status"]
+            pos = np.searchsorted(self.orders["order_id"], self.items["order_id"])
+            live = (status != CANCELLED) & (status != DELETED)
+            self._derived = {"pos": pos, "live": live, "item_live": live[pos]}
+        return self._derived
+
+    def _lookup(self, ids, keys):
+        """Positions of keys in the sorted ids array, and which keys were found."""
+        np = self.np
+        if not len(ids):
+            return np.zeros(len(keys), "int64"), np.zeros(len(keys), bool)
+        idx = np.minimum(np.searchsorted(ids, keys), len(ids) - 1)
+        return idx, ids[idx] == keys
+
+    def _names(self, dim: Dict, key: str, values) -> List[Optional[str]]:
+        if not len(dim[key]):
+            return [None] * len(values)
+        idx, found = self._lookup(dim[key], values)
+        names = dim["name"][idx].tolist()
+        return [n if ok else None for n, ok in zip(names, found.tolist())]
+
+    # ---- questions ----
+
+    def top_selling_products(self, limit: int = 5) -> List[Dict]:
+        """Best sellers by units: prod_id, product_name, total_qty, total_revenue, order_count."""
+        np = self.np
+        with self._lock:
+            d, it = self._d(), self.items
+            keep = d["item_live"] & self._lookup(self.products["prod_id"], it["prod_id"])[1]
+            if not keep.any():
+                return []
+            qty = it["quantity"][keep]
+            ids, inv = np.unique(it["prod_id"][keep], return_inverse=True)
+            total_qty = np.bincount(inv, weights=qty, minlength=len(ids)).astype("int64")
+            revenue = np.bincount(inv, weights=qty * it["price"][keep], minlength=len(ids))
+            # distinct (product, order) pairs per product
+            n_orders = len(self.orders["order_id"])
+            pairs = np.unique(inv.astype("int64") * n_orders + d["pos"][keep])
+            order_count = np.bincount(pairs // n_orders, minlength=len(ids))
+            top = np.lexsort((ids, -total_qty))[:limit]
+            names = self._names(self.products, "prod_id", ids[top])
+            return [{"prod_id": int(ids[i]), "product_name": name, "total_qty": int(total_qty[i]),
+                     "total_revenue": round(float(revenue[i]), 2), "order_count": int(order_count[i])}
+                    for i, name in zip(top.tolist(), names)]
+
+    def revenue_by_period(self, period: str = "month", since: Optional[str] = None,
+                          until: Optional[str] = None) -> List[Dict]:
+        """
+        Revenue and order count of COMPLETED orders per day, week (starting
+        Monday), month or year, oldest first; since/until bound order_date
+        (inclusive / exclusive, ISO dates).
+        """
+        np = self.np
+        if period not in PERIODS:
+            raise AnalyticsError(f"period must be one of {', '.join(PERIODS)}")
+        with self._lock:
+            dates = self.orders["order_date"]
+            keep = (self.orders["status"] == COMPLETED) & (dates != np.iinfo("int64").min)
+            if since:
+                keep &= dates >= _seconds(np, [since])[0]
+            if until:
+                keep &= dates < _seconds(np, [until])[0]
+            buckets = dates[keep].astype("datetime64[s]").astype(f"datetime64[{PERIODS[period]}]")
+            if period == "week":
+                days = buckets.astype("int64")
+                buckets = (days - (days + 3) % 7).astype("datetime64[D]")   # 1970-01-01 was a Thursday
+            keys, inv = np.unique(buckets, return_inverse=True)
+            revenue = np.bincount(inv, weights=self.orders["total_amount"][keep], minlength=len(keys))
+            orders = np.bincount(inv, minlength=len(keys))
+            return [{"period": label, "revenue": round(r, 2), "orders": n}
+                    for label, r, n in zip(np.datetime_as_string(keys).tolist(), revenue.tolist(), orders.tolist())]
+
+    def _customer_totals(self):
+        np = self.np
+        o = self.orders
+        keep = self._d()["live"] & self._lookup(self.customers["cust_id"], o["cust_id"])[1]
+        ids, inv = np.unique(o["cust_id"][keep], return_inverse=True)
+        orders = np.bincount(inv, minlength=len(ids))
+        spent = np.bincount(inv, weights=o["total_amount"][keep], minlength=len(ids))
+        return ids, orders, spent
+
+    def _customer_rows(self, ids, orders, spent) -> List[Dict]:
+        top = self.np.lexsort((ids, -orders))
+        names = self._names(self.customers, "cust_id", ids[top])
+        return [{"cust_id": int(ids[i]), "customer_name": name, "total_orders": int(orders[i]),
+                 "total_spent": round(float(spent[i]), 2)}
+                for i, name in zip(top.tolist(), names)]
+
+    def orders_per_customer(self) -> List[Dict]:
+        """cust_id, customer_name, total_orders, total_spent for every customer with orders."""
+        with self._lock:
+            return self._customer_rows(*self._customer_totals())
+
+    def customers_more_than_n_orders(self, n: int = 2) -> List[Dict]:
+        with self._lock:
+            ids, orders, spent = self._customer_totals()
+            keep = orders > n
+            return self._customer_rows(ids[keep], orders[keep], spent[keep])
+
+    def basket_metrics(self, top_pairs: int = 5) -> Dict:
+        """
+        Size and value of baskets (orders not CANCELLED): average/median/p90
+        value, average lines and units, orders by line count, and the product
+        pairs found together in the most orders.
+        """
+        np = self.np
+        with self._lock:
+            d, it = self._d(), self.items
+            live = np.flatnonzero(d["live"])
+            if not len(live):
+                return {"orders": 0}
+            n_orders = len(self.orders["order_id"])
+            pos = d["pos"][d["item_live"]]
+            lines = np.bincount(pos, minlength=n_orders)[live]
+            units = np.bincount(pos, weights=it["quantity"][d["item_live"]], minlength=n_orders)[live]
+            values = self.orders["total_amount"][live]
+            median, p90 = np.percentile(values, [50, 90]).tolist()
+            return {
+                "orders": len(live),
+                "avg_value": round(float(values.mean()), 2),
+                "median_value": round(median, 2),
+                "p90_value": round(p90, 2),
+                "avg_lines": round(float(lines.mean()), 3),
+                "avg_units": round(float(units.mean()), 3),
+                "orders_by_lines": {str(k): v for k, v in enumerate(np.bincount(lines).tolist()) if v},
+                "top_pairs": self._pairs(pos, it["prod_id"][d["item_live"]], top_pairs),
+            }
+
+    def _pairs(self, pos, prod, limit: int) -> List[Dict]:
+        np = self.np
+        keep = prod != _MISSING
+        pos, prod = pos[keep], prod[keep]
+        order = np.lexsort((prod, pos))
+        pos, prod = pos[order], prod[order]
+        # one entry per (order, product): repeated lines of a product form no pair
+        first = np.ones(len(pos), bool)
+        first[1:] = (pos[1:] != pos[:-1]) | (prod[1:] != prod[:-1])
+        pos, prod = pos[first], prod[first]
+        if limit <= 0 or len(prod) < 2:
+            return []
+        width = int(prod.max()) + 1
+        keys = []
+        # pair each line with the ones `gap` places after it in the same order;
+        # lines are sorted by order, so once no order has a gap-th partner, none has more
+        gap = 1
+        while gap < len(pos):
+            same = pos[:-gap] == pos[gap:]
+            if not same.any():
+                break
+            keys.append(prod[:-gap][same] * width + prod[gap:][same])
+            gap += 1
+        if not keys:
+            return []
+        uniq, counts = np.unique(np.concatenate(keys), return_counts=True)
+        top = np.lexsort((uniq, -counts))[:limit]
+        a, b = uniq[top] // width, uniq[top] % width
+        names_a = self._names(self.products, "prod_id", a)
+        names_b = self._names(self.products, "prod_id", b)
+        return [{"prod_ids": [x, y], "names": [na, nb], "orders": c}
+                for x, y, na, nb, c in zip(a.tolist(), b.tolist(), names_a, names_b, counts[top].tolist())]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            meta = self.meta
+            return {"path": os.path.abspath(self.path), "orders": meta["orders"], "items": meta["items"],
+                    "products": len(self.products["prod_id"]), "customers": len(self.customers["cust_id"]),
+                    "max_order_id": meta["max_order_id"], "built_at": meta["built_at"],
+                    "refreshed_at": meta["refreshed_at"]}
+
+
+def _key(value) -> int:
+    return _MISSING if value is None else value
+
+
+def _seconds(np, values: List) -> "np.ndarray":
+    """ISO timestamps -> int64 seconds of their wall-clock time (the offset is ignored, as order_date[:10] does)."""
+    text = [str(v)[:19].replace(" ", "T") if v else "NaT" for v in values]
+    return np.array(text, dtype="datetime64[s]").astype("int64")
+
+
+_snapshots: Dict[str, Snapshot] = {}
+_snapshots_lock = threading.Lock()
+
+
+def open_snapshot(path: Optional[str] = None, refresh: bool = True) -> Snapshot:
+    """The process's Snapshot of `path` (default config.ANALYTICS_DIR), refreshed unless refresh=False."""
+    key = os.path.abspath(path or config.ANALYTICS_DIR)
+    with _snapshots_lock:
+        snap = _snapshots.get(key)
+        if snap is None:
+            snap = _snapshots[key] = Snapshot(key)
+    if refresh:
+        snap.refresh()
+    return snap
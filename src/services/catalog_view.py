@@ -0,0 +1,218 @@
+# src/services/catalog_view.py
+"""
+Product catalog held in memory for UIs (app.py).
+
+The catalog is loaded once into a ColumnBatch (src/dao/models.py). After
+that, refresh() fetches only what changed: rows whose updated_at is at or
+after the newest one already held (sql/products_updated_at.sql), or, on
+a schema without that column, rows above the highest prod_id seen. Writes
+made by this process arrive at once through the "products_changed" and
+"stock_changed" events. Deletes made by other processes show up at the
+next full reload (every `full_reload_after` seconds).
+
+Pages are views over the shared columns. They are cached per (category,
+page, page size) until the catalog changes.
+"""
+import time
+import logging
+import threading
+import weakref
+from typing import Dict, List, Optional, Set
+import src.config as config
+import src.dao.product_dao as product_dao
+from src.dao.models import ColumnBatch, Product
+from src.services import events
+
+log = logging.getLogger(__name__)
+
+class CatalogView:
+    def __init__(self, batch_size: int = 1000, full_reload_after: Optional[float] = None):
+        self.batch_size = batch_size
+        self.full_reload_after = config.CATALOG_FULL_RELOAD if full_reload_after is None else full_reload_after
+        self._lock = threading.RLock()
+        self._batch = ColumnBatch.empty(Product.FIELDS)
+        self._pos: Dict[int, int] = {}     # prod_id -> row position in _batch
+        self._dead: Set[int] = set()       # positions of deleted rows (dropped at the next full reload)
+        self._in_order = True              # positions follow prod_id order
+        self._version = 0
+        self._pages: Dict[tuple, ColumnBatch] = {}
+        self._orders: Dict[Optional[str], List[int]] = {}
+        self._mode = "updated_at"          # or "prod_id" when the column is missing
+        self._watermark: Optional[str] = None
+        self._max_id: Optional[int] = None
+        self._loaded_at: Optional[float] = None
+        self.refreshed_at: Optional[float] = None
+        self.last_refresh: Dict = {}
+        self._subscribe()
+
+    def _subscribe(self):
+        # handlers hold only a weak reference, so a dropped view (ended UI session) unsubscribes itself
+        ref = weakref.ref(self)
+
+        def on_products(rows, deleted=(), **_):
+            view = ref()
+            if view is not None:
+                view.apply(rows, deleted)
+
+        def on_stock(changes, **_):
+            view = ref()
+            if view is not None:
+                view.apply([c["product"] for c in changes])
+
+        handlers = {"products_changed": on_products, "stock_changed": on_stock}
+        for event, handler in handlers.items():
+            events.subscribe(event, handler)
+        weakref.finalize(self, _unsubscribe, handlers)
+
+    # ---- loading ----
+
+    def refresh(self, full: bool = False) -> Dict:
+        """
+        Bring the view up to date: a full load the first time, when `full`
+        is set, or when the last full load is older than full_reload_after;
+        otherwise only changed rows. Returns {"mode", "rows", "ms", "at"}.
+        """
+        start = time.perf_counter()
+        full = full or self._loaded_at is None or time.monotonic() - self._loaded_at >= self.full_reload_after
+        if full:
+            rows = self._load_all()
+            mode = "full"
+        else:
+            rows = self._load_changes()
+            mode = self._mode
+        self.refreshed_at = time.time()
+        self.last_refresh = {"mode": mode, "rows": rows, "ms": round((time.perf_counter() - start) * 1000, 1),
+                             "at": self.refreshed_at}
+        return self.last_refresh
+
+    def _load_all(self) -> int:
+        batch = ColumnBatch.empty(Product.FIELDS)
+        for page in product_dao.iter_product_batches(self.batch_size):
+            batch.extend(page)
+        ids = batch.column("prod_id")
+        stamps = [s for s in batch.column("updated_at") if s is not None]
+        with self._lock:
+            self._batch = batch
+            self._pos = {pid: i for i, pid in enumerate(ids)}
+            self._dead = set()
+            self._in_order = True
+            self._max_id = max(ids) if len(ids) else None
+            # an empty catalog tells nothing about the column; try updated_at first
+            self._mode = "updated_at" if stamps or not len(ids) else "prod_id"
+            self._watermark = max(stamps) if stamps else None
+            self._loaded_at = time.monotonic()
+            self._changed()
+        return len(batch)
+
+    def _load_changes(self) -> int:
+        if self._mode == "updated_at":
+            try:
+                pages = list(product_dao.iter_product_batches(self.batch_size, changed_since=self._watermark)
+                             if self._watermark is not None else product_dao.iter_product_batches(self.batch_size))
+            except Exception as e:
+                log.info("products.updated_at unavailable, refreshing by prod_id: %s", e)
+                self._mode = "prod_id"
+                return self._load_changes()
+        else:
+            pages = list(product_dao.iter_product_batches(self.batch_size, after_id=self._max_id))
+        n = 0
+        with self._lock:
+            for page in pages:
+                for row in page.rows():
+                    self._upsert(row)
+                    n += 1
+                    stamp = row.get("updated_at")
+                    if stamp is not None and (self._watermark is None or stamp > self._watermark):
+                        self._watermark = stamp
+            if n:
+                self._changed()
+        return n
+
+    # ---- changes pushed by this process ----
+
+    def apply(self, rows: List[Dict], deleted=()):
+        """Merge created/updated rows and drop deleted prod_ids (event handlers call this)."""
+        with self._lock:
+            for row in rows:
+                self._upsert(row)
+            for prod_id in deleted:
+                pos = self._pos.pop(prod_id, None)
+                if pos is not None:
+                    self._dead.add(pos)
+            if rows or deleted:
+                self._changed()
+
+    def _upsert(self, row: Dict):
+        # the watermark only moves on fetched rows: advancing it from our own writes
+        # could skip rows other processes committed just before them
+        prod_id = row["prod_id"]
+        pos = self._pos.get(prod_id)
+        if pos is not None:
+            self._batch.set(pos, row)
+            return
+        if self._max_id is not None and prod_id < self._max_id:
+            self._in_order = False
+        self._pos[prod_id] = self._batch.append(row)
+        self._max_id = prod_id if self._max_id is None else max(self._max_id, prod_id)
+
+    def _changed(self):
+        self._version += 1
+        self._pages = {}
+        self._orders = {}
+
+    # ---- reading ----
+
+    def _order(self, category: Optional[str]) -> List[int]:
+        order = self._orders.get(category)
+        if order is None:
+            cats = self._batch.column("category")
+            dead = self._dead
+            order = [i for i in range(len(self._batch))
+                     if i not in dead and (category is None or cats[i] == category)]
+            if not self._in_order:
+                ids = self._batch.column("prod_id")
+                order.sort(key=ids.__getitem__)
+            self._orders[category] = order
+        return order
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._pos)
+
+    def count(self, category: Optional[str] = None) -> int:
+        with self._lock:
+            return len(self._order(category))
+
+    def page_count(self, page_size: int, category: Optional[str] = None) -> int:
+        return max(1, -(-self.count(category) // page_size))
+
+    def page(self, number: int, page_size: Optional[int] = None, category: Optional[str] = None) -> ColumnBatch:
+        """Page `number` (0-based) in prod_id order, as a view over the catalog columns."""
+        page_size = page_size or config.CATALOG_PAGE_SIZE
+        key = (category, number, page_size)
+        with self._lock:
+            cached = self._pages.get(key)
+            if cached is None:
+                order = self._order(category)
+                cached = self._pages[key] = self._batch.take(order[number * page_size:(number + 1) * page_size])
+            return cached
+
+    def categories(self) -> List[str]:
+        with self._lock:
+            cats = self._batch.column("category")
+            return sorted({cats[i] for i in self._pos.values() if cats[i] is not None})
+
+    def stats(self) -> Dict:
+        """Row count, cache age and the last refresh, for the UI's freshness indicator."""
+        with self._lock:
+            return {
+                "rows": len(self._pos),
+                "version": self._version,
+                "age_s": None if self.refreshed_at is None else round(time.time() - self.refreshed_at, 1),
+                "last_refresh": dict(self.last_refresh),
+                "mode": self._mode,
+            }
+
+def _unsubscribe(handlers: Dict):
+    for event, handler in handlers.items():
+        events.unsubscribe(event, handler)
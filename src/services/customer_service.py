@@ -6,7 +6,7 @@ class CustomerError(Exception):
     pass
 
 def add_customer(name: str, email: str, phone: str, city: str | None = None) -> Dict:
-    if customer_dao.get_customer_by_email(email):
+    if customer_dao.get_customer_by_email(email, fresh=True):
         raise CustomerError(f"Email already exists: {email}")
     return customer_dao.create_customer(name, email, phone, city)
 
@@ -21,8 +21,9 @@ def update_customer(cust_id: int, phone: str | None = None, city: str | None = N
     return customer_dao.update_customer(cust_id, fields)
 
 def delete_customer(cust_id: int) -> Dict:
-    orders = order_dao.get_orders_by_customer(cust_id)
-    if orders:
+    # one row is enough to know the customer has orders
+    has_orders = next(order_dao.iter_orders_by_customer(cust_id, batch_size=1), None)
+    if has_orders:
         raise CustomerError("Cannot delete customer with existing orders")
     return customer_dao.delete_customer(cust_id)
 
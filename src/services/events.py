@@ -0,0 +1,37 @@
+# src/services/events.py
+"""
+Minimal in-process event bus for domain state transitions.
+
+Services publish after a change is committed (e.g. "order_placed",
+"order_paid", "order_cancelled"); subscribers such as the sales aggregates
+react to them. A failing subscriber is logged and never breaks the
+operation that published the event.
+"""
+import logging
+import threading
+from typing import Callable, Dict, List
+
+log = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_subscribers: Dict[str, List[Callable]] = {}
+
+def subscribe(event: str, handler: Callable) -> None:
+    with _lock:
+        handlers = _subscribers.setdefault(event, [])
+        if handler not in handlers:
+            handlers.append(handler)
+
+def unsubscribe(event: str, handler: Callable) -> None:
+    with _lock:
+        if handler in _subscribers.get(event, []):
+            _subscribers[event].remove(handler)
+
+def publish(event: str, **payload) -> None:
+    with _lock:
+        handlers = list(_subscribers.get(event, ()))
+    for handler in handlers:
+        try:
+            handler(**payload)
+        except Exception:
+            log.exception("event handler %r failed for %s", handler, event)
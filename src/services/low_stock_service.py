@@ -0,0 +1,151 @@
+# src/services/low_stock_service.py
+"""
+Low-stock monitoring and reorder suggestions.
+
+A product's reorder threshold is its own (stock_thresholds.prod_id), else
+its category's, else LOW_STOCK_DEFAULT_THRESHOLD. Listing low stock runs on
+the server (low_stock_products() in sql/low_stock.sql). Crossings are
+detected as they happen: stock_service publishes "stock_changed" after
+every successful adjustment (orders, cancellations, reduce/restock), and
+this module turns a move across a threshold into "stock_low" or
+"stock_restored". Those feed the reorder_suggestions queue: one OPEN
+suggestion per product, resolved automatically once stock recovers.
+No polling and no catalog scans.
+"""
+import time
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional
+import src.config as config
+import src.dao.stock_dao as stock_dao
+from src.services import events
+
+log = logging.getLogger(__name__)
+
+SUGGESTION_STATUSES = ("OPEN", "ORDERED", "DISMISSED", "RESOLVED")
+
+class LowStockError(Exception):
+    pass
+
+# thresholds table, cached per process (it is small: one row per override)
+_lock = threading.Lock()
+_thresholds: Optional[Dict[str, Dict]] = None
+_loaded_at = 0.0
+
+def _load_thresholds() -> Dict[str, Dict]:
+    global _thresholds, _loaded_at
+    with _lock:
+        if _thresholds is not None and time.monotonic() - _loaded_at < config.LOW_STOCK_THRESHOLD_TTL:
+            return _thresholds
+    by_prod, by_category = {}, {}
+    for t in stock_dao.list_thresholds():
+        if t.get("prod_id") is not None:
+            by_prod[t["prod_id"]] = t
+        else:
+            by_category[t["category"]] = t
+    with _lock:
+        _thresholds = {"prod_id": by_prod, "category": by_category}
+        _loaded_at = time.monotonic()
+        return _thresholds
+
+def invalidate_thresholds():
+    global _thresholds
+    with _lock:
+        _thresholds = None
+
+def threshold_for(product: Dict) -> Dict:
+    """{"threshold", "reorder_qty"} that apply to a product row."""
+    t = _load_thresholds()
+    rule = t["prod_id"].get(product["prod_id"]) or t["category"].get(product.get("category"))
+    if rule:
+        return {"threshold": rule["threshold"], "reorder_qty": rule.get("reorder_qty")}
+    return {"threshold": config.LOW_STOCK_DEFAULT_THRESHOLD, "reorder_qty": None}
+
+def set_threshold(threshold: int, prod_id: Optional[int] = None, category: Optional[str] = None,
+                  reorder_qty: Optional[int] = None) -> Dict:
+    """Set the reorder threshold of one product or one category."""
+    if (prod_id is None) == (category is None):
+        raise LowStockError("Give exactly one of prod_id or category")
+    if threshold is None or int(threshold) < 0:
+        raise LowStockError("Threshold must be a non-negative integer")
+    if reorder_qty is not None and int(reorder_qty) <= 0:
+        raise LowStockError("Reorder quantity must be positive")
+    row = stock_dao.upsert_threshold(int(threshold), prod_id, category,
+                                     int(reorder_qty) if reorder_qty is not None else None)
+    invalidate_thresholds()
+    if not row:
+        raise LowStockError("Failed to save threshold")
+    return row
+
+def remove_threshold(prod_id: Optional[int] = None, category: Optional[str] = None) -> Optional[Dict]:
+    if (prod_id is None) == (category is None):
+        raise LowStockError("Give exactly one of prod_id or category")
+    row = stock_dao.delete_threshold(prod_id, category)
+    invalidate_thresholds()
+    return row
+
+def iter_low_stock(batch_size: int = 500) -> Iterator[Dict]:
+    """Products at or below their own threshold, filtered on the server, in prod_id order."""
+    return stock_dao.iter_low_stock(config.LOW_STOCK_DEFAULT_THRESHOLD, batch_size)
+
+# ---- crossing detection ----
+
+def _on_stock_changed(changes: List[Dict], **_):
+    for change in changes:
+        product = change["product"]
+        rule = threshold_for(product)
+        t = rule["threshold"]
+        if change["old"] > t >= change["new"]:
+            events.publish("stock_low", product=product, stock=change["new"], **rule)
+        elif change["old"] <= t < change["new"]:
+            events.publish("stock_restored", product=product, stock=change["new"], **rule)
+
+# ---- reorder suggestion queue ----
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+def _suggested_qty(stock: int, threshold: int, reorder_qty: Optional[int]) -> int:
+    # without a configured quantity, bring stock back up to twice the threshold
+    return reorder_qty or max(1, 2 * threshold - stock)
+
+def _on_stock_low(product: Dict, stock: int, threshold: int, reorder_qty: Optional[int] = None, **_):
+    qty = _suggested_qty(stock, threshold, reorder_qty)
+    existing = stock_dao.get_open_suggestion(product["prod_id"])
+    if existing:
+        stock_dao.update_suggestion(existing["suggestion_id"], {"stock": stock, "suggested_qty": qty},
+                                    expected_status="OPEN")
+        return
+    try:
+        stock_dao.create_suggestion(product["prod_id"], stock, threshold, qty)
+    except Exception as e:
+        # a concurrent crossing opened it first (unique open suggestion per product)
+        log.info("reorder suggestion for product %s not created: %s", product["prod_id"], e)
+
+def _on_stock_restored(product: Dict, stock: int, **_):
+    existing = stock_dao.get_open_suggestion(product["prod_id"])
+    if existing:
+        stock_dao.update_suggestion(existing["suggestion_id"],
+                                    {"status": "RESOLVED", "stock": stock, "updated_at": _now()},
+                                    expected_status="OPEN")
+
+def reorder_suggestions(status: Optional[str] = "OPEN", limit: int = 100) -> List[Dict]:
+    """The reorder queue, oldest first."""
+    if status is not None and status not in SUGGESTION_STATUSES:
+        raise LowStockError(f"Unknown status {status}")
+    return stock_dao.list_suggestions(status, limit)
+
+def close_suggestion(suggestion_id: int, status: str = "ORDERED") -> Dict:
+    """Mark an OPEN suggestion as ORDERED or DISMISSED."""
+    if status not in ("ORDERED", "DISMISSED"):
+        raise LowStockError("Status must be ORDERED or DISMISSED")
+    row = stock_dao.update_suggestion(suggestion_id, {"status": status, "updated_at": _now()},
+                                      expected_status="OPEN")
+    if not row:
+        raise LowStockError(f"No open reorder suggestion {suggestion_id}")
+    return row
+
+events.subscribe("stock_changed", _on_stock_changed)
+events.subscribe("stock_low", _on_stock_low)
+events.subscribe("stock_restored", _on_stock_restored)
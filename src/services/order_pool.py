@@ -0,0 +1,416 @@
+# src/services/order_pool.py
+"""
+Multi-process order processing with SKU-sharded routing.
+
+OrderPool runs N worker processes, each with its own warm client, row cache
+and ORDER_WORKER_THREADS handler threads, fed by one bounded local queue per
+worker. Every SKU belongs to one shard (a stable hash of its prod_id), and
+requests are routed so that its stock is only changed by the owning worker:
+  - create_order whose SKUs share a shard goes to that shard's worker (by
+    customer if it has no items);
+  - a basket spanning shards is split: the pool reserves each shard's part
+    on the worker owning it, then the worker of its lowest prod_id writes
+    the order without reserving again. If a part cannot be reserved or the
+    order cannot be written, the parts already reserved are released on
+    their workers;
+  - pay_order goes to the worker that placed the order (the pool remembers
+    recent placements), else by order_id. So does cancel_order of an order
+    whose SKUs share a shard; any other cancel (cross-shard or not
+    remembered) is split: that worker cancels without restocking, then each
+    shard's part of the stock is released on the worker owning it.
+A keyed create_order (idempotency_key) is not split: its reservation must
+be one adjust_stock_once call, so it goes whole to the worker of its lowest
+prod_id and its other SKUs are changed through the normal atomic stock
+engine. Correctness never depends on the routing, only contention does.
+
+Workers open their own store, so the pool needs one they can share: the
+memory backend is per process and is refused.
+
+submit() returns a concurrent.futures.Future and blocks while the target
+worker's queue is full. close() drains by default: no new requests are
+accepted, every queued one is finished (and write-behind changes flushed)
+before the workers exit.
+"""
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+import src.config as config
+
+log = logging.getLogger(__name__)
+
+OPS = ("create_order", "cancel_order", "pay_order")
+# placements remembered for routing cancel/pay to the worker that placed the order
+ORDER_ROUTES = 100_000
+
+
+class PoolError(Exception):
+    pass
+
+
+class PoolClosed(PoolError):
+    """The pool is draining or stopped and takes no new requests."""
+    pass
+
+
+def shard_of(key: str, workers: int) -> int:
+    """Stable across processes and runs (unlike hash() of a str)."""
+    return zlib.crc32(key.encode()) % workers
+
+
+def _worker(index: int, inbox, results, backend: Optional[Dict], threads: int):
+    """Worker process: handle requests from inbox on `threads` threads until the None sentinel."""
+    # Ctrl-C and `kill` of the process group reach the workers too: the parent decides when to stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    parent = os.getppid()
+    if backend:
+        spec = dict(backend)
+        config.use_client(config.open_backend(spec.pop("name"), **spec))
+    from src.services import order_service, payment_service, stock_service, write_behind
+    stock_service.set_sole_writer()   # routing sends this worker's SKUs' stock changes here
+    handlers = {
+        "create_order": order_service.create_order,
+        "cancel_order": order_service.cancel_order,
+        "pay_order": payment_service.pay_order,
+        # the steps of a split cross-shard order
+        "reserve_stock": order_service.reserve_order_stock,
+        "release_stock": stock_service.release,
+        "place_reserved": order_service.place_reserved_order,
+        "cancel_unreleased": order_service.cancel_order_unreleased,
+    }
+    config.get_supabase()   # connect before the first request
+    counts = {"handled": 0, "failed": 0}
+    counts_lock = threading.Lock()
+    slots = threading.BoundedSemaphore(threads * 2)   # keep the backlog in the bounded inbox
+
+    def handle(rid: int, op: str, kwargs: Dict):
+        try:
+            results.put((rid, True, handlers[op](**kwargs)))
+            failed = 0
+        except Exception as e:
+            results.put((rid, False, (type(e).__name__, str(e))))
+            failed = 1
+        finally:
+            slots.release()
+        with counts_lock:
+            counts["handled"] += 1
+            counts["failed"] += failed
+
+    results.put(("ready", index, None))
+    with ThreadPoolExecutor(max_workers=threads, thread_name_prefix=f"order-worker-{index}") as pool:
+        while True:
+            try:
+                msg = inbox.get(timeout=1.0)
+            except queue.Empty:
+                if os.getppid() != parent:
+                    log.error("order worker %d: parent process is gone, stopping", index)
+                    break
+                continue
+            if msg is None:
+                break
+            slots.acquire()
+            pool.submit(handle, *msg)
+    write_behind.shutdown()
+    results.put(("stopped", index, dict(counts, stock=stock_service.stock_metrics())))
+
+
+def _error(name: str, message: str) -> Exception:
+    from src.services import order_service, payment_service
+    cls = {"OrderError": order_service.OrderError, "PaymentError": payment_service.PaymentError}.get(name)
+    return cls(message) if cls else PoolError(f"{name}: {message}")
+
+
+class OrderPool:
+    def __init__(self, workers: Optional[int] = None, threads: Optional[int] = None,
+                 queue_size: Optional[int] = None, backend: Optional[Dict] = None,
+                 start_method: str = "spawn", start_timeout: float = 60.0):
+        """
+        backend ({"name": "sqlite", "path": ..., ...}) is opened in every
+        worker; by default workers use the configured STORAGE_BACKEND, which
+        must not be "memory" (each worker would get an empty store of its own).
+        """
+        if backend is None and config.STORAGE_BACKEND == "memory":
+            raise PoolError("order workers cannot share the memory backend: pass backend= "
+                            "(e.g. {'name': 'sqlite', 'path': ...}) or set STORAGE_BACKEND")
+        self.workers = workers or config.ORDER_WORKERS
+        threads = threads or config.ORDER_WORKER_THREADS
+        ctx = multiprocessing.get_context(start_method)
+        self._results = ctx.Queue()
+        self._inboxes = [ctx.Queue(maxsize=queue_size or config.ORDER_QUEUE_SIZE) for _ in range(self.workers)]
+        self._procs = [ctx.Process(target=_worker, args=(i, self._inboxes[i], self._results, backend, threads),
+                                   name=f"order-worker-{i}", daemon=True) for i in range(self.workers)]
+        self._futures: Dict[int, Tuple[Future, int, str]] = {}
+        self._ids = itertools.count(1)
+        self._routes: "OrderedDict[int, Tuple[int, bool]]" = OrderedDict()   # order_id -> (shard, cross-shard)
+        self._cond = threading.Condition()
+        self._submitting = 0
+        self._closed = False
+        self._stopped = False
+        self._done: set = set()
+        self.stats: List[Optional[Dict]] = [None] * self.workers
+        self.routed = {"home": 0, "cross_shard": 0, "split": 0, "by_order": 0, "by_customer": 0, "split_cancel": 0}
+        # runs the steps of split cross-shard orders (each waits on its workers' results)
+        self._splitter = ThreadPoolExecutor(max_workers=self.workers * threads, thread_name_prefix="order-pool-split")
+        for p in self._procs:
+            p.start()
+        self._await_ready(start_timeout)
+        self._collector = threading.Thread(target=self._collect, name="order-pool-results", daemon=True)
+        self._collector.start()
+
+    def _await_ready(self, timeout: float):
+        deadline = time.monotonic() + timeout
+        ready = 0
+        while ready < self.workers:
+            try:
+                msg = self._results.get(timeout=max(0.1, deadline - time.monotonic()))
+            except queue.Empty:
+                msg = None
+            if msg is None or time.monotonic() > deadline:
+                for p in self._procs:
+                    p.terminate()
+                raise PoolError(f"only {ready} of {self.workers} order workers started")
+            ready += msg[0] == "ready"
+
+    # ---- routing ----
+
+    def _route(self, op: str, kwargs: Dict) -> Tuple[int, Optional[Dict[int, Dict[int, int]]]]:
+        """
+        (worker, None), or for a basket to split (home worker, {worker: {prod_id: qty}}),
+        or for a cancel to split (worker, {}): its parts are only known once cancelled.
+        """
+        parts = None
+        if op == "create_order":
+            quantities: Dict[int, int] = {}
+            for it in kwargs.get("items") or []:
+                quantities[int(it["prod_id"])] = quantities.get(int(it["prod_id"]), 0) + int(it["quantity"])
+            if not quantities:
+                how, shard = "by_customer", shard_of(f"customer:{kwargs.get('customer_id')}", self.workers)
+            else:
+                by_shard: Dict[int, Dict[int, int]] = {}
+                for pid, qty in quantities.items():
+                    by_shard.setdefault(shard_of(f"product:{pid}", self.workers), {})[pid] = qty
+                shard = shard_of(f"product:{min(quantities)}", self.workers)
+                how = "home" if len(by_shard) == 1 else "cross_shard"
+                if how == "cross_shard" and kwargs.get("idempotency_key") is None:
+                    parts = by_shard
+            with self._cond:
+                self.routed[how] += 1
+                if parts is not None:
+                    self.routed["split"] += 1
+            return shard, parts
+        order_id = int(kwargs["order_id"])
+        with self._cond:
+            self.routed["by_order"] += 1
+            shard, cross = self._routes.get(order_id, (None, True))
+            if op == "cancel_order" and cross:
+                self.routed["split_cancel"] += 1
+        if shard is None:
+            shard = shard_of(f"order:{order_id}", self.workers)
+        return shard, ({} if op == "cancel_order" and cross else None)
+
+    def _remember(self, order_id: int, shard: int, items: List[Dict]):
+        cross = len({shard_of(f"product:{it['prod_id']}", self.workers) for it in items}) > 1
+        with self._cond:
+            self._routes[order_id] = (shard, cross)
+            self._routes.move_to_end(order_id)
+            if len(self._routes) > ORDER_ROUTES:
+                self._routes.popitem(last=False)
+
+    # ---- front end ----
+
+    def submit(self, op: str, **kwargs) -> Future:
+        """Queue one request (create_order / cancel_order / pay_order keyword arguments)."""
+        if op not in OPS:
+            raise ValueError(f"unknown operation {op!r} (use {', '.join(OPS)})")
+        shard, parts = self._route(op, kwargs)
+        if parts is None:
+            return self._send(shard, op, kwargs)
+        with self._cond:
+            if self._closed:
+                raise PoolClosed("order pool is not accepting requests")
+            self._submitting += 1
+        try:
+            split = self._create_split if op == "create_order" else self._cancel_split
+            return self._splitter.submit(split, shard, parts, kwargs)
+        finally:
+            with self._cond:
+                self._submitting -= 1
+                self._cond.notify_all()
+
+    def _send(self, shard: int, op: str, kwargs: Dict, internal: bool = False) -> Future:
+        """Queue one message for one worker. internal steps of a split order are still sent while draining."""
+        future: Future = Future()
+        with self._cond:
+            if self._closed and not internal:
+                raise PoolClosed("order pool is not accepting requests")
+            if self._stopped or shard in self._done:
+                raise PoolError(f"order worker {shard} is not running")
+            rid = next(self._ids)
+            self._futures[rid] = (future, shard, op)
+            self._submitting += 1
+        try:
+            while True:
+                try:
+                    self._inboxes[shard].put((rid, op, kwargs), timeout=1.0)   # waits while that worker is backed up
+                    break
+                except queue.Full:
+                    if not self._procs[shard].is_alive():
+                        raise PoolError(f"order worker {shard} is not running")
+        except BaseException:
+            with self._cond:
+                self._futures.pop(rid, None)
+            raise
+        finally:
+            with self._cond:
+                self._submitting -= 1
+                self._cond.notify_all()
+        return future
+
+    def create_order(self, customer_id: int, items: List[Dict], idempotency_key: Optional[str] = None) -> Future:
+        return self.submit("create_order", customer_id=customer_id, items=items, idempotency_key=idempotency_key)
+
+    def cancel_order(self, order_id: int) -> Future:
+        return self.submit("cancel_order", order_id=order_id)
+
+    def pay_order(self, order_id: int, method: str, idempotency_key: Optional[str] = None) -> Future:
+        return self.submit("pay_order", order_id=order_id, method=method, idempotency_key=idempotency_key)
+
+    def _create_split(self, home: int, parts: Dict[int, Dict[int, int]], kwargs: Dict) -> Dict:
+        """A cross-shard create_order: each part reserved on its worker, then the order written on `home`."""
+        pending = {}
+        error: Optional[Exception] = None
+        for shard, quantities in parts.items():
+            try:
+                pending[shard] = self._send(shard, "reserve_stock", {"quantities": quantities}, internal=True)
+            except Exception as e:
+                error = error or e
+                break
+        reserved = []
+        for shard, future in pending.items():
+            try:
+                future.result()
+                reserved.append(shard)
+            except Exception as e:
+                error = error or e
+        if error is None:
+            try:
+                return self._send(home, "place_reserved", {"customer_id": kwargs["customer_id"],
+                                                           "items": kwargs["items"]}, internal=True).result()
+            except Exception as e:
+                error = e
+        for shard in reserved:
+            try:
+                self._send(shard, "release_stock", {"quantities": parts[shard]}, internal=True).result()
+            except Exception as e:
+                log.error("order pool: stock %s reserved on worker %d was not released: %s", parts[shard], shard, e)
+        raise error
+
+    def _cancel_split(self, shard: int, _parts, kwargs: Dict) -> Dict:
+        """A cancel_order without restock on `shard`, then each SKU's stock released on its owning worker."""
+        result = self._send(shard, "cancel_unreleased", {"order_id": kwargs["order_id"]}, internal=True).result()
+        parts: Dict[int, Dict[int, int]] = {}
+        for pid, qty in result["release"].items():
+            parts.setdefault(shard_of(f"product:{pid}", self.workers), {})[pid] = qty
+        pending = {}
+        for owner, quantities in parts.items():
+            try:
+                pending[owner] = self._send(owner, "release_stock", {"quantities": quantities}, internal=True)
+            except Exception as e:
+                log.error("order pool: stock %s of cancelled order %s was not released: %s",
+                          quantities, kwargs["order_id"], e)
+        for owner, future in pending.items():
+            try:
+                future.result()
+            except Exception as e:
+                log.error("order pool: stock %s of cancelled order %s was not released on worker %d: %s",
+                          parts[owner], kwargs["order_id"], owner, e)
+        return result["order"]
+
+    # ---- results ----
+
+    def _collect(self):
+        while len(self._done) < self.workers:
+            try:
+                msg = self._results.get(timeout=0.5)
+            except queue.Empty:
+                self._reap()
+                continue
+            if msg[0] == "stopped":
+                self.stats[msg[1]] = msg[2]
+                self._done.add(msg[1])
+                continue
+            rid, ok, payload = msg
+            with self._cond:
+                entry = self._futures.pop(rid, None)
+            if entry is None:
+                continue   # already failed by close() or _reap()
+            future, shard, op = entry
+            if ok:
+                if op in ("create_order", "place_reserved"):
+                    self._remember(payload["order"]["order_id"], shard, payload.get("items") or [])
+                future.set_result(payload)
+            else:
+                future.set_exception(_error(*payload))
+
+    def _reap(self):
+        """Fail the requests of workers that died without stopping."""
+        for i, p in enumerate(self._procs):
+            if i in self._done or p.is_alive():
+                continue
+            with self._cond:
+                self._done.add(i)
+            log.error("order worker %d exited with code %s", i, p.exitcode)
+            self._fail(lambda shard: shard == i, PoolError(f"order worker {i} exited with code {p.exitcode}"))
+
+    def _fail(self, which, error: Exception):
+        with self._cond:
+            lost = [rid for rid, (_, shard, _) in self._futures.items() if which(shard)]
+            futures = [self._futures.pop(rid)[0] for rid in lost]
+        for future in futures:
+            future.set_exception(error)
+
+    def close(self, drain: bool = True, timeout: Optional[float] = None) -> List[Optional[Dict]]:
+        """
+        Stop taking requests. With drain, every queued request is finished
+        before the workers exit; otherwise they are terminated and pending
+        requests fail with PoolError. Returns per-worker stats.
+        """
+        with self._cond:
+            if self._closed:
+                return self.stats
+            self._closed = True
+            self._cond.wait_for(lambda: self._submitting == 0)
+        # split orders still send their steps while the workers drain; without drain they fail below
+        self._splitter.shutdown(wait=drain, cancel_futures=not drain)
+        if drain:
+            for inbox in self._inboxes:
+                inbox.put(None)
+            for p in self._procs:
+                p.join(timeout)
+        for p in self._procs:
+            if p.is_alive():
+                p.terminate()
+                p.join()
+        for inbox in self._inboxes:
+            inbox.cancel_join_thread()   # a dead worker's unread requests must not hold up exit
+        self._collector.join(timeout)
+        with self._cond:
+            self._stopped = True
+        self._fail(lambda shard: True, PoolError("order pool stopped"))
+        return self.stats
+
+    def __enter__(self) -> "OrderPool":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
@@ -1,82 +1,537 @@
-from typing import List, Dict
+import json
+import logging
+from typing import List, Dict, Iterable, Iterator, Tuple, Optional
+import src.config as config
 import src.dao.product_dao as product_dao
 import src.dao.customer_dao as customer_dao
 import src.dao.order_dao as order_dao
+import src.dao.async_dao as async_dao
+import src.services.stock_service as stock_service
+from src.services import events, outbox, write_behind
+from src.services import low_stock_service  # registers the threshold-crossing subscribers
+
+log = logging.getLogger(__name__)
 
 class OrderError(Exception):
     pass
 
-def create_order(customer_id: int, items: List[Dict]) -> Dict:
-    # 1. Check customer exists
-    customer = customer_dao.get_customer_by_id(customer_id)
+def create_order(customer_id: int, items: List[Dict], idempotency_key: Optional[str] = None) -> Dict:
+    """
+    Place an order in a fixed number of round trips, whatever the basket size:
+    customer lookup, one IN (...) product fetch, an atomic stock reservation,
+    order insert and order_items insert. The response is built from the rows
+    already in hand instead of re-reading them through get_order_details.
+    The reservation is one adjust_stock call; without sql/adjust_stock.sql
+    the cas stock engine makes one conditional update per product instead.
+
+    With idempotency_key the write goes through the outbox (see
+    _create_order_once): retrying with the same key after any failure
+    finishes that one order instead of placing another.
+    """
+    if idempotency_key is not None:
+        return _create_order_once(idempotency_key, customer_id, items)
+    return _place_order(customer_id, items, reserve=True)
+
+def place_reserved_order(customer_id: int, items: List[Dict]) -> Dict:
+    """
+    create_order() for a basket whose stock the caller has already reserved
+    (order_pool reserves a cross-shard basket shard by shard). Nothing is
+    reserved or released here: if this raises, the caller gives the stock back.
+    """
+    return _place_order(customer_id, items, reserve=False)
+
+def reserve_order_stock(quantities: Dict[int, int], known_stock: Optional[Dict[int, int]] = None) -> None:
+    """Reserve {prod_id: qty} for an order, raising OrderError when it cannot be had."""
+    try:
+        stock_service.reserve(quantities, known_stock)
+    except stock_service.InsufficientStockError as e:
+        raise OrderError(f"Not enough stock: {e}")
+    except stock_service.StockError as e:
+        raise OrderError(str(e))
+
+def _place_order(customer_id: int, items: List[Dict], reserve: bool) -> Dict:
+    plan = _plan_order(customer_id, items, check_stock=reserve)
+    products = plan["products"]
+    wanted = _quantities(plan["items"])
+
+    # 3. Reserve stock atomically (conditional decrements / adjust_stock rpc)
+    if reserve:
+        reserve_order_stock(wanted, {pid: int(products[pid].get("stock") or 0) for pid in wanted})
+
+    try:
+        # 4. Insert order
+        order_row = order_dao.create_order_row(customer_id, plan["total"])
+        order_id = order_row["order_id"]
+
+        # 5. Insert order items
+        item_rows = order_dao.add_order_items(order_id, plan["items"])
+    except Exception:
+        # give the reserved stock back so a failed insert doesn't leak inventory
+        if reserve:
+            stock_service.release(wanted)
+        raise
+    for d in item_rows:
+        d["product_name"] = products[d["prod_id"]]["name"]
+
+    events.publish("order_placed", order=order_row, items=item_rows)
+    return {
+        "order": order_row,
+        "customer": plan["customer"],
+        "items": item_rows
+    }
+
+def _quantities(items: List[Dict]) -> Dict[int, int]:
+    wanted: Dict[int, int] = {}
+    for item in items:
+        wanted[item["prod_id"]] = wanted.get(item["prod_id"], 0) + item["quantity"]
+    return wanted
+
+def _plan_order(customer_id: int, items: List[Dict], check_stock: bool = True) -> Dict:
+    """
+    Steps 1-2 of an order: validate it and price the items. Nothing is written.
+    check_stock=False skips the stock check (the stock is already reserved).
+    """
+    if not items:
+        raise OrderError("Order must contain at least one item")
+
+    # 1+2. Customer check and the single product fetch are independent: run them together
+    customer, product_rows = _load_customer_and_products(customer_id, [i["prod_id"] for i in items])
     if not customer:
         raise OrderError("Customer not found")
 
-    # 2. Prepare items with price and calculate total
-    total_amount = 0
-    items_with_price = []
+    # Validate every referenced product in memory
+    products = {p["prod_id"]: p for p in product_rows}
+    wanted: Dict[int, int] = {}
     for item in items:
-        prod = product_dao.get_product_by_id(item["prod_id"])
-        if not prod:
+        if item["quantity"] <= 0:
+            raise OrderError(f"Quantity must be positive for product {item['prod_id']}")
+        if item["prod_id"] not in products:
             raise OrderError(f"Product {item['prod_id']} not found")
-        if (prod.get("stock") or 0) < item["quantity"]:
+        wanted[item["prod_id"]] = wanted.get(item["prod_id"], 0) + item["quantity"]
+    for prod_id, qty in wanted.items():
+        prod = products[prod_id]
+        if check_stock and (prod.get("stock") or 0) < qty:
             raise OrderError(f"Not enough stock for product {prod['name']}")
-        item_with_price = {
+
+    total_amount = 0
+    items_with_price = []
+    for item in items:
+        price = products[item["prod_id"]]["price"]
+        items_with_price.append({
             "prod_id": item["prod_id"],
             "quantity": item["quantity"],
-            "price": prod["price"]
-        }
-        items_with_price.append(item_with_price)
-        total_amount += prod["price"] * item["quantity"]
+            "price": price
+        })
+        total_amount += price * item["quantity"]
+    return {"customer": customer, "products": products, "items": items_with_price, "total": total_amount}
+
+def _create_order_once(key: str, customer_id: int, items: List[Dict]) -> Dict:
+    """
+    create_order() as an outbox write. The priced plan is recorded locally
+    before anything remote happens; every remote step is idempotent per key
+    (adjust_stock_once, one order row per key, items only if the order has
+    none), so a retry or outbox.replay() runs the same steps again and only
+    the missing ones take effect. A retry of a finished order returns the
+    recorded result without a round trip.
+    """
+    outbox.replay_once()
+    entry = _claim_order(key, customer_id, items)
+    if entry["state"] == outbox.DONE:
+        return entry["result"]
+    if entry["state"] == outbox.FAILED:
+        raise OrderError(entry["error"])
+    return outbox.drive(entry, _order_steps)
 
-    # 3. Deduct stock
-    for item in items_with_price:
-        prod = product_dao.get_product_by_id(item["prod_id"])
-        new_stock = prod["stock"] - item["quantity"]
-        product_dao.update_product(prod["prod_id"], {"stock": new_stock})
+def queue_order(customer_id: int, items: List[Dict], idempotency_key: str) -> Dict:
+    """
+    Record a keyed order in the outbox without placing it: it is validated
+    and priced now, from whatever the DAO layer reads (the local replica in
+    terminal mode), and placed later by outbox.replay(). Returns the outbox
+    entry; a key that was already used returns its entry as it stands.
+    """
+    entry = _claim_order(idempotency_key, customer_id, items)
+    if entry["state"] == outbox.PENDING:
+        outbox.get_outbox().release(idempotency_key, "queued")
+    return entry
 
-    # 4. Insert order
-    order_row = order_dao.create_order_row(customer_id, total_amount)
-    order_id = order_row["order_id"]
+def _claim_order(key: str, customer_id: int, items: List[Dict]) -> Dict:
+    box = outbox.get_outbox()
+    request = {"customer_id": customer_id,
+               "items": [{"prod_id": i["prod_id"], "quantity": i["quantity"]} for i in items]}
+    plan = None
+    if box.get(key) is None:
+        planned = _plan_order(customer_id, items)
+        names = {pid: p["name"] for pid, p in planned["products"].items()}
+        plan = {"customer": planned["customer"], "total": planned["total"],
+                "items": [dict(it, product_name=names[it["prod_id"]]) for it in planned["items"]]}
+    try:
+        return box.claim(key, "order", request, plan)
+    except outbox.OutboxError as e:
+        raise OrderError(str(e))
 
-    # 5. Insert order items
-    order_dao.add_order_items(order_id, items_with_price)
+def _order_steps(entry: Dict) -> Dict:
+    key, plan = entry["key"], entry["plan"]
+    wanted = _quantities(plan["items"])
+    try:
+        stock_service.reserve(wanted, key=f"order:{key}")
+    except stock_service.InsufficientStockError as e:
+        raise OrderError(f"Not enough stock: {e}")
+    except stock_service.StockError as e:
+        raise OrderError(str(e))
+    try:
+        order_row, created = order_dao.create_order_row_once(plan["customer"]["cust_id"], plan["total"], key)
+        # items go in with one statement, so an order that has any has them all
+        item_rows = [] if created else order_dao.get_order_items([order_row["order_id"]])
+        if not item_rows:
+            item_rows = order_dao.add_order_items(order_row["order_id"], plan["items"])
+    except Exception as e:
+        if not outbox.is_transient(e):
+            # the order cannot be written: give the reserved stock back, also at most once
+            stock_service.release(wanted, key=f"order:{key}:release")
+        raise
+    names = {it["prod_id"]: it["product_name"] for it in plan["items"]}
+    for d in item_rows:
+        d["product_name"] = names.get(d["prod_id"])
+    events.publish("order_placed", order=order_row, items=item_rows)
+    return {"order": order_row, "customer": plan["customer"], "items": item_rows}
 
-    return get_order_details(order_id)
+outbox.register("order", _order_steps)
+
+def _load_customer_and_products(customer_id: int, prod_ids: List[int]) -> Tuple[Optional[Dict], List[Dict]]:
+    if config.ASYNC_FANOUT:
+        return tuple(async_dao.run_sync(async_dao.gather(
+            async_dao.get_customer_by_id(customer_id),
+            async_dao.get_products_by_ids(prod_ids),
+        )))
+    return customer_dao.get_customer_by_id(customer_id), product_dao.get_products_by_ids(prod_ids)
 
 def get_order_details(order_id: int) -> Dict:
+    if config.ASYNC_FANOUT:
+        return async_dao.run_sync(get_order_details_async(order_id))
     order = order_dao.get_order_by_id(order_id)
     if not order:
         raise OrderError("Order not found")
+    return hydrate_orders([order])[0]
 
-    customer = customer_dao.get_customer_by_id(order["cust_id"])
-    items = _get_order_items(order_id)
-    return {
-        "order": order,
-        "customer": customer,
-        "items": items
-    }
+async def get_order_details_async(order_id: int) -> Dict:
+    """
+    Order and its items are fetched together, then customer and products
+    together: two round-trip latencies instead of four.
+    """
+    order, items = await async_dao.gather(
+        async_dao.get_order_by_id(order_id),
+        async_dao.get_order_items([order_id]),
+    )
+    if not order:
+        raise OrderError("Order not found")
+    customer, products = await async_dao.gather(
+        async_dao.get_customer_by_id(order["cust_id"]),
+        async_dao.get_products_by_ids([it["prod_id"] for it in items]),
+    )
+    return _assemble([order], items, products, [customer] if customer else [])[0]
+
+def get_customer_order_details(cust_id: int) -> List[Dict]:
+    """
+    Full details (customer + items with product names) for every order of a customer.
+    """
+    return hydrate_orders(order_dao.list_orders_by_customer(cust_id))
+
+def iter_customer_order_details(cust_id: int, batch_size: int = 100) -> Iterator[Dict]:
+    """
+    Stream a customer's hydrated orders, hydrating one keyset page at a time.
+    """
+    page: List[Dict] = []
+    for order in order_dao.iter_orders_by_customer(cust_id, batch_size=batch_size):
+        page.append(order)
+        if len(page) == batch_size:
+            yield from hydrate_orders(page)
+            page = []
+    yield from hydrate_orders(page)
 
-def _get_order_items(order_id: int) -> List[Dict]:
-    resp = order_dao._sb().table("order_items").select("*").eq("order_id", order_id).execute()
-    data = resp.data or []
-    for d in data:
-        prod = product_dao.get_product_by_id(d["prod_id"])
-        d["product_name"] = prod["name"] if prod else "Unknown"
-        d["price"] = prod["price"] if prod else 0
-    return data
+def hydrate_orders(orders: List[Dict]) -> List[Dict]:
+    """
+    Attach customer and line items (with product_name) to a page of orders.
+    Costs three round trips however many orders/items there are: one for all
+    order_items, one IN (...) query for their products and one for the customers.
+    Item prices are the ones recorded on the order, not the current list price.
+    """
+    if not orders:
+        return []
+    if config.ASYNC_FANOUT:
+        return async_dao.run_sync(hydrate_orders_async(orders))
+    items = order_dao.get_order_items([o["order_id"] for o in orders])
+    products = product_dao.get_products_by_ids([it["prod_id"] for it in items])
+    customers = customer_dao.get_customers_by_ids([o["cust_id"] for o in orders])
+    return _assemble(orders, items, products, customers)
+
+async def hydrate_orders_async(orders: List[Dict]) -> List[Dict]:
+    """hydrate_orders() with the items and customers queries in flight together."""
+    if not orders:
+        return []
+    items, customers = await async_dao.gather(
+        async_dao.get_order_items([o["order_id"] for o in orders]),
+        async_dao.get_customers_by_ids([o["cust_id"] for o in orders]),
+    )
+    products = await async_dao.get_products_by_ids([it["prod_id"] for it in items])
+    return _assemble(orders, items, products, customers)
+
+def _assemble(orders: List[Dict], items: List[Dict], products: List[Dict], customers: List[Dict]) -> List[Dict]:
+    products_by_id = {p["prod_id"]: p for p in products}
+    customers_by_id = {c["cust_id"]: c for c in customers}
+    items_by_order: Dict[int, List[Dict]] = {}
+    for it in items:
+        prod = products_by_id.get(it["prod_id"])
+        it["product_name"] = prod["name"] if prod else "Unknown"
+        items_by_order.setdefault(it["order_id"], []).append(it)
+
+    return [
+        {
+            "order": write_behind.overlay_order(o),
+            "customer": customers_by_id.get(o["cust_id"]),
+            "items": items_by_order.get(o["order_id"], [])
+        }
+        for o in orders
+    ]
 
 def cancel_order(order_id: int) -> Dict:
-    order = order_dao.get_order_by_id(order_id)
+    wb = write_behind.active()
+    order = _cancellable(order_id, wb)
+
+    if wb is not None:
+        # status flip (still conditional), stock restore and event all happen in the next flush
+        cancelled = wb.set_status(order, "CANCELLED", expected_status="PLACED", restock=True, event="order_cancelled")
+        if not cancelled:
+            raise OrderError("Only orders with status PLACED can be cancelled")
+        return cancelled
+
+    cancelled, items = _flip_to_cancelled(order_id)
+    # Restore stock (atomic increments, safe against concurrent checkouts)
+    stock_service.release(_quantities(items))
+
+    events.publish("order_cancelled", order=cancelled, items=items)
+    return cancelled
+
+def cancel_order_unreleased(order_id: int) -> Dict:
+    """
+    cancel_order() that leaves giving the stock back to the caller (order_pool
+    releases each SKU on the worker owning it). Returns {"order", "release":
+    {prod_id: qty}}. Not deferred by write-behind: the caller needs the
+    quantities once the cancel is stored.
+    """
+    _cancellable(order_id, write_behind.active())
+    cancelled, items = _flip_to_cancelled(order_id)
+    events.publish("order_cancelled", order=cancelled, items=items)
+    return {"order": cancelled, "release": _quantities(items)}
+
+def _cancellable(order_id: int, wb) -> Dict:
+    order = (wb and wb.order(order_id)) or order_dao.get_order_by_id(order_id)
     if not order:
         raise OrderError("Order not found")
     if order["status"] != "PLACED":
         raise OrderError("Only orders with status PLACED can be cancelled")
+    return order
+
+def _flip_to_cancelled(order_id: int) -> Tuple[Dict, List[Dict]]:
+    # Flip the status first, conditionally, so a concurrent cancel can't restore stock twice
+    cancelled = order_dao.update_order_status(order_id, "CANCELLED", expected_status="PLACED")
+    if not cancelled:
+        raise OrderError("Only orders with status PLACED can be cancelled")
+    return cancelled, order_dao.get_order_items([order_id])
 
-    # Restore stock
-    items = _get_order_items(order_id)
+def read_order_feed(lines: Iterable[str]) -> Iterator[Tuple[int, Dict]]:
+    """
+    Parse an NDJSON order feed into (line number, order) pairs. Each line is
+    {"customer_id": 1, "items": [{"prod_id": 3, "quantity": 2} | {"sku": "A-1", "quantity": 2}],
+     "ref": "POS-17-0042", "order_date": "..."}; ref and order_date are optional.
+    Unparseable lines come through as {"__error__": ...} so they are reported, not fatal.
+    """
+    for n, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield n, json.loads(line)
+        except ValueError as e:
+            yield n, {"__error__": f"invalid JSON: {e}"}
+
+def _parse_feed_order(raw: Dict) -> Dict:
+    if not isinstance(raw, dict):
+        raise OrderError("Order must be a JSON object")
+    if "__error__" in raw:
+        raise OrderError(raw["__error__"])
+    cust_id = raw.get("customer_id", raw.get("cust_id"))
+    items = raw.get("items") or []
+    if cust_id is None:
+        raise OrderError("customer_id is required")
+    try:
+        cust_id = int(cust_id)
+    except (TypeError, ValueError):
+        raise OrderError(f"Invalid customer_id: {cust_id!r}")
+    if not isinstance(items, list):
+        raise OrderError("items must be a list")
+    if not items:
+        raise OrderError("Order must contain at least one item")
+    parsed = []
     for item in items:
-        prod = product_dao.get_product_by_id(item["prod_id"])
-        product_dao.update_product(prod["prod_id"], {"stock": prod["stock"] + item["quantity"]})
+        if not isinstance(item, dict):
+            raise OrderError(f"Invalid item {item!r}")
+        try:
+            qty = int(item["quantity"])
+        except (KeyError, TypeError, ValueError):
+            raise OrderError(f"Invalid quantity in item {item}")
+        key = item.get("prod_id")
+        if key is None and item.get("sku") is None:
+            raise OrderError(f"Item needs prod_id or sku: {item}")
+        try:
+            key = int(key) if key is not None else None
+        except (TypeError, ValueError):
+            raise OrderError(f"Invalid prod_id in item {item}")
+        if qty <= 0:
+            raise OrderError(f"Quantity must be positive for product {key or item.get('sku')}")
+        parsed.append({"prod_id": key, "sku": item.get("sku"), "quantity": qty})
+    return {"cust_id": cust_id, "items": parsed, "ref": raw.get("ref"), "order_date": raw.get("order_date")}
+
+def _failed(n: int, ref, error: str) -> Dict:
+    return {"line": n, "ref": ref, "status": "failed", "error": error}
+
+def _place_chunk(chunk: List[Tuple[int, Dict]]) -> List[Dict]:
+    """
+    Place a chunk of feed orders with a fixed number of round trips: customers,
+    products (by id and by sku), one stock reservation for the chunk's summed
+    per-product quantities (one call, or one update per product with the cas
+    stock engine), one orders insert and one order_items insert.
+    Stock is allocated to orders in input order, so the same feed against the
+    same stock always accepts the same orders.
+    """
+    lines = [n for n, _ in chunk]
+    results: Dict[int, Dict] = {}
+    parsed: List[Tuple[int, Dict]] = []
+    for n, raw in chunk:
+        ref = raw.get("ref") if isinstance(raw, dict) else None
+        try:
+            parsed.append((n, _parse_feed_order(raw)))
+        except OrderError as e:
+            results[n] = {"line": n, "ref": ref, "status": "rejected", "error": str(e)}
+        except Exception as e:
+            # a line the checks above did not foresee must not stop the run
+            results[n] = _failed(n, ref, f"unreadable order: {e!r}")
+    chunk = parsed
+
+    try:
+        customers = {c["cust_id"] for c in customer_dao.get_customers_by_ids([o["cust_id"] for _, o in chunk])}
+        prod_ids = [it["prod_id"] for _, o in chunk for it in o["items"] if it["prod_id"] is not None]
+        skus = [it["sku"] for _, o in chunk for it in o["items"] if it["prod_id"] is None]
+        products = {p["prod_id"]: p for p in product_dao.get_products_by_ids(prod_ids)}
+        by_sku = {p["sku"]: p for p in product_dao.get_products_by_skus(skus)} if skus else {}
+        products.update({p["prod_id"]: p for p in by_sku.values()})
+    except Exception as e:
+        # nothing written yet: the orders can be sent again as they are
+        for n, order in chunk:
+            results[n] = _failed(n, order["ref"], f"lookup failed: {e}")
+        return [results[n] for n in lines]
+
+    available = {pid: int(p.get("stock") or 0) for pid, p in products.items()}
+    accepted: List[Tuple[int, Dict, Dict[int, int]]] = []
+    for n, order in chunk:
+        try:
+            if order["cust_id"] not in customers:
+                raise OrderError("Customer not found")
+            wanted: Dict[int, int] = {}
+            for it in order["items"]:
+                prod = products.get(it["prod_id"]) if it["prod_id"] is not None else by_sku.get(it["sku"])
+                if prod is None:
+                    raise OrderError(f"Product {it['prod_id'] or it['sku']} not found")
+                it["prod_id"] = prod["prod_id"]
+                wanted[prod["prod_id"]] = wanted.get(prod["prod_id"], 0) + it["quantity"]
+            for pid, qty in wanted.items():
+                if available[pid] < qty:
+                    raise OrderError(f"Not enough stock for product {products[pid]['name']}")
+        except OrderError as e:
+            results[n] = {"line": n, "ref": order["ref"], "status": "rejected", "error": str(e)}
+            continue
+        for pid, qty in wanted.items():
+            available[pid] -= qty
+        accepted.append((n, order, wanted))
+
+    if accepted:
+        total: Dict[int, int] = {}
+        for _, _, wanted in accepted:
+            for pid, qty in wanted.items():
+                total[pid] = total.get(pid, 0) + qty
+        try:
+            stock_service.reserve(total, {pid: int(products[pid].get("stock") or 0) for pid in total})
+        except stock_service.StockError:
+            # stock moved under us since the read: place this chunk's orders one by one,
+            # still in input order, so each gets its own verdict
+            for n, order, _ in accepted:
+                results[n] = _place_single(n, order)
+            return [results[n] for n in lines]
+        except Exception as e:
+            # transient error before any order row is written: report them failed, not rejected
+            for n, order, _ in accepted:
+                results[n] = _failed(n, order["ref"], f"stock reservation failed: {e}")
+            return [results[n] for n in lines]
+
+        try:
+            order_rows = order_dao.create_order_rows([
+                {"cust_id": o["cust_id"], "order_date": o["order_date"],
+                 "total_amount": sum(products[it["prod_id"]]["price"] * it["quantity"] for it in o["items"])}
+                for _, o, _ in accepted
+            ])
+            try:
+                item_rows = order_dao.insert_order_items([
+                    {"order_id": row["order_id"], "prod_id": it["prod_id"], "quantity": it["quantity"],
+                     "price": products[it["prod_id"]]["price"]}
+                    for row, (_, o, _) in zip(order_rows, accepted) for it in o["items"]
+                ])
+            except Exception:
+                try:
+                    order_dao.delete_orders([row["order_id"] for row in order_rows])
+                except Exception as e:
+                    # report the items failure, not the clean-up's
+                    log.error("orders %s left without items: delete failed: %s",
+                              [row["order_id"] for row in order_rows], e)
+                raise
+        except Exception as e:
+            stock_service.release(total)
+            for n, order, _ in accepted:
+                results[n] = _failed(n, order["ref"], f"chunk write failed: {e}")
+            return [results[n] for n in lines]
+
+        items_by_order: Dict[int, List[Dict]] = {}
+        for d in item_rows:
+            d["product_name"] = products[d["prod_id"]]["name"]
+            items_by_order.setdefault(d["order_id"], []).append(d)
+        for row, (n, order, _) in zip(order_rows, accepted):
+            events.publish("order_placed", order=row, items=items_by_order.get(row["order_id"], []))
+            results[n] = {"line": n, "ref": order["ref"], "status": "placed",
+                          "order_id": row["order_id"], "total_amount": row["total_amount"]}
+    return [results[n] for n in lines]
+
+def _place_single(n: int, order: Dict) -> Dict:
+    try:
+        placed = create_order(order["cust_id"], [{"prod_id": it["prod_id"], "quantity": it["quantity"]}
+                                                 for it in order["items"]])
+    except (OrderError, stock_service.StockError) as e:
+        return {"line": n, "ref": order["ref"], "status": "rejected", "error": str(e)}
+    except Exception as e:
+        return _failed(n, order["ref"], str(e))
+    return {"line": n, "ref": order["ref"], "status": "placed",
+            "order_id": placed["order"]["order_id"], "total_amount": placed["order"]["total_amount"]}
 
-    return order_dao.update_order_status(order_id, "CANCELLED")
+def create_orders_bulk(orders: Iterable[Tuple[int, Dict]], chunk_size: int = 500) -> Iterator[Dict]:
+    """
+    Place a stream of (line number, raw order) pairs, e.g. from read_order_feed(),
+    chunk_size orders at a time. Yields one result per input order, in input
+    order: {"line", "ref", "status": "placed" | "rejected" | "failed", and
+    "order_id"/"total_amount" or "error"}. A bad order never stops the run.
+    """
+    if chunk_size <= 0:
+        raise OrderError("chunk_size must be positive")
+    chunk: List[Tuple[int, Dict]] = []
+    for n, raw in orders:
+        chunk.append((n, raw))
+        if len(chunk) >= chunk_size:
+            yield from _place_chunk(chunk)
+            chunk = []
+    if chunk:
+        yield from _place_chunk(chunk)
@@ -0,0 +1,271 @@
+# src/services/outbox.py
+"""
+Write-ahead outbox for multi-step writes made with an idempotency key.
+
+Placing an order (stock, order row, items) or paying one (payment row,
+order status) takes several remote calls, and the network can fail between
+any two of them. With a key, each of those calls is idempotent on the
+server (sql/idempotency.sql), and this module keeps a durable local record
+of the write in a SQLite file (OUTBOX_PATH):
+
+  - claim() records the request and its plan (prices, amounts) before the
+    first remote call;
+  - drive() runs the steps, then records the result (done) or the error
+    (failed). A network error leaves the entry pending;
+  - a retry with the same key returns the recorded result or error, or
+    runs the same steps again from the recorded plan. Steps that already
+    happened are no-ops the second time, so nothing is placed or charged
+    twice;
+  - replay() finishes the pending writes of crashed or disconnected
+    processes (it runs on the first keyed write of each process, and from
+    `retail-cli outbox replay`).
+
+A claim holds a lease of OUTBOX_LEASE seconds, or until its process
+exits, so only one thread or process drives a key at a time.
+"""
+import os
+import json
+import time
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+import src.config as config
+
+log = logging.getLogger(__name__)
+
+PENDING, DONE, FAILED = "pending", "done", "failed"
+
+SCHEMA = """
+create table if not exists outbox (
+    key         text primary key,
+    kind        text not null,
+    request     text not null,
+    plan        text,
+    state       text not null default 'pending',
+    result      text,
+    error       text,
+    attempts    integer not null default 0,
+    owner       text,
+    lease_until real,
+    created_at  real not null,
+    updated_at  real not null
+);
+create index if not exists outbox_state_idx on outbox (state, updated_at);
+"""
+
+
+class OutboxError(Exception):
+    pass
+
+
+class KeyInUse(OutboxError):
+    """Another thread or process is running the write for this key."""
+    pass
+
+
+class KeyReused(OutboxError):
+    """The key was first used for a different request."""
+    pass
+
+
+def is_transient(exc: BaseException) -> bool:
+    """Network-level failures: the request may or may not have reached the server."""
+    import httpx
+    return isinstance(exc, (OSError, httpx.TransportError))
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, sort_keys=True, default=str)
+
+
+def _owner() -> str:
+    return f"{os.getpid()}:{threading.get_ident()}"
+
+
+def _owner_alive(owner: str) -> bool:
+    pid = int(owner.split(":")[0])
+    if pid == os.getpid() or os.name != "posix":
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class Outbox:
+    def __init__(self, path: Optional[str] = None, lease: Optional[float] = None):
+        self.path = path or config.OUTBOX_PATH
+        self.lease = config.OUTBOX_LEASE if lease is None else lease
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        if self.path != ":memory:":
+            self._conn.execute("pragma journal_mode = wal")
+        self._conn.execute(f"pragma synchronous = {'normal' if config.OUTBOX_SYNC == 'normal' else 'full'}")
+        self._conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _tx(self):
+        with self._lock:
+            self._conn.execute("begin immediate")
+            try:
+                yield self._conn
+                self._conn.execute("commit")
+            except BaseException:
+                self._conn.execute("rollback")
+                raise
+
+    @staticmethod
+    def _entry(row: sqlite3.Row) -> Dict:
+        entry = dict(row)
+        for col in ("request", "plan", "result"):
+            if entry[col] is not None:
+                entry[col] = json.loads(entry[col])
+        return entry
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute("select * from outbox where key = ?", (key,)).fetchone()
+        return self._entry(row) if row else None
+
+    def claim(self, key: str, kind: str, request: Dict, plan: Optional[Dict] = None) -> Dict:
+        """
+        Start or resume the write for key. A new key is recorded with its
+        request and plan; a pending one is taken over if its lease ran out
+        (it keeps its original plan). Done and failed entries come back as
+        they are, unclaimed. Raises KeyReused if the key belongs to another
+        request, KeyInUse if someone else holds it.
+        """
+        now = time.time()
+        text = _dumps(request)
+        with self._tx() as c:
+            row = c.execute("select * from outbox where key = ?", (key,)).fetchone()
+            if row is None:
+                c.execute("insert into outbox (key, kind, request, plan, attempts, owner, lease_until, created_at, updated_at) "
+                          "values (?, ?, ?, ?, 1, ?, ?, ?, ?)",
+                          (key, kind, text, _dumps(plan), _owner(), now + self.lease, now, now))
+                row = c.execute("select * from outbox where key = ?", (key,)).fetchone()
+                return self._entry(row)
+            if row["kind"] != kind or row["request"] != text:
+                raise KeyReused(f"idempotency key {key!r} was already used for a different {row['kind']} request")
+            if row["state"] != PENDING:
+                return self._entry(row)
+            if (row["owner"] not in (None, _owner()) and (row["lease_until"] or 0) > now
+                    and _owner_alive(row["owner"])):
+                raise KeyInUse(f"a {kind} with idempotency key {key!r} is already in progress")
+            c.execute("update outbox set attempts = attempts + 1, owner = ?, lease_until = ?, updated_at = ? "
+                      "where key = ?", (_owner(), now + self.lease, now, key))
+            row = c.execute("select * from outbox where key = ?", (key,)).fetchone()
+        return self._entry(row)
+
+    def _set(self, key: str, **fields):
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{k} = ?" for k in fields)
+        with self._tx() as c:
+            c.execute(f"update outbox set {assignments} where key = ?", (*fields.values(), key))
+
+    def finish(self, key: str, result: Any):
+        self._set(key, state=DONE, result=_dumps(result), error=None, owner=None, lease_until=None)
+
+    def fail(self, key: str, error: str):
+        self._set(key, state=FAILED, error=error, owner=None, lease_until=None)
+
+    def release(self, key: str, error: str):
+        """Give up the claim but keep the write pending (a retry or replay() picks it up)."""
+        self._set(key, error=error, owner=None, lease_until=None)
+
+    def entries(self, state: Optional[str] = None, limit: int = 100) -> List[Dict]:
+        with self._lock:
+            if state:
+                rows = self._conn.execute("select * from outbox where state = ? order by created_at limit ?",
+                                          (state, limit)).fetchall()
+            else:
+                rows = self._conn.execute("select * from outbox order by created_at limit ?", (limit,)).fetchall()
+        return [self._entry(r) for r in rows]
+
+    def purge(self, older_than: float) -> int:
+        """Forget done and failed writes last touched more than older_than seconds ago."""
+        with self._tx() as c:
+            return c.execute("delete from outbox where state != ? and updated_at < ?",
+                             (PENDING, time.time() - older_than)).rowcount
+
+
+_outboxes: Dict[str, Outbox] = {}
+_outboxes_lock = threading.Lock()
+_handlers: Dict[str, Callable[[Dict], Any]] = {}
+_replayed = False
+
+
+def get_outbox() -> Outbox:
+    """The process's Outbox for config.OUTBOX_PATH."""
+    path = config.OUTBOX_PATH
+    with _outboxes_lock:
+        box = _outboxes.get(path)
+        if box is None:
+            box = _outboxes[path] = Outbox(path)
+        return box
+
+
+def register(kind: str, handler: Callable[[Dict], Any]):
+    """handler(entry) runs the steps of a claimed `kind` write from entry["plan"] and returns its result."""
+    _handlers[kind] = handler
+
+
+def drive(entry: Dict, steps: Callable[[Dict], Any]) -> Any:
+    """
+    Run steps(entry) for a claimed entry and record the outcome: the return
+    value as the result, an error as failed, or, for a network error,
+    nothing (the entry stays pending). Errors are re-raised.
+    """
+    box = get_outbox()
+    try:
+        result = steps(entry)
+    except Exception as e:
+        if is_transient(e):
+            box.release(entry["key"], f"{type(e).__name__}: {e}")
+        else:
+            box.fail(entry["key"], str(e))
+        raise
+    box.finish(entry["key"], result)
+    return result
+
+
+def replay(limit: int = 100) -> Dict:
+    """Finish pending writes nobody holds. Returns counts by outcome."""
+    # the services register their handlers on import
+    from src.services import order_service, payment_service  # noqa: F401
+    box = get_outbox()
+    counts = {"replayed": 0, DONE: 0, FAILED: 0, PENDING: 0, "busy": 0}
+    for entry in box.entries(PENDING, limit):
+        try:
+            entry = box.claim(entry["key"], entry["kind"], entry["request"])
+        except KeyInUse:
+            counts["busy"] += 1
+            continue
+        if entry["state"] != PENDING:
+            continue
+        counts["replayed"] += 1
+        try:
+            drive(entry, _handlers[entry["kind"]])
+        except Exception as e:
+            log.warning("outbox replay of %s %s: %s", entry["kind"], entry["key"], e)
+        counts[box.get(entry["key"])["state"]] += 1
+    return counts
+
+
+def replay_once():
+    """replay() on the first keyed write of the process (writes an earlier run left pending)."""
+    global _replayed
+    with _outboxes_lock:
+        if _replayed:
+            return
+        _replayed = True
+    try:
+        replay()
+    except Exception as e:
+        log.warning("outbox replay failed: %s", e)
@@ -2,31 +2,89 @@ from typing import Dict, Optional
 from datetime import datetime
 import src.dao.payment_dao as payment_dao
 import src.dao.order_dao as order_dao
+from src.services import events, outbox, write_behind
 
 class PaymentError(Exception):
     pass
 
-def pay_order(order_id: int, method: str) -> Dict:
-    order = order_dao.get_order_by_id(order_id)
+def pay_order(order_id: int, method: str, idempotency_key: Optional[str] = None) -> Dict:
+    if idempotency_key is not None:
+        return _pay_order_once(idempotency_key, order_id, method)
+    order = write_behind.overlay_order(order_dao.get_order_by_id(order_id))
     if not order:
         raise PaymentError("Order not found")
     if order["status"] != "PLACED":
         raise PaymentError("Only PLACED orders can be paid")
 
+    # Claim the order first (PLACED -> COMPLETED), so a concurrent cancel or
+    # payment that got there first leaves no payment row behind
+    completed = order_dao.update_order_status(order_id, "COMPLETED", expected_status="PLACED")
+    if not completed:
+        raise PaymentError("Only PLACED orders can be paid")
+
     # Create payment record
-    payment = payment_dao.create_payment(order_id, order["total_amount"], method)
-    
-    # Mark order as COMPLETED
-    order_dao.update_order_status(order_id, "COMPLETED")
-    
+    try:
+        payment = payment_dao.create_payment(order_id, order["total_amount"], method)
+    except Exception:
+        order_dao.update_order_status(order_id, "PLACED", expected_status="COMPLETED")
+        raise
+
+    events.publish("order_paid", order=completed, payment=payment)
     return payment
 
+def _pay_order_once(key: str, order_id: int, method: str) -> Dict:
+    """
+    pay_order() as an outbox write (see order_service._create_order_once):
+    one payment row per key, and the PLACED -> COMPLETED update is
+    conditional, so a retry after a lost response completes the same
+    payment instead of charging again.
+    """
+    outbox.replay_once()
+    box = outbox.get_outbox()
+    plan = None
+    if box.get(key) is None:
+        order = write_behind.overlay_order(order_dao.get_order_by_id(order_id))
+        if not order:
+            raise PaymentError("Order not found")
+        # a COMPLETED order may have been paid by this key before the outbox knew it
+        if order["status"] != "PLACED" and payment_dao.get_payment_by_key(key) is None:
+            raise PaymentError("Only PLACED orders can be paid")
+        plan = {"amount": order["total_amount"]}
+    try:
+        entry = box.claim(key, "payment", {"order_id": order_id, "method": method}, plan)
+    except outbox.OutboxError as e:
+        raise PaymentError(str(e))
+    if entry["state"] == outbox.DONE:
+        return entry["result"]
+    if entry["state"] == outbox.FAILED:
+        raise PaymentError(entry["error"])
+    return outbox.drive(entry, _payment_steps)
+
+def _payment_steps(entry: Dict) -> Dict:
+    key, request = entry["key"], entry["request"]
+    order_id = request["order_id"]
+    payment, _ = payment_dao.create_payment_once(order_id, entry["plan"]["amount"], request["method"], key)
+    completed = order_dao.update_order_status(order_id, "COMPLETED", expected_status="PLACED")
+    if not completed:
+        order = order_dao.get_order_by_id(order_id)
+        if not order or order["status"] != "COMPLETED":
+            payment_dao.update_payment(payment["payment_id"], {"status": "FAILED"})
+            raise PaymentError("Only PLACED orders can be paid")
+        # an earlier attempt completed it and its response was lost
+        completed = order
+    events.publish("order_paid", order=completed, payment=payment)
+    return payment
+
+outbox.register("payment", _payment_steps)
+
 def refund_order(order_id: int) -> Dict:
-    order = order_dao.get_order_by_id(order_id)
+    order = write_behind.overlay_order(order_dao.get_order_by_id(order_id))
     if not order:
         raise PaymentError("Order not found")
     if order["status"] != "CANCELLED":
         raise PaymentError("Only CANCELLED orders can be refunded")
 
     payment = payment_dao.mark_payment_refunded(order_id)
+    if not payment:
+        raise PaymentError("No payment found for order")
     return payment
@@ -0,0 +1,256 @@
+# src/services/product_bulk_service.py
+"""
+Bulk product import / export.
+
+Import streams CSV, NDJSON or Parquet input, validates each row with the
+add_product rules, rejects duplicate SKUs inside the file, and writes in
+chunks: one batched SKU existence check plus one upsert per column set in
+the chunk, with chunks spread over a small worker pool. Rows that fail are
+written to a reject file (NDJSON: line, row, error) instead of stopping the
+run. An existing product only gets the columns its row gives; a new stock
+is applied as a delta through stock_service.adjust, so reservations made
+since the chunk read the product are kept and "stock_changed" is published
+like for any other stock adjustment.
+
+Export streams the catalog through keyset pagination, so memory stays
+constant whatever the catalog size.
+"""
+import csv
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+import src.dao.product_dao as product_dao
+import src.services.stock_service as stock_service
+from src.services import product_service
+from src.services.product_service import ProductError
+
+FORMATS = ("csv", "ndjson", "parquet")
+COLUMNS = ["prod_id", "name", "sku", "price", "stock", "category"]
+
+
+def detect_format(path: str, fmt: Optional[str] = None) -> str:
+    if fmt:
+        if fmt not in FORMATS:
+            raise ProductError(f"Unsupported format: {fmt} (use one of {', '.join(FORMATS)})")
+        return fmt
+    lower = path.lower()
+    if lower.endswith(".csv"):
+        return "csv"
+    if lower.endswith((".ndjson", ".jsonl", ".json")):
+        return "ndjson"
+    if lower.endswith(".parquet"):
+        return "parquet"
+    raise ProductError(f"Cannot tell the format of {path}; pass --format")
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+        return pyarrow
+    except ImportError:
+        raise ProductError("Parquet support needs pyarrow (pip install pyarrow)")
+
+
+def read_rows(path: str, fmt: Optional[str] = None) -> Iterator[Tuple[int, Dict]]:
+    """Yield (line/row number, raw dict) from a product file without loading it whole."""
+    fmt = detect_format(path, fmt)
+    if fmt == "csv":
+        with open(path, newline="", encoding="utf-8") as f:
+            # line 1 is the header
+            for n, row in enumerate(csv.DictReader(f), start=2):
+                yield n, row
+    elif fmt == "ndjson":
+        with open(path, encoding="utf-8") as f:
+            for n, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield n, json.loads(line)
+                except ValueError as e:
+                    yield n, {"__error__": f"invalid JSON: {e}", "__raw__": line.rstrip()}
+    else:
+        pa = _pyarrow()
+        n = 0
+        for batch in pa.parquet.ParquetFile(path).iter_batches(batch_size=10_000):
+            for row in batch.to_pylist():
+                n += 1
+                yield n, row
+
+
+def _normalise(raw: Dict) -> Dict:
+    """
+    Validated payload. Optional columns the row does not give (no stock
+    value, no category column) are left out, so existing products keep them.
+    """
+    if "__error__" in raw:
+        raise ProductError(raw["__error__"])
+    try:
+        price = float(raw["price"]) if raw.get("price") not in (None, "") else None
+        stock = int(float(raw["stock"])) if raw.get("stock") not in (None, "") else 0
+    except (TypeError, ValueError):
+        raise ProductError("price/stock must be numeric")
+    payload = product_service.validate_new_product(
+        str(raw.get("name") or ""), str(raw.get("sku") or ""), price, stock, raw.get("category") or None
+    )
+    if raw.get("stock") in (None, ""):
+        del payload["stock"]
+    if "category" not in raw:
+        del payload["category"]
+    return payload
+
+
+def _upsert_by_columns(payloads: List[Dict]) -> List[Dict]:
+    # a bulk upsert sends a column missing from one row as NULL for that row,
+    # so rows are written in groups that give the same columns
+    groups: Dict[Tuple[str, ...], List[Dict]] = {}
+    for p in payloads:
+        groups.setdefault(tuple(sorted(p)), []).append(p)
+    written = []
+    for rows in groups.values():
+        written.extend(product_dao.upsert_products(rows))
+    return written
+
+
+def _write_chunk(chunk: List[Tuple[int, Dict]], on_existing: str) -> Dict:
+    """
+    One existence query, one upsert per column set and one stock adjustment
+    for a chunk of validated payloads.
+    """
+    existing = {p["sku"]: p for p in product_dao.get_products_by_skus([p["sku"] for _, p in chunk])}
+    rejects = []
+    if on_existing == "reject":
+        rejects = [(n, p, f"SKU already exists: {p['sku']}") for n, p in chunk if p["sku"] in existing]
+        chunk = [(n, p) for n, p in chunk if p["sku"] not in existing]
+    payloads = [{k: v for k, v in p.items() if k != "stock"} if p["sku"] in existing
+                else dict({"stock": 0, "category": None}, **p) for _, p in chunk]
+    try:
+        written = _upsert_by_columns(payloads)
+    except Exception as e:
+        return {"written": [], "inserted": 0, "updated": 0,
+                "rejects": rejects + [(n, p, f"chunk write failed: {e}") for n, p in chunk]}
+    updated = sum(1 for _, p in chunk if p["sku"] in existing)
+
+    deltas, known, lines = {}, {}, {}
+    for n, p in chunk:
+        old = existing.get(p["sku"])
+        if old is not None and "stock" in p:
+            known[old["prod_id"]] = int(old.get("stock") or 0)
+            deltas[old["prod_id"]] = p["stock"] - known[old["prod_id"]]
+            lines[old["prod_id"]] = (n, p)
+    if any(deltas.values()):
+        try:
+            adjusted = {row["prod_id"]: row for row in stock_service.adjust(deltas, known)}
+            written = [adjusted.get(row["prod_id"], row) for row in written]
+        except stock_service.StockError as e:
+            # the other columns are written; only the stock of these rows is not
+            rejects += [(n, p, f"stock not updated: {e}") for pid, (n, p) in lines.items() if deltas[pid]]
+    return {"written": written, "inserted": len(chunk) - updated, "updated": updated, "rejects": rejects}
+
+
+def import_products(rows: Iterable[Tuple[int, Dict]], chunk_size: int = 1000, workers: int = 4,
+                    on_existing: str = "update", reject_file: Optional[str] = None,
+                    progress: Optional[Callable[[Dict], None]] = None) -> Dict:
+    """
+    Import (line number, raw row) pairs, e.g. from read_rows().
+    on_existing: "update" upserts SKUs that already exist, "reject" treats
+    them like add_product does (rejected with an error).
+    Returns counts and throughput; rejected rows go to reject_file if given.
+    """
+    if on_existing not in ("update", "reject"):
+        raise ProductError("on_existing must be 'update' or 'reject'")
+    if chunk_size <= 0 or workers <= 0:
+        raise ProductError("chunk_size and workers must be positive")
+
+    stats = {"rows": 0, "inserted": 0, "updated": 0, "rejected": 0}
+    reject_out = open(reject_file, "w", encoding="utf-8") if reject_file else None
+    seen_skus: Dict[str, int] = {}
+    start = time.perf_counter()
+
+    def reject(n, row, error):
+        stats["rejected"] += 1
+        if reject_out:
+            reject_out.write(json.dumps({"line": n, "row": row, "error": error}, default=str) + "\n")
+
+    def collect(done):
+        for fut in done:
+            result = fut.result()
+            stats["inserted"] += result["inserted"]
+            stats["updated"] += result["updated"]
+            for n, row, error in result["rejects"]:
+                reject(n, row, error)
+            product_service.index_products(result["written"])
+        if progress:
+            progress(dict(stats, seconds=time.perf_counter() - start))
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="product-import") as pool:
+            in_flight = set()
+            chunk: List[Tuple[int, Dict]] = []
+            for n, raw in rows:
+                stats["rows"] += 1
+                try:
+                    payload = _normalise(raw)
+                except ProductError as e:
+                    reject(n, raw, str(e))
+                    continue
+                first = seen_skus.setdefault(payload["sku"], n)
+                if first != n:
+                    reject(n, raw, f"duplicate SKU {payload['sku']} in input (first on line {first})")
+                    continue
+                chunk.append((n, payload))
+                if len(chunk) >= chunk_size:
+                    in_flight.add(pool.submit(_write_chunk, chunk, on_existing))
+                    chunk = []
+                    # backpressure: don't read further ahead than the workers can write
+                    if len(in_flight) >= workers * 2:
+                        done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                        collect(done)
+            if chunk:
+                in_flight.add(pool.submit(_write_chunk, chunk, on_existing))
+            collect(in_flight)
+    finally:
+        if reject_out:
+            reject_out.close()
+
+    elapsed = time.perf_counter() - start
+    stats["seconds"] = round(elapsed, 3)
+    stats["rows_per_sec"] = round(stats["rows"] / elapsed, 1) if elapsed else None
+    return stats
+
+
+def export_products(path: str, fmt: Optional[str] = None, category: Optional[str] = None,
+                    batch_size: int = 1000) -> int:
+    """Stream the catalog to a file; returns the number of rows written."""
+    fmt = detect_format(path, fmt)
+    rows = product_dao.iter_products(batch_size=batch_size, category=category)
+    count = 0
+    if fmt == "csv":
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=COLUMNS, extrasaction="ignore")
+            writer.writeheader()
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+    elif fmt == "ndjson":
+        with open(path, "w", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row, default=str) + "\n")
+                count += 1
+    else:
+        pa = _pyarrow()
+        schema = pa.schema([("prod_id", pa.int64()), ("name", pa.string()), ("sku", pa.string()),
+                            ("price", pa.float64()), ("stock", pa.int64()), ("category", pa.string())])
+        with pa.parquet.ParquetWriter(path, schema) as writer:
+            batch: List[Dict] = []
+            for row in rows:
+                batch.append({c: row.get(c) for c in COLUMNS})
+                if len(batch) >= batch_size:
+                    writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                    count += len(batch)
+                    batch = []
+            if batch:
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                count += len(batch)
+    return count
@@ -1,6 +1,13 @@
 # src/services/product_service.py
 from typing import Optional, Dict, List
 import src.dao.product_dao as product_dao
+import src.services.stock_service as stock_service
+from src.services import events, write_behind
+from src.services import low_stock_service  # registers the threshold-crossing subscribers
+from src.services.search_index import ProductSearchIndex
+
+# optional in-process name index (see enable_search_index)
+_search_index: Optional[ProductSearchIndex] = None
 
 class ProductError(Exception):
     """Base exception for product service errors."""
@@ -18,13 +25,10 @@ class ProductDeleteError(ProductError):
     """Raised when product cannot be deleted (e.g., referenced in orders)."""
     pass
 
-def add_product(name: str, sku: str, price: float, stock: int = 0, category: Optional[str] = None) -> Dict:
+def validate_new_product(name: str, sku: str, price: float, stock: int = 0, category: Optional[str] = None) -> Dict:
     """
-    Validate and insert a new product.
-    Raises:
-      ProductExistsError if SKU already exists.
-      ProductError for validation failures.
-    Returns created product dict.
+    Check the add_product rules and return the normalised insert payload.
+    Raises ProductError for validation failures (no database access).
     """
     if not name or not name.strip():
         raise ProductError("Product name is required")
@@ -34,22 +38,50 @@ def add_product(name: str, sku: str, price: float, stock: int = 0, category: Opt
         raise ProductError("Price must be greater than 0")
     if stock is None or int(stock) < 0:
         raise ProductError("Stock must be >= 0")
+    return {
+        "name": name.strip(),
+        "sku": sku.strip(),
+        "price": float(price),
+        "stock": int(stock),
+        "category": category.strip() if category else None,
+    }
 
-    # SKU uniqueness check
-    existing = product_dao.get_product_by_sku(sku.strip())
+def add_product(name: str, sku: str, price: float, stock: int = 0, category: Optional[str] = None) -> Dict:
+    """
+    Validate and insert a new product.
+    Raises:
+      ProductExistsError if SKU already exists.
+      ProductError for validation failures.
+    Returns created product dict.
+    """
+    p = validate_new_product(name, sku, price, stock, category)
+
+    # SKU uniqueness check (bypass the cache: a stale miss would let a duplicate through)
+    existing = product_dao.get_product_by_sku(p["sku"], fresh=True)
     if existing:
-        raise ProductExistsError(f"SKU already exists: {sku.strip()} (prod_id={existing.get('prod_id')})")
+        raise ProductExistsError(f"SKU already exists: {p['sku']} (prod_id={existing.get('prod_id')})")
 
-    created = product_dao.create_product(name.strip(), sku.strip(), float(price), int(stock), category.strip() if category else None)
+    created = product_dao.create_product(p["name"], p["sku"], p["price"], p["stock"], p["category"])
     if not created:
         raise ProductError("Failed to create product")
+    index_products([created])
     return created
 
+def index_products(rows: List[Dict]) -> None:
+    """
+    Feed created/updated rows to the in-process search index, if enabled,
+    and to "products_changed" subscribers (e.g. catalog views in app.py).
+    """
+    if _search_index is not None:
+        for row in rows:
+            _search_index.add(row)
+    events.publish("products_changed", rows=rows, deleted=[])
+
 def get_product(prod_id: int) -> Dict:
     """
     Return product dict or raise ProductNotFoundError.
     """
-    p = product_dao.get_product_by_id(prod_id)
+    p = write_behind.overlay_product(product_dao.get_product_by_id(prod_id))
     if not p:
         raise ProductNotFoundError(f"Product not found: {prod_id}")
     return p
@@ -60,17 +92,43 @@ def list_products(limit: int = 100, category: Optional[str] = None) -> List[Dict
     """
     return product_dao.list_products(limit=limit, category=category)
 
-def search_products_by_name(name_substr: str, limit: int = 100) -> List[Dict]:
+def search_products_by_name(name_substr: str, limit: int = 100, offset: int = 0) -> List[Dict]:
     """
-    Simple search by substring on product name.
-    (Implemented in service so UI/CLI can call it; DAO currently doesn't do LIKE queries,
-    so we use list_products and filter in Python.)
+    Case-insensitive substring search on product name, run by the database
+    (ILIKE) so the whole catalog is searched, not just the first page.
+    Paginate with limit/offset.
     """
-    name_substr = (name_substr or "").strip().lower()
+    name_substr = (name_substr or "").strip()
     if not name_substr:
-        return list_products(limit=limit)
-    allp = product_dao.list_products(limit=1000)
-    return [p for p in allp if name_substr in (p.get("name") or "").lower()][:limit]
+        return product_dao.list_products(limit=limit, offset=offset)
+    return product_dao.search_products(name_substr, limit=limit, offset=offset)
+
+def enable_search_index(page_size: int = 1000) -> ProductSearchIndex:
+    """
+    Load every product into the in-process name index and keep it current on
+    add/update/delete and stock changes from this process. Meant for
+    long-lived UIs (Streamlit).
+    """
+    global _search_index
+    if _search_index is None:
+        _search_index = ProductSearchIndex().build(product_dao.iter_products(batch_size=page_size))
+        events.subscribe("stock_changed", _index_stock_changes)
+    return _search_index
+
+def _index_stock_changes(changes, **_):
+    if _search_index is not None:
+        for change in changes:
+            if change.get("product"):
+                _search_index.add(change["product"])
+
+def quick_search(query: str, limit: int = 20, fuzzy: bool = True) -> List[Dict]:
+    """
+    Prefix/fuzzy name search for typeahead. Uses the in-process index when
+    enabled, otherwise falls back to the database search.
+    """
+    if _search_index is None:
+        return search_products_by_name(query, limit=limit)
+    return _search_index.search(query, limit=limit, fuzzy=fuzzy)
 
 def update_product(prod_id: int, fields: Dict) -> Dict:
     """
@@ -97,7 +155,7 @@ def update_product(prod_id: int, fields: Dict) -> Dict:
             sku_val = str(v).strip()
             if not sku_val:
                 raise ProductError("SKU cannot be empty")
-            other = product_dao.get_product_by_sku(sku_val)
+            other = product_dao.get_product_by_sku(sku_val, fresh=True)
             if other and other.get("prod_id") != prod_id:
                 raise ProductExistsError(f"SKU '{sku_val}' is already used by prod_id={other.get('prod_id')}")
             updates[k] = sku_val
@@ -120,6 +178,7 @@ def update_product(prod_id: int, fields: Dict) -> Dict:
     updated = product_dao.update_product(prod_id, updates)
     if not updated:
         raise ProductError("Failed to update product")
+    index_products([updated])
     return updated
 
 def restock_product(prod_id: int, delta: int) -> Dict:
@@ -129,11 +188,16 @@ def restock_product(prod_id: int, delta: int) -> Dict:
     """
     if delta is None or int(delta) <= 0:
         raise ProductError("Delta must be a positive integer")
-    p = product_dao.get_product_by_id(prod_id)
+    wb = write_behind.active()
+    p = (wb and wb.product(prod_id)) or product_dao.get_product_by_id(prod_id)
     if not p:
         raise ProductNotFoundError(f"Product not found: {prod_id}")
-    new_stock = (p.get("stock") or 0) + int(delta)
-    return product_dao.update_product(prod_id, {"stock": new_stock})
+    if wb is not None:
+        # summed with other queued deltas for this product, written by the next flush
+        return wb.add_stock({prod_id: int(delta)}, {prod_id: p})[0]
+    # atomic increment (no lost updates under concurrent writers)
+    rows = stock_service.adjust({prod_id: int(delta)}, {prod_id: int(p.get("stock") or 0)})
+    return rows[0]
 
 def reduce_stock(prod_id: int, delta: int) -> Dict:
     """
@@ -143,14 +207,24 @@ def reduce_stock(prod_id: int, delta: int) -> Dict:
     """
     if delta is None or int(delta) <= 0:
         raise ProductError("Delta must be a positive integer")
-    p = product_dao.get_product_by_id(prod_id)
+    wb = write_behind.active()
+    p = (wb and wb.product(prod_id)) or product_dao.get_product_by_id(prod_id, fresh=True)
     if not p:
         raise ProductNotFoundError(f"Product not found: {prod_id}")
     current = int(p.get("stock") or 0)
     if current < int(delta):
         raise ProductError(f"Insufficient stock for product {prod_id}: available={current}, required={delta}")
-    new_stock = current - int(delta)
-    return product_dao.update_product(prod_id, {"stock": new_stock})
+    if wb is not None:
+        try:
+            return wb.add_stock({prod_id: -int(delta)}, {prod_id: p})[0]
+        except stock_service.StockError as e:
+            raise ProductError(str(e))
+    # conditional decrement: fails instead of overselling if stock moved meanwhile
+    try:
+        rows = stock_service.reserve({prod_id: int(delta)}, {prod_id: current})
+    except stock_service.StockError as e:
+        raise ProductError(str(e))
+    return rows[0]
 
 def delete_product(prod_id: int) -> Dict:
     """
@@ -159,7 +233,7 @@ def delete_product(prod_id: int) -> Dict:
     We attempt to delete and return the deleted row (fetched prior to delete).
     If deletion fails (e.g., due to FK), raise ProductDeleteError with a helpful message.
     """
-    p = product_dao.get_product_by_id(prod_id)
+    p = product_dao.get_product_by_id(prod_id, fresh=True)
     if not p:
         raise ProductNotFoundError(f"Product not found: {prod_id}")
 
@@ -172,14 +246,20 @@ def delete_product(prod_id: int) -> Dict:
         deleted = product_dao.delete_product(prod_id)
         if not deleted:
             raise ProductDeleteError("Delete did not return deleted row — check DB constraints")
+        if _search_index is not None:
+            _search_index.remove(prod_id)
+        events.publish("products_changed", rows=[], deleted=[prod_id])
         return deleted
     except Exception as e:
         # Bubble up as ProductDeleteError for clearer messaging
         raise ProductDeleteError(f"Failed to delete product {prod_id}: {e}")
 
-def get_low_stock(threshold: int = 5) -> List[Dict]:
+def get_low_stock(threshold: Optional[int] = None) -> List[Dict]:
     """
-    Return products with stock <= threshold.
+    Return products with stock <= threshold, filtered by the database over the
+    whole catalog. Without a threshold each product is checked against its
+    own / its category's reorder threshold (see low_stock_service).
     """
-    allp = product_dao.list_products(limit=1000)
-    return [p for p in allp if (p.get("stock") or 0) <= int(threshold)]
+    if threshold is None:
+        return list(low_stock_service.iter_low_stock())
+    return list(product_dao.iter_products(max_stock=int(threshold)))
@@ -1,49 +1,44 @@
-from src.dao import order_dao, product_dao, customer_dao
+from src.dao import order_dao, report_dao
+from src.services import sales_aggregates
 from datetime import datetime, timedelta
+
+# Aggregations run in the database (sql/reports.sql): each report is one rpc
+# call returning rows that already carry product/customer names.
+
 def top_selling_products(limit: int = 5):
-    resp = product_dao._sb().table("order_items")\
-        .select("prod_id, sum(quantity) as total_qty")\
-        .group("prod_id")\
-        .order("total_qty", desc=True)\
-        .limit(limit)\
-        .execute()
-    data = resp.data or []
-    for d in data:
-        prod = product_dao.get_product_by_id(d["prod_id"])
-        d["product_name"] = prod["name"] if prod else "Unknown"
-    return data
+    """Best sellers by units: prod_id, product_name, total_qty, total_revenue, order_count."""
+    return report_dao.top_selling_products(limit)
 
 def total_revenue_last_month():
+    """
+    Revenue of COMPLETED orders placed in the previous calendar month: an O(1)
+    read where the running totals are held (dashboards), otherwise one query
+    over that month's orders.
+    """
     now = datetime.utcnow()
-    start = datetime(now.year, now.month-1, 1)
     end = datetime(now.year, now.month, 1)
-    resp = order_dao._sb().table("orders")\
-        .select("sum(total_amount)")\
-        .eq("status", "COMPLETED")\
-        .gte("order_date", start.isoformat())\
-        .lt("order_date", end.isoformat())\
-        .execute()
-    return resp.data[0]["sum"] if resp.data else 0
+    # step back from the 1st of this month so January rolls over to December
+    last_month = end - timedelta(days=1)
+    if sales_aggregates.is_built():
+        return sales_aggregates.revenue_for_month(last_month.year, last_month.month)
+    start = datetime(last_month.year, last_month.month, 1)
+    return order_dao.revenue_between(start.isoformat(), end.isoformat())
+
+def sales_snapshot():
+    """Running totals (revenue per day/month, units per product, orders per customer)."""
+    return sales_aggregates.snapshot()
+
+def reconcile_sales():
+    """Recompute the running totals from the orders table."""
+    return sales_aggregates.rebuild()
 
 def orders_per_customer():
-    resp = order_dao._sb().table("orders")\
-        .select("cust_id, count(order_id) as total_orders")\
-        .group("cust_id")\
-        .execute()
-    data = resp.data or []
-    for d in data:
-        cust = customer_dao.get_customer_by_id(d["cust_id"])
-        d["customer_name"] = cust["name"] if cust else "Unknown"
-    return data
+    """cust_id, customer_name, total_orders, total_spent for every customer with orders."""
+    return report_dao.orders_per_customer()
 
 def customers_more_than_n_orders(n: int = 2):
-    resp = order_dao._sb().table("orders")\
-        .select("cust_id, count(order_id) as total_orders")\
-        .group("cust_id")\
-        .having("count(order_id)", ">", n)\
-        .execute()
-    data = resp.data or []
-    for d in data:
-        cust = customer_dao.get_customer_by_id(d["cust_id"])
-        d["customer_name"] = cust["name"] if cust else "Unknown"
-    return data
+    return report_dao.customers_more_than_n_orders(n)
+
+def refresh_reports():
+    """Refresh the report materialized views now instead of waiting for the schedule."""
+    report_dao.refresh_views()
@@ -0,0 +1,283 @@
+# src/services/sales_aggregates.py
+"""
+Incrementally maintained sales totals for dashboards.
+
+Running totals are updated from order events instead of rescanning orders:
+  - revenue per day and per month (COMPLETED orders, keyed by order_date)
+  - units sold per product and orders per customer (orders not CANCELLED)
+Reads are dict lookups. The aggregate remembers each order's last applied
+status and only applies the difference on a transition, so repeated or
+replayed events are harmless. rebuild() recomputes everything from the
+database (on first read, and every SALES_FULL_REBUILD seconds).
+
+Orders placed or changed by other processes (CLI, daemon, order workers)
+are picked up by refresh(): at most every SALES_REFRESH_INTERVAL seconds a
+read fetches the orders whose updated_at is at or after the newest seen
+(sql/orders_updated_at.sql). An order read before its items were written
+is counted without units until a later refresh or event brings the items.
+Database reads happen outside the lock that guards the totals.
+"""
+import time
+import logging
+import threading
+from datetime import date, datetime
+from typing import Dict, List, Optional, Set
+import src.config as config
+import src.dao.order_dao as order_dao
+from src.services import events
+
+log = logging.getLogger(__name__)
+
+# statuses whose orders count as sales / as revenue
+_COUNTED = {"PLACED", "COMPLETED"}
+_REVENUE = {"COMPLETED"}
+
+
+class SalesAggregates:
+    def __init__(self):
+        self.revenue_by_day: Dict[str, float] = {}
+        self.revenue_by_month: Dict[str, float] = {}
+        self.units_by_product: Dict[int, int] = {}
+        self.orders_by_customer: Dict[int, int] = {}
+        self.order_status: Dict[int, str] = {}
+        self.order_stamp: Dict[int, str] = {}   # updated_at of the applied row
+        self.unitless: Set[int] = set()         # counted orders whose items were not there yet
+        self.watermark: Optional[str] = None
+        self.built_at: Optional[datetime] = None
+        self.loaded_at = time.monotonic()
+        self.checked_at = self.loaded_at
+
+    @staticmethod
+    def _add(d: Dict, key, amount):
+        value = d.get(key, 0) + amount
+        if value:
+            d[key] = value
+        else:
+            d.pop(key, None)
+
+    def _units(self, items: List[Dict], sign: int):
+        for it in items:
+            self._add(self.units_by_product, it["prod_id"], sign * it["quantity"])
+
+    def _contribute(self, order: Dict, status: Optional[str], items: Optional[List[Dict]], sign: int):
+        if status in _COUNTED:
+            self._add(self.orders_by_customer, order["cust_id"], sign)
+            self._units(items or (), sign)
+        if status in _REVENUE:
+            day = str(order.get("order_date") or "")[:10]
+            amount = sign * float(order.get("total_amount") or 0)
+            self._add(self.revenue_by_day, day, amount)
+            self._add(self.revenue_by_month, day[:7], amount)
+
+    def needs_items(self, order: Dict) -> bool:
+        """Whether apply(order) changes units, i.e. needs the order's items."""
+        old = self.order_status.get(order["order_id"])
+        new = order["status"]
+        if old == new:
+            return new in _COUNTED and order["order_id"] in self.unitless
+        return (old in _COUNTED) != (new in _COUNTED)
+
+    def fill_units(self, order_id: int, items: List[Dict]):
+        """Count the units of an order that was counted before its items existed."""
+        if items and order_id in self.unitless:
+            self.unitless.discard(order_id)
+            if self.order_status.get(order_id) in _COUNTED:
+                self._units(items, +1)
+
+    def apply(self, order: Dict, items: Optional[List[Dict]] = None):
+        """
+        Move `order` from its last applied status to order["status"].
+        `items` are only needed when units change (see needs_items());
+        they are fetched if not supplied. Rows older than the one already
+        applied (by updated_at) are ignored.
+        """
+        order_id = order["order_id"]
+        stamp = order.get("updated_at")
+        if stamp is not None:
+            if stamp < self.order_stamp.get(order_id, ""):
+                return
+            self.order_stamp[order_id] = stamp
+        old = self.order_status.get(order_id)
+        new = order["status"]
+        if old == new:
+            if items:
+                self.fill_units(order_id, items)
+            return
+        units_change = (old in _COUNTED) != (new in _COUNTED)
+        if units_change and items is None:
+            items = order_dao.get_order_items([order_id])
+        unitless = order_id in self.unitless
+        self._contribute(order, old, items if units_change and not unitless else None, -1)
+        self._contribute(order, new, items if units_change else None, +1)
+        self.order_status[order_id] = new
+        if new in _COUNTED and (not items if units_change else unitless):
+            self.unitless.add(order_id)
+        else:
+            self.unitless.discard(order_id)
+
+
+_lock = threading.Lock()
+_refresh_lock = threading.Lock()
+_state: Optional[SalesAggregates] = None
+_rebuilding = False
+_pending: List[tuple] = []
+
+
+def _items_by_order(order_ids) -> Dict[int, List[Dict]]:
+    items: Dict[int, List[Dict]] = {oid: [] for oid in order_ids}
+    if items:
+        for it in order_dao.get_order_items(list(items)):
+            items[it["order_id"]].append(it)
+    return items
+
+
+def _latest_stamp() -> Optional[str]:
+    # read before scanning: rows changed while the scan pages through the table
+    # are stamped at or after it, so the next refresh fetches them
+    try:
+        return order_dao.latest_order_update()
+    except Exception as e:
+        log.info("orders.updated_at unavailable, sales totals refresh by full rebuild: %s", e)
+        return None
+
+
+def _build(batch_size: int) -> SalesAggregates:
+    agg = SalesAggregates()
+    agg.watermark = _latest_stamp()
+    page: List[Dict] = []
+
+    def flush(orders: List[Dict]):
+        items = _items_by_order(o["order_id"] for o in orders)
+        for o in orders:
+            agg.apply(o, items[o["order_id"]])
+
+    for order in order_dao.iter_orders(batch_size=batch_size):
+        page.append(order)
+        if len(page) == batch_size:
+            flush(page)
+            page = []
+    if page:
+        flush(page)
+    agg.built_at = datetime.utcnow()
+    return agg
+
+
+def rebuild(batch_size: int = 500) -> SalesAggregates:
+    """
+    Recompute every total from the orders table and swap it in. Events that
+    arrive during the scan are replayed on the new totals afterwards.
+    """
+    global _state, _rebuilding
+    with _lock:
+        _rebuilding = True
+        _pending.clear()
+    try:
+        fresh = _build(batch_size)
+    finally:
+        with _lock:
+            _rebuilding = False
+    with _lock:
+        for order, items in _pending:
+            fresh.apply(order, items)
+        _pending.clear()
+        _state = fresh
+    return fresh
+
+
+def refresh(batch_size: int = 500) -> SalesAggregates:
+    """
+    Apply orders changed by any process since the last look (a full rebuild
+    when the totals are older than SALES_FULL_REBUILD, or when orders have no
+    updated_at column). A refresh already running in another thread is not
+    repeated.
+    """
+    state = _state
+    if state is None or time.monotonic() - state.loaded_at >= config.SALES_FULL_REBUILD:
+        return rebuild(batch_size)
+    if not _refresh_lock.acquire(blocking=False):
+        return state
+    try:
+        since = state.watermark
+        if since is None and state.order_status:
+            return rebuild(batch_size)
+        watermark = _latest_stamp()
+        orders = list(order_dao.iter_orders(batch_size=batch_size, changed_since=since))
+        with _lock:
+            need = {o["order_id"] for o in orders if state.needs_items(o)} | state.unitless
+        items = _items_by_order(need)
+        with _lock:
+            for o in orders:
+                state.apply(o, items.get(o["order_id"]))
+            for order_id in need:
+                state.fill_units(order_id, items[order_id])
+            if watermark is not None:
+                state.watermark = watermark
+            state.checked_at = time.monotonic()
+        return state
+    finally:
+        _refresh_lock.release()
+
+
+def is_built() -> bool:
+    """Whether this process holds the totals (a dashboard); one-shot callers can query instead."""
+    return _state is not None
+
+
+def _get() -> SalesAggregates:
+    state = _state
+    if state is None:
+        return rebuild()
+    if time.monotonic() - state.checked_at >= config.SALES_REFRESH_INTERVAL:
+        try:
+            return refresh()
+        except Exception as e:
+            state.checked_at = time.monotonic()
+            log.warning("sales totals not refreshed, serving the previous ones: %s", e)
+    return state
+
+
+def _on_order_event(order: Dict, items: Optional[List[Dict]] = None, **_):
+    with _lock:
+        state = _state
+        if state is None and not _rebuilding:
+            return  # not built yet: the first read rebuilds from the database anyway
+        fetch = items is None and (state is None or state.needs_items(order))
+    if fetch:
+        items = order_dao.get_order_items([order["order_id"]])
+    with _lock:
+        if _rebuilding:
+            _pending.append((dict(order), items))
+        if _state is not None:
+            _state.apply(order, items)
+
+
+for _event in ("order_placed", "order_paid", "order_cancelled"):
+    events.subscribe(_event, _on_order_event)
+
+
+# ---- O(1) reads ----
+
+def revenue_for_day(day) -> float:
+    key = day.isoformat() if isinstance(day, (date, datetime)) else str(day)
+    return _get().revenue_by_day.get(key[:10], 0.0)
+
+def revenue_for_month(year: int, month: int) -> float:
+    return _get().revenue_by_month.get(f"{year:04d}-{month:02d}", 0.0)
+
+def units_sold(prod_id: int) -> int:
+    return _get().units_by_product.get(prod_id, 0)
+
+def order_count(cust_id: int) -> int:
+    return _get().orders_by_customer.get(cust_id, 0)
+
+def snapshot() -> Dict:
+    """Copy of all running totals (for dashboards)."""
+    state = _get()
+    with _lock:
+        return {
+            "revenue_by_day": dict(state.revenue_by_day),
+            "revenue_by_month": dict(state.revenue_by_month),
+            "units_by_product": dict(state.units_by_product),
+            "orders_by_customer": dict(state.orders_by_customer),
+            "built_at": state.built_at,
+        }
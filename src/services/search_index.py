@@ -0,0 +1,135 @@
+# src/services/search_index.py
+"""
+Optional in-process product name index for interactive UIs.
+
+Keeps a sorted token list (for prefix matching: "choc" -> "chocolate") and a
+trigram posting list (for fuzzy matching: "choclate" -> "chocolate") over
+product names. It is kept current incrementally through add()/remove(), which
+product_service calls after add/update/delete when the index is enabled, and
+on every "stock_changed" event (rows are returned as indexed, stock included).
+"""
+import re
+import bisect
+import threading
+from typing import Dict, Iterable, List, Optional, Set
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _tokens(text: str) -> List[str]:
+    return _TOKEN_RE.findall((text or "").lower())
+
+
+def _trigrams(text: str) -> Set[str]:
+    grams = set()
+    for tok in _tokens(text):
+        padded = f"  {tok} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class ProductSearchIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._products: Dict[int, Dict] = {}
+        self._token_postings: Dict[str, Set[int]] = {}
+        self._sorted_tokens: List[str] = []
+        self._gram_postings: Dict[str, Set[int]] = {}
+        self._grams: Dict[int, Set[str]] = {}
+
+    def __len__(self):
+        return len(self._products)
+
+    def build(self, products: Iterable[Dict]) -> "ProductSearchIndex":
+        for p in products:
+            self.add(p)
+        return self
+
+    def add(self, product: Dict):
+        """Index (or re-index) a product row."""
+        prod_id = product["prod_id"]
+        with self._lock:
+            old = self._products.get(prod_id)
+            if old is not None and old.get("name") == product.get("name"):
+                # same tokens (e.g. a stock change): only the stored row changes
+                self._products[prod_id] = dict(product)
+                return
+            if old is not None:
+                self.remove(prod_id)
+            self._products[prod_id] = dict(product)
+            for tok in set(_tokens(product.get("name"))):
+                postings = self._token_postings.get(tok)
+                if postings is None:
+                    postings = self._token_postings[tok] = set()
+                    bisect.insort(self._sorted_tokens, tok)
+                postings.add(prod_id)
+            grams = _trigrams(product.get("name"))
+            self._grams[prod_id] = grams
+            for g in grams:
+                self._gram_postings.setdefault(g, set()).add(prod_id)
+
+    def remove(self, prod_id: int):
+        with self._lock:
+            product = self._products.pop(prod_id, None)
+            if product is None:
+                return
+            for tok in set(_tokens(product.get("name"))):
+                postings = self._token_postings.get(tok)
+                if postings is not None:
+                    postings.discard(prod_id)
+                    if not postings:
+                        del self._token_postings[tok]
+                        i = bisect.bisect_left(self._sorted_tokens, tok)
+                        if i < len(self._sorted_tokens) and self._sorted_tokens[i] == tok:
+                            del self._sorted_tokens[i]
+            for g in self._grams.pop(prod_id, ()):
+                postings = self._gram_postings.get(g)
+                if postings is not None:
+                    postings.discard(prod_id)
+                    if not postings:
+                        del self._gram_postings[g]
+
+    def _prefix_ids(self, prefix: str) -> Set[int]:
+        ids: Set[int] = set()
+        i = bisect.bisect_left(self._sorted_tokens, prefix)
+        while i < len(self._sorted_tokens) and self._sorted_tokens[i].startswith(prefix):
+            ids |= self._token_postings[self._sorted_tokens[i]]
+            i += 1
+        return ids
+
+    def search(self, query: str, limit: int = 20, fuzzy: bool = True, min_similarity: float = 0.3) -> List[Dict]:
+        """
+        Products whose name has a word starting with every query word, ordered
+        by prod_id; if fuzzy, topped up with trigram matches ranked by similarity.
+        """
+        words = _tokens(query)
+        if not words:
+            return []
+        with self._lock:
+            hits: Optional[Set[int]] = None
+            for w in words:
+                ids = self._prefix_ids(w)
+                hits = ids if hits is None else hits & ids
+                if not hits:
+                    break
+            exact = sorted(hits or ())
+            results = [dict(self._products[i]) for i in exact[:limit]]
+            if not fuzzy or len(results) >= limit:
+                return results
+
+            qgrams = _trigrams(query)
+            shared: Dict[int, int] = {}
+            for g in qgrams:
+                for pid in self._gram_postings.get(g, ()):
+                    shared[pid] = shared.get(pid, 0) + 1
+            seen = set(exact)
+            scored = []
+            for pid, n in shared.items():
+                if pid in seen:
+                    continue
+                sim = n / (len(qgrams) + len(self._grams[pid]) - n)
+                if sim >= min_similarity:
+                    scored.append((-sim, pid))
+            scored.sort()
+            results += [dict(self._products[pid]) for _, pid in scored[:limit - len(results)]]
+            return results
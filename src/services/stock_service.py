@@ -0,0 +1,232 @@
+# src/services/stock_service.py
+"""
+Contention-safe stock changes.
+
+Every stock change goes through adjust(), which never does a blind
+read-modify-write:
+  - "cas" engine: per-product conditional update (stock = new WHERE stock = old),
+    re-read and retry with jittered exponential backoff on conflict; a basket
+    that fails part-way is compensated so it is all-or-nothing. Threads in the
+    same process queue on a striped per-SKU lock around each attempt, so only
+    writers in other processes can cause a conflict.
+  - "rpc" engine: one call to the adjust_stock SQL function, atomic on the server.
+The engine is chosen by STOCK_ENGINE in src.config; the default "auto" uses
+rpc and switches to cas once the server reports adjust_stock missing. A
+change made with a key (idempotent order writes) always goes through
+adjust_stock_once (sql/idempotency.sql): a compare-and-swap whose response
+was lost cannot be told apart from one that never ran, so only the server
+can apply it once.
+A successful adjust() publishes "stock_changed" with the old and new stock of
+every product it touched (see low_stock_service).
+"""
+import time
+import random
+import logging
+import threading
+from typing import Dict, List, Optional
+import src.config as config
+import src.dao.product_dao as product_dao
+from src.services import events
+
+log = logging.getLogger(__name__)
+
+# SQLSTATE adjust_stock() raises when a product is missing or would go below zero
+# (sql/adjust_stock.sql): check_violation, what a stock >= 0 constraint reports
+INSUFFICIENT_STOCK_CODE = "23514"
+# what PostgreSQL / PostgREST report when sql/adjust_stock.sql is not installed
+MISSING_FUNCTION_CODES = ("42883", "PGRST202")
+
+class StockError(Exception):
+    pass
+
+class InsufficientStockError(StockError):
+    """Raised when a reservation would take stock below zero."""
+    pass
+
+class StockConflictError(StockError):
+    """Raised when a compare-and-swap keeps losing after all retries."""
+    pass
+
+_metrics_lock = threading.Lock()
+_metrics = {
+    "adjustments": 0,
+    "cas_attempts": 0,
+    "cas_conflicts": 0,
+    "retries_exhausted": 0,
+    "insufficient": 0,
+    "compensations": 0,
+    "compensation_failures": 0,
+    "rpc_calls": 0,
+    "backoff_seconds": 0.0,
+}
+
+# striped per-SKU locks: one in-flight CAS per product per process
+_STRIPES = [threading.Lock() for _ in range(64)]
+
+# stock this process last wrote per product, trusted over the caller's read
+# when the process is the sole writer of its SKUs (see set_sole_writer())
+_sole_writer = False
+_written: Dict[int, int] = {}
+
+# set when STOCK_ENGINE="auto" found adjust_stock missing on the server
+_rpc_missing = False
+
+def _count(key: str, n=1):
+    with _metrics_lock:
+        _metrics[key] += n
+
+def stock_metrics() -> Dict:
+    """Snapshot of contention counters since start (or the last reset)."""
+    with _metrics_lock:
+        m = dict(_metrics)
+    m["conflict_rate"] = m["cas_conflicts"] / m["cas_attempts"] if m["cas_attempts"] else 0.0
+    return m
+
+def reset_stock_metrics():
+    with _metrics_lock:
+        for k in _metrics:
+            _metrics[k] = 0.0 if isinstance(_metrics[k], float) else 0
+
+def _backoff(attempt: int):
+    delay = random.uniform(0, min(config.STOCK_BACKOFF_MAX, config.STOCK_BACKOFF_BASE * (2 ** attempt)))
+    _count("backoff_seconds", delay)
+    time.sleep(delay)
+
+def set_sole_writer(enabled: bool = True):
+    """
+    Declare that this process makes the stock changes to the products it
+    touches, as an order_pool worker does for its shard. The cas engine then
+    starts from the stock it last wrote rather than the caller's earlier
+    read, which another handler thread may have overtaken. A wrong guess
+    only costs a conflict and a re-read.
+    """
+    global _sole_writer
+    _sole_writer = enabled
+    _written.clear()
+
+def _cas_one(prod_id: int, delta: int, known_stock: Optional[int]) -> Dict:
+    """Apply one delta with compare-and-swap, retrying on conflict."""
+    current = known_stock
+    stripe = _STRIPES[hash(prod_id) % len(_STRIPES)]
+    for attempt in range(config.STOCK_MAX_RETRIES + 1):
+        with stripe:
+            if attempt == 0 and _sole_writer and prod_id in _written:
+                current = _written[prod_id]
+            if current is None:
+                prod = product_dao.get_product_by_id(prod_id, fresh=True)
+                if not prod:
+                    raise InsufficientStockError(f"Product {prod_id} not found")
+                current = int(prod.get("stock") or 0)
+            if current + delta < 0:
+                _count("insufficient")
+                raise InsufficientStockError(f"Insufficient stock for product {prod_id}: available={current}, required={-delta}")
+            _count("cas_attempts")
+            row = product_dao.compare_and_set_stock(prod_id, current, current + delta)
+            if row:
+                if _sole_writer:
+                    _written[prod_id] = int(row.get("stock") or 0)
+                return row
+            _count("cas_conflicts")
+            _written.pop(prod_id, None)
+            current = None
+        _backoff(attempt)
+    _count("retries_exhausted")
+    raise StockConflictError(f"Gave up updating stock for product {prod_id} after {config.STOCK_MAX_RETRIES} retries")
+
+def _adjust_cas(deltas: Dict[int, int], known: Dict[int, int]) -> List[Dict]:
+    applied: Dict[int, int] = {}
+    rows = []
+    try:
+        # stable order keeps competing baskets from starving each other
+        for prod_id in sorted(deltas):
+            rows.append(_cas_one(prod_id, deltas[prod_id], known.get(prod_id)))
+            applied[prod_id] = deltas[prod_id]
+    except Exception:
+        if applied:
+            _count("compensations")
+            _compensate(applied)
+        raise
+    return rows
+
+def _compensate(applied: Dict[int, int]):
+    """Undo applied deltas. Every product is attempted; failures are logged and counted, not raised."""
+    for prod_id, delta in applied.items():
+        try:
+            _cas_one(prod_id, -delta, None)
+        except Exception as e:
+            _count("compensation_failures")
+            log.error("stock of product %s is off by %+d: compensation failed: %s", prod_id, delta, e)
+
+def _adjust_rpc(deltas: Dict[int, int]) -> List[Dict]:
+    _count("rpc_calls")
+    try:
+        return product_dao.adjust_stock(deltas)
+    except Exception as e:
+        if getattr(e, "code", None) == INSUFFICIENT_STOCK_CODE:
+            _count("insufficient")
+            raise InsufficientStockError(str(e))
+        raise
+
+def _adjust_auto(deltas: Dict[int, int], known: Dict[int, int]) -> List[Dict]:
+    global _rpc_missing
+    if not _rpc_missing:
+        try:
+            return _adjust_rpc(deltas)
+        except Exception as e:
+            if getattr(e, "code", None) not in MISSING_FUNCTION_CODES:
+                raise
+            # the call failed before anything was applied
+            log.warning("adjust_stock is not installed (sql/adjust_stock.sql), using the cas stock engine: %s", e)
+            _rpc_missing = True
+    return _adjust_cas(deltas, known)
+
+def _adjust_once(key: str, deltas: Dict[int, int]) -> Optional[List[Dict]]:
+    """Rows after the change, or None if an earlier call with this key already applied it."""
+    _count("rpc_calls")
+    try:
+        result = product_dao.adjust_stock_once(key, deltas)
+    except Exception as e:
+        if getattr(e, "code", None) == INSUFFICIENT_STOCK_CODE:
+            _count("insufficient")
+            raise InsufficientStockError(str(e))
+        raise
+    return result["rows"] if result["applied"] else None
+
+def adjust(deltas: Dict[int, int], known_stock: Optional[Dict[int, int]] = None,
+           key: Optional[str] = None) -> List[Dict]:
+    """
+    Atomically apply signed stock deltas {prod_id: delta}.
+    known_stock ({prod_id: stock}) lets the cas engine skip the first read when
+    the caller already fetched the products. With `key`, retries of the same
+    change are no-ops (and publish nothing).
+    Returns the updated product rows; raises InsufficientStockError and leaves
+    stock untouched if any product would go negative.
+    """
+    deltas = {int(pid): int(d) for pid, d in deltas.items() if int(d) != 0}
+    if not deltas:
+        return []
+    _count("adjustments")
+    if key is not None:
+        rows = _adjust_once(key, deltas)
+        if rows is None:
+            return []
+    elif config.STOCK_ENGINE == "rpc":
+        rows = _adjust_rpc(deltas)
+    elif config.STOCK_ENGINE == "cas":
+        rows = _adjust_cas(deltas, known_stock or {})
+    else:
+        rows = _adjust_auto(deltas, known_stock or {})
+    events.publish("stock_changed", changes=[
+        {"product": row, "old": int(row.get("stock") or 0) - deltas[row["prod_id"]], "new": int(row.get("stock") or 0)}
+        for row in rows
+    ])
+    return rows
+
+def reserve(quantities: Dict[int, int], known_stock: Optional[Dict[int, int]] = None,
+            key: Optional[str] = None) -> List[Dict]:
+    """Take stock for {prod_id: qty} (all-or-nothing)."""
+    return adjust({pid: -int(q) for pid, q in quantities.items()}, known_stock, key)
+
+def release(quantities: Dict[int, int], key: Optional[str] = None) -> List[Dict]:
+    """Give stock back for {prod_id: qty}."""
+    return adjust({pid: int(q) for pid, q in quantities.items()}, key=key)
@@ -0,0 +1,602 @@
+# src/services/terminal.py
+"""
+Offline-first store terminal mode.
+
+With TERMINAL_MODE on, a terminal (retail-cli, its daemon, app.py) keeps a
+SQLite replica of products and customers (TERMINAL_REPLICA_PATH) and
+answers their reads from it: DAO reads of those two tables are routed to
+the replica (config.set_read_router), so they cost a local query instead of
+a WAN round trip and keep working while the link is down. Everything else
+(orders, payments, reports, all writes) still goes to the server; rows the
+server returns for writes to the two tables are copied into the replica.
+Reads made with fresh=True (the stock compare-and-swap) skip the replica.
+
+Orders are queued instead of placed (place_order): validated and priced
+against the replica, recorded in the outbox (src/services/outbox.py), and
+their quantities held in the replica so the terminal does not sell the same
+stock twice. A background thread runs sync() every TERMINAL_SYNC_INTERVAL
+seconds, and at once when an order is queued while the link is up:
+  - pull: rows with updated_at at or after the newest one seen
+    (sql/products_updated_at.sql, sql/customers_updated_at.sql), or with a
+    higher id on a schema without the column; everything every
+    TERMINAL_FULL_RESYNC seconds, which also drops rows deleted on the
+    server (and rows an in-flight transaction stamped behind the watermark);
+  - push: outbox.replay(). Queued orders go through the keyed, idempotent
+    steps of create_order, so one cut off half-way is finished, never
+    placed twice;
+  - settle: pushed orders give up their holds and their products are read
+    back from the server.
+Stock is server-authoritative: the replica's stock is the server's last
+value minus the holds of this terminal's unpushed orders. An order the
+server rejects (the stock went to another terminal) is failed in the outbox
+and counted as a conflict; dropping its hold restores the server's figure.
+
+status() reports sync lag: seconds since each table was pulled, orders
+waiting to be pushed and the age of the oldest, and how long pushed orders
+waited.
+"""
+import atexit
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+import src.config as config
+import src.dao.cache as cache
+from src.dao.paging import keyset_pages
+from src.services import events, order_service, outbox
+
+log = logging.getLogger(__name__)
+
+# replicated table -> primary key
+REPLICATED = {"products": "prod_id", "customers": "cust_id"}
+WRITES = ("insert", "upsert", "update", "delete")
+
+SCHEMA = """
+create table if not exists replica_state (
+    table_name text primary key,
+    mode       text not null default 'updated_at',
+    watermark  text,
+    max_id     integer,
+    pulled_at  real,
+    full_at    real
+);
+create table if not exists replica_holds (
+    key      text not null,
+    prod_id  integer not null,
+    quantity integer not null,
+    held_at  real not null,
+    primary key (key, prod_id)
+);
+"""
+
+
+def _chunks(values: List, size: int = 500) -> Iterable[List]:
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+class Replica:
+    """
+    The terminal's SQLite file: products and customers as last seen on the
+    server (read through a SQLiteClient, like any local backend), the sync
+    state of each table and the stock held by queued orders.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.client = config.open_backend("sqlite", path=path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.executescript(SCHEMA)
+        self._columns = {t: [r[1] for r in self._conn.execute(f"pragma table_info({t})")] for t in REPLICATED}
+        self._ready = {r[0] for r in self._conn.execute("select table_name from replica_state where full_at is not null")}
+
+    @contextmanager
+    def _tx(self):
+        with self._lock:
+            self._conn.execute("begin immediate")
+            try:
+                yield self._conn
+                self._conn.execute("commit")
+            except BaseException:
+                self._conn.execute("rollback")
+                raise
+
+    def ready(self, table: str) -> bool:
+        """True once the table has been loaded in full (until then its reads go to the server)."""
+        return table in self._ready
+
+    def state(self, table: str) -> Dict:
+        with self._lock:
+            row = self._conn.execute("select * from replica_state where table_name = ?", (table,)).fetchone()
+        if row is None:
+            return {"table_name": table, "mode": "updated_at", "watermark": None, "max_id": None,
+                    "pulled_at": None, "full_at": None}
+        return dict(row)
+
+    def count(self, table: str) -> int:
+        with self._lock:
+            return self._conn.execute(f"select count(*) from {table}").fetchone()[0]
+
+    def apply(self, table: str, rows: List[Dict], full: bool = False, pulled: bool = False,
+              mode: Optional[str] = None, release: Iterable[str] = ()) -> Tuple[List[Dict], List]:
+        """
+        Store rows as the server returned them, in one transaction. Product
+        stock becomes the server's value minus the holds left after dropping
+        those of `release` (settled orders). full: rows are the whole table
+        and the rest is deleted; pulled: advance the table's sync state.
+        Returns (rows as stored, deleted ids).
+        """
+        pk = REPLICATED[table]
+        columns = self._columns[table]
+        release = list(release)
+        now = time.time()
+        with self._tx() as c:
+            deleted = []
+            if full:
+                keep = {r[pk] for r in rows}
+                deleted = [r[0] for r in c.execute(f"select {pk} from {table}") if r[0] not in keep]
+                for chunk in _chunks(deleted):
+                    c.execute(f"delete from {table} where {pk} in ({', '.join('?' * len(chunk))})", chunk)
+            for key in release:
+                c.execute("delete from replica_holds where key = ?", (key,))
+            for row in rows:
+                cols = [col for col in columns if col in row]
+                # replace also evicts a row holding the same sku / email under another id
+                c.execute(f"insert or replace into {table} ({', '.join(cols)}) values ({', '.join('?' * len(cols))})",
+                          [row[col] for col in cols])
+            ids = [r[pk] for r in rows]
+            if table == "products":
+                self._subtract_holds(c, ids)
+            if pulled:
+                self._advance(c, table, rows, full, mode, now)
+            stored = []
+            for chunk in _chunks(ids):
+                stored += [dict(r) for r in c.execute(
+                    f"select * from {table} where {pk} in ({', '.join('?' * len(chunk))})", chunk)]
+        if pulled and full:
+            self._ready.add(table)
+        return stored, deleted
+
+    @staticmethod
+    def _subtract_holds(c: sqlite3.Connection, prod_ids: List[int]):
+        for chunk in _chunks(prod_ids):
+            c.execute("update products set stock = stock - (select sum(quantity) from replica_holds h "
+                      "where h.prod_id = products.prod_id) "
+                      f"where prod_id in ({', '.join('?' * len(chunk))}) "
+                      "and prod_id in (select prod_id from replica_holds)", chunk)
+
+    def _advance(self, c: sqlite3.Connection, table: str, rows: List[Dict], full: bool, mode: Optional[str],
+                 now: float):
+        pk = REPLICATED[table]
+        old = c.execute("select * from replica_state where table_name = ?", (table,)).fetchone()
+        stamps = [r["updated_at"] for r in rows if r.get("updated_at") is not None]
+        ids = [r[pk] for r in rows]
+        watermark = max(stamps) if stamps else None
+        max_id = max(ids) if ids else None
+        if old is not None and not full:
+            watermark = max(filter(None, (watermark, old["watermark"])), default=None)
+            max_id = max(filter(None, (max_id, old["max_id"])), default=None)
+        mode = mode or (old["mode"] if old is not None else "updated_at")
+        full_at = now if full else (old["full_at"] if old is not None else None)
+        c.execute("insert or replace into replica_state (table_name, mode, watermark, max_id, pulled_at, full_at) "
+                  "values (?, ?, ?, ?, ?, ?)", (table, mode, watermark, max_id, now, full_at))
+
+    def delete(self, table: str, ids: List) -> None:
+        pk = REPLICATED[table]
+        with self._tx() as c:
+            for chunk in _chunks(ids):
+                c.execute(f"delete from {table} where {pk} in ({', '.join('?' * len(chunk))})", chunk)
+
+    # ---- holds ----
+
+    def hold(self, key: str, quantities: Dict[int, int]) -> bool:
+        """
+        Take quantities {prod_id: qty} off the replica's stock for a queued
+        order. False, holding nothing, if a product has less left; true if
+        the key already holds its stock.
+        """
+        with self._tx() as c:
+            if c.execute("select 1 from replica_holds where key = ? limit 1", (key,)).fetchone():
+                return True
+            for prod_id, qty in quantities.items():
+                row = c.execute("select stock from products where prod_id = ?", (prod_id,)).fetchone()
+                if row is None or (row[0] or 0) < qty:
+                    return False
+            now = time.time()
+            for prod_id, qty in quantities.items():
+                c.execute("insert into replica_holds (key, prod_id, quantity, held_at) values (?, ?, ?, ?)",
+                          (key, prod_id, qty, now))
+                c.execute("update products set stock = stock - ? where prod_id = ?", (qty, prod_id))
+        return True
+
+    def is_held(self, key: str) -> bool:
+        with self._lock:
+            return self._conn.execute("select 1 from replica_holds where key = ? limit 1", (key,)).fetchone() is not None
+
+    def holds(self) -> Dict[str, Dict]:
+        """{key: {"prod_ids": [...], "held_at": ts}} for every queued order."""
+        out: Dict[str, Dict] = {}
+        with self._lock:
+            for r in self._conn.execute("select key, prod_id, held_at from replica_holds order by held_at"):
+                out.setdefault(r["key"], {"prod_ids": [], "held_at": r["held_at"]})["prod_ids"].append(r["prod_id"])
+        return out
+
+
+class _RoutedQuery:
+    """Records builder calls, then replays them on the replica (reads) or the server (writes)."""
+
+    def __init__(self, terminal: "Terminal", remote, table: str, is_async: bool):
+        self._terminal = terminal
+        self._remote = remote
+        self._table = table
+        self._async = is_async
+        self._calls: List[Tuple[str, tuple, dict]] = []
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        def call(*args, **kwargs):
+            self._calls.append((name, args, kwargs))
+            return self
+        return call
+
+    def _build(self, q):
+        for name, args, kwargs in self._calls:
+            q = getattr(q, name)(*args, **kwargs)
+        return q
+
+    def execute(self):
+        op = next((name for name, _, _ in self._calls if name in WRITES), "select")
+        if op == "select" and self._terminal.replica.ready(self._table):
+            # microseconds either way: async callers get the answer without a thread hop
+            resp = self._build(self._terminal.replica.client.table(self._table)).execute()
+            self._terminal._count("local_reads")
+            return self._resolved(resp) if self._async else resp
+        q = self._build(self._remote.table(self._table))
+        if self._async:
+            return self._execute_async(q, op)
+        resp = q.execute()
+        self._terminal._remote_done(self._table, op, resp.data)
+        return resp
+
+    async def _execute_async(self, q, op: str):
+        resp = await q.execute()
+        self._terminal._remote_done(self._table, op, resp.data)
+        return resp
+
+    @staticmethod
+    async def _resolved(resp):
+        return resp
+
+
+class _RoutedClient:
+    def __init__(self, terminal: "Terminal", remote, is_async: bool):
+        self._terminal = terminal
+        self._remote = remote
+        self._async = is_async
+
+    def table(self, name: str):
+        if name not in REPLICATED:
+            return self._remote.table(name)
+        return _RoutedQuery(self._terminal, self._remote, name, self._async)
+
+    from_ = table
+
+    def __getattr__(self, name):
+        # rpc() and the rest of the client surface go to the server
+        return getattr(self._remote, name)
+
+
+class Terminal:
+    def __init__(self, path: Optional[str] = None, interval: Optional[float] = None,
+                 full_resync: Optional[float] = None, push_batch: Optional[int] = None):
+        self.replica = Replica(path or config.TERMINAL_REPLICA_PATH)
+        self.interval = config.TERMINAL_SYNC_INTERVAL if interval is None else interval
+        self.full_resync = config.TERMINAL_FULL_RESYNC if full_resync is None else full_resync
+        self.push_batch = push_batch or config.TERMINAL_PUSH_BATCH
+        self.online: Optional[bool] = None
+        self.last_error: Optional[str] = None
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._sync_lock = threading.Lock()
+        self._urgent = False
+        self._closed = False
+        self._metrics = {"syncs": 0, "sync_errors": 0, "rows_pulled": 0, "queued": 0, "pushed": 0, "rejected": 0,
+                         "local_reads": 0, "remote_reads": 0, "write_through": 0, "last_sync_ms": None,
+                         "last_push_lag_s": None, "max_push_lag_s": 0.0}
+        events.subscribe("stock_changed", self._on_stock_changed)
+        config.set_read_router(self)
+        self._thread = threading.Thread(target=self._run, name="terminal-sync", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # ---- read routing (config.set_read_router) ----
+
+    def route(self, client):
+        return _RoutedClient(self, client, False)
+
+    def route_async(self, client):
+        return _RoutedClient(self, client, True)
+
+    def _count(self, key: str, n: int = 1):
+        with self._lock:
+            self._metrics[key] += n
+
+    def _remote_done(self, table: str, op: str, rows: Optional[List[Dict]]):
+        """Copy what a write returned into the replica (the server's rows are authoritative)."""
+        if op == "select":
+            self._count("remote_reads")
+            return
+        if not rows:
+            return
+        try:
+            if op == "delete":
+                self.replica.delete(table, [r[REPLICATED[table]] for r in rows])
+            else:
+                self.replica.apply(table, rows)
+            self._count("write_through")
+        except Exception as e:
+            log.warning("terminal replica: could not copy a %s on %s: %s", op, table, e)
+
+    def _on_stock_changed(self, changes, **_):
+        # stock rpc / compare-and-swap results, including the ones sync() pushes
+        self._remote_done("products", "update", [c["product"] for c in changes if c.get("product")])
+
+    # ---- sync ----
+
+    def _run(self):
+        while True:
+            try:
+                self.sync()
+            except Exception:
+                log.exception("terminal sync failed")
+            with self._lock:
+                if not self._urgent and not self._closed:
+                    self._changed.wait(self.interval)
+                if self._closed:
+                    return
+                self._urgent = False
+
+    def sync(self, full: bool = False) -> Dict:
+        """
+        Pull changed rows, push queued writes, settle pushed orders. A
+        network error ends the round (the terminal is offline until one
+        succeeds). Returns what was done.
+        """
+        with self._sync_lock:
+            start = time.perf_counter()
+            report: Dict = {"pulled": {}}
+            try:
+                for table in REPLICATED:
+                    report["pulled"][table] = self._pull(table, full)
+                report.update(self._push())
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                if not outbox.is_transient(e):
+                    log.warning("terminal sync: %s", error)
+                with self._lock:
+                    self.online = not outbox.is_transient(e)
+                    self.last_error = error
+                    self._metrics["sync_errors"] += 1
+                report["error"] = error
+                return report
+            ms = round((time.perf_counter() - start) * 1000, 1)
+            with self._lock:
+                self.online = True
+                self.last_error = None
+                self._metrics["syncs"] += 1
+                self._metrics["last_sync_ms"] = ms
+                self._changed.notify_all()
+            report["ms"] = ms
+            return report
+
+    def _fetch(self, base, pk: str) -> List[Dict]:
+        rows: List[Dict] = []
+        for page in keyset_pages(base, pk, 1000, prefetch=False):
+            rows += page
+        return rows
+
+    def _pull(self, table: str, full: bool) -> Dict:
+        pk = REPLICATED[table]
+        state = self.replica.state(table)
+        remote = config.get_client_manager().get()
+        full = full or state["full_at"] is None or time.time() - state["full_at"] >= self.full_resync
+
+        def base():
+            return remote.table(table).select("*")
+
+        mode = None
+        if full:
+            rows = self._fetch(base, pk)
+            # an empty table tells nothing about the column; try updated_at first
+            mode = "updated_at" if not rows or any(r.get("updated_at") for r in rows) else "id"
+        elif state["mode"] == "updated_at" and state["watermark"] is not None:
+            try:
+                rows = self._fetch(lambda: base().gte("updated_at", state["watermark"]), pk)
+            except Exception as e:
+                if outbox.is_transient(e):
+                    raise
+                log.info("%s.updated_at unavailable, syncing by %s: %s", table, pk, e)
+                mode = "id"
+                rows = self._fetch(lambda: base().gt(pk, state["max_id"] or 0), pk)
+        elif state["max_id"] is not None:
+            rows = self._fetch(lambda: base().gt(pk, state["max_id"]), pk)
+        else:
+            rows = self._fetch(base, pk)
+        stored, deleted = self.replica.apply(table, rows, full=full, pulled=True, mode=mode)
+        self._count("rows_pulled", len(rows))
+        self._changed_rows(table, stored, deleted)
+        return {"mode": "full" if full else (mode or state["mode"]), "rows": len(rows), "deleted": len(deleted)}
+
+    def _changed_rows(self, table: str, rows: List[Dict], deleted: List):
+        pk = REPLICATED[table]
+        for row in rows:
+            cache.refresh(table, row[pk], store=False)
+        for value in deleted:
+            cache.refresh(table, value, store=False)
+        if table == "products" and (rows or deleted):
+            events.publish("products_changed", rows=rows, deleted=deleted)
+
+    def _push(self) -> Dict:
+        held = self.replica.holds()
+        counts = outbox.replay(self.push_batch)
+        if counts["replayed"] >= self.push_batch:
+            with self._lock:
+                self._urgent = True
+        box = outbox.get_outbox()
+        placed, rejected = [], []
+        for key in held:
+            entry = box.get(key)
+            if entry is None or entry["state"] == outbox.FAILED:
+                rejected.append(key)
+            elif entry["state"] == outbox.DONE:
+                placed.append(key)
+        settled = placed + rejected
+        if not settled:
+            return {"pushed": 0, "rejected": 0}
+        ids = sorted({pid for key in settled for pid in held[key]["prod_ids"]})
+        remote = config.get_client_manager().get()
+        rows = []
+        for chunk in _chunks(ids):
+            rows += remote.table("products").select("*").in_("prod_id", chunk).execute().data or []
+        stored, _ = self.replica.apply("products", rows, release=settled)
+        self._changed_rows("products", stored, [])
+        now = time.time()
+        lags = [now - held[key]["held_at"] for key in placed]
+        for key in rejected:
+            entry = box.get(key)
+            log.warning("terminal: order %s was rejected by the server: %s", key, entry and entry["error"])
+        with self._lock:
+            self._metrics["pushed"] += len(placed)
+            self._metrics["rejected"] += len(rejected)
+            if lags:
+                self._metrics["last_push_lag_s"] = round(max(lags), 3)
+                self._metrics["max_push_lag_s"] = round(max(self._metrics["max_push_lag_s"], *lags), 3)
+        return {"pushed": len(placed), "rejected": len(rejected)}
+
+    def wake(self):
+        """Run sync() now instead of at the next interval."""
+        with self._lock:
+            self._urgent = True
+            self._changed.notify_all()
+
+    # ---- orders ----
+
+    def place_order(self, customer_id: int, items: List[Dict], key: Optional[str] = None,
+                    wait: Optional[float] = None) -> Dict:
+        """
+        Queue an order (see order_service.queue_order) and hold its stock in
+        the replica, then wait up to `wait` seconds (TERMINAL_ORDER_WAIT) for
+        the background sync to place it. Returns the placed order with
+        state "placed", or a receipt with state "queued" (the order is placed
+        later under the same key). Raises OrderError if the order is invalid
+        or the server rejected it.
+        """
+        key = key or uuid.uuid4().hex
+        entry = order_service.queue_order(customer_id, items, key)
+        if entry["state"] == outbox.PENDING:
+            wanted: Dict[int, int] = {}
+            for it in entry["plan"]["items"]:
+                wanted[it["prod_id"]] = wanted.get(it["prod_id"], 0) + it["quantity"]
+            if not self.replica.hold(key, wanted):
+                message = "Not enough stock (taken by orders queued on this terminal)"
+                outbox.get_outbox().fail(key, message)
+                raise order_service.OrderError(message)
+            self._count("queued")
+            wait = config.TERMINAL_ORDER_WAIT if wait is None else wait
+            if self.online is not False:
+                self.wake()
+                if wait > 0:
+                    with self._lock:
+                        self._changed.wait_for(lambda: self._closed or not self.replica.is_held(key), wait)
+            entry = outbox.get_outbox().get(key)
+        return self._receipt(entry)
+
+    @staticmethod
+    def _receipt(entry: Dict) -> Dict:
+        if entry["state"] == outbox.DONE:
+            return dict(entry["result"], key=entry["key"], state="placed")
+        if entry["state"] == outbox.FAILED:
+            raise order_service.OrderError(entry["error"])
+        plan = entry["plan"]
+        return {"key": entry["key"], "state": "queued", "order": None, "customer": plan["customer"],
+                "items": plan["items"], "total": plan["total"]}
+
+    # ---- lag ----
+
+    def status(self) -> Dict:
+        now = time.time()
+        tables = {}
+        for table in REPLICATED:
+            s = self.replica.state(table)
+            tables[table] = {
+                "rows": self.replica.count(table),
+                "mode": s["mode"],
+                "watermark": s["watermark"],
+                "lag_s": round(now - s["pulled_at"], 3) if s["pulled_at"] else None,
+                "full_age_s": round(now - s["full_at"], 3) if s["full_at"] else None,
+            }
+        held = self.replica.holds()
+        with self._lock:
+            out = {"online": self.online, "last_error": self.last_error, "tables": tables,
+                   "waiting": len(held),
+                   "oldest_waiting_s": round(now - min(h["held_at"] for h in held.values()), 3) if held else None}
+            out.update(self._metrics)
+        return out
+
+    def close(self, timeout: float = 2.0):
+        """Stop syncing and serve reads from the server again. Queued orders stay in the outbox."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._changed.notify_all()
+        atexit.unregister(self.close)
+        config.set_read_router(None)
+        events.unsubscribe("stock_changed", self._on_stock_changed)
+        if threading.current_thread() is not self._thread:
+            self._thread.join(timeout)
+
+
+_instance: Optional[Terminal] = None
+_instance_lock = threading.Lock()
+
+
+def start(**kwargs) -> Terminal:
+    """The process's Terminal, started on first use (Terminal(**kwargs))."""
+    global _instance
+    with _instance_lock:
+        if _instance is None:
+            _instance = Terminal(**kwargs)
+        return _instance
+
+
+def active() -> Optional[Terminal]:
+    return _instance
+
+
+def stop():
+    global _instance
+    with _instance_lock:
+        terminal, _instance = _instance, None
+    if terminal is not None:
+        terminal.close()
+
+
+def place_order(customer_id: int, items: List[Dict], key: Optional[str] = None,
+                wait: Optional[float] = None) -> Dict:
+    return start().place_order(customer_id, items, key, wait)
+
+
+def sync(full: bool = False) -> Dict:
+    return start().sync(full)
+
+
+def status() -> Dict:
+    return start().status()
@@ -0,0 +1,387 @@
+# src/services/write_behind.py
+"""
+Optional write-behind coalescer for high-frequency stock and status writes.
+
+With WRITE_BEHIND on, restock_product, reduce_stock and cancel_order queue
+their writes here instead of making them one call at a time:
+  - stock deltas are summed per prod_id;
+  - status changes are merged per order_id (a conditional change keeps the
+    expected status of the first one queued);
+and a background thread flushes everything every WRITE_BEHIND_INTERVAL
+seconds, or as soon as WRITE_BEHIND_BATCH changes are queued: one
+conditional bulk update per (expected, new) status pair, one items read for
+the cancelled orders, and one stock_service.adjust() call for all deltas.
+
+The process that queued a change reads it back at once: get_product, the
+order reads of order_service and payment_service, and reduce_stock's stock
+check see pending changes on top of the last stored values. Other processes
+only see a change after the flush, and this process does not see their
+writes to a product or order while it has something pending for it.
+
+Memory is bounded: when WRITE_BEHIND_MAX_PENDING products + orders are
+pending, writers block until a flush makes room. Everything pending is
+flushed when the process exits (flush() / close() to do it earlier).
+
+A decrement is checked against this process's view when it is queued; if
+another process took the stock meanwhile the flush drops it, as it drops a
+status change whose order left the expected status. Both are logged and
+counted (write_behind.metrics()). Network errors re-queue the batch.
+"""
+import atexit
+import logging
+import threading
+import time
+from typing import Dict, List, Optional
+import src.config as config
+import src.dao.order_dao as order_dao
+import src.dao.product_dao as product_dao
+import src.services.stock_service as stock_service
+from src.services import events
+from src.services.outbox import is_transient
+
+log = logging.getLogger(__name__)
+
+
+class WriteBehind:
+    def __init__(self, interval: Optional[float] = None, batch: Optional[int] = None,
+                 max_pending: Optional[int] = None):
+        self.interval = config.WRITE_BEHIND_INTERVAL if interval is None else interval
+        self.batch = batch or config.WRITE_BEHIND_BATCH
+        self.max_pending = max_pending or config.WRITE_BEHIND_MAX_PENDING
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()
+        # queued, and taken by the flush in progress
+        self._stock: Dict[int, int] = {}
+        self._stock_inflight: Dict[int, int] = {}
+        self._status: Dict[int, Dict] = {}
+        self._status_inflight: Dict[int, Dict] = {}
+        # status changes stored by a flush that failed before restocking / publishing them
+        self._landed: List[Dict] = []
+        # last stored row of every product with a change queued or in flight
+        self._base: Dict[int, Dict] = {}
+        self._queued_since_flush = 0
+        self._urgent = False
+        self._closed = False
+        self._metrics = {"queued": 0, "coalesced": 0, "flushes": 0, "writes": 0, "conflicts": 0,
+                         "dropped": 0, "requeued": 0, "backpressure_waits": 0, "max_pending": 0}
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # ---- queueing ----
+
+    def _pending(self) -> int:
+        return (len(self._stock.keys() | self._stock_inflight.keys())
+                + len(self._status.keys() | self._status_inflight.keys()) + len(self._landed))
+
+    def _admit(self, new_keys: int):
+        """Block (lock held) while new_keys more would exceed max_pending."""
+        if threading.current_thread() is self._thread:
+            return
+        waited = False
+        while new_keys and self._pending() and self._pending() + new_keys > self.max_pending and not self._closed:
+            if not waited:
+                self._metrics["backpressure_waits"] += 1
+                waited = True
+            self._urgent = True
+            self._changed.notify_all()
+            self._changed.wait()
+
+    def _queued(self, n: int):
+        self._metrics["queued"] += n
+        self._metrics["max_pending"] = max(self._metrics["max_pending"], self._pending())
+        self._queued_since_flush += n
+        if self._queued_since_flush == n or self._queued_since_flush >= self.batch:
+            self._changed.notify_all()
+
+    def _stock_of(self, prod_id: int) -> int:
+        return (int(self._base[prod_id].get("stock") or 0)
+                + self._stock_inflight.get(prod_id, 0) + self._stock.get(prod_id, 0))
+
+    def product(self, prod_id: int) -> Optional[Dict]:
+        """This process's view of a product with changes pending, else None (read it from the DAO)."""
+        with self._lock:
+            if prod_id not in self._base:
+                return None
+            return dict(self._base[prod_id], stock=self._stock_of(prod_id))
+
+    def order(self, order_id: int) -> Optional[Dict]:
+        """This process's view of an order with a status change pending, else None."""
+        with self._lock:
+            entry = self._status.get(order_id) or self._status_inflight.get(order_id)
+            return dict(entry["order"]) if entry else None
+
+    def add_stock(self, deltas: Dict[int, int], rows: Dict[int, Dict]) -> List[Dict]:
+        """
+        Queue signed stock deltas {prod_id: delta}. rows ({prod_id: row}) are
+        the caller's copies of the products, used for those with nothing
+        pending. Raises InsufficientStockError, queueing nothing, if a
+        product would go negative in this process's view. Returns the
+        products as they will be after the flush.
+        """
+        deltas = {int(pid): int(d) for pid, d in deltas.items() if int(d) != 0}
+        with self._changed:
+            self._admit(len([pid for pid in deltas if pid not in self._base]))
+            fresh = {pid: dict(rows[pid]) for pid in deltas if pid not in self._base}
+            self._base.update(fresh)
+            short = [pid for pid, d in deltas.items() if self._stock_of(pid) + d < 0]
+            if short:
+                pid = short[0]
+                message = f"Insufficient stock for product {pid}: available={self._stock_of(pid)}, required={-deltas[pid]}"
+                for fresh_pid in fresh:
+                    del self._base[fresh_pid]
+                raise stock_service.InsufficientStockError(message)
+            for pid, d in deltas.items():
+                if pid in self._stock:
+                    self._metrics["coalesced"] += 1
+                self._stock[pid] = self._stock.get(pid, 0) + d
+            self._queued(len(deltas))
+            return [dict(self._base[pid], stock=self._stock_of(pid)) for pid in deltas]
+
+    def set_status(self, order: Dict, status: str, expected_status: Optional[str] = None, restock: bool = False,
+                   event: Optional[str] = None) -> Optional[Dict]:
+        """
+        Queue a status change for `order` (the caller's copy). With
+        expected_status it is checked now against this process's view and
+        again by the flush's conditional update. restock gives the order's
+        items back to stock once the change is stored, and `event` is then
+        published with order= and items=. Returns the order as it will be,
+        or None if it is not in expected_status.
+        """
+        order_id = order["order_id"]
+        with self._changed:
+            if order_id not in self._status:
+                self._admit(1)
+            entry = self._status.get(order_id)
+            current = entry or self._status_inflight.get(order_id)
+            view = current["order"] if current else order
+            if expected_status is not None and view["status"] != expected_status:
+                return None
+            if entry is None:
+                entry = self._status[order_id] = {"expected": expected_status, "restock": False, "events": []}
+            else:
+                self._metrics["coalesced"] += 1
+            entry["order"] = dict(view, status=status)
+            entry["restock"] = entry["restock"] or restock
+            if event is not None:
+                entry["events"].append(event)
+            self._queued(1)
+            return dict(entry["order"])
+
+    # ---- flushing ----
+
+    def flush(self) -> Dict:
+        """Write everything queued so far; returns what was written, dropped and re-queued."""
+        with self._flush_lock:
+            with self._lock:
+                stock, self._stock = self._stock, {}
+                statuses, self._status = self._status, {}
+                self._stock_inflight, self._status_inflight = stock, statuses
+                landed, self._landed = self._landed, []
+                self._queued_since_flush = 0
+            done = {"statuses": 0, "products": 0, "conflicts": 0, "dropped": 0, "requeued": 0}
+            rows: List[Dict] = []
+            unwritten = stock
+            try:
+                self._write_statuses(statuses, landed, done)
+                self._finish_landed(landed, stock)
+                landed = []
+                # the in-flight dict stays whole for readers until _settle()
+                unwritten = dict(stock)
+                self._write_stock(unwritten, rows, done)
+            except Exception as e:
+                if is_transient(e) or isinstance(e, stock_service.StockConflictError):
+                    log.warning("write-behind flush failed, re-queued: %s", e)
+                    done["requeued"] = len(unwritten) + len(statuses) + len(landed)
+                else:
+                    done["dropped"] = len(unwritten) + len(statuses) + len(landed)
+                    unwritten, statuses, landed = {}, {}, []
+                    raise
+            finally:
+                self._settle(unwritten, statuses, landed, rows, done)
+            return done
+
+    def _write_statuses(self, statuses: Dict[int, Dict], landed: List[Dict], done: Dict):
+        """One conditional bulk update per (expected, new) status; stored changes move to `landed`."""
+        groups: Dict[tuple, List[int]] = {}
+        for order_id, entry in statuses.items():
+            groups.setdefault((entry["expected"], entry["order"]["status"]), []).append(order_id)
+        for (expected, status), ids in groups.items():
+            self._metrics["writes"] += 1
+            changed = {r["order_id"]: r for r in order_dao.update_orders_status(ids, status, expected)}
+            for order_id in ids:
+                entry = statuses.pop(order_id)
+                if order_id in changed:
+                    landed.append(dict(entry, order=changed[order_id]))
+                    done["statuses"] += 1
+                else:
+                    done["conflicts"] += 1
+                    log.warning("write-behind: order %s was no longer %s, not set to %s", order_id, expected, status)
+
+    def _finish_landed(self, landed: List[Dict], stock: Dict[int, int]):
+        """Add the items of restocking orders to the stock deltas and publish the orders' events."""
+        wanted = [e["order"]["order_id"] for e in landed if e["restock"] or e["events"]]
+        if not wanted:
+            return
+        self._metrics["writes"] += 1
+        items_by_order: Dict[int, List[Dict]] = {}
+        for it in order_dao.get_order_items(wanted):
+            items_by_order.setdefault(it["order_id"], []).append(it)
+        for entry in landed:
+            items = items_by_order.get(entry["order"]["order_id"], [])
+            if entry["restock"]:
+                for it in items:
+                    stock[it["prod_id"]] = stock.get(it["prod_id"], 0) + it["quantity"]
+            for event in entry["events"]:
+                events.publish(event, order=entry["order"], items=items)
+
+    def _write_stock(self, stock: Dict[int, int], rows: List[Dict], done: Dict):
+        """
+        All deltas in one stock_service.adjust(); product by product if that runs
+        short. Deltas are removed from `stock` as they are written (or dropped) and
+        the stored rows added to `rows`, so a failure part-way leaves in `stock`
+        exactly what still has to be re-queued.
+        """
+        deltas = {pid: d for pid, d in stock.items() if d}
+        if not deltas:
+            stock.clear()
+            return
+        with self._lock:
+            known = {pid: int(self._base[pid].get("stock") or 0) for pid in deltas if pid in self._base}
+        self._metrics["writes"] += 1
+        try:
+            rows.extend(stock_service.adjust(deltas, known))
+            stock.clear()
+        except stock_service.InsufficientStockError:
+            # another process took stock meanwhile: apply what still fits
+            for pid, d in deltas.items():
+                self._metrics["writes"] += 1
+                try:
+                    rows.extend(stock_service.adjust({pid: d}, {pid: known[pid]} if pid in known else None))
+                except stock_service.InsufficientStockError as e:
+                    done["dropped"] += 1
+                    log.warning("write-behind: dropped stock change %+d for product %s: %s", d, pid, e)
+                    fresh = product_dao.get_product_by_id(pid, fresh=True)
+                    if fresh:
+                        rows.append(fresh)
+                del stock[pid]
+                done["products"] += 1
+            stock.clear()   # the zero deltas
+            return
+        done["products"] = len(deltas)
+
+    def _settle(self, stock: Dict[int, int], statuses: Dict[int, Dict], landed: List[Dict],
+                rows: List[Dict], done: Dict):
+        """End of a flush: take in the stored rows, re-queue what was not written, wake writers."""
+        with self._changed:
+            for row in rows:
+                if row["prod_id"] in self._base:
+                    self._base[row["prod_id"]] = row
+            # what was not written goes in front of whatever was queued meanwhile
+            for pid, d in stock.items():
+                self._stock[pid] = self._stock.get(pid, 0) + d
+            for order_id, entry in statuses.items():
+                newer = self._status.get(order_id)
+                if newer is not None:
+                    entry = dict(newer, expected=entry["expected"], restock=entry["restock"] or newer["restock"],
+                                 events=entry["events"] + newer["events"])
+                self._status[order_id] = entry
+            self._landed = landed + self._landed
+            for pid in self._stock_inflight:
+                if pid not in self._stock:
+                    self._base.pop(pid, None)
+            self._stock_inflight, self._status_inflight = {}, {}
+            self._metrics["flushes"] += 1
+            for k in ("conflicts", "dropped", "requeued"):
+                self._metrics[k] += done[k]
+            self._changed.notify_all()
+
+    def _run(self):
+        while True:
+            with self._changed:
+                while not self._closed and not self._pending():
+                    self._changed.wait()
+                deadline = time.monotonic() + self.interval
+                while not self._closed and not self._urgent and self._queued_since_flush < self.batch:
+                    left = deadline - time.monotonic()
+                    if left <= 0:
+                        break
+                    self._changed.wait(left)
+                if self._closed:
+                    return
+                self._urgent = False
+            try:
+                if self.flush()["requeued"]:
+                    time.sleep(self.interval)
+            except Exception as e:
+                log.error("write-behind flush failed: %s", e)
+                time.sleep(self.interval)
+
+    def metrics(self) -> Dict:
+        with self._lock:
+            m = dict(self._metrics)
+            m["pending"] = self._pending()
+        return m
+
+    def close(self, attempts: int = 5):
+        """Stop the background thread and flush what is left."""
+        with self._changed:
+            if self._closed:
+                return
+            self._closed = True
+            self._changed.notify_all()
+        self._thread.join()
+        atexit.unregister(self.close)
+        for _ in range(attempts):
+            if not self.flush()["requeued"]:
+                return
+            time.sleep(self.interval)
+        log.error("write-behind: %d changes could not be written before exit", self.metrics()["pending"])
+
+
+_instance: Optional[WriteBehind] = None
+_instance_lock = threading.Lock()
+
+
+def active() -> Optional[WriteBehind]:
+    """The process's coalescer when WRITE_BEHIND is on (started on first use), else None."""
+    global _instance
+    if not config.WRITE_BEHIND:
+        return None
+    with _instance_lock:
+        if _instance is None:
+            _instance = WriteBehind()
+        return _instance
+
+
+def flush() -> Optional[Dict]:
+    return _instance.flush() if _instance is not None else None
+
+
+def shutdown():
+    """Flush and stop the coalescer (the next active() starts a new one)."""
+    global _instance
+    with _instance_lock:
+        wb, _instance = _instance, None
+    if wb is not None:
+        wb.close()
+
+
+def metrics() -> Dict:
+    return _instance.metrics() if _instance is not None else {}
+
+
+def overlay_product(row: Optional[Dict]) -> Optional[Dict]:
+    """row with this process's pending stock changes applied."""
+    if row is None or _instance is None:
+        return row
+    view = _instance.product(row["prod_id"])
+    return dict(row, stock=view["stock"]) if view else row
+
+
+def overlay_order(row: Optional[Dict]) -> Optional[Dict]:
+    """row with this process's pending status change applied."""
+    if row is None or _instance is None:
+        return row
+    return _instance.order(row["order_id"]) or row